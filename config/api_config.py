@@ -19,10 +19,52 @@ TRACKING_TIMEOUT = 3600  # Тайм-аут отслеживания в секу
 MIN_DISTANCE_DELTA = 10  # Минимальное изменение позиции в метрах для обновления
 ACCURACY_THRESHOLD = 100  # Максимальная погрешность в метрах
 
+# Настройки пакетной записи координат
+LOCATION_BATCH_SIZE = 200  # Точек в одной транзакции
+LOCATION_BATCH_WINDOW = 0.5  # Максимальное ожидание пачки в секундах
+LOCATION_QUEUE_SIZE = 20000  # Размер очереди до включения backpressure
+GROUP_MAP_DEBOUNCE = 5  # Минимальный интервал обновления карты группы в секундах
+GROUP_MAP_COALESCE_WINDOW = 1  # Окно объединения обновлений позиций группы перед перерисовкой
+USER_GROUP_MISS_TTL = 30  # Секунд до повторного поиска группы пользователя вне групп
+LIVE_POSITION_MAX_AGE = 900  # Секунд без отметок, после которых волонтер не считается на месте
+LIVE_POSITION_PRUNE_INTERVAL = 60  # Интервал очистки устаревших live-позиций в секундах
+
+# История перемещений (суточные файлы-шарды)
+LOCATION_HISTORY_DIR = os.getenv("LOCATION_HISTORY_DIR", "data/locations")
+LOCATION_RETENTION_DAYS = int(os.getenv("LOCATION_RETENTION_DAYS", 90))  # Удаление шардов старше
+LOCATION_DOWNSAMPLE_AFTER_DAYS = 7  # Прореживание шардов старше
+LOCATION_DOWNSAMPLE_INTERVAL = 30  # Одна точка пользователя на интервал (сек) после прореживания
+LOCATION_HEAT_PRECISION = 4  # Знаков координат в ячейке тепловой карты
+
 # Настройки кэширования карт
 CACHE_LIFETIME = 86400  # Время жизни кэша в секундах (24 часа)
 MAX_CACHE_SIZE = 1024 * 1024 * 100  # Максимальный размер кэша (100 МБ)
 
+# Загрузка тайлов
+TILE_SOURCES = {
+    'osm': 'https://tile.openstreetmap.org/{z}/{x}/{y}.png',
+    'topo': 'https://tile.opentopomap.org/{z}/{x}/{y}.png',
+}
+TILE_MAX_CONNECTIONS = 32  # Всего одновременных соединений
+TILE_PER_HOST_LIMIT = 8  # Одновременных запросов к одному серверу тайлов
+TILE_REQUEST_TIMEOUT = 15  # Тайм-аут загрузки тайла в секундах
+TILE_USER_AGENT = os.getenv("TILE_USER_AGENT", "ZOZ-Burevestnik/1.0")
+
+# Офлайн-карты
+OFFLINE_MAPS_DIR = "cache/offline"
+OFFLINE_ZOOM_RANGE = (10, 16)  # Масштабы для скачивания области
+OFFLINE_DOWNLOAD_CONCURRENCY = 2  # Одновременных загрузок тайлов
+OFFLINE_DOWNLOAD_RATE = float(os.getenv("OFFLINE_DOWNLOAD_RATE", 2))  # Тайлов в секунду с сервера
+# Сервер, разрешающий массовую выгрузку (свой или по договору с провайдером).
+# Без источника скачивание областей отключено
+OFFLINE_TILE_URL = os.getenv("OFFLINE_TILE_URL")
+if OFFLINE_TILE_URL:
+    TILE_SOURCES['offline'] = OFFLINE_TILE_URL
+OFFLINE_TILE_SOURCE = os.getenv("OFFLINE_TILE_SOURCE", 'offline' if OFFLINE_TILE_URL else None)
+# Политика tile.openstreetmap.org запрещает массовую выгрузку
+OFFLINE_FORBIDDEN_SOURCES = {'osm'}
+OFFLINE_AVG_TILE_SIZE = 20 * 1024  # Средний размер тайла для оценки объема, байт
+
 # Настройки отображения
 MAP_STYLES = {
     'default': 'map',
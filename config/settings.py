@@ -20,6 +20,42 @@ DEFAULT_PASSWORD = os.getenv('DEFAULT_PASSWORD', 'KREML')
 
 # Database settings
 DATABASE_PATH = "bot_database.db"
+DB_READ_POOL_SIZE = int(os.getenv('DB_READ_POOL_SIZE', 4))  # читающих соединений
+DB_BUSY_TIMEOUT = int(os.getenv('DB_BUSY_TIMEOUT', 5000))  # мс
+DB_STATEMENT_CACHE_SIZE = int(os.getenv('DB_STATEMENT_CACHE_SIZE', 256))
+DB_EXECUTOR_WORKERS = int(os.getenv('DB_EXECUTOR_WORKERS', 4))  # потоков для синхронного sqlite3
+LOOP_BLOCK_THRESHOLD = float(os.getenv('LOOP_BLOCK_THRESHOLD', 0.1))  # сек; дольше - блокировка цикла
+
+# Экспорт отчетов
+REPORT_EXPORT_WORKERS = int(os.getenv('REPORT_EXPORT_WORKERS', 2))  # потоков записи файлов
+REPORT_EXPORT_BATCH = 500  # строк в одной пачке чтения/записи
+
+# Рассылка уведомлений (лимиты Telegram)
+NOTIFICATION_GLOBAL_RATE = 30  # сообщений в секунду на бота
+NOTIFICATION_CHAT_RATE = 1  # сообщений в секунду в один чат
+NOTIFICATION_WORKERS = int(os.getenv('NOTIFICATION_WORKERS', 8))  # параллельных отправителей
+
+# Кэш: локальный уровень всегда, Redis - если задан REDIS_URL
+REDIS_URL = os.getenv('REDIS_URL')
+CACHE_DEFAULT_TTL = 3600  # секунд в Redis
+CACHE_LOCAL_TTL = int(os.getenv('CACHE_LOCAL_TTL', 60))  # секунд в памяти процесса
+CACHE_MAX_ITEMS = 10000
+CACHE_MAX_BYTES = int(os.getenv('CACHE_MAX_BYTES', 32 * 1024 * 1024))
+
+# Материализованная аналитика
+ANALYTICS_REFRESH_INTERVAL = int(os.getenv('ANALYTICS_REFRESH_INTERVAL', 300))  # секунд
+ANALYTICS_REFRESH_CONCURRENCY = 4  # операций, пересчитываемых одновременно
+
+# Растровые сетки покрытия операций
+COVERAGE_GRID_FLUSH_INTERVAL = int(os.getenv('COVERAGE_GRID_FLUSH_INTERVAL', 60))  # секунд между растеризацией и записью
+
+# Массовое создание секторов
+SECTOR_VALIDATION_PROCESSES = int(os.getenv('SECTOR_VALIDATION_PROCESSES', 2))  # процессов проверки геометрии
+SECTOR_VALIDATION_CHUNK = 250  # секторов в одном задании; меньшие пачки проверяются без пула
+SECTOR_PREVIEW_CONCURRENCY = 4  # превью карт, генерируемых одновременно
+SECTOR_GRID_MAX_CELLS = int(os.getenv('SECTOR_GRID_MAX_CELLS', 5000))  # предел автоматической нарезки
+SECTOR_WALKING_SPEED = 3.0  # км/ч, скорость прочесывания по открытой местности
+SECTOR_SWEEP_WIDTH = 100.0  # м, ширина полосы прочесывания одного поисковика
 
 # Email settings
 SMTP_SERVER = os.getenv('SMTP_SERVER', "smtp.gmail.com")
@@ -1,9 +1,11 @@
 from typing import Dict, List, Optional
 from datetime import datetime, timedelta
+import asyncio
 import json
 import logging
 import numpy as np
 from dataclasses import dataclass
+from services.analytics_summary import AnalyticsSummary
 
 logger = logging.getLogger(__name__)
 
@@ -20,49 +22,51 @@ class OperationAnalytics:
     resource_utilization: float
 
 class AnalyticsManager:
-    def __init__(self, db_manager):
+    # Метрики сравнения операций: имя -> чем больше, тем лучше
+    COMPARED_METRICS = {
+        'task_completion_rate': True,
+        'coverage_rate': True,
+        'coordination_score': True,
+        'resource_efficiency': True,
+        'distance_per_participant': True,
+        'response_time': False,
+    }
+
+    def __init__(self, db_manager, summary: Optional[AnalyticsSummary] = None):
         self.db = db_manager
+        self.summary = summary or AnalyticsSummary(db_manager)
 
     async def get_detailed_analytics(self, operation_id: int) -> Dict:
         """Получение детальной аналитики операции"""
         try:
-            # Базовая информация
-            operation = await self.db.fetch_one("""
-                SELECT * FROM operation_analytics WHERE operation_id = ?
-            """, (operation_id,))
-            
-            # Временная линия событий
-            timeline = await self._get_operation_timeline(operation_id)
-            
-            # Анализ эффективности команд
-            team_analysis = await self._analyze_teams(operation_id)
-            
-            # Анализ покрытия территории
-            coverage_analysis = await self._analyze_coverage(operation_id)
-            
-            # Анализ выполнения задач
-            task_analysis = await self._analyze_tasks(operation_id)
-            
-            return {
-                'basic_info': operation,
-                'timeline': timeline,
-                'team_analysis': team_analysis,
-                'coverage_analysis': coverage_analysis,
-                'task_analysis': task_analysis,
-                'recommendations': await self._generate_recommendations(operation_id)
-            }
+            # Базовая информация и команды - из материализованных сводок
+            operation, teams, timeline = await asyncio.gather(
+                self.summary.get_operation(operation_id),
+                self.summary.get_teams([operation_id]),
+                self._get_operation_timeline(operation_id)
+            )
+            if not operation:
+                return None
+            return self._build_analytics(operation, teams[operation_id], timeline)
         except Exception as e:
             logger.error(f"Error getting detailed analytics: {e}")
             return None
 
     async def generate_comparative_analysis(self, operation_ids: List[int]) -> Dict:
-        """Сравнительный анализ нескольких операций"""
+        """Сравнительный анализ нескольких операций
+
+        Сводки всех операций и их команд читаются двумя запросами
+        независимо от числа операций.
+        """
         try:
-            operations_data = []
-            for op_id in operation_ids:
-                analytics = await self.get_detailed_analytics(op_id)
-                if analytics:
-                    operations_data.append(analytics)
+            operations, teams = await asyncio.gather(
+                self.summary.get_operations(operation_ids),
+                self.summary.get_teams(operation_ids)
+            )
+            operations_data = [
+                self._build_analytics(operation, teams[operation['operation_id']])
+                for operation in operations
+            ]
             
             return {
                 'operations': operations_data,
@@ -73,44 +77,116 @@ class AnalyticsManager:
             logger.error(f"Error generating comparative analysis: {e}")
             return None
 
-    async def _analyze_teams(self, operation_id: int) -> List[Dict]:
+    def _build_analytics(self, operation: Dict, teams: List[Dict],
+                         timeline: Optional[List[Dict]] = None) -> Dict:
+        task_analysis = self._analyze_tasks(operation)
+        analytics = {
+            'basic_info': operation,
+            'team_analysis': self._analyze_teams(teams),
+            'coverage_analysis': self._analyze_coverage(operation),
+            'task_analysis': task_analysis,
+        }
+        if timeline is not None:
+            analytics['timeline'] = timeline
+        analytics['recommendations'] = self._generate_recommendations(operation, task_analysis)
+        return analytics
+
+    async def _get_operation_timeline(self, operation_id: int) -> List[Dict]:
+        """Временная линия событий операции"""
+        try:
+            return await self.db.fetch_all("""
+                SELECT event_type, timestamp, details
+                FROM operation_timestamps
+                WHERE operation_id = ?
+                ORDER BY timestamp
+            """, (operation_id,))
+        except Exception as e:
+            logger.warning(f"Operation timeline unavailable: {e}")
+            return []
+
+    @staticmethod
+    def _analyze_teams(teams: List[Dict]) -> List[Dict]:
         """Анализ эффективности команд"""
-        return await self.db.fetch_all("""
-            SELECT 
-                sg.group_id,
-                sg.name as team_name,
-                COUNT(DISTINCT gm.user_id) as member_count,
-                tpm.coverage_area,
-                tpm.task_completion_rate,
-                tpm.coordination_score,
-                tpm.response_time
-            FROM search_groups sg
-            LEFT JOIN group_members gm ON sg.group_id = gm.group_id
-            LEFT JOIN team_performance_metrics tpm 
-                ON sg.group_id = tpm.team_id 
-                AND tpm.operation_id = sg.operation_id
-            WHERE sg.operation_id = ?
-            GROUP BY sg.group_id
-        """, (operation_id,))
-
-    async def _analyze_coverage(self, operation_id: int) -> Dict:
-        """Анализ покрытия территории"""
-        coverage_data = await self.db.fetch_all("""
-            SELECT 
-                sa.sector_id,
-                sa.boundaries,
-                sa.priority,
-                sa.status,
-                COUNT(DISTINCT t.track_id) as track_count,
-                SUM(t.distance) as total_distance
-            FROM search_areas sa
-            LEFT JOIN tracks t ON ST_Intersects(sa.boundaries, t.path)
-            WHERE sa.operation_id = ?
-            GROUP BY sa.sector_id
-        """, (operation_id,))
-        
+        return [{
+            'group_id': team['group_id'],
+            'team_name': team.get('team_name'),
+            'member_count': team['member_count'],
+            'task_completion_rate': round(
+                team['task_completed'] / team['task_total'] * 100, 2) if team['task_total'] else 0.0,
+            'total_distance': round(team['total_distance'], 2),
+            'track_count': team['track_count'],
+        } for team in teams]
+
+    @staticmethod
+    def _analyze_coverage(operation: Dict) -> Dict:
+        """Анализ покрытия территории (пересчитывается планировщиком)"""
         return {
-            'sectors': coverage_data,
-            'total_coverage': self._calculate_total_coverage(coverage_data),
-            'efficiency_score': self._calculate_coverage_efficiency(coverage_data)
+            'total_coverage': operation.get('coverage_rate') or 0.0,
+            'total_distance': round(operation['total_distance'], 2),
+            'refreshed_at': operation.get('refreshed_at'),
         }
+
+    @staticmethod
+    def _analyze_tasks(operation: Dict) -> Dict:
+        """Анализ выполнения задач"""
+        total = operation['task_total']
+        return {
+            'total': total,
+            'completed': operation['task_completed'],
+            'completion_rate': round(operation['task_completed'] / total * 100, 2) if total else 0.0,
+        }
+
+    @staticmethod
+    def _generate_recommendations(operation: Dict, task_analysis: Dict) -> List[str]:
+        recommendations = []
+        if task_analysis['total'] and task_analysis['completion_rate'] < 50:
+            recommendations.append("Выполнено меньше половины задач: пересмотрите распределение")
+        if operation['team_count'] and operation['participant_count'] < operation['team_count'] * 2:
+            recommendations.append("В командах мало участников: объедините группы")
+        if (operation.get('coverage_rate') or 0) < 50:
+            recommendations.append("Покрыто меньше половины области поиска")
+        return recommendations
+
+    def _metrics(self, analytics: Dict) -> Dict[str, float]:
+        operation = analytics['basic_info']
+        participants = operation['participant_count']
+        return {
+            'task_completion_rate': analytics['task_analysis']['completion_rate'],
+            'coverage_rate': operation.get('coverage_rate') or 0.0,
+            'coordination_score': operation.get('coordination_score') or 0.0,
+            'resource_efficiency': operation.get('resource_efficiency') or 0.0,
+            'distance_per_participant': round(operation['total_distance'] / participants, 2)
+            if participants else 0.0,
+            'response_time': operation.get('response_time') or 0,
+        }
+
+    def _compare_operations(self, operations_data: List[Dict]) -> Dict:
+        """Минимум, максимум, среднее и лучшая операция по каждой метрике"""
+        if not operations_data:
+            return {}
+        ids = [data['basic_info']['operation_id'] for data in operations_data]
+        values = np.array([list(self._metrics(data).values()) for data in operations_data], dtype=float)
+        comparison = {}
+        for column, (name, higher_is_better) in enumerate(self.COMPARED_METRICS.items()):
+            series = values[:, column]
+            best = int(np.argmax(series) if higher_is_better else np.argmin(series))
+            comparison[name] = {
+                'min': float(series.min()),
+                'max': float(series.max()),
+                'avg': round(float(series.mean()), 2),
+                'best_operation': ids[best],
+            }
+        return comparison
+
+    async def _identify_best_practices(self, operations_data: List[Dict]) -> List[Dict]:
+        """Операции с лучшим выполнением задач и их состав"""
+        ranked = sorted(operations_data, key=lambda data: data['task_analysis']['completion_rate'],
+                        reverse=True)
+        return [{
+            'operation_id': data['basic_info']['operation_id'],
+            'completion_rate': data['task_analysis']['completion_rate'],
+            'team_count': data['basic_info']['team_count'],
+            'participants_per_team': round(
+                data['basic_info']['participant_count'] / data['basic_info']['team_count'], 2
+            ) if data['basic_info']['team_count'] else 0.0,
+        } for data in ranked[:3] if data['task_analysis']['completion_rate'] > 0]
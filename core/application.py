@@ -1,45 +1,133 @@
 import logging
 from telegram import Update
 from telegram.ext import ApplicationBuilder
+from config.api_config import YANDEX_API_KEY
+from config.settings import DATABASE_PATH
 from core.bot import Bot
+from core.efficiency_manager import EfficiencyManager
+from core.escalation_manager import EscalationManager
 from core.handler_registry import HandlerRegistry
+from core.scheduler import JobScheduler, TaskScheduler
+from core.task_management_service import TaskManagementService
+from database.db_manager import DatabaseManager
+from database.executor import close_executors
+from services.analytics_summary import AnalyticsRefresher, AnalyticsSummary
+from services.coverage_grid import CoverageGridStore
+from services.location_store import LocationHistoryStore
+from services.notification_manager import NotificationManager
+from services.tracking_service import TrackingService
+from services.yandex_maps_service import YandexMapsService
+from utils.loop_monitor import LoopBlockDetector
 
 logger = logging.getLogger(__name__)
 
 class BotApplication:
-    def __init__(self, token: str):
+    def __init__(self, token: str, db_path: str = DATABASE_PATH):
         self.token = token
         self.application = None
         self.bot = None
         self.handler_registry = None
-        
+        self.loop_monitor = LoopBlockDetector()
+        self.db = DatabaseManager(db_path)
+        # Shared background services, one instance per process
+        self.analytics_summary = AnalyticsSummary(self.db)
+        self.coverage_grids = CoverageGridStore(self.db)
+        self.location_history = LocationHistoryStore()
+        # Heat map queries in database/operations.py read these from the manager
+        self.db.coverage_grids = self.coverage_grids
+        self.db.location_store = self.location_history
+        self.efficiency_manager = EfficiencyManager(self.db, coverage_grids=self.coverage_grids,
+                                                    summary=self.analytics_summary)
+        self.analytics_refresher = AnalyticsRefresher(self.analytics_summary, self.efficiency_manager)
+        # One job scheduler for every manager: each only claims its own job kinds
+        self.scheduler = JobScheduler(self.db)
+        self.tracking = TrackingService(self.db, YandexMapsService(YANDEX_API_KEY),
+                                        coverage_grids=self.coverage_grids,
+                                        location_history=self.location_history)
+        self.notifications = None
+        self.escalations = None
+        self.task_service = None
+        self.task_scheduler = None
+
     async def setup(self):
         """Initialize bot and register handlers"""
         try:
+            await self.db.init_pool()
+            await self.setup_services()
+
             # Initialize application
             self.application = ApplicationBuilder().token(self.token).build()
-            
+
             # Initialize bot
             self.bot = Bot(self.application)
-            
+            self.setup_managers(self.application.bot)
+
             # Initialize and register handlers
             self.handler_registry = HandlerRegistry(self.bot)
             await self.handler_registry.register_all_handlers()
-            
+
             logger.info("Bot setup completed successfully")
-            
+
         except Exception as e:
             logger.error(f"Error during setup: {e}")
             raise
 
+    async def setup_services(self):
+        """Prepare database-backed services before the bot starts"""
+        # Summary triggers depend on the source table columns, so they are
+        # installed at startup; rebuild reconciles counters written without them
+        try:
+            await self.analytics_summary.install()
+            await self.analytics_summary.rebuild()
+        except Exception as e:
+            logger.error(f"Error preparing analytics summaries: {e}")
+        await self.scheduler.install()
+
+    def setup_managers(self, telegram_bot):
+        """Managers that send messages, all sharing the application scheduler"""
+        self.notifications = NotificationManager(telegram_bot, self.db)
+        self.escalations = EscalationManager(self.db, self.notifications, scheduler=self.scheduler)
+        self.task_service = TaskManagementService(self.db, self.notifications, self.escalations)
+        self.task_scheduler = TaskScheduler(self.task_service, scheduler=self.scheduler)
+
+    async def start_services(self):
+        self.analytics_refresher.start()
+        self.coverage_grids.start()
+        # Retention and downsampling of the daily location shards
+        self.location_history.start()
+        # Stale volunteers are dropped from the nearest-volunteer index
+        self.tracking.start()
+        if self.notifications:
+            await self.notifications.start()
+            await self.escalations.start()
+            await self.task_scheduler.start()
+
+    async def stop_services(self):
+        await self.analytics_refresher.stop()
+        await self.tracking.shutdown()
+        # Last points of stopped tracks are rasterized and saved
+        await self.coverage_grids.stop()
+        await self.location_history.close()
+        await self.scheduler.stop()
+        if self.notifications:
+            await self.notifications.stop()
+
     async def start(self):
         """Start the bot"""
         try:
             if not self.bot:
                 raise ValueError("Bot not initialized. Call setup() first")
-                
+
+            # Log coroutines that hold the event loop for too long
+            self.loop_monitor.start()
+            await self.start_services()
             await self.bot.start()
-            
+
         except Exception as e:
             logger.error(f"Error starting bot: {e}")
             raise
+        finally:
+            await self.stop_services()
+            await self.loop_monitor.stop()
+            await self.db.close()
+            close_executors()
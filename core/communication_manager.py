@@ -3,6 +3,8 @@ from datetime import datetime
 import logging
 from telegram import Bot, InlineKeyboardMarkup, InlineKeyboardButton
 
+from core.constants.notification_types import NotificationType, NOTIFICATION_PRIORITIES
+
 logger = logging.getLogger(__name__)
 
 class CommunicationManager:
@@ -107,15 +109,14 @@ class CommunicationManager:
             logger.error(f"Error creating quick command: {e}")
             return None
 
-    async def handle_emergency_message(self, group_id: int, content: str, sender_id: int):
-        """Обработка экстренного сообщения"""
-        try:
-            # Получаем всех координаторов группы
-            coordinators = await self.db.execute_query_fetchall("""
-                SELECT user_id FROM group_members 
-                WHERE group_id = ? AND role = 'coordinator'
-            """, (group_id,))
+    async def handle_emergency_message(self, group_id: int, content: str, sender_id: int,
+                                       operation_id: Optional[int] = None):
+        """Обработка экстренного сообщения.
 
+        Без ``operation_id`` оповещаются координаторы группы, с ним - все
+        участники операции; рассылка уходит одним пакетом.
+        """
+        try:
             # Формируем экстренное сообщение
             sender_info = await self.db.get_user(sender_id)
             emergency_message = (
@@ -126,13 +127,16 @@ class CommunicationManager:
                 "Требуется немедленное внимание!"
             )
 
-            # Отправляем уведомления координаторам
-            for coord in coordinators:
-                await self.notification.send_notification(
-                    coord['user_id'],
-                    emergency_message,
-                    level='critical'
-                )
+            if operation_id is not None:
+                targets = {'group_ids': [group_id], 'operation_id': operation_id}
+            else:
+                targets = {'group_ids': [group_id], 'roles': ['coordinator']}
+            await self.notification.broadcast(
+                emergency_message,
+                priority=NOTIFICATION_PRIORITIES[NotificationType.URGENT],
+                exclude_user_ids=[sender_id],
+                **targets
+            )
 
             # Обновляем статус отправителя
             await self.update_member_status(sender_id, group_id, 'emergency')
@@ -7,14 +7,17 @@ from .notification_manager import NotificationManager
 from .sector_manager import SectorManager
 from .group_manager import GroupManager
 from .task_manager import TaskManager
+from services.sector_assignment import claim_sector
 
 logger = logging.getLogger(__name__)
 
 class CoordinationManager:
-    def __init__(self, db_manager: DatabaseManager, notification_manager: NotificationManager):
+    def __init__(self, db_manager: DatabaseManager, notification_manager: NotificationManager,
+                 escalation_manager=None):
         self.db = db_manager
         self.notification_manager = notification_manager
         self.task_manager = TaskManager(db_manager, notification_manager)
+        self.escalations = escalation_manager  # EscalationManager на общем планировщике
 
     async def create_operation(self, coordinator_id: int, data: Dict) -> Optional[int]:
         """Создание новой поисковой операции"""
@@ -162,37 +165,27 @@ class CoordinationManager:
     async def _assign_sector(self, group_id: int, sector_id: int) -> bool:
         """Назначение сектора группе"""
         try:
-            with self.db.get_connection() as conn:
-                cursor = conn.cursor()
-                
-                # Проверяем, не занят ли сектор
-                cursor.execute("""
-                    SELECT status FROM search_sectors 
-                    WHERE sector_id = ? AND status != 'completed'
-                """, (sector_id,))
-                
-                if cursor.fetchone():
+            async def job(conn):
+                # Захватываем сектор, только если он свободен
+                if not await claim_sector(conn, sector_id, group_id):
                     return False
-                
+
                 # Назначаем сектор группе
-                cursor.execute("""
+                await conn.execute("""
                     UPDATE operation_groups 
                     SET current_sector_id = ? 
                     WHERE group_id = ?
                 """, (sector_id, group_id))
-                
-                # Обновляем статус сектора
-                cursor.execute("""
-                    UPDATE search_sectors 
-                    SET status = 'in_progress', assigned_team = ? 
-                    WHERE sector_id = ?
-                """, (group_id, sector_id))
-                
-                # Уведомляем участников группы
-                await self._notify_group_members(group_id, 
-                    "🎯 Группе назначен новый сектор поиска!")
-                
                 return True
+
+            if not await self.db.run_in_transaction(job):
+                return False
+
+            # Уведомляем участников группы
+            await self._notify_group_members(group_id, 
+                "🎯 Группе назначен новый сектор поиска!")
+            
+            return True
         except Exception as e:
             logger.error(f"Error assigning sector: {e}")
             return False
@@ -242,6 +235,10 @@ class CoordinationManager:
             task_id = await self.db.execute_query_fetchone(query, params)
             
             if task_id:
+                if self.escalations and data.get('deadline'):
+                    await self.escalations.track_task(
+                        {'task_id': task_id, 'deadline': data['deadline'], 'status': 'pending'}
+                    )
                 await self._notify_task_creation(task_id, data)
             return task_id
         except Exception as e:
@@ -276,12 +273,15 @@ class CoordinationManager:
                     updated_at = CURRENT_TIMESTAMP
                 WHERE task_id = ?
             """
+            status = self._calculate_task_status(data.get('progress_percentage', 0))
             task_params = (
                 data.get('progress_percentage', 0),
-                self._calculate_task_status(data.get('progress_percentage', 0)),
+                status,
                 task_id
             )
             await self.db.execute_query(task_query, task_params)
+            if self.escalations and status == 'completed':
+                await self.escalations.task_completed(task_id)
 
             await self._notify_task_update(task_id, data)
             return True
@@ -1,13 +1,19 @@
 from typing import Dict, List, Optional
 from datetime import datetime
+import json
 import logging
 import numpy as np
+from services.analytics_summary import AnalyticsSummary
+from services.coverage_grid import CoverageGridStore
 
 logger = logging.getLogger(__name__)
 
 class EfficiencyManager:
-    def __init__(self, db_manager):
+    def __init__(self, db_manager, coverage_grids: Optional[CoverageGridStore] = None,
+                 summary: Optional[AnalyticsSummary] = None):
         self.db = db_manager
+        self.coverage_grids = coverage_grids or CoverageGridStore(db_manager)
+        self.summary = summary or AnalyticsSummary(db_manager)
 
     async def calculate_operation_metrics(self, operation_id: int) -> Dict:
         """Расчет метрик эффективности операции"""
@@ -46,6 +52,48 @@ class EfficiencyManager:
             logger.error(f"Error calculating operation metrics: {e}")
             return None
 
+    async def _calculate_resource_efficiency(self, operation_id: int) -> float:
+        """Выполненные задачи на участника, приведенные к 0-100"""
+        summary = await self.summary.get_operation(operation_id)
+        if not summary or not summary['participant_count']:
+            return 0.0
+        return round(min(summary['task_completed'] / summary['participant_count'], 1.0) * 100, 2)
+
+    async def _get_coordination_factors(self, operation_id: int) -> Dict[str, float]:
+        """Факторы координации из материализованных сводок операции и команд"""
+        summary = await self.summary.get_operation(operation_id)
+        teams = (await self.summary.get_teams([operation_id]))[operation_id]
+        task_completion = (summary['task_completed'] / summary['task_total'] * 100
+                           if summary and summary['task_total'] else 0.0)
+        # Доля команд, которые отчитывались выполнением задач
+        active = [team for team in teams if team['task_total']]
+        communication = (sum(1 for team in active if team['task_completed']) / len(active) * 100
+                         if active else 0.0)
+        # Синхронность: разброс процента выполнения между командами
+        rates = [team['task_completed'] / team['task_total'] * 100 for team in active]
+        team_sync = 100 - float(np.std(rates)) if rates else 0.0
+        return {
+            'task_completion': task_completion,
+            'communication': communication,
+            'team_sync': team_sync
+        }
+
+    async def _save_metrics(self, operation_id: int, metrics: Dict):
+        summary = await self.summary.get_operation(operation_id) or {}
+        await self.db.execute("""
+            INSERT OR REPLACE INTO operation_metrics (
+                operation_id, response_time, coordination_score, resource_efficiency,
+                coverage_rate, success_rate, total_distance
+            ) VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (
+            operation_id, metrics['response_time'], metrics['coordination_score'],
+            metrics['resource_efficiency'], metrics['coverage_rate'], metrics['success_rate'],
+            summary.get('total_distance', 0)
+        ))
+
+    async def _get_team_metrics(self, operation_id: int) -> List[Dict]:
+        return (await self.summary.get_teams([operation_id]))[operation_id]
+
     async def get_team_performance(self, team_id: int, operation_id: int) -> Dict:
         """Получение метрик эффективности команды"""
         try:
@@ -79,6 +127,20 @@ class EfficiencyManager:
             return int((first_action_time - start_time).total_seconds() / 60)
         return 0
 
+    async def _calculate_coverage_rate(self, operation_id: int) -> float:
+        """Процент покрытия области поиска по растровой сетке операции"""
+        grid = await self.coverage_grids.load(operation_id)
+        if not grid:
+            return 0.0
+
+        operation = await self.db.fetch_one("""
+            SELECT search_area FROM search_operations WHERE operation_id = ?
+        """, (operation_id,))
+        area = json.loads(operation['search_area']) if operation and operation['search_area'] else None
+        if area and area.get('type') == 'Polygon':
+            return round(grid.coverage(area['coordinates'][0], key=('operation', operation_id)), 2)
+        return round(grid.coverage(), 2)
+
     async def _calculate_coordination_score(self, operation_id: int) -> float:
         """Расчет оценки координации"""
         # Учитываем различные факторы
@@ -1,42 +1,87 @@
 from datetime import datetime, timedelta
+from typing import Optional
 import logging
 
+from core.scheduler import JobScheduler
+
 logger = logging.getLogger(__name__)
 
 class EscalationManager:
-    def __init__(self, db_manager, notification_manager):
+    def __init__(self, db_manager, notification_manager, scheduler: Optional[JobScheduler] = None):
         self.db = db_manager
         self.notification_manager = notification_manager
+        # Общий планировщик приложения останавливает само приложение
+        self.owns_scheduler = scheduler is None
+        self.scheduler = scheduler or JobScheduler(db_manager)
+        # За сколько до срока поднимается уровень эскалации
+        self.escalation_thresholds = {
+            2: timedelta(hours=3),
+            3: timedelta(hours=1)
+        }
         self.escalation_levels = {
             1: "Повышенное внимание",
             2: "Срочное вмешательство",
             3: "Критическая ситуация"
         }
 
+    async def start(self):
+        """Регистрация обработчика и постановка сроков текущих задач"""
+        self.scheduler.register('escalation', self._fire_escalation)
+        await self.scheduler.start()
+        await self.check_pending_escalations(None)
+
+    async def stop(self):
+        if self.owns_scheduler:
+            await self.scheduler.stop()
+
     async def check_pending_escalations(self, context):
-        """Периодическая проверка задач на необходимость эскалации"""
+        """Постановка сроков эскалации всех незавершенных задач.
+
+        Задания идемпотентны: повторный вызов не вызывает повторной эскалации.
+        """
         try:
             tasks = await self.db.get_pending_tasks()
-            for task in tasks:
-                await self._check_task_escalation(task)
+            await self.track_tasks(tasks)
         except Exception as e:
             logger.error(f"Error in escalation check: {e}")
-    
-    async def _check_task_escalation(self, task):
-        """Проверка необходимости эскалации для конкретной задачи"""
+
+    async def track_task(self, task):
+        """Постановка или перенос эскалаций задачи (при создании и смене срока)"""
+        await self.track_tasks([task])
+
+    async def track_tasks(self, tasks):
         current_time = datetime.now()
-        deadline = datetime.fromisoformat(task['deadline'])
-        time_left = deadline - current_time
-        
-        if time_left < timedelta(hours=1) and task['status'] != 'completed':
-            await self._escalate_task(task['task_id'], 3)
-        elif time_left < timedelta(hours=3) and task['status'] != 'completed':
-            await self._escalate_task(task['task_id'], 2)
-    
-    async def _escalate_task(self, task_id: int, level: int):
+        jobs = []
+        for task in tasks:
+            if not task.get('deadline') or task['status'] == 'completed':
+                continue
+            deadline = task['deadline']
+            if isinstance(deadline, str):
+                deadline = datetime.fromisoformat(deadline)
+            for level, before in sorted(self.escalation_thresholds.items()):
+                escalate_at = deadline - before
+                # Уровень 2 не нужен, если уже пора эскалировать на 3
+                if level < 3 and deadline - self.escalation_thresholds[3] <= current_time:
+                    continue
+                jobs.append(('escalation', task['task_id'], escalate_at, {'level': level},
+                             f"escalation:{task['task_id']}:{level}"))
+        if jobs:
+            await self.scheduler.schedule_many(jobs)
+
+    async def task_completed(self, task_id: int):
+        """Отмена эскалаций выполненной задачи"""
+        await self.scheduler.cancel_ref('escalation', task_id)
+
+    async def _fire_escalation(self, job):
+        """Срабатывание задания планировщика"""
+        task = await self.db.get_task(job['ref_id'])
+        if task and task['status'] != 'completed':
+            await self._escalate_task(job['ref_id'], job['payload']['level'], task)
+
+    async def _escalate_task(self, task_id: int, level: int, task=None):
         """Эскалация задачи"""
         await self.db.create_escalation(task_id, level)
-        task = await self.db.get_task(task_id)
+        task = task or await self.db.get_task(task_id)
         
         # Уведомляем координаторов
         message = (
@@ -3,44 +3,61 @@ from datetime import datetime
 import json
 import logging
 
+from database.cache_manager import CacheManager, cached
+
 logger = logging.getLogger(__name__)
 
 class GroupManager:
-    def __init__(self, db_manager, notification_manager):
+    def __init__(self, db_manager, notification_manager, cache: Optional[CacheManager] = None,
+                 tracking=None):
         self.db = db_manager
         self.notification = notification_manager
+        self.cache = cache
+        # TrackingService кэширует группу пользователя; при смене состава кэш сбрасывается
+        self.tracking = tracking
+
+    async def _invalidate_group(self, group_id: int):
+        """Сброс закэшированных данных группы после записи"""
+        if self.cache:
+            await self.cache.invalidate_tags(f"group:{group_id}")
+
+    def _member_moved(self, user_id: int, group_id: Optional[int]):
+        if self.tracking:
+            self.tracking.user_group_changed(user_id, group_id)
 
     async def create_group(self, operation_id: int, data: dict) -> Optional[int]:
         """Создание поисковой группы"""
+        async def create(conn):
+            cursor = await conn.execute("""
+                INSERT INTO search_groups
+                (operation_id, name, leader_id, type, max_members,
+                 equipment_required, experience_required)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (
+                operation_id,
+                data['name'],
+                data['leader_id'],
+                data.get('type', 'general'),
+                data.get('max_members', 10),
+                json.dumps(data.get('equipment_required', [])),
+                data.get('experience_required', 0)
+            ))
+
+            group_id = cursor.lastrowid
+
+            # Добавляем лидера как участника
+            await conn.execute("""
+                INSERT INTO group_members
+                (group_id, user_id, role, status)
+                VALUES (?, ?, 'leader', 'active')
+            """, (group_id, data['leader_id']))
+
+            return group_id
+
         try:
-            with self.db.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    INSERT INTO search_groups 
-                    (operation_id, name, leader_id, type, max_members, 
-                     equipment_required, experience_required)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                    RETURNING group_id
-                """, (
-                    operation_id,
-                    data['name'],
-                    data['leader_id'],
-                    data.get('type', 'general'),
-                    data.get('max_members', 10),
-                    json.dumps(data.get('equipment_required', [])),
-                    data.get('experience_required', 0)
-                ))
-                
-                group_id = cursor.fetchone()[0]
-                
-                # Добавляем лидера как участника
-                cursor.execute("""
-                    INSERT INTO group_members 
-                    (group_id, user_id, role, status)
-                    VALUES (?, ?, 'leader', 'active')
-                """, (group_id, data['leader_id']))
-                
-                return group_id
+            group_id = await self.db.run_in_transaction(create)
+            self._member_moved(data['leader_id'], group_id)
+            return group_id
         except Exception as e:
             logger.error(f"Error creating group: {e}")
             return None
@@ -48,70 +65,86 @@ class GroupManager:
     async def add_member(self, group_id: int, user_id: int, role: str = 'member') -> bool:
         """Добавление участника в группу"""
         try:
-            with self.db.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    INSERT INTO group_members 
-                    (group_id, user_id, role, status)
-                    VALUES (?, ?, ?, 'active')
-                    ON CONFLICT (group_id, user_id) 
-                    DO UPDATE SET role = ?, status = 'active'
-                """, (group_id, user_id, role, role))
-                
-                await self.notification.notify_group(
-                    group_id,
-                    f"👤 Новый участник присоединился к группе!",
-                    exclude_user_id=user_id
-                )
-                return True
+            await self.db.execute("""
+                INSERT INTO group_members
+                (group_id, user_id, role, status)
+                VALUES (?, ?, ?, 'active')
+                ON CONFLICT (group_id, user_id)
+                DO UPDATE SET role = ?, status = 'active'
+            """, (group_id, user_id, role, role))
+            await self._invalidate_group(group_id)
+            self._member_moved(user_id, group_id)
+
+            await self.notification.notify_group(
+                group_id,
+                f"👤 Новый участник присоединился к группе!",
+                exclude_user_id=user_id
+            )
+            return True
         except Exception as e:
             logger.error(f"Error adding member: {e}")
             return False
 
+    async def remove_member(self, group_id: int, user_id: int) -> bool:
+        """Выход участника из группы"""
+        async def deactivate(conn):
+            cursor = await conn.execute("""
+                UPDATE group_members
+                SET status = 'inactive'
+                WHERE group_id = ? AND user_id = ?
+            """, (group_id, user_id))
+            return cursor.rowcount
+
+        try:
+            updated = await self.db.run_in_transaction(deactivate)
+            await self._invalidate_group(group_id)
+            self._member_moved(user_id, None)
+            return updated > 0
+        except Exception as e:
+            logger.error(f"Error removing member: {e}")
+            return False
+
     async def create_task(self, group_id: int, task_data: dict) -> Optional[int]:
         """Создание задания для группы"""
         try:
-            with self.db.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    INSERT INTO group_tasks 
-                    (group_id, title, description, priority, assigned_to, 
-                     location, deadline)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                    RETURNING task_id
-                """, (
-                    group_id,
-                    task_data['title'],
-                    task_data.get('description', ''),
-                    task_data.get('priority', 'normal'),
-                    task_data.get('assigned_to'),
-                    json.dumps(task_data.get('location', {})),
-                    task_data.get('deadline')
-                ))
-                return cursor.fetchone()[0]
+            return await self.db.execute("""
+                INSERT INTO group_tasks
+                (group_id, title, description, priority, assigned_to,
+                 location, deadline)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (
+                group_id,
+                task_data['title'],
+                task_data.get('description', ''),
+                task_data.get('priority', 'normal'),
+                task_data.get('assigned_to'),
+                json.dumps(task_data.get('location', {})),
+                task_data.get('deadline')
+            ))
         except Exception as e:
             logger.error(f"Error creating task: {e}")
             return None
 
     async def update_location(self, user_id: int, group_id: int, location: dict) -> bool:
         """Обновление местоположения участника"""
+        async def update(conn):
+            await conn.execute("""
+                UPDATE group_members
+                SET last_location = ?,
+                    last_active = CURRENT_TIMESTAMP
+                WHERE group_id = ? AND user_id = ?
+            """, (json.dumps(location), group_id, user_id))
+
+            await conn.execute("""
+                INSERT INTO location_history
+                (user_id, group_id, location)
+                VALUES (?, ?, ?)
+            """, (user_id, group_id, json.dumps(location)))
+
         try:
-            with self.db.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    UPDATE group_members 
-                    SET last_location = ?,
-                        last_active = CURRENT_TIMESTAMP
-                    WHERE group_id = ? AND user_id = ?
-                """, (json.dumps(location), group_id, user_id))
-                
-                cursor.execute("""
-                    INSERT INTO location_history 
-                    (user_id, group_id, location)
-                    VALUES (?, ?, ?)
-                """, (user_id, group_id, json.dumps(location)))
-                
-                return True
+            # Состав группы не изменился, кэш не сбрасывается
+            await self.db.run_in_transaction(update)
+            return True
         except Exception as e:
             logger.error(f"Error updating location: {e}")
             return False
@@ -119,55 +152,68 @@ class GroupManager:
     async def send_message(self, from_group_id: int, data: dict) -> bool:
         """Отправка сообщения между группами"""
         try:
-            with self.db.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    INSERT INTO group_messages 
-                    (from_group_id, to_group_id, sender_id, 
-                     message_type, content, is_broadcast)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                """, (
-                    from_group_id,
-                    data.get('to_group_id'),
-                    data['sender_id'],
-                    data['message_type'],
-                    data['content'],
-                    data.get('is_broadcast', False)
-                ))
-                return True
+            await self.db.execute("""
+                INSERT INTO group_messages
+                (from_group_id, to_group_id, sender_id,
+                 message_type, content, is_broadcast)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (
+                from_group_id,
+                data.get('to_group_id'),
+                data['sender_id'],
+                data['message_type'],
+                data['content'],
+                data.get('is_broadcast', False)
+            ))
+            return True
         except Exception as e:
             logger.error(f"Error sending message: {e}")
             return False
 
+    @cached(ttl=300, key=lambda group_id: f"group:{group_id}:members",
+            tags=lambda group_id: [f"group:{group_id}"])
     async def get_group_members(self, group_id: int) -> List[Dict]:
-        """Получение списка участников группы"""
+        """Состав группы (кэшируется до изменения состава).
+
+        Позиции участников меняются с каждой отметкой GPS и в кэш не
+        попадают, см. get_member_locations. Ошибка запроса не кэшируется
+        и передается вызывающему.
+        """
+        rows = await self.db.fetchall("""
+            SELECT
+                u.user_id,
+                u.username,
+                u.full_name,
+                gm.role,
+                gm.status
+            FROM group_members gm
+            JOIN users u ON gm.user_id = u.user_id
+            WHERE gm.group_id = ?
+            ORDER BY gm.role DESC, u.full_name
+        """, (group_id,))
+
+        return [{
+            'user_id': row[0],
+            'username': row[1],
+            'full_name': row[2],
+            'role': row[3],
+            'status': row[4]
+        } for row in rows]
+
+    async def get_member_locations(self, group_id: int) -> List[Dict]:
+        """Последние позиции участников группы (без кэша)"""
         try:
-            with self.db.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    SELECT 
-                        u.user_id,
-                        u.username,
-                        u.full_name,
-                        gm.role,
-                        gm.status,
-                        gm.last_location,
-                        gm.last_active
-                    FROM group_members gm
-                    JOIN users u ON gm.user_id = u.user_id
-                    WHERE gm.group_id = ?
-                    ORDER BY gm.role DESC, u.full_name
-                """, (group_id,))
-                
-                return [{
-                    'user_id': row[0],
-                    'username': row[1],
-                    'full_name': row[2],
-                    'role': row[3],
-                    'status': row[4],
-                    'last_location': json.loads(row[5]) if row[5] else None,
-                    'last_active': row[6]
-                } for row in cursor.fetchall()]
+            rows = await self.db.fetchall("""
+                SELECT user_id, last_location, last_active
+                FROM group_members
+                WHERE group_id = ? AND last_location IS NOT NULL
+            """, (group_id,))
+
+            return [{
+                'user_id': row[0],
+                'last_location': json.loads(row[1]),
+                'last_active': row[2]
+            } for row in rows]
         except Exception as e:
-            logger.error(f"Error getting group members: {e}")
+            logger.error(f"Error getting member locations: {e}")
             return []
@@ -1,149 +1,416 @@
-from typing import Dict, List, Optional
-from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+from datetime import datetime, timedelta
 import asyncio
-from queue import PriorityQueue
+import heapq
+import itertools
 import logging
 
+from telegram.error import Forbidden, RetryAfter
+
+from config.settings import NOTIFICATION_CHAT_RATE, NOTIFICATION_GLOBAL_RATE, NOTIFICATION_WORKERS
+
 logger = logging.getLogger(__name__)
 
+# Строк в одном многострочном INSERT рассылки (4 параметра на строку)
+BROADCAST_CHUNK = 200
+# Отметка отправленных: пачкой по SENT_FLUSH_SIZE или не позже чем через
+# SENT_FLUSH_DELAY секунд после первой неотмеченной отправки
+SENT_FLUSH_SIZE = 100
+SENT_FLUSH_DELAY = 1.0
+
+
+class TokenBucket:
+    """Ведро токенов: ``rate`` токенов в секунду, запас до ``capacity``"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated: Optional[float] = None
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float):
+        if self.updated is None:
+            self.updated = now
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def ready_in(self, now: float) -> float:
+        """Секунды до появления токена (0 - токен есть), без его изъятия"""
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def try_acquire(self, now: float) -> float:
+        """Взять токен; 0 - взят, иначе секунды до появления токена"""
+        wait = self.ready_in(now)
+        if not wait:
+            self.tokens -= 1
+        return wait
+
+    async def acquire(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            wait = self.try_acquire(loop.time())
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+    def pause(self, now: float, seconds: float):
+        """Остановка выдачи токенов (ответ 429 от Telegram)"""
+        self.blocked_until = max(self.blocked_until, now + seconds)
+        self.tokens = 0.0
+        self.updated = self.blocked_until
+
+
 class NotificationQueueManager:
-    def __init__(self, notification_manager, db_manager):
-        self.notification_manager = notification_manager
+    """Очередь уведомлений с учетом лимитов Telegram.
+
+    Уведомления упорядочены по времени отправки, а созревшие - по
+    приоритету; все они сохраняются в таблице notification_queue, поэтому
+    переживают перезапуск. ``workers`` отправителей берут самое приоритетное
+    из созревших уведомлений; отправку ограничивают
+    общее ведро токенов (~30 сообщений/с на бота) и ведра чатов (1
+    сообщение/с). Если чат еще не готов, уведомление откладывается до его
+    готовности, не занимая отправителя. Ответ 429 приостанавливает всю
+    рассылку на ``retry_after`` секунд.
+    """
+
+    def __init__(self, bot, db_manager, workers: int = NOTIFICATION_WORKERS,
+                 global_rate: float = NOTIFICATION_GLOBAL_RATE,
+                 chat_rate: float = NOTIFICATION_CHAT_RATE):
+        self.bot = bot
         self.db = db_manager
-        self.queue = PriorityQueue()
+        self.workers = workers
+        self.chat_rate = chat_rate
+        self.global_bucket = TokenBucket(global_rate)
+        self.chat_buckets: Dict[int, TokenBucket] = {}
         self.retry_delays = [60, 300, 900]  # Retry after 1min, 5min, 15min
         self.is_running = False
+        self._ready: List[tuple] = []  # (приоритет, номер, id, данные)
+        self._delayed: List[tuple] = []  # (время отправки, приоритет, номер, id, данные)
+        self._sequence = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        self._sent: List[int] = []
+        self._flush_timer: Optional[asyncio.Task] = None
+        self._in_flight = 0
+        self.stats = {'sent': 0, 'failed': 0, 'retried': 0, 'rate_limited': 0}
 
-    async def start(self):
-        """Запуск обработчика очереди"""
+    async def start(self, restore: bool = True):
+        """Запуск отправителей (с восстановлением неотправленных уведомлений)"""
+        if self.is_running:
+            return
         self.is_running = True
-        asyncio.create_task(self._process_queue())
+        self._wakeup = asyncio.Event()
+        if restore:
+            await self._restore()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
 
     async def stop(self):
-        """Остановка обработчика очереди"""
+        """Остановка отправителей; неотправленное остается в notification_queue"""
         self.is_running = False
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self._flush_sent()
 
-    async def add_notification(self, 
-                             user_id: int, 
-                             message: str, 
+    async def add_notification(self,
+                             user_id: int,
+                             message: str,
                              priority: int = 2,
-                             scheduled_time: Optional[datetime] = None) -> int:
+                             scheduled_time: Optional[datetime] = None,
+                             notification_type: Any = None,
+                             **send_options) -> int:
         """
         Добавление уведомления в очередь
         priority: 1 (высокий), 2 (средний), 3 (низкий)
+        ``send_options`` (reply_markup, parse_mode) передаются в send_message
+        и не сохраняются в БД.
         """
         try:
-            notification_id = await self.db.execute_query("""
-                INSERT INTO notification_queue 
+            notification_id = await self.db.execute("""
+                INSERT INTO notification_queue
                 (user_id, message, priority, scheduled_time, status)
                 VALUES (?, ?, ?, ?, 'pending')
-                RETURNING id
-            """, (user_id, message, priority, scheduled_time))
-
-            self.queue.put((
-                priority,
-                notification_id,
-                {
-                    'user_id': user_id,
-                    'message': message,
-                    'scheduled_time': scheduled_time,
-                    'retry_count': 0
-                }
-            ))
+            """, (user_id, message, priority, scheduled_time.isoformat() if scheduled_time else None))
 
+            self._push(notification_id, {
+                'user_id': user_id,
+                'message': message,
+                'priority': priority,
+                'retry_count': 0,
+                'options': send_options
+            }, scheduled_time)
             return notification_id
         except Exception as e:
             logger.error(f"Error adding notification to queue: {e}")
             return None
 
-    async def add_group_notification(self, 
-                                   group_id: int, 
+    async def add_group_notification(self,
+                                   group_id: int,
                                    message: str,
                                    priority: int = 2,
-                                   exclude_user_id: Optional[int] = None):
+                                   exclude_user_id: Optional[int] = None,
+                                   notification_type: Any = None):
         """Добавление группового уведомления"""
+        return await self.broadcast(message, group_ids=[group_id], priority=priority,
+                                    exclude_user_ids=[exclude_user_id] if exclude_user_id else ())
+
+    async def broadcast(self,
+                        message: str,
+                        user_ids: Iterable[int] = (),
+                        group_ids: Iterable[int] = (),
+                        operation_id: Optional[int] = None,
+                        roles: Iterable[str] = (),
+                        priority: int = 2,
+                        scheduled_time: Optional[datetime] = None,
+                        exclude_user_ids: Iterable[int] = (),
+                        **send_options) -> List[int]:
+        """
+        Рассылка одного сообщения многим получателям.
+        Получатели - ``user_ids`` плюс участники ``group_ids`` и всех групп
+        операции ``operation_id`` (с ролью из ``roles``, если задана);
+        состав групп читается одним запросом, каждый пользователь получает
+        сообщение один раз, строки очереди вставляются одной транзакцией.
+        """
         try:
-            members = await self.db.get_group_members(group_id)
-            for member in members:
-                if member['user_id'] != exclude_user_id:
-                    await self.add_notification(
-                        member['user_id'],
-                        message,
-                        priority
-                    )
+            recipients = list(dict.fromkeys(user_ids))
+            recipients.extend(await self._resolve_members(list(group_ids), operation_id, list(roles)))
+            excluded = set(exclude_user_ids)
+            recipients = [user_id for user_id in dict.fromkeys(recipients) if user_id not in excluded]
+            if not recipients:
+                return []
+
+            scheduled = scheduled_time.isoformat() if scheduled_time else None
+
+            async def job(conn):
+                created = []
+                for start in range(0, len(recipients), BROADCAST_CHUNK):
+                    chunk = recipients[start:start + BROADCAST_CHUNK]
+                    cursor = await conn.execute(f"""
+                        INSERT INTO notification_queue
+                        (user_id, message, priority, scheduled_time, status)
+                        VALUES {', '.join(["(?, ?, ?, ?, 'pending')"] * len(chunk))}
+                        RETURNING id, user_id
+                    """, [value for user_id in chunk for value in (user_id, message, priority, scheduled)])
+                    created.extend(await cursor.fetchall())
+                return created
+
+            created = await self.db.run_in_transaction(job)
+            for notification_id, user_id in created:
+                self._push(notification_id, {
+                    'user_id': user_id,
+                    'message': message,
+                    'priority': priority,
+                    'retry_count': 0,
+                    'options': send_options
+                }, scheduled_time)
+            return [notification_id for notification_id, _ in created]
         except Exception as e:
-            logger.error(f"Error adding group notification: {e}")
+            logger.error(f"Error broadcasting notification: {e}")
+            return []
 
-    async def _process_queue(self):
-        """Обработка очереди уведомлений"""
-        while self.is_running:
+    async def _resolve_members(self, group_ids: List[int], operation_id: Optional[int],
+                               roles: List[str]) -> List[int]:
+        """Участники групп и операции одним запросом"""
+        if not group_ids and operation_id is None:
+            return []
+        targets = []
+        params: List[Any] = []
+        if group_ids:
+            targets.append(f"gm.group_id IN ({', '.join('?' * len(group_ids))})")
+            params.extend(group_ids)
+        if operation_id is not None:
+            targets.append("gm.group_id IN (SELECT group_id FROM search_groups WHERE operation_id = ?)")
+            params.append(operation_id)
+        query = f"SELECT DISTINCT gm.user_id FROM group_members gm WHERE ({' OR '.join(targets)})"
+        if roles:
+            query += f" AND gm.role IN ({', '.join('?' * len(roles))})"
+            params.extend(roles)
+        rows = await self.db.fetchall(query + " ORDER BY gm.user_id", tuple(params))
+        return [row[0] for row in rows]
+
+    def pending(self) -> int:
+        return len(self._ready) + len(self._delayed)
+
+    async def join(self, timeout: Optional[float] = None):
+        """Ожидание, пока очередь не опустеет"""
+        async def wait():
+            while self.pending() or self._in_flight:
+                await asyncio.sleep(0.01)
+        await asyncio.wait_for(wait(), timeout)
+        await self._flush_sent()
+
+    # ---- очередь ----
+
+    def _push(self, notification_id: int, data: Dict, when=None):
+        """Постановка в очередь; ``when`` - datetime или задержка в секундах"""
+        loop = asyncio.get_running_loop()
+        if isinstance(when, datetime):
+            delay = (when - datetime.now()).total_seconds()
+        else:
+            delay = when or 0.0
+        entry = (data['priority'], next(self._sequence), notification_id, data)
+        if delay > 0:
+            heapq.heappush(self._delayed, (loop.time() + delay,) + entry)
+        else:
+            heapq.heappush(self._ready, entry)
+        if self._wakeup:
+            self._wakeup.set()
+
+    async def _next(self):
+        """Самое приоритетное из уведомлений, время отправки которых наступило"""
+        loop = asyncio.get_running_loop()
+        while True:
+            now = loop.time()
+            while self._delayed and self._delayed[0][0] <= now:
+                heapq.heappush(self._ready, heapq.heappop(self._delayed)[1:])
+            if self._ready:
+                return heapq.heappop(self._ready)
+            timeout = self._delayed[0][0] - now if self._delayed else None
+            self._wakeup.clear()
             try:
-                if self.queue.empty():
-                    await asyncio.sleep(1)
-                    continue
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
 
-                priority, notification_id, data = self.queue.get()
-                current_time = datetime.now()
+    async def _restore(self):
+        """Загрузка неотправленных уведомлений после перезапуска"""
+        try:
+            rows = await self.db.fetch_all("""
+                SELECT id, user_id, message, priority, scheduled_time, retry_count
+                FROM notification_queue
+                WHERE status IN ('pending', 'retry')
+            """)
+        except Exception as e:
+            logger.error(f"Error restoring notification queue: {e}")
+            return
+        for row in rows:
+            scheduled = row['scheduled_time']
+            self._push(row['id'], {
+                'user_id': row['user_id'],
+                'message': row['message'],
+                'priority': row['priority'],
+                'retry_count': row['retry_count'] or 0,
+                'options': {}
+            }, datetime.fromisoformat(scheduled) if scheduled else None)
 
-                # Проверка времени отправки для отложенных уведомлений
-                if data.get('scheduled_time') and data['scheduled_time'] > current_time:
-                    self.queue.put((priority, notification_id, data))
-                    await asyncio.sleep(1)
-                    continue
+    # ---- отправка ----
 
-                success = await self._send_notification(data)
-                
-                if success:
-                    await self._mark_as_sent(notification_id)
-                else:
-                    await self._handle_failed_notification(priority, notification_id, data)
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while self.is_running:
+            priority, _, notification_id, data = await self._next()
+            chat = data['user_id']
+            bucket = self.chat_buckets.get(chat)
+            if bucket is None:
+                bucket = self.chat_buckets[chat] = TokenBucket(self.chat_rate, 1)
+            wait = bucket.ready_in(loop.time())
+            if wait:
+                # Чат еще не готов: откладываем, отправитель берет следующее
+                self._push(notification_id, data, wait)
+                continue
 
+            self._in_flight += 1
+            try:
+                await self.global_bucket.acquire()
+                # Пока ждали общий лимит, чат мог занять другой отправитель
+                wait = bucket.try_acquire(loop.time())
+                if wait:
+                    self._push(notification_id, data, wait)
+                    continue
+                await self._send(notification_id, data)
+            except asyncio.CancelledError:
+                # Остановка во время отправки: уведомление остается в БД
+                raise
             except Exception as e:
                 logger.error(f"Error in queue processing: {e}")
-                await asyncio.sleep(1)
+            finally:
+                self._in_flight -= 1
 
-    async def _send_notification(self, data: Dict) -> bool:
-        """Отправка уведомления"""
+    async def _send(self, notification_id: int, data: Dict):
+        loop = asyncio.get_running_loop()
         try:
-            await self.notification_manager.send_notification(
-                data['user_id'],
-                data['message']
-            )
-            return True
+            await self.bot.send_message(chat_id=data['user_id'], text=data['message'], **data['options'])
+        except RetryAfter as e:
+            retry_after = e.retry_after
+            if isinstance(retry_after, timedelta):
+                retry_after = retry_after.total_seconds()
+            self.stats['rate_limited'] += 1
+            logger.warning(f"Telegram flood control: pausing for {retry_after} s")
+            self.global_bucket.pause(loop.time(), retry_after)
+            # Лимит - не ошибка уведомления: повтор без увеличения счетчика
+            self._push(notification_id, data, retry_after)
+            return
+        except Forbidden as e:
+            # Пользователь заблокировал бота - повторять бессмысленно
+            logger.info(f"Notification {notification_id} rejected: {e}")
+            await self._mark_failed(notification_id)
+            return
         except Exception as e:
             logger.error(f"Error sending notification: {e}")
-            return False
+            await self._handle_failed_notification(notification_id, data)
+            return
 
-    async def _handle_failed_notification(self, priority: int, 
-                                        notification_id: int, 
-                                        data: Dict):
+        self.stats['sent'] += 1
+        self._sent.append(notification_id)
+        if len(self._sent) >= SENT_FLUSH_SIZE:
+            await self._flush_sent()
+        elif self._flush_timer is None:
+            self._flush_timer = asyncio.create_task(self._flush_later())
+
+    async def _handle_failed_notification(self, notification_id: int, data: Dict):
         """Обработка неудачной отправки"""
         retry_count = data.get('retry_count', 0)
-        
+
         if retry_count < len(self.retry_delays):
             # Планируем повторную попытку
             data['retry_count'] = retry_count + 1
-            data['scheduled_time'] = datetime.now().timestamp() + self.retry_delays[retry_count]
-            
-            self.queue.put((priority + 1, notification_id, data))
-            
-            await self.db.execute_query("""
-                UPDATE notification_queue 
+            self.stats['retried'] += 1
+            self._push(notification_id, data, self.retry_delays[retry_count])
+
+            await self.db.execute("""
+                UPDATE notification_queue
                 SET retry_count = ?, status = 'retry'
                 WHERE id = ?
             """, (retry_count + 1, notification_id))
         else:
             # Помечаем как неудачное после всех попыток
-            await self.db.execute_query("""
-                UPDATE notification_queue 
-                SET status = 'failed'
-                WHERE id = ?
-            """, (notification_id,))
+            await self._mark_failed(notification_id)
 
-    async def _mark_as_sent(self, notification_id: int):
-        """Отметка уведомления как отправленного"""
-        await self.db.execute_query("""
-            UPDATE notification_queue 
-            SET status = 'sent', sent_at = CURRENT_TIMESTAMP
+    async def _mark_failed(self, notification_id: int):
+        self.stats['failed'] += 1
+        await self.db.execute("""
+            UPDATE notification_queue
+            SET status = 'failed'
             WHERE id = ?
-        """, (notification_id,))
\ No newline at end of file
+        """, (notification_id,))
+
+    async def _flush_later(self):
+        """Отметка отправленных по таймеру, если пачка не набралась"""
+        await asyncio.sleep(SENT_FLUSH_DELAY)
+        # Таймер сбрасывается до записи: отмена не должна прервать UPDATE
+        self._flush_timer = None
+        await self._flush_sent()
+
+    async def _flush_sent(self):
+        """Отметка отправленных уведомлений одной пачкой"""
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        if not self._sent:
+            return
+        sent, self._sent = self._sent, []
+        try:
+            await self.db.executemany("""
+                UPDATE notification_queue
+                SET status = 'sent', sent_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            """, [(notification_id,) for notification_id in sent])
+        except Exception as e:
+            logger.error(f"Error marking notifications as sent: {e}")
@@ -2,21 +2,19 @@ from datetime import datetime, time
 import json
 import logging
 from typing import Dict, List, Optional
-from core.constants.notification_settings import DEFAULT_SETTINGS, NotificationChannel, NotificationPreference
+from core.constants.notification_settings import NotificationChannel, NotificationPreference
+from services.user_cache import UserSettings, access_cache_for
 
 logger = logging.getLogger(__name__)
 
 class NotificationSettingsManager:
     def __init__(self, db_manager):
         self.db = db_manager
+        self.cache = access_cache_for(db_manager)
 
     async def get_user_settings(self, user_id: int) -> Dict:
         """Получение настроек пользователя"""
-        settings = await self.db.fetch_one(
-            "SELECT settings FROM notification_settings WHERE user_id = ?",
-            (user_id,)
-        )
-        return json.loads(settings['settings']) if settings else DEFAULT_SETTINGS
+        return (await self.cache.get_settings(user_id)).settings
 
     async def update_user_settings(self, user_id: int, settings: Dict) -> bool:
         """Обновление настроек пользователя"""
@@ -28,6 +26,7 @@ class NotificationSettingsManager:
                    settings = ?, updated_at = CURRENT_TIMESTAMP""",
                 (user_id, json.dumps(settings), json.dumps(settings))
             )
+            self.cache.invalidate_settings(user_id)
             return True
         except Exception as e:
             logger.error(f"Error updating settings for user {user_id}: {e}")
@@ -45,6 +44,7 @@ class NotificationSettingsManager:
                    enabled = ?, start_time = ?, end_time = ?, updated_at = CURRENT_TIMESTAMP""",
                 (user_id, enabled, start_time, end_time, enabled, start_time, end_time)
             )
+            self.cache.invalidate_settings(user_id)
             return True
         except Exception as e:
             logger.error(f"Error setting DND for user {user_id}: {e}")
@@ -52,19 +52,24 @@ class NotificationSettingsManager:
 
     async def can_send_notification(self, user_id: int, notification_type: str) -> bool:
         """Проверка возможности отправки уведомления"""
-        settings = await self.get_user_settings(user_id)
-        
+        user_settings = await self.cache.get_settings(user_id)
+        return self._allows(user_settings, notification_type, datetime.now().time())
+
+    async def filter_recipients(self, user_ids: List[int], notification_type: str) -> List[int]:
+        """Получатели рассылки, которым сейчас можно отправить уведомление"""
+        settings = await self.cache.get_settings_many(user_ids)
+        current_time = datetime.now().time()
+        return [user_id for user_id in user_ids
+                if self._allows(settings[user_id], notification_type, current_time)]
+
+    @staticmethod
+    def _allows(user_settings: UserSettings, notification_type: str, current_time: time) -> bool:
         # Проверка фильтров
-        if settings['filters'].get(notification_type) == NotificationPreference.DISABLED:
+        if user_settings.settings['filters'].get(notification_type) == NotificationPreference.DISABLED:
             return False
 
         # Проверка режима "Не беспокоить"
-        if settings['do_not_disturb']['enabled']:
-            current_time = datetime.now().time()
-            start_time = datetime.strptime(settings['do_not_disturb']['start_time'], '%H:%M').time()
-            end_time = datetime.strptime(settings['do_not_disturb']['end_time'], '%H:%M').time()
-            
-            if start_time <= current_time <= end_time:
-                return notification_type == 'urgent'  # Пропускаем только срочные уведомления
+        if user_settings.dnd and user_settings.dnd.contains(current_time):
+            return notification_type == 'urgent'  # Пропускаем только срочные уведомления
 
-        return True
\ No newline at end of file
+        return True
@@ -1,35 +1,35 @@
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional
-import asyncio
 import logging
 
+from core.scheduler import JobScheduler
+
 logger = logging.getLogger(__name__)
 
 class ReminderManager:
-    def __init__(self, db_manager, notification_manager):
+    def __init__(self, db_manager, notification_manager, scheduler: Optional[JobScheduler] = None):
         self.db = db_manager
         self.notification_manager = notification_manager
-        self.active_reminders = {}
-        self.check_interval = 60  # секунды
+        # Общий планировщик приложения останавливает само приложение
+        self.owns_scheduler = scheduler is None
+        self.scheduler = scheduler or JobScheduler(db_manager)
 
     async def start(self):
         """Запуск менеджера напоминаний"""
-        asyncio.create_task(self._reminder_checker())
+        self.scheduler.register('reminder', self._process_reminder)
+        await self.scheduler.start()
+        # Напоминания, созданные до появления планировщика
+        reminders = await self.db.fetch_all("""
+            SELECT reminder_id, reminder_time FROM task_reminders WHERE is_sent = FALSE
+        """)
+        await self.scheduler.schedule_many(
+            ('reminder', reminder['reminder_id'], reminder['reminder_time'], None)
+            for reminder in reminders
+        )
 
-    async def _reminder_checker(self):
-        """Периодическая проверка напоминаний"""
-        while True:
-            try:
-                current_time = datetime.now()
-                reminders = await self._get_pending_reminders(current_time)
-                
-                for reminder in reminders:
-                    await self._process_reminder(reminder)
-                    
-                await asyncio.sleep(self.check_interval)
-            except Exception as e:
-                logger.error(f"Error in reminder checker: {e}")
-                await asyncio.sleep(self.check_interval)
+    async def stop(self):
+        if self.owns_scheduler:
+            await self.scheduler.stop()
 
     async def create_reminder(self, task_id: int, user_id: int, reminder_time: datetime, 
                             reminder_type: str = 'custom') -> Optional[int]:
@@ -39,49 +39,53 @@ class ReminderManager:
                 INSERT INTO task_reminders (task_id, user_id, reminder_time, reminder_type)
                 VALUES (?, ?, ?, ?)
             """
-            reminder_id = await self.db.execute_query(
+            reminder_id = await self.db.execute(
                 query, 
-                (task_id, user_id, reminder_time, reminder_type),
-                return_id=True
+                (task_id, user_id, reminder_time, reminder_type)
             )
+            await self.scheduler.schedule('reminder', reminder_id, reminder_time)
             return reminder_id
         except Exception as e:
             logger.error(f"Error creating reminder: {e}")
             return None
 
-    async def _get_pending_reminders(self, current_time: datetime) -> List[Dict]:
-        """Получение всех непосланных напоминаний"""
+    async def _get_reminder(self, reminder_id: int) -> Optional[Dict]:
+        """Неотправленное напоминание с данными задачи"""
         query = """
             SELECT r.*, t.title, t.description
             FROM task_reminders r
             JOIN coordination_tasks t ON r.task_id = t.task_id
-            WHERE r.is_sent = FALSE AND r.reminder_time <= ?
+            WHERE r.reminder_id = ? AND r.is_sent = FALSE
         """
-        return await self.db.fetch_all(query, (current_time,))
+        return await self.db.fetch_one(query, (reminder_id,))
 
-    async def _process_reminder(self, reminder: Dict):
-        """Обработка напоминания"""
-        try:
-            # Отправляем уведомление
-            message = self._format_reminder_message(reminder)
-            await self.notification_manager.send_notification(
-                reminder['user_id'],
-                message
-            )
-            
-            # Отмечаем напоминание как отправленное
-            await self.db.execute_query(
-                "UPDATE task_reminders SET is_sent = TRUE WHERE reminder_id = ?",
-                (reminder['reminder_id'],)
-            )
-        except Exception as e:
-            logger.error(f"Error processing reminder {reminder['reminder_id']}: {e}")
+    async def _process_reminder(self, job: Dict):
+        """Обработка напоминания (в момент срабатывания задания планировщика)"""
+        reminder = await self._get_reminder(job['ref_id'])
+        if not reminder:
+            return
+
+        # Отправляем уведомление
+        message = self._format_reminder_message(reminder)
+        await self.notification_manager.send_notification(
+            reminder['user_id'],
+            message
+        )
+
+        # Отмечаем напоминание как отправленное
+        await self.db.execute(
+            "UPDATE task_reminders SET is_sent = TRUE WHERE reminder_id = ?",
+            (reminder['reminder_id'],)
+        )
 
     def _format_reminder_message(self, reminder: Dict) -> str:
         """Форматирование сообщения напоминания"""
+        reminder_time = reminder['reminder_time']
+        if isinstance(reminder_time, str):
+            reminder_time = datetime.fromisoformat(reminder_time)
         return (
             f"⏰ Напоминание о задаче!\n\n"
             f"📋 {reminder['title']}\n"
             f"📝 {reminder['description']}\n\n"
-            f"Время: {reminder['reminder_time'].strftime('%H:%M %d.%m.%Y')}"
-        )
\ No newline at end of file
+            f"Время: {reminder_time.strftime('%H:%M %d.%m.%Y')}"
+        )
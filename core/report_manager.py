@@ -3,9 +3,7 @@ import logging
 from datetime import datetime
 from typing import Optional, Dict, List
 from pathlib import Path
-import csv
-import xlsxwriter
-from io import BytesIO
+from services.report_export import ReportSection, StreamingReportExporter, dict_rows
 
 logger = logging.getLogger(__name__)
 
@@ -15,6 +13,7 @@ class ReportManager:
         self.notification_manager = notification_manager
         self.reports_dir = Path('data/reports')
         self.reports_dir.mkdir(parents=True, exist_ok=True)
+        self.exporter = StreamingReportExporter(self.reports_dir / 'spool')
 
     async def create_report(self, group_id: int, data: Dict) -> Optional[int]:
         """Создание отчета от группы"""
@@ -158,96 +157,89 @@ class ReportManager:
             logger.error(f"Error generating operation report: {e}")
             return None
 
-    async def export_report(self, report_data: Dict, format: str = 'xlsx') -> Optional[bytes]:
-        """Экспорт отчета в различные форматы"""
+    OPERATION_HEADERS = ['ID', 'Название', 'Статус', 'Дата начала', 'Дата завершения']
+    OPERATION_KEYS = ['operation_id', 'name', 'status', 'start_time', 'end_time']
+    GROUP_HEADERS = ['ID группы', 'Название', 'Участников', 'Статус']
+    GROUP_KEYS = ['group_id', 'name', 'participants_count', 'status']
+
+    async def export_report(self, report_data: Dict, format: str = 'xlsx',
+                            path: Optional[Path] = None) -> Optional[Path]:
+        """Экспорт отчета в различные форматы
+
+        Возвращает путь к файлу (по умолчанию - во временном каталоге отчетов),
+        который можно открыть и отправить как документ.
+        """
         try:
             if format == 'xlsx':
-                return await self._export_to_xlsx(report_data)
+                return await self._export_to_xlsx(report_data, path)
             elif format == 'csv':
-                return await self._export_to_csv(report_data)
+                return await self._export_to_csv(report_data, path)
+            elif format == 'jsonl':
+                return await self.exporter.export(self._report_sections(report_data), 'jsonl', path)
             elif format == 'json':
-                return json.dumps(report_data, indent=2).encode('utf-8')
+                return await self.exporter.export_json(report_data, path)
             else:
                 raise ValueError(f"Unsupported format: {format}")
         except Exception as e:
             logger.error(f"Error exporting report: {e}")
             return None
 
-    async def _export_to_xlsx(self, report_data: Dict) -> bytes:
-        """Экспорт отчета в Excel формат"""
-        output = BytesIO()
-        workbook = xlsxwriter.Workbook(output)
-
-        # Форматирование
-        header_format = workbook.add_format({
-            'bold': True,
-            'bg_color': '#4CAF50',
-            'color': 'white'
-        })
-
-        # Лист с основной информацией
-        ws_main = workbook.add_worksheet('Основная информация')
-        operation = report_data['operation']
-        
-        headers = ['ID', 'Название', 'Статус', 'Дата начала', 'Дата завершения']
-        for col, header in enumerate(headers):
-            ws_main.write(0, col, header, header_format)
-            
-        ws_main.write_row(1, 0, [
-            operation['operation_id'],
-            operation['name'],
-            operation['status'],
-            operation['start_date'],
-            operation['end_date']
-        ])
-
-        # Лист с группами
-        ws_groups = workbook.add_worksheet('Группы')
-        group_headers = ['ID группы', 'Название', 'Участников', 'Статус']
-        for col, header in enumerate(group_headers):
-            ws_groups.write(0, col, header, header_format)
+    def _report_sections(self, report_data: Dict) -> List[ReportSection]:
+        return [
+            ReportSection('Основная информация', self.OPERATION_HEADERS,
+                          dict_rows([report_data['operation']], self.OPERATION_KEYS)),
+            ReportSection('Группы', self.GROUP_HEADERS,
+                          dict_rows(report_data['groups'], self.GROUP_KEYS)),
+        ]
 
-        for row, group in enumerate(report_data['groups'], 1):
-            ws_groups.write_row(row, 0, [
-                group['group_id'],
-                group['name'],
-                group['participants_count'],
-                group['status']
-            ])
-
-        workbook.close()
-        return output.getvalue()
+    async def _export_to_xlsx(self, report_data: Dict, path: Optional[Path] = None) -> Path:
+        """Экспорт отчета в Excel формат"""
+        return await self.exporter.export(self._report_sections(report_data), 'xlsx', path)
 
-    async def _export_to_csv(self, report_data: Dict) -> bytes:
+    async def _export_to_csv(self, report_data: Dict, path: Optional[Path] = None) -> Path:
         """Экспорт отчета в CSV формат"""
-        output = BytesIO()
-        writer = csv.writer(output)
+        return await self.exporter.export(self._report_sections(report_data), 'csv', path)
 
-        # Записываем основную информацию
-        writer.writerow(['Operation Information'])
-        writer.writerow(['ID', 'Name', 'Status', 'Start Date', 'End Date'])
-        operation = report_data['operation']
-        writer.writerow([
-            operation['operation_id'],
-            operation['name'],
-            operation['status'],
-            operation['start_date'],
-            operation['end_date']
-        ])
+    async def export_operation(self, operation_id: int, format: str = 'xlsx',
+                               path: Optional[Path] = None) -> Optional[Path]:
+        """Потоковый экспорт операции напрямую из БД, включая точки треков
 
-        # Записываем информацию о группах
-        writer.writerow([])
-        writer.writerow(['Groups Information'])
-        writer.writerow(['Group ID', 'Name', 'Participants Count', 'Status'])
-        for group in report_data['groups']:
-            writer.writerow([
-                group['group_id'],
-                group['name'],
-                group['participants_count'],
-                group['status']
-            ])
-
-        return output.getvalue()
+        Строки читаются курсором пачками и сразу пишутся в файл, поэтому
+        память не зависит от размера операции.
+        """
+        sections = [
+            ReportSection('Основная информация', self.OPERATION_HEADERS, self.db.iterate("""
+                SELECT operation_id, name, status, start_time, end_time
+                FROM search_operations WHERE operation_id = ?
+            """, (operation_id,))),
+            ReportSection('Группы', self.GROUP_HEADERS, self.db.iterate("""
+                SELECT g.group_id, g.name, COUNT(p.participant_id), g.status
+                FROM search_groups g
+                LEFT JOIN group_participants p ON g.group_id = p.group_id
+                WHERE g.operation_id = ?
+                GROUP BY g.group_id
+            """, (operation_id,))),
+            ReportSection('Задачи', ['ID', 'Название', 'Статус', 'Исполнитель', 'Создана', 'Завершена'],
+                          self.db.iterate("""
+                SELECT task_id, title, status, assigned_to, created_at, completed_at
+                FROM coordination_tasks WHERE operation_id = ?
+                ORDER BY task_id
+            """, (operation_id,))),
+            ReportSection('Точки треков', ['Трек', 'Пользователь', 'Широта', 'Долгота', 'Высота', 'Время'],
+                          self.db.iterate("""
+                SELECT p.track_id, p.user_id, p.latitude, p.longitude, p.altitude, p.timestamp
+                FROM track_points p
+                JOIN user_tracks t ON t.track_id = p.track_id
+                JOIN search_groups g ON g.group_id = t.group_id
+                WHERE g.operation_id = ?
+                ORDER BY p.track_id, p.timestamp
+            """, (operation_id,))),
+        ]
+        try:
+            return await self.exporter.export(sections, format, path)
+        except Exception as e:
+            logger.error(f"Error exporting operation: {e}")
+            return None
 
     async def archive_operation(self, operation_id: int) -> bool:
         """Архивирование информации об операции"""
@@ -262,13 +254,10 @@ class ReportManager:
             archive_dir.mkdir(parents=True, exist_ok=True)
 
             # Сохраняем отчет в JSON
-            with open(archive_dir / 'report.json', 'w', encoding='utf-8') as f:
-                json.dump(report_data, f, indent=2, ensure_ascii=False)
+            await self.exporter.export_json(report_data, archive_dir / 'report.json')
 
             # Сохраняем отчет в Excel
-            excel_data = await self._export_to_xlsx(report_data)
-            with open(archive_dir / 'report.xlsx', 'wb') as f:
-                f.write(excel_data)
+            await self._export_to_xlsx(report_data, archive_dir / 'report.xlsx')
 
             # Обновляем статус операции
             await self.db.execute("""
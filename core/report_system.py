@@ -1,41 +1,130 @@
 from typing import Dict, List, Optional
 from datetime import datetime
+import asyncio
 import json
 import logging
 from pathlib import Path
-import csv
-import xlsxwriter
-from io import BytesIO
+from services.report_export import StreamingReportExporter, report_sections
 
 logger = logging.getLogger(__name__)
 
+class ReportBuild:
+    """Состояние одной сборки отчета.
+
+    Базовые выборки операции (группы, участники, задачи, треки, секторы)
+    выполняются не более одного раза: параллельные разделы отчета ждут
+    общий результат вместо повторного запроса.
+    """
+
+    QUERIES = {
+        'operation': """
+            SELECT * FROM search_operations WHERE operation_id = ?
+        """,
+        'groups': """
+            SELECT group_id, name, leader_id, status, created_at
+            FROM search_groups WHERE operation_id = ?
+        """,
+        'members': """
+            SELECT m.user_id, m.group_id, m.role, m.status, m.joined_at
+            FROM group_members m
+            JOIN search_groups g ON g.group_id = m.group_id
+            WHERE g.operation_id = ?
+        """,
+        'tasks': """
+            SELECT task_id, group_id, title, status, assigned_to, created_at, completed_at
+            FROM coordination_tasks WHERE operation_id = ?
+            ORDER BY task_id
+        """,
+        'tracks': """
+            SELECT t.track_id, t.user_id, t.group_id, t.start_time, t.end_time, t.distance
+            FROM user_tracks t
+            JOIN search_groups g ON g.group_id = t.group_id
+            WHERE g.operation_id = ?
+        """,
+        # Одна агрегирующая выборка вместо отдельных COUNT по секторам
+        'sectors': """
+            SELECT COUNT(*) AS total,
+                   COALESCE(SUM(status = 'completed'), 0) AS completed,
+                   COALESCE(AVG(progress), 0) AS avg_progress
+            FROM search_sectors WHERE operation_id = ?
+        """,
+    }
+
+    def __init__(self, db, operation_id: int):
+        self.db = db
+        self.operation_id = operation_id
+        self.queries = 0
+        self._memo: Dict[str, asyncio.Future] = {}
+
+    def rows(self, key: str) -> asyncio.Future:
+        """Строки базовой выборки ``key`` (запрос выполняется один раз)"""
+        if key not in self._memo:
+            self._memo[key] = asyncio.ensure_future(self._fetch(key))
+        return self._memo[key]
+
+    async def _fetch(self, key: str) -> List[Dict]:
+        self.queries += 1
+        try:
+            return await self.db.fetch_all(self.QUERIES[key], (self.operation_id,))
+        except Exception as e:
+            # Отсутствующая таблица не должна ронять весь отчет
+            logger.warning(f"Report query '{key}' failed: {e}")
+            return []
+
+    async def one(self, key: str) -> Optional[Dict]:
+        rows = await self.rows(key)
+        return rows[0] if rows else None
+
+
+def _parse_time(value) -> Optional[datetime]:
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+
+
 class ReportSystem:
     def __init__(self, db_manager, statistics_manager):
         self.db = db_manager
         self.stats = statistics_manager
         self.reports_dir = Path('data/reports')
         self.reports_dir.mkdir(parents=True, exist_ok=True)
+        self.exporter = StreamingReportExporter(self.reports_dir / 'spool')
 
     async def generate_operation_report(self, operation_id: int) -> Dict:
-        """Генерация подробного отчета по операции"""
+        """Генерация подробного отчета по операции
+
+        Разделы собираются параллельно через пул читающих соединений,
+        базовые выборки общие для всех разделов.
+        """
         try:
-            operation = await self.db.fetch_one("""
-                SELECT * FROM search_operations 
-                WHERE operation_id = ?
-            """, (operation_id,))
-            
+            build = ReportBuild(self.db, operation_id)
+            operation = await build.one('operation')
+
             if not operation:
                 return None
 
             # Сбор всех данных для отчета
+            statistics, participants, tasks, tracks, timeline, efficiency = await asyncio.gather(
+                self._get_operation_statistics(build),
+                self._get_participants_data(build),
+                self._get_tasks_data(build),
+                self._get_tracks_data(build),
+                self._get_operation_timeline(build),
+                self._calculate_efficiency(build)
+            )
             report_data = {
                 "operation": operation,
-                "statistics": await self._get_operation_statistics(operation_id),
-                "participants": await self._get_participants_data(operation_id),
-                "tasks": await self._get_tasks_data(operation_id),
-                "tracks": await self._get_tracks_data(operation_id),
-                "timeline": await self._get_operation_timeline(operation_id),
-                "efficiency": await self._calculate_efficiency(operation_id),
+                "statistics": statistics,
+                "participants": participants,
+                "tasks": tasks,
+                "tracks": tracks,
+                "timeline": timeline,
+                "efficiency": efficiency,
                 "generated_at": datetime.now().isoformat()
             }
 
@@ -45,52 +134,92 @@ class ReportSystem:
             logger.error(f"Error generating operation report: {e}")
             return None
 
-    async def _get_operation_statistics(self, operation_id: int) -> Dict:
-        """Сбор статистики по операции"""
+    async def _get_operation_statistics(self, build: ReportBuild) -> Dict:
+        """Сбор статистики по операции (из общих выборок, без отдельных COUNT)"""
+        operation, members, tasks, tracks, sectors = await asyncio.gather(
+            build.one('operation'), build.rows('members'), build.rows('tasks'),
+            build.rows('tracks'), build.one('sectors')
+        )
+        start = _parse_time(operation.get('start_time'))
+        end = _parse_time(operation.get('end_time')) or datetime.now()
         return {
-            "total_participants": await self.db.count_participants(operation_id),
-            "total_tasks": await self.db.count_tasks(operation_id),
-            "completed_tasks": await self.db.count_completed_tasks(operation_id),
-            "covered_area": await self.db.get_covered_area(operation_id),
-            "total_distance": await self.db.get_total_distance(operation_id),
-            "duration": await self.db.get_operation_duration(operation_id)
+            "total_participants": len({m['user_id'] for m in members}),
+            "total_tasks": len(tasks),
+            "completed_tasks": sum(1 for t in tasks if t['status'] == 'completed'),
+            "average_sector_progress": round(sectors['avg_progress'], 2) if sectors else 0.0,
+            "total_distance": round(sum(t['distance'] or 0 for t in tracks), 2),
+            "duration": round((end - start).total_seconds() / 3600, 2) if start else 0.0
         }
 
-    async def export_report(self, report_data: Dict, format: str = 'xlsx') -> bytes:
-        """Экспорт отчета в различные форматы"""
-        export_functions = {
-            'xlsx': self._export_to_xlsx,
-            'csv': self._export_to_csv,
-            'json': self._export_to_json,
-            'pdf': self._export_to_pdf
+    async def _get_participants_data(self, build: ReportBuild) -> List[Dict]:
+        """Участники операции с пройденной дистанцией"""
+        members, tracks = await asyncio.gather(build.rows('members'), build.rows('tracks'))
+        distance: Dict[int, float] = {}
+        for track in tracks:
+            distance[track['user_id']] = distance.get(track['user_id'], 0) + (track['distance'] or 0)
+        return [{**member, 'distance': round(distance.get(member['user_id'], 0), 2)}
+                for member in members]
+
+    async def _get_tasks_data(self, build: ReportBuild) -> List[Dict]:
+        return list(await build.rows('tasks'))
+
+    async def _get_tracks_data(self, build: ReportBuild) -> List[Dict]:
+        return list(await build.rows('tracks'))
+
+    async def _get_operation_timeline(self, build: ReportBuild) -> List[Dict]:
+        """Хронология операции из общих выборок"""
+        operation, groups, tasks = await asyncio.gather(
+            build.one('operation'), build.rows('groups'), build.rows('tasks')
+        )
+        events = [
+            (operation.get('start_time'), 'operation_start', operation.get('name')),
+            (operation.get('end_time'), 'operation_end', operation.get('name')),
+        ]
+        events += [(g['created_at'], 'group_created', g['name']) for g in groups]
+        events += [(t['created_at'], 'task_created', t['title']) for t in tasks]
+        events += [(t['completed_at'], 'task_completed', t['title']) for t in tasks]
+        return [
+            {'timestamp': ts, 'event': event, 'description': description}
+            for ts, event, description in sorted((e for e in events if e[0]), key=lambda e: str(e[0]))
+        ]
+
+    async def _calculate_efficiency(self, build: ReportBuild) -> Dict:
+        """Показатели эффективности на основе статистики"""
+        stats = await self._get_operation_statistics(build)
+        participants = stats['total_participants'] or 1
+        hours = stats['duration'] or 1
+        return {
+            "task_completion_rate": round(
+                stats['completed_tasks'] / stats['total_tasks'] * 100, 2
+            ) if stats['total_tasks'] else 0.0,
+            "distance_per_participant": round(stats['total_distance'] / participants, 2),
+            "tasks_per_hour": round(stats['completed_tasks'] / hours, 2),
+            "sector_progress_per_hour": round(stats['average_sector_progress'] / hours, 2)
         }
 
-        if format not in export_functions:
-            raise ValueError(f"Unsupported format: {format}")
-
-        return await export_functions[format](report_data)
-
-    async def _export_to_xlsx(self, report_data: Dict) -> bytes:
-        """Экспорт в Excel формат"""
-        output = BytesIO()
-        workbook = xlsxwriter.Workbook(output)
-
-        # Форматирование
-        header_format = workbook.add_format({
-            'bold': True,
-            'bg_color': '#4CAF50',
-            'color': 'white'
-        })
-
-        # Основная информация
-        self._write_operation_sheet(workbook, report_data, header_format)
-        self._write_statistics_sheet(workbook, report_data, header_format)
-        self._write_participants_sheet(workbook, report_data, header_format)
-        self._write_tasks_sheet(workbook, report_data, header_format)
-
-        workbook.close()
-        output.seek(0)
-        return output.getvalue()
+    SECTION_TITLES = {
+        'operation': 'Операция',
+        'statistics': 'Статистика',
+        'participants': 'Участники',
+        'tasks': 'Задачи',
+        'tracks': 'Треки',
+        'timeline': 'Хронология',
+        'efficiency': 'Эффективность'
+    }
+
+    async def export_report(self, report_data: Dict, format: str = 'xlsx',
+                            path: Optional[Path] = None) -> Path:
+        """Экспорт отчета в различные форматы
+
+        Файл пишется потоково в пуле потоков; возвращается путь к нему.
+        """
+        if format == 'json':
+            return await self.exporter.export_json(report_data, path)
+        if format in ('xlsx', 'csv', 'jsonl'):
+            return await self.exporter.export(
+                report_sections(report_data, self.SECTION_TITLES), format, path
+            )
+        raise ValueError(f"Unsupported format: {format}")
 
     async def archive_operation(self, operation_id: int) -> bool:
         """Архивирование данных операции"""
@@ -103,10 +232,8 @@ class ReportSystem:
             archive_dir.mkdir(parents=True, exist_ok=True)
 
             # Сохраняем в разных форматах
-            for format in ['xlsx', 'json', 'pdf']:
-                export_data = await self.export_report(report_data, format)
-                with open(archive_dir / f'report.{format}', 'wb') as f:
-                    f.write(export_data)
+            for format in ['xlsx', 'json']:
+                await self.export_report(report_data, format, archive_dir / f'report.{format}')
 
             # Архивируем треки
             await self._archive_tracks(operation_id, archive_dir)
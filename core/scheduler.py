@@ -1,28 +1,281 @@
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from apscheduler.triggers.interval import IntervalTrigger
+from datetime import datetime
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple, Union
+import asyncio
+import heapq
+import itertools
+import json
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
+SCHEMA_PATH = Path(__file__).resolve().parents[1] / 'database' / 'migrations' / '16_scheduled_jobs.sql'
+
+When = Union[datetime, float]
+
+
+def _timestamp(when: When) -> float:
+    if isinstance(when, datetime):
+        return when.timestamp()
+    if isinstance(when, str):
+        return datetime.fromisoformat(when).timestamp()
+    return float(when)
+
+
+class JobScheduler:
+    """Единый планировщик отложенных заданий.
+
+    Задания хранятся в scheduled_jobs и в памяти - в куче по времени
+    срабатывания; цикл спит ровно до ближайшего задания, без опроса таблиц.
+    В память поднимаются только задания ближайших ``horizon`` секунд
+    (по индексу на due_at), остальные подгружаются по мере приближения.
+    Перед вызовом обработчика задание отмечается fired_at: после
+    перезапуска оно не сработает повторно. Планировщик берет только
+    задания видов, для которых зарегистрирован обработчик, поэтому
+    менеджеры должны использовать один общий экземпляр (его создает
+    приложение), иначе чужие задания подхватываются лишь при подгрузке.
+    """
+
+    def __init__(self, db_manager, horizon: float = 6 * 3600,
+                 retry_delay: float = 30, max_attempts: int = 3):
+        self.db = db_manager
+        self.horizon = horizon
+        self.retry_delay = retry_delay
+        self.max_attempts = max_attempts
+        self.handlers: Dict[str, Callable[[Dict], Awaitable]] = {}
+        self.is_running = False
+        self._heap: List[Tuple[float, int, str]] = []
+        self._armed: Dict[str, Dict] = {}  # job_key -> задание в куче
+        self._loaded_until = 0.0
+        self._sequence = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._running: set = set()
+        self.stats = {'fired': 0, 'skipped': 0, 'failed': 0}
+
+    async def install(self):
+        await self.db.executescript(SCHEMA_PATH.read_text(encoding='utf-8'))
+
+    def register(self, kind: str, handler: Callable[[Dict], Awaitable]):
+        """Обработчик заданий вида ``kind``; получает задание с payload"""
+        new_kind = kind not in self.handlers
+        self.handlers[kind] = handler
+        if new_kind and self.is_running:
+            # Задания нового вида, уже лежащие в БД, поднимаются заново
+            self._loaded_until = 0.0
+            self._wakeup.set()
+
+    async def start(self):
+        if self.is_running:
+            return
+        self.is_running = True
+        await self._load(time.time() + self.horizon)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self.is_running = False
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await asyncio.gather(*self._running, return_exceptions=True)
+
+    # ---- задания ----
+
+    async def schedule(self, kind: str, ref_id: Optional[int], when: When,
+                       payload: Optional[Dict] = None, key: Optional[str] = None) -> str:
+        """Создание или перенос задания.
+
+        Повторный вызов с тем же временем ничего не меняет (уже сработавшее
+        задание не оживает), новое время снова взводит задание.
+        """
+        return (await self.schedule_many([(kind, ref_id, when, payload, key)]))[0]
+
+    async def schedule_many(self, jobs: Iterable[Tuple]) -> List[str]:
+        """Пакетное ``schedule``: (kind, ref_id, when, payload[, key]) одной транзакцией"""
+        rows = []
+        for kind, ref_id, when, payload, *rest in jobs:
+            key = (rest[0] if rest else None) or f"{kind}:{ref_id}"
+            rows.append((key, kind, ref_id, _timestamp(when), json.dumps(payload) if payload else None))
+
+        async def job(conn):
+            armed = []
+            for row in rows:
+                cursor = await conn.execute("""
+                    INSERT INTO scheduled_jobs (job_key, kind, ref_id, due_at, payload)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT (job_key) DO UPDATE SET
+                        payload = excluded.payload,
+                        fired_at = CASE WHEN scheduled_jobs.due_at = excluded.due_at
+                                        THEN scheduled_jobs.fired_at END,
+                        attempts = CASE WHEN scheduled_jobs.due_at = excluded.due_at
+                                        THEN scheduled_jobs.attempts ELSE 0 END,
+                        due_at = excluded.due_at
+                    RETURNING job_key, kind, ref_id, due_at, payload, fired_at, attempts
+                """, row)
+                armed.append(await cursor.fetchone())
+            return armed
+
+        for row in await self.db.run_in_transaction(job):
+            key, kind, ref_id, due_at, payload, fired_at, attempts = row
+            if fired_at is None:
+                self._arm({'job_key': key, 'kind': kind, 'ref_id': ref_id, 'due_at': due_at,
+                           'payload': json.loads(payload) if payload else None, 'attempts': attempts})
+            else:
+                self._armed.pop(key, None)
+        return [row[0] for row in rows]
+
+    async def cancel(self, key: str):
+        self._armed.pop(key, None)
+        await self.db.execute("DELETE FROM scheduled_jobs WHERE job_key = ?", (key,))
+
+    async def cancel_ref(self, kind: str, ref_id: int):
+        """Отмена всех заданий объекта (например, эскалаций выполненной задачи)"""
+        for key, job in list(self._armed.items()):
+            if job['kind'] == kind and job['ref_id'] == ref_id:
+                del self._armed[key]
+        await self.db.execute("DELETE FROM scheduled_jobs WHERE kind = ? AND ref_id = ?", (kind, ref_id))
+
+    def pending(self) -> int:
+        return len(self._armed)
+
+    # ---- цикл ----
+
+    def _arm(self, job: Dict):
+        if job['kind'] not in self.handlers:
+            # Задание другого планировщика: не трогаем, чтобы не отметить его fired_at
+            self._armed.pop(job['job_key'], None)
+            return
+        self._armed[job['job_key']] = job
+        if job['due_at'] <= self._loaded_until or not self.is_running:
+            heapq.heappush(self._heap, (job['due_at'], next(self._sequence), job['job_key']))
+            self._wakeup.set()
+        else:
+            # Дальше горизонта: поднимется из БД при подгрузке
+            del self._armed[job['job_key']]
+
+    async def _load(self, until: float):
+        """Подгрузка заданий зарегистрированных видов до ``until`` по индексу на due_at"""
+        kinds = list(self.handlers)
+        if kinds:
+            rows = await self.db.fetchall(f"""
+                SELECT job_key, kind, ref_id, due_at, payload, attempts
+                FROM scheduled_jobs
+                WHERE fired_at IS NULL AND due_at > ? AND due_at <= ?
+                  AND kind IN ({', '.join('?' * len(kinds))})
+                ORDER BY due_at
+            """, (self._loaded_until, until, *kinds))
+        else:
+            rows = []
+        self._loaded_until = until
+        for key, kind, ref_id, due_at, payload, attempts in rows:
+            if key not in self._armed:
+                self._arm({'job_key': key, 'kind': kind, 'ref_id': ref_id, 'due_at': due_at,
+                           'payload': json.loads(payload) if payload else None, 'attempts': attempts})
+
+    async def _run(self):
+        while self.is_running:
+            try:
+                now = time.time()
+                if now + self.horizon / 2 >= self._loaded_until:
+                    await self._load(now + self.horizon)
+                due = self._pop_due(now)
+                if due:
+                    await self._fire(due)
+                    continue
+                timeout = self._loaded_until - self.horizon / 2 - now
+                if self._heap:
+                    timeout = min(timeout, self._heap[0][0] - now)
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), max(timeout, 0))
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in job scheduler: {e}")
+                await asyncio.sleep(1)
+
+    def _pop_due(self, now: float) -> List[Dict]:
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            due_at, _, key = heapq.heappop(self._heap)
+            job = self._armed.get(key)
+            # Отмененные и перенесенные задания остаются в куче до извлечения
+            if job is not None and job['due_at'] == due_at:
+                del self._armed[key]
+                due.append(job)
+        return due
+
+    async def _fire(self, jobs: List[Dict]):
+        """Отметка срабатывания одной транзакцией, затем запуск обработчиков"""
+        fired_at = time.time()
+        # Задание без обработчика остается в БД для планировщика, который его знает
+        jobs = [job for job in jobs if job['kind'] in self.handlers]
+        if not jobs:
+            return
+
+        async def claim(conn):
+            claimed = []
+            for job in jobs:
+                cursor = await conn.execute("""
+                    UPDATE scheduled_jobs SET fired_at = ?
+                    WHERE job_key = ? AND due_at = ? AND fired_at IS NULL
+                """, (fired_at, job['job_key'], job['due_at']))
+                if cursor.rowcount:
+                    claimed.append(job)
+            return claimed
+
+        claimed = await self.db.run_in_transaction(claim)
+        self.stats['skipped'] += len(jobs) - len(claimed)
+        for job in claimed:
+            task = asyncio.create_task(self._handle(job))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _handle(self, job: Dict):
+        handler = self.handlers[job['kind']]
+        try:
+            await handler(job)
+            self.stats['fired'] += 1
+        except Exception as e:
+            logger.error(f"Scheduled job {job['job_key']} failed: {e}")
+            self.stats['failed'] += 1
+            attempts = job['attempts'] + 1
+            if attempts < self.max_attempts:
+                await self._retry(job, attempts)
+
+    async def _retry(self, job: Dict, attempts: int):
+        due_at = time.time() + self.retry_delay * attempts
+        await self.db.execute("""
+            UPDATE scheduled_jobs SET due_at = ?, fired_at = NULL, attempts = ?
+            WHERE job_key = ?
+        """, (due_at, attempts, job['job_key']))
+        self._arm({**job, 'due_at': due_at, 'attempts': attempts})
+
+
 class TaskScheduler:
-    def __init__(self, task_service):
-        self.scheduler = AsyncIOScheduler()
+    """Напоминания о сроках задач TaskManagementService через JobScheduler"""
+
+    def __init__(self, task_service, scheduler: Optional[JobScheduler] = None):
         self.task_service = task_service
+        # Общий планировщик приложения останавливает само приложение
+        self.owns_scheduler = scheduler is None
+        self.scheduler = scheduler or JobScheduler(task_service.db)
 
-    def start(self):
+    async def start(self):
         """Запуск планировщика"""
-        # Проверка напоминаний каждые 5 минут
-        self.scheduler.add_job(
-            self.task_service.check_reminders,
-            trigger=IntervalTrigger(minutes=5),
-            id='check_reminders',
-            replace_existing=True
-        )
-        
-        self.scheduler.start()
+        self.task_service.scheduler = self.scheduler
+        self.scheduler.register('task_reminder', self.task_service.send_reminder)
+        await self.scheduler.start()
+        # Напоминания, созданные до появления планировщика
+        await self.task_service.schedule_pending_reminders()
         logger.info("Task scheduler started")
 
-    def stop(self):
+    async def stop(self):
         """Остановка планировщика"""
-        self.scheduler.shutdown()
-        logger.info("Task scheduler stopped")
\ No newline at end of file
+        if self.owns_scheduler:
+            await self.scheduler.stop()
+        logger.info("Task scheduler stopped")
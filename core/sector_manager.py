@@ -1,69 +1,172 @@
 from typing import Dict, List, Optional
 from datetime import datetime
+import asyncio
 import json
 import logging
-from shapely.geometry import Polygon, Point
-from shapely.ops import unary_union
+from functools import partial
+from shapely.geometry import Polygon
+from services.coverage_engine import CoverageEngine
+from services.coverage_grid import CoverageGridStore
+from services.sector_grid import grid_search_area
+from services.sector_assignment import SectorAssignmentEngine, claim_sector
+from services.sector_import import validate_sectors
+from config.settings import SECTOR_PREVIEW_CONCURRENCY
 from .notification_manager import NotificationManager
 
 logger = logging.getLogger(__name__)
 
+# Строк в одном многострочном INSERT секторов (6 параметров на строку)
+SECTOR_INSERT_CHUNK = 150
+
 class SectorManager:
-    def __init__(self, db_manager, notification_manager: NotificationManager, map_service):
+    def __init__(self, db_manager, notification_manager: NotificationManager, map_service,
+                 coverage_grids: Optional[CoverageGridStore] = None):
         self.db = db_manager
         self.notification_manager = notification_manager
         self.map_service = map_service
+        self.coverage_engine = CoverageEngine(search_radius=50.0)
+        # Растровый бэкенд: если сетка операции загружена, покрытие считается по ней
+        self.coverage_grids = coverage_grids
+        self._background = set()  # задачи превью и уведомлений о новых секторах
+        self.assignments = SectorAssignmentEngine(db_manager, notification_manager)
 
     async def create_sector(self, operation_id: int, data: Dict) -> Optional[int]:
         """Создание нового сектора с расширенными параметрами"""
+        sector_ids = await self.create_sectors(operation_id, [data])
+        return sector_ids[0] if sector_ids else None
+
+    async def create_sectors(self, operation_id: int, sectors: List[Dict]) -> List[Optional[int]]:
+        """Массовое создание секторов (например, импорт сетки из GeoJSON).
+
+        Геометрия проверяется вне цикла событий, все секторы вставляются
+        одной транзакцией многострочными INSERT ... RETURNING. Превью карт и уведомление
+        координаторов ставятся в фоновую задачу и не задерживают ответ.
+        Возвращает ID секторов в порядке входного списка, None - для
+        отклоненных.
+        """
         try:
-            # Валидация границ сектора
-            boundaries = data['boundaries']
-            if len(boundaries) < 3:
-                logger.error("Invalid sector boundaries: less than 3 points")
-                return None
+            checks = await validate_sectors([sector['boundaries'] for sector in sectors])
+
+            rows = []
+            accepted = []
+            for index, (sector, (error, geojson)) in enumerate(zip(sectors, checks)):
+                if error:
+                    logger.error(f"Invalid sector boundaries '{sector.get('name')}': {error}")
+                    continue
+                # Вычисляем сложность сектора на основе рельефа
+                difficulty = await self._calculate_sector_difficulty(sector['boundaries'])
+                rows.append((
+                    operation_id,
+                    sector['name'],
+                    geojson,
+                    sector.get('priority', 1),
+                    difficulty,
+                    sector.get('terrain_type', 'unknown')
+                ))
+                accepted.append(index)
+
+            result: List[Optional[int]] = [None] * len(sectors)
+            if not rows:
+                return result
+
+            async def job(conn):
+                created = []
+                for start in range(0, len(rows), SECTOR_INSERT_CHUNK):
+                    chunk = rows[start:start + SECTOR_INSERT_CHUNK]
+                    cursor = await conn.execute(f"""
+                        INSERT INTO search_sectors
+                        (operation_id, name, boundaries, priority, difficulty,
+                        terrain_type, status, created_at)
+                        VALUES {', '.join(["(?, ?, ?, ?, ?, ?, 'pending', CURRENT_TIMESTAMP)"] * len(chunk))}
+                        RETURNING sector_id
+                    """, [value for row in chunk for value in row])
+                    # Порядок строк RETURNING не гарантирован, а ID в одной
+                    # вставке растут в порядке VALUES
+                    created.extend(sorted(row[0] for row in await cursor.fetchall()))
+                return created
+
+            created = await self.db.run_in_transaction(job)
+            for index, sector_id in zip(accepted, created):
+                result[index] = sector_id
+
+            self._run_in_background(self._announce_sectors(
+                operation_id,
+                [(sector_id, sectors[index]) for index, sector_id in zip(accepted, created)]
+            ))
+            return result
 
-            polygon = Polygon(boundaries)
-            if not polygon.is_valid:
-                logger.error("Invalid polygon boundaries")
-                return None
+        except Exception as e:
+            logger.error(f"Error creating sectors: {e}")
+            return [None] * len(sectors)
+
+    async def generate_sectors(self, operation_id: int, shape: str = 'square',
+                               cell_area_m2: Optional[float] = None,
+                               walking_minutes: Optional[float] = None,
+                               terrain=None) -> List[Optional[int]]:
+        """Автоматическая нарезка области поиска операции на секторы.
+
+        Область берется из search_operations.search_area, нарезка
+        выполняется в потоке, секторы записываются одной вставкой
+        через create_sectors.
+        """
+        try:
+            row = await self.db.fetch_one(
+                "SELECT search_area FROM search_operations WHERE operation_id = ?",
+                (operation_id,)
+            )
+            if not row or not row['search_area']:
+                logger.error(f"Operation {operation_id} has no search area")
+                return []
+
+            sectors = await asyncio.get_running_loop().run_in_executor(None, partial(
+                grid_search_area,
+                row['search_area'],
+                shape=shape,
+                cell_area_m2=cell_area_m2,
+                walking_minutes=walking_minutes,
+                terrain=terrain
+            ))
+            return await self.create_sectors(operation_id, sectors)
 
-            # Создаем GeoJSON для границ
-            geojson = {
-                'type': 'Polygon',
-                'coordinates': [boundaries + [boundaries[0]]]  # Замыкаем полигон
-            }
+        except Exception as e:
+            logger.error(f"Error generating sectors: {e}")
+            return []
 
-            # Вычисляем сложность сектора на основе рельефа
-            difficulty = await self._calculate_sector_difficulty(boundaries)
+    def _run_in_background(self, coro):
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
 
-            sector_id = await self.db.execute("""
-                INSERT INTO search_sectors 
-                (operation_id, name, boundaries, priority, difficulty, 
-                terrain_type, status, created_at)
-                VALUES (?, ?, ?, ?, ?, ?, 'pending', CURRENT_TIMESTAMP)
-                RETURNING sector_id
-            """, (
-                operation_id,
-                data['name'],
-                json.dumps(geojson),
-                data.get('priority', 1),
-                difficulty,
-                data.get('terrain_type', 'unknown')
-            ))
+    async def wait_background_tasks(self):
+        """Ожидание фоновых превью и уведомлений (при остановке и в тестах)"""
+        while self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
 
-            if sector_id:
-                await self.notification_manager.notify_coordinators(
-                    f"🆕 Создан новый сектор '{data['name']}' в операции #{operation_id}"
-                )
-                # Генерируем превью карты сектора
-                await self.map_service.generate_sector_preview(sector_id, boundaries)
+    async def _announce_sectors(self, operation_id: int, created: List[tuple]):
+        """Одно уведомление координаторам и превью карт созданных секторов"""
+        try:
+            if len(created) == 1:
+                message = f"🆕 Создан новый сектор '{created[0][1]['name']}' в операции #{operation_id}"
+            else:
+                message = f"🆕 В операции #{operation_id} создано секторов: {len(created)}"
+            await self.notification_manager.notify_coordinators(message)
+        except Exception as e:
+            logger.error(f"Error notifying about new sectors: {e}")
 
-            return sector_id
+        # Генерируем превью карт секторов
+        semaphore = asyncio.Semaphore(SECTOR_PREVIEW_CONCURRENCY)
 
-        except Exception as e:
-            logger.error(f"Error creating sector: {e}")
-            return None
+        async def preview(sector_id: int, boundaries):
+            async with semaphore:
+                await self.map_service.generate_sector_preview(sector_id, boundaries)
+
+        results = await asyncio.gather(
+            *(preview(sector_id, sector['boundaries']) for sector_id, sector in created),
+            return_exceptions=True
+        )
+        failed = sum(isinstance(result, Exception) for result in results)
+        if failed:
+            logger.error(f"Failed to generate {failed} sector previews in operation {operation_id}")
 
     def get_sector_coverage(self, sector_id: int) -> float:
         """Получение процента покрытия сектора"""
@@ -73,37 +176,46 @@ class SectorManager:
             if not sector:
                 return 0.0
 
-            # Получаем все треки в этом секторе
-            tracks = self.db.get_sector_tracks(sector_id)
-            
-            # Создаем полигон сектора
             sector_bounds = json.loads(sector['boundaries'])
-            sector_polygon = Polygon(sector_bounds['coordinates'][0])
-            
-            # Создаем буферы для треков (покрытая область)
-            covered_areas = []
-            for track in tracks:
-                points = json.loads(track['points_json'])
-                track_line = [Point(p['lon'], p['lat']) for p in points]
-                # Создаем буфер 50 метров вокруг каждой точки трека
-                for point in track_line:
-                    covered_areas.append(point.buffer(0.00045))  # ~50 метров
-
-            if not covered_areas:
-                return 0.0
+            grid = self._get_coverage_grid(sector)
+            if grid:
+                return grid.sector_coverage(sector_id, sector_bounds['coordinates'][0])
 
-            # Объединяем все покрытые области
-            covered_union = unary_union(covered_areas)
-            
-            # Вычисляем процент покрытия
-            coverage = (covered_union.intersection(sector_polygon).area / 
-                      sector_polygon.area) * 100
-            
-            return min(100.0, coverage)
+            coverage = self.coverage_engine.ensure_sector(sector_id, sector_bounds['coordinates'][0])
+
+            # Учитываем только точки, появившиеся с прошлого расчета
+            tracks = self.db.get_sector_tracks(sector_id)
+            revision = coverage.revision
+            self._apply_tracks(coverage, tracks)
+            if coverage.revision != revision:
+                # Переписанный трек сбросил покрытие: треки до него учитываются заново
+                self._apply_tracks(coverage, tracks)
+
+            return self.coverage_engine.get_coverage(sector_id)
         except Exception as e:
             logger.error(f"Error calculating sector coverage: {e}")
             return 0.0
 
+    @staticmethod
+    def _apply_tracks(coverage, tracks: List[Dict]):
+        for track in tracks:
+            track_id = track.get('track_id', track.get('id'))
+            if not coverage.is_changed(track_id, track['points_json']):
+                continue
+            coverage.add_points(track_id, json.loads(track['points_json']))
+
+    def add_track_points(self, sector_id: int, track_id: int, points: List[Dict]) -> int:
+        """Учет новых точек трека в покрытии сектора без перечитывания треков
+
+        ``points`` - только точки, пришедшие после уже учтенных.
+        """
+        return self.coverage_engine.extend(sector_id, track_id, points)
+
+    def _get_coverage_grid(self, sector: Dict):
+        if not self.coverage_grids or 'operation_id' not in sector:
+            return None
+        return self.coverage_grids.cached(sector['operation_id'])
+
     async def update_sector_boundaries(self, sector_id: int, new_boundaries: List[tuple]) -> bool:
         """Обновление границ сектора"""
         try:
@@ -124,6 +236,10 @@ class SectorManager:
             """, (json.dumps(geojson), sector_id))
 
             if success:
+                self.coverage_engine.reset_sector(sector_id)
+                if self.coverage_grids:
+                    for grid in self.coverage_grids.grids.values():
+                        grid.reset_mask(sector_id)
                 await self.map_service.generate_sector_preview(sector_id, new_boundaries)
                 await self.notification_manager.notify_sector_teams(
                     sector_id, 
@@ -139,36 +255,39 @@ class SectorManager:
     async def assign_team_to_sector(self, sector_id: int, team_id: int) -> bool:
         """Назначение команды на сектор"""
         try:
-            # Проверяем, не занят ли сектор
-            current_team = await self.db.fetchone(
-                "SELECT assigned_team FROM search_sectors WHERE sector_id = ?",
-                (sector_id,)
-            )
+            async def job(conn):
+                # Проверка и захват сектора - одним условным UPDATE
+                if not await claim_sector(conn, sector_id, team_id):
+                    return False
+                await conn.execute(
+                    "UPDATE search_teams SET current_sector = ? WHERE team_id = ?",
+                    (sector_id, team_id)
+                )
+                return True
 
-            if current_team and current_team['assigned_team']:
+            success = await self.db.run_in_transaction(job)
+            if not success:
                 logger.warning(f"Sector {sector_id} already has assigned team")
                 return False
 
-            success = await self.db.execute("""
-                UPDATE search_sectors 
-                SET assigned_team = ?,
-                    status = 'in_progress',
-                    last_searched = CURRENT_TIMESTAMP
-                WHERE sector_id = ?
-            """, (team_id, sector_id))
-
-            if success:
-                await self.notification_manager.notify_team(
-                    team_id,
-                    f"📍 Ваша команда назначена на новый сектор"
-                )
-
-            return success
+            await self.notification_manager.notify_team(
+                team_id,
+                f"📍 Ваша команда назначена на новый сектор"
+            )
+            return True
 
         except Exception as e:
             logger.error(f"Error assigning team to sector: {e}")
             return False
 
+    async def auto_assign_teams(self, operation_id: int) -> List[tuple]:
+        """Распределение всех свободных команд операции по незанятым секторам"""
+        try:
+            return await self.assignments.assign(operation_id)
+        except Exception as e:
+            logger.error(f"Error auto-assigning teams: {e}")
+            return []
+
     async def update_sector_progress(self, sector_id: int, team_id: int, coverage: float) -> bool:
         """Обновление прогресса поиска в секторе"""
         try:
@@ -178,15 +297,33 @@ class SectorManager:
                 VALUES (?, ?, ?, CURRENT_TIMESTAMP)
             """, (sector_id, team_id, coverage))
 
-            # Обновляем общий прогресс сектора
+            # Обновляем общий прогресс сектора. Сектор с назначенной командой
+            # завершается только через release_team, чтобы повторный отчет
+            # не закрыл следующий сектор команды
             total_coverage = await self._calculate_total_coverage(sector_id)
             await self.db.execute("""
                 UPDATE search_sectors 
                 SET progress = ?,
-                    status = CASE WHEN ? >= 100 THEN 'completed' ELSE 'in_progress' END
+                    status = CASE
+                        WHEN status = 'completed' THEN status
+                        WHEN ? < 100 THEN 'in_progress'
+                        WHEN assigned_team IS NULL THEN 'completed'
+                        ELSE status
+                    END
                 WHERE sector_id = ?
             """, (total_coverage, total_coverage, sector_id))
 
+            if total_coverage >= 100:
+                # Команда сектора свободна - подбираем ей следующий сектор
+                sector = await self.db.fetch_one(
+                    "SELECT operation_id, assigned_team FROM search_sectors WHERE sector_id = ?",
+                    (sector_id,)
+                )
+                if sector and sector['assigned_team'] is not None:
+                    await self.assignments.release_team(
+                        sector['operation_id'], sector['assigned_team'], sector_id
+                    )
+
             return True
 
         except Exception as e:
@@ -206,7 +343,7 @@ class SectorManager:
     async def _calculate_total_coverage(self, sector_id: int) -> float:
         """Расчет общего прогресса поиска в секторе"""
         try:
-            result = await self.db.fetchone("""
+            result = await self.db.fetch_one("""
                 SELECT AVG(coverage_percent) as avg_coverage
                 FROM sector_progress
                 WHERE sector_id = ?
@@ -6,9 +6,11 @@ import logging
 logger = logging.getLogger(__name__)
 
 class TaskManagementService:
-    def __init__(self, db_manager, notification_manager):
+    def __init__(self, db_manager, notification_manager, escalation_manager=None):
         self.db = db_manager
         self.notification_manager = notification_manager
+        self.scheduler = None  # JobScheduler, подключается TaskScheduler
+        self.escalations = escalation_manager  # EscalationManager на общем планировщике
         
     async def create_task(self, data: Dict) -> Optional[int]:
         """Создание новой задачи"""
@@ -38,12 +40,41 @@ class TaskManagementService:
             
             if task_id and data.get('deadline'):
                 await self._create_reminders(task_id, data['deadline'])
+                await self._track_escalations(task_id, data['deadline'])
             
             return task_id
         except Exception as e:
             logger.error(f"Error creating task: {e}")
             return None
 
+    async def update_task_deadline(self, task_id: int, deadline: datetime) -> bool:
+        """Перенос срока задачи: напоминания и эскалации ставятся заново"""
+        try:
+            await self.db.execute(
+                "UPDATE coordination_tasks SET deadline = ? WHERE task_id = ?",
+                (deadline, task_id)
+            )
+            stale = await self.db.fetch_all(
+                "SELECT reminder_id FROM task_reminders WHERE task_id = ? AND is_sent = FALSE",
+                (task_id,)
+            )
+            await self.db.execute(
+                "DELETE FROM task_reminders WHERE task_id = ? AND is_sent = FALSE", (task_id,)
+            )
+            if self.scheduler:
+                for reminder in stale:
+                    await self.scheduler.cancel(f"task_reminder:{reminder['reminder_id']}")
+            await self._create_reminders(task_id, deadline)
+            await self._track_escalations(task_id, deadline)
+            return True
+        except Exception as e:
+            logger.error(f"Error updating task deadline: {e}")
+            return False
+
+    async def _track_escalations(self, task_id: int, deadline) -> None:
+        if self.escalations:
+            await self.escalations.track_task({'task_id': task_id, 'deadline': deadline, 'status': 'pending'})
+
     async def _create_reminders(self, task_id: int, deadline: datetime) -> None:
         """Создание напоминаний для задачи"""
         reminders = [
@@ -52,34 +83,50 @@ class TaskManagementService:
             (deadline - timedelta(minutes=30), 'before_deadline', '🚨 Критично! Осталось 30 минут')
         ]
         
+        jobs = []
         for reminder_time, reminder_type, reminder_text in reminders:
-            await self.db.execute_query("""
+            reminder_id = await self.db.execute("""
                 INSERT INTO task_reminders (task_id, reminder_time, reminder_type, reminder_text)
                 VALUES (?, ?, ?, ?)
             """, (task_id, reminder_time, reminder_type, reminder_text))
+            jobs.append(('task_reminder', reminder_id, reminder_time, None))
 
-    async def check_reminders(self) -> None:
-        """Проверка и отправка напоминаний"""
-        reminders = await self.db.execute_query_fetchall("""
+        if self.scheduler:
+            await self.scheduler.schedule_many(jobs)
+
+    async def schedule_pending_reminders(self) -> None:
+        """Постановка в планировщик неотправленных напоминаний из БД"""
+        reminders = await self.db.fetch_all("""
+            SELECT reminder_id, reminder_time FROM task_reminders WHERE is_sent = FALSE
+        """)
+        await self.scheduler.schedule_many(
+            ('task_reminder', reminder['reminder_id'], reminder['reminder_time'], None)
+            for reminder in reminders
+        )
+
+    async def send_reminder(self, job: Dict) -> None:
+        """Отправка напоминания (вызывается планировщиком в момент срабатывания)"""
+        reminder = await self.db.fetch_one("""
             SELECT r.*, t.assigned_to, t.title
             FROM task_reminders r
             JOIN coordination_tasks t ON r.task_id = t.task_id
-            WHERE r.is_sent = FALSE AND r.reminder_time <= CURRENT_TIMESTAMP
-        """)
-        
-        for reminder in reminders:
-            if reminder['assigned_to']:
-                await self.notification_manager.send_notification(
-                    reminder['assigned_to'],
-                    f"{reminder['reminder_text']}\n"
-                    f"Задача: {reminder['title']}"
-                )
-                
-            await self.db.execute_query(
-                "UPDATE task_reminders SET is_sent = TRUE WHERE reminder_id = ?",
-                (reminder['reminder_id'],)
+            WHERE r.reminder_id = ? AND r.is_sent = FALSE
+        """, (job['ref_id'],))
+        if not reminder:
+            return
+
+        if reminder['assigned_to']:
+            await self.notification_manager.send_notification(
+                reminder['assigned_to'],
+                f"{reminder['reminder_text']}\n"
+                f"Задача: {reminder['title']}"
             )
 
+        await self.db.execute(
+            "UPDATE task_reminders SET is_sent = TRUE WHERE reminder_id = ?",
+            (reminder['reminder_id'],)
+        )
+
     async def create_task_template(self, data: Dict) -> Optional[int]:
         """Создание шаблона задачи"""
         try:
@@ -1,6 +1,7 @@
 from datetime import datetime, timedelta
 from typing import Optional, Dict, List
 import sqlite3
+from database.executor import executor_for
 from utils.password_utils import PasswordUtils
 
 class AuthManager:
@@ -8,6 +9,8 @@ class AuthManager:
         self.db_path = db_path
         self._connections = set()
         self.pwd_utils = PasswordUtils()
+        # Запросы выполняются в пуле потоков, не в цикле событий
+        self.executor = executor_for(db_path)
 
     def get_connection(self):
         conn = sqlite3.connect(self.db_path)
@@ -23,11 +26,11 @@ class AuthManager:
                 pass
         self._connections.clear()
 
-    def register_user(self, user_id: int, password: str) -> bool:
+    async def register_user(self, user_id: int, password: str) -> bool:
         """Register a new user with password"""
         try:
             password_hash, salt = self.pwd_utils.hash_password(password)
-            with self.get_connection() as conn:
+            def job(conn):
                 cursor = conn.cursor()
                 cursor.execute(
                     """
@@ -38,12 +41,13 @@ class AuthManager:
                 )
                 conn.commit()
                 return True
+            return await self.executor.run(job)
         except Exception:
             return False
 
-    def verify_user(self, user_id: int, password: str) -> bool:
+    async def verify_user(self, user_id: int, password: str) -> bool:
         """Проверка пароля пользователя"""
-        with self.get_connection() as conn:
+        def job(conn):
             cursor = conn.cursor()
             cursor.execute("""
                 SELECT password_hash, salt FROM users 
@@ -56,20 +60,22 @@ class AuthManager:
             
             stored_hash, stored_salt = result
             return self.pwd_utils.verify_password(stored_hash, stored_salt, password)
+        return await self.executor.run(job)
 
-    def update_password(self, user_id: int, new_password: str) -> bool:
+    async def update_password(self, user_id: int, new_password: str) -> bool:
         """Обновление пароля"""
-        with self.get_connection() as conn:
+        def job(conn):
             cursor = conn.cursor()
             password_hash, salt = self.pwd_utils.hash_password(new_password)
             cursor.execute("""
                 UPDATE users SET password_hash = ?, salt = ? WHERE user_id = ?
             """, (password_hash, salt, user_id))
             return cursor.rowcount > 0
+        return await self.executor.run(job)
 
-    def create_recovery_code(self, user_id: int) -> Optional[str]:
+    async def create_recovery_code(self, user_id: int) -> Optional[str]:
         """Создание кода восстановления"""
-        with self.get_connection() as conn:
+        def job(conn):
             cursor = conn.cursor()
             recovery_code = self.pwd_utils.generate_recovery_code()
             expires_at = datetime.utcnow() + timedelta(hours=1)
@@ -81,10 +87,11 @@ class AuthManager:
             """, (user_id, recovery_code, expires_at))
             
             return recovery_code if cursor.rowcount > 0 else None
+        return await self.executor.run(job)
 
-    def verify_recovery_code(self, user_id: int, code: str) -> bool:
+    async def verify_recovery_code(self, user_id: int, code: str) -> bool:
         """Проверка кода восстановления"""
-        with self.get_connection() as conn:
+        def job(conn):
             cursor = conn.cursor()
             cursor.execute("""
                 SELECT recovery_code, expires_at, attempts 
@@ -110,3 +117,4 @@ class AuthManager:
                 return False
                 
             return True
+        return await self.executor.run(job)
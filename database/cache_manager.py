@@ -1,24 +1,301 @@
-from typing import Any, Optional
-import redis
+from collections import OrderedDict
+from fnmatch import fnmatchcase
+from functools import wraps
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Set
+import asyncio
 import json
+import logging
+import time
+
+from config.settings import CACHE_DEFAULT_TTL, CACHE_LOCAL_TTL, CACHE_MAX_BYTES, CACHE_MAX_ITEMS, REDIS_URL
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # Redis не обязателен: без него работает только локальный уровень
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+def _encode(value: Any) -> bytes:
+    return json.dumps(value, default=str, ensure_ascii=False).encode('utf-8')
+
+
+class LocalCache:
+    """LRU-кэш в памяти процесса с TTL, лимитом записей и лимитом байт.
+
+    Значения хранятся сериализованными в JSON: размер известен точно, а
+    вызывающий код не может изменить закэшированный объект.
+    """
+
+    def __init__(self, max_items: int = CACHE_MAX_ITEMS, max_bytes: int = CACHE_MAX_BYTES):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._data: OrderedDict = OrderedDict()  # ключ -> (срок годности, данные, теги)
+        self._tags: Dict[str, Set[str]] = {}
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def get(self, key: str) -> Any:
+        entry = self._data.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                self.delete(key)
+            self.stats['misses'] += 1
+            return _MISSING
+        self._data.move_to_end(key)
+        self.stats['hits'] += 1
+        return json.loads(entry[1])
+
+    def set(self, key: str, data: bytes, ttl: float, tags: Iterable[str] = ()):
+        if len(data) > self.max_bytes:
+            return
+        self.delete(key)
+        tags = frozenset(tags)
+        self._data[key] = (time.monotonic() + ttl, data, tags)
+        self.size += len(data)
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while len(self._data) > self.max_items or self.size > self.max_bytes:
+            self.delete(next(iter(self._data)))
+            self.stats['evictions'] += 1
+
+    def delete(self, key: str):
+        entry = self._data.pop(key, None)
+        if entry is None:
+            return
+        self.size -= len(entry[1])
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def invalidate(self, pattern: str):
+        for key in [key for key in self._data if fnmatchcase(key, pattern)]:
+            self.delete(key)
+
+    def invalidate_tags(self, tags: Iterable[str]):
+        for tag in tags:
+            for key in list(self._tags.get(tag, ())):
+                self.delete(key)
+
+    def clear(self):
+        self._data.clear()
+        self._tags.clear()
+        self.size = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
 
 class CacheManager:
-    def __init__(self):
-        self.redis = redis.Redis(host='localhost', port=6379, db=0)
-        self.default_ttl = 3600  # 1 час
+    """Двухуровневый кэш: локальный LRU и, если доступен, общий Redis.
+
+    Чтение идет из памяти процесса, промах дочитывается из Redis. Локальные
+    записи живут не дольше ``local_ttl``, чтобы изменения других процессов
+    были видны без отдельной шины. Ошибка Redis переводит кэш в локальный
+    режим на ``retry_interval`` секунд; без REDIS_URL или пакета redis кэш
+    сразу работает только локально.
+    """
+
+    def __init__(self, redis_url: Optional[str] = REDIS_URL, namespace: str = 'zoz',
+                 default_ttl: int = CACHE_DEFAULT_TTL, local_ttl: int = CACHE_LOCAL_TTL,
+                 max_items: int = CACHE_MAX_ITEMS, max_bytes: int = CACHE_MAX_BYTES,
+                 redis_client=None, retry_interval: float = 30):
+        self.redis_url = redis_url
+        self.namespace = namespace
+        self.default_ttl = default_ttl
+        self.local_ttl = local_ttl
+        self.retry_interval = retry_interval
+        self.local = LocalCache(max_items, max_bytes)
+        self.redis = redis_client
+        self._redis_down_until = 0.0
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.stats = {'redis_hits': 0, 'redis_errors': 0, 'loads': 0, 'coalesced': 0}
 
-    async def get(self, key: str) -> Optional[Any]:
+    async def connect(self) -> bool:
+        """Подключение к Redis; False - кэш работает только локально"""
+        if self.redis is None and self.redis_url and aioredis is not None:
+            self.redis = aioredis.from_url(self.redis_url)
+        if self.redis is None:
+            return False
+        try:
+            await self.redis.ping()
+            return True
+        except Exception as e:
+            self._redis_failed(e)
+            return False
+
+    async def close(self):
+        if self.redis is not None:
+            close = getattr(self.redis, 'aclose', None) or self.redis.close
+            await close()
+
+    @property
+    def redis_available(self) -> bool:
+        return self.redis is not None and time.monotonic() >= self._redis_down_until
+
+    def _redis_failed(self, error: Exception):
+        self.stats['redis_errors'] += 1
+        self._redis_down_until = time.monotonic() + self.retry_interval
+        logger.warning(f"Redis cache unavailable, using local cache only: {error}")
+
+    def _key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    def _tag_key(self, tag: str) -> str:
+        return f"{self.namespace}:tag:{tag}"
+
+    # ---- чтение и запись ----
+
+    async def get(self, key: str, default: Any = None) -> Any:
         """Получение данных из кэша"""
-        data = self.redis.get(key)
-        return json.loads(data) if data else None
+        value = await self._get(key)
+        return default if value is _MISSING else value
+
+    async def _get(self, key: str) -> Any:
+        value = self.local.get(key)
+        if value is not _MISSING or not self.redis_available:
+            return value
+        try:
+            data = await self.redis.get(self._key(key))
+        except Exception as e:
+            self._redis_failed(e)
+            return _MISSING
+        if data is None:
+            return _MISSING
+        self.stats['redis_hits'] += 1
+        self.local.set(key, data, self.local_ttl)
+        return json.loads(data)
 
-    async def set(self, key: str, value: Any, ttl: int = None) -> bool:
+    async def set(self, key: str, value: Any, ttl: int = None, tags: Iterable[str] = ()) -> bool:
         """Сохранение данных в кэш"""
         ttl = ttl or self.default_ttl
-        return self.redis.setex(key, ttl, json.dumps(value))
+        tags = list(tags)
+        data = _encode(value)
+        self.local.set(key, data, min(ttl, self.local_ttl), tags)
+        if not self.redis_available:
+            return True
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.set(self._key(key), data, ex=ttl)
+                for tag in tags:
+                    pipe.sadd(self._tag_key(tag), self._key(key))
+                    pipe.expire(self._tag_key(tag), ttl)
+                await pipe.execute()
+        except Exception as e:
+            self._redis_failed(e)
+        return True
+
+    async def delete(self, key: str):
+        self.local.delete(key)
+        if self.redis_available:
+            try:
+                await self.redis.delete(self._key(key))
+            except Exception as e:
+                self._redis_failed(e)
+
+    async def get_or_set(self, key: str, loader: Callable[[], Awaitable[Any]],
+                         ttl: int = None, tags: Iterable[str] = ()) -> Any:
+        """Значение из кэша или результат ``loader``.
+
+        Одновременные промахи по одному ключу ждут единственную загрузку.
+        """
+        value = await self._get(key)
+        if value is not _MISSING:
+            return value
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.stats['coalesced'] += 1
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            self.stats['loads'] += 1
+            value = await loader()
+            await self.set(key, value, ttl, tags)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            # Исключение уже передано ожидающим; без них оно не должно попасть в лог цикла
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    # ---- инвалидация ----
 
     async def invalidate(self, pattern: str) -> None:
-        """Инвалидация кэша по паттерну"""
-        keys = self.redis.keys(pattern)
-        if keys:
-            self.redis.delete(*keys)
\ No newline at end of file
+        """Инвалидация кэша по паттерну (SCAN вместо KEYS)"""
+        self.local.invalidate(pattern)
+        if not self.redis_available:
+            return
+        try:
+            batch = []
+            async for key in self.redis.scan_iter(match=self._key(pattern), count=500):
+                batch.append(key)
+                if len(batch) >= 500:
+                    await self.redis.unlink(*batch)
+                    batch = []
+            if batch:
+                await self.redis.unlink(*batch)
+        except Exception as e:
+            self._redis_failed(e)
+
+    async def invalidate_tags(self, *tags: str) -> None:
+        """Инвалидация всех записей, сохраненных с любым из тегов"""
+        self.local.invalidate_tags(tags)
+        if not self.redis_available or not tags:
+            return
+        try:
+            for tag in tags:
+                keys = await self.redis.smembers(self._tag_key(tag))
+                await self.redis.unlink(self._tag_key(tag), *keys)
+        except Exception as e:
+            self._redis_failed(e)
+
+    def get_stats(self) -> Dict:
+        local = self.local.stats
+        lookups = local['hits'] + local['misses']
+        return {
+            **local,
+            **self.stats,
+            'items': len(self.local),
+            'bytes': self.local.size,
+            'hit_rate': round(local['hits'] / lookups, 3) if lookups else 0.0,
+            'redis': self.redis_available,
+        }
+
+
+def cached(ttl: int = None, key: Optional[Callable[..., str]] = None,
+           tags: Optional[Callable[..., Iterable[str]]] = None):
+    """Кэширование результата метода менеджера в ``self.cache``.
+
+    Ключ по умолчанию - имя метода и аргументы; ``key`` и ``tags``
+    получают те же аргументы, что и метод. Без ``self.cache`` метод
+    вызывается напрямую.
+    """
+    def decorator(func):
+        name = f"{func.__module__}.{func.__qualname__}"
+
+        @wraps(func)
+        async def wrapper(self, *args, **kwargs):
+            cache = getattr(self, 'cache', None)
+            if cache is None:
+                return await func(self, *args, **kwargs)
+            cache_key = key(*args, **kwargs) if key else \
+                f"{name}:{json.dumps([args, kwargs], default=str, sort_keys=True)}"
+            return await cache.get_or_set(
+                cache_key,
+                lambda: func(self, *args, **kwargs),
+                ttl,
+                tags(*args, **kwargs) if tags else ()
+            )
+        return wrapper
+    return decorator
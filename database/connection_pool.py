@@ -0,0 +1,303 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import aiosqlite
+
+logger = logging.getLogger(__name__)
+
+WriteJob = Callable[[aiosqlite.Connection], Awaitable[Any]]
+
+
+class SQLitePool:
+    """Пул соединений SQLite: N читающих соединений и один писатель.
+
+    Все записи выполняются отдельной задачей-писателем, которая забирает
+    накопившиеся задания из очереди и фиксирует их одной транзакцией
+    (каждое задание изолировано собственным SAVEPOINT). Чтение идет
+    параллельно через читающие соединения в режиме WAL.
+    """
+
+    dialect = 'sqlite'
+
+    def __init__(self, db_path: str, readers: int = 4, busy_timeout: int = 5000,
+                 statement_cache: int = 256, max_write_batch: int = 64):
+        self.db_path = db_path
+        self.busy_timeout = busy_timeout
+        self.statement_cache = statement_cache
+        self.max_write_batch = max_write_batch
+        # In-memory базы не разделяются между соединениями - читаем через писателя
+        self.readers_count = 0 if self._is_memory(db_path) else max(readers, 0)
+
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._readers: List[aiosqlite.Connection] = []
+        self._idle: Optional[asyncio.Queue] = None
+        self._write_queue: Optional[asyncio.Queue] = None
+        self._writer_task: Optional[asyncio.Task] = None
+        self._writer_lock = asyncio.Lock()
+        self._closed = True
+
+        self._stats = {
+            'read_acquires': 0,
+            'read_wait_total': 0.0,
+            'read_wait_max': 0.0,
+            'reads_in_use': 0,
+            'reads_in_use_max': 0,
+            'write_jobs': 0,
+            'write_commits': 0,
+            'write_errors': 0,
+            'write_wait_total': 0.0,
+            'write_wait_max': 0.0,
+        }
+
+    @staticmethod
+    def _is_memory(db_path: str) -> bool:
+        return db_path == ':memory:' or 'mode=memory' in str(db_path)
+
+    async def _connect(self, readonly: bool = False) -> aiosqlite.Connection:
+        conn = await aiosqlite.connect(
+            self.db_path,
+            cached_statements=self.statement_cache,
+            uri=str(self.db_path).startswith('file:')
+        )
+        await conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout)}")
+        if not self._is_memory(self.db_path):
+            await conn.execute("PRAGMA journal_mode = WAL")
+            await conn.execute("PRAGMA synchronous = NORMAL")
+        if readonly:
+            await conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    async def open(self):
+        """Открытие соединений и запуск задачи-писателя"""
+        if not self._closed:
+            return
+        self._writer = await self._connect()
+        self._idle = asyncio.Queue()
+        for _ in range(self.readers_count):
+            conn = await self._connect(readonly=True)
+            self._readers.append(conn)
+            self._idle.put_nowait(conn)
+        self._write_queue = asyncio.Queue()
+        self._writer_task = asyncio.create_task(self._writer_loop())
+        self._closed = False
+
+    async def close(self):
+        """Остановка писателя и закрытие всех соединений"""
+        if self._closed:
+            return
+        self._closed = True
+        await self._write_queue.put(None)
+        try:
+            await self._writer_task
+        except Exception as e:
+            logger.error(f"Writer task failed on shutdown: {e}")
+        for conn in self._readers:
+            await conn.close()
+        self._readers.clear()
+        await self._writer.close()
+        self._writer = None
+
+    @property
+    def is_open(self) -> bool:
+        return not self._closed
+
+    # ---- чтение ----
+
+    @asynccontextmanager
+    async def acquire_reader(self):
+        """Получение читающего соединения из пула"""
+        started = time.perf_counter()
+        if self.readers_count:
+            conn = await self._idle.get()
+        else:
+            await self._writer_lock.acquire()
+            conn = self._writer
+        waited = time.perf_counter() - started
+
+        stats = self._stats
+        stats['read_acquires'] += 1
+        stats['read_wait_total'] += waited
+        stats['read_wait_max'] = max(stats['read_wait_max'], waited)
+        stats['reads_in_use'] += 1
+        stats['reads_in_use_max'] = max(stats['reads_in_use_max'], stats['reads_in_use'])
+        try:
+            yield conn
+        finally:
+            stats['reads_in_use'] -= 1
+            if self.readers_count:
+                self._idle.put_nowait(conn)
+            else:
+                self._writer_lock.release()
+
+    async def fetchone(self, query: str, params: tuple = ()) -> Optional[tuple]:
+        async with self.acquire_reader() as conn:
+            async with conn.execute(query, params) as cursor:
+                return await cursor.fetchone()
+
+    async def fetchall(self, query: str, params: tuple = ()) -> List[tuple]:
+        async with self.acquire_reader() as conn:
+            async with conn.execute(query, params) as cursor:
+                return await cursor.fetchall()
+
+    async def fetch_dicts(self, query: str, params: tuple = (), one: bool = False) -> List[Dict]:
+        """Строки результата в виде словарей"""
+        async with self.acquire_reader() as conn:
+            async with conn.execute(query, params) as cursor:
+                rows = [await cursor.fetchone()] if one else await cursor.fetchall()
+                columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in rows if row is not None]
+
+    async def iterate(self, query: str, params: tuple = (), batch_size: int = 500):
+        """Построчное чтение большого результата пачками по ``batch_size``.
+
+        Читающее соединение занято, пока генератор не исчерпан или не закрыт.
+        """
+        async with self.acquire_reader() as conn:
+            async with conn.execute(query, params) as cursor:
+                while True:
+                    rows = await cursor.fetchmany(batch_size)
+                    if not rows:
+                        return
+                    yield rows
+
+    # ---- запись ----
+
+    async def write(self, job: WriteJob) -> Any:
+        """Выполнение задания записи через задачу-писателя.
+
+        ``job`` получает соединение писателя и не должен вызывать commit:
+        фиксация выполняется писателем после пачки заданий.
+        """
+        if self._closed:
+            raise RuntimeError("Connection pool is closed")
+        future = asyncio.get_running_loop().create_future()
+        await self._write_queue.put((job, future, time.perf_counter()))
+        return await future
+
+    async def execute(self, query: str, params: tuple = ()) -> Tuple[Optional[int], int]:
+        """Выполнение запроса записи, возвращает (lastrowid, rowcount)"""
+        async def job(conn):
+            cursor = await conn.execute(query, params)
+            result = (cursor.lastrowid, cursor.rowcount)
+            await cursor.close()
+            return result
+        return await self.write(job)
+
+    async def executemany(self, query: str, params_seq) -> int:
+        """Пакетное выполнение запроса записи, возвращает rowcount"""
+        async def job(conn):
+            cursor = await conn.executemany(query, params_seq)
+            result = cursor.rowcount
+            await cursor.close()
+            return result
+        return await self.write(job)
+
+    async def copy_records(self, table: str, columns: Sequence[str], records: Iterable[Sequence]) -> int:
+        """Пакетная вставка строк (аналог COPY в PostgreSQL)"""
+        query = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        records = list(records)
+        await self.executemany(query, records)
+        return len(records)
+
+    async def executescript(self, script: str):
+        async def job(conn):
+            # executescript делает неявный COMMIT, поэтому вне SAVEPOINT
+            await conn.executescript(script)
+        job.standalone = True
+        return await self.write(job)
+
+    async def _writer_loop(self):
+        queue = self._write_queue
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            batch = [item]
+            while len(batch) < self.max_write_batch and not queue.empty():
+                nxt = queue.get_nowait()
+                if nxt is None:
+                    # Завершаем текущую пачку, затем выходим
+                    await self._run_batch(batch)
+                    return
+                batch.append(nxt)
+            await self._run_batch(batch)
+
+    async def _run_batch(self, batch):
+        conn = self._writer
+        stats = self._stats
+        results = []
+        async with self._writer_lock:
+            for job, future, enqueued in batch:
+                waited = time.perf_counter() - enqueued
+                stats['write_jobs'] += 1
+                stats['write_wait_total'] += waited
+                stats['write_wait_max'] = max(stats['write_wait_max'], waited)
+
+                if getattr(job, 'standalone', False):
+                    try:
+                        await conn.commit()
+                        results.append((future, await job(conn), None))
+                    except Exception as e:
+                        results.append((future, None, e))
+                    continue
+
+                try:
+                    if not conn.in_transaction:
+                        await conn.execute("BEGIN")
+                    await conn.execute("SAVEPOINT pool_job")
+                    result = await job(conn)
+                    await conn.execute("RELEASE SAVEPOINT pool_job")
+                    results.append((future, result, None))
+                except Exception as e:
+                    stats['write_errors'] += 1
+                    try:
+                        await conn.execute("ROLLBACK TO SAVEPOINT pool_job")
+                        await conn.execute("RELEASE SAVEPOINT pool_job")
+                    except Exception as rollback_error:
+                        logger.error(f"Savepoint rollback failed: {rollback_error}")
+                    results.append((future, None, e))
+
+            commit_error = None
+            try:
+                await conn.commit()
+                stats['write_commits'] += 1
+            except Exception as e:
+                logger.error(f"Batch commit failed: {e}")
+                commit_error = e
+                await conn.rollback()
+
+        for future, result, error in results:
+            if future.done():
+                continue
+            error = error or commit_error
+            if error:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    # ---- статистика ----
+
+    def get_stats(self) -> Dict:
+        """Статистика пула: ожидание, занятость, насыщение"""
+        stats = self._stats
+        readers = self.readers_count or 1
+        acquires = stats['read_acquires']
+        jobs = stats['write_jobs']
+        return {
+            'readers': self.readers_count,
+            'reads_in_use': stats['reads_in_use'],
+            'reads_in_use_max': stats['reads_in_use_max'],
+            'read_saturation': round(stats['reads_in_use'] / readers, 3),
+            'read_acquires': acquires,
+            'read_wait_avg': stats['read_wait_total'] / acquires if acquires else 0.0,
+            'read_wait_max': stats['read_wait_max'],
+            'write_queue_size': self._write_queue.qsize() if self._write_queue else 0,
+            'write_jobs': jobs,
+            'write_commits': stats['write_commits'],
+            'write_errors': stats['write_errors'],
+            'write_wait_avg': stats['write_wait_total'] / jobs if jobs else 0.0,
+            'write_wait_max': stats['write_wait_max'],
+        }
@@ -1,16 +1,11 @@
-import sqlite3
-import logging
-import aiosqlite
-from pathlib import Path
+from database.db_manager import DatabaseManager as BaseDatabaseManager
 
-class DatabaseManager:
-    def __init__(self, db_path):
-        self.db_path = db_path
-        self.pool = None
+class DatabaseManager(BaseDatabaseManager):
+    """Legacy entry point, backed by the shared pooled data-access layer"""
 
     async def initialize(self):
         """Initialize database and create tables"""
-        await self.create_tables()
+        await self.init_pool()
         await self.setup_indexes()
     
     async def create_tables(self):
@@ -23,7 +18,3 @@ class DatabaseManager:
         # Index creation logic here
         pass
 
-    async def close(self):
-        """Close database connection"""
-        if self.pool:
-            await self.pool.close()
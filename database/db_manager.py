@@ -1,67 +1,200 @@
-import aiosqlite
+import asyncio
 import logging
-from typing import Optional
+from typing import Dict, Iterable, List, Optional, Sequence, Union
+
+from config.settings import DB_BUSY_TIMEOUT, DB_READ_POOL_SIZE, DB_STATEMENT_CACHE_SIZE
+from database.connection_pool import SQLitePool, WriteJob
+from database.postgres_pool import PostgresPool
+
+POSTGRES_SCHEMES = ('postgres://', 'postgresql://')
+
+
+def create_pool(database: str, pool_size: int = DB_READ_POOL_SIZE,
+                busy_timeout: int = DB_BUSY_TIMEOUT) -> Union[SQLitePool, PostgresPool]:
+    """Pool for a SQLite path or a PostgreSQL DSN (postgresql://...)"""
+    if database.startswith(POSTGRES_SCHEMES):
+        return PostgresPool(database, max_size=pool_size, statement_cache=DB_STATEMENT_CACHE_SIZE)
+    return SQLitePool(database, readers=pool_size, busy_timeout=busy_timeout,
+                      statement_cache=DB_STATEMENT_CACHE_SIZE)
+
 
 class DatabaseManager:
-    def __init__(self, db_path: str):
+    """Async data access over SQLite or PostgreSQL.
+
+    Queries use ``?`` placeholders on both backends; the PostgreSQL pool
+    translates them. ``db_path`` is a SQLite file or a postgresql:// DSN.
+    """
+
+    def __init__(self, db_path: str, pool_size: int = DB_READ_POOL_SIZE,
+                 busy_timeout: int = DB_BUSY_TIMEOUT):
         self.db_path = db_path
-        self.pool = None
+        self.pool: Optional[Union[SQLitePool, PostgresPool]] = None
+        self.pool_size = pool_size
+        self.busy_timeout = busy_timeout
+        self._init_lock = asyncio.Lock()
+
+    @property
+    def dialect(self) -> str:
+        return 'postgres' if self.db_path.startswith(POSTGRES_SCHEMES) else 'sqlite'
 
     async def init_pool(self):
         """Initialize database connection pool"""
-        try:
-            self.pool = await aiosqlite.connect(self.db_path)
-            await self.create_tables()
-            return True
-        except Exception as e:
-            logging.error(f"Failed to initialize database pool: {e}")
-            return False
+        async with self._init_lock:
+            if self.pool and self.pool.is_open:
+                return True
+            try:
+                self.pool = create_pool(self.db_path, self.pool_size, self.busy_timeout)
+                await self.pool.open()
+                if self.dialect == 'sqlite':
+                    # PostgreSQL schema is managed by migrations
+                    await self.create_tables()
+                return True
+            except Exception as e:
+                logging.error(f"Failed to initialize database pool: {e}")
+                self.pool = None
+                return False
+
+    async def _ensure_pool(self):
+        if not self.pool:
+            await self.init_pool()
 
     async def create_tables(self):
         """Create necessary database tables"""
-        async with self.pool as conn:
-            await conn.executescript("""
-                CREATE TABLE IF NOT EXISTS users (
-                    user_id INTEGER PRIMARY KEY,
-                    password_hash TEXT NOT NULL,
-                    status TEXT DEFAULT 'user',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                );
-                
-                CREATE TABLE IF NOT EXISTS tasks (
-                    task_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    operation_id INTEGER NOT NULL,
-                    title TEXT NOT NULL,
-                    description TEXT,
-                    status TEXT DEFAULT 'pending',
-                    assigned_to INTEGER,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                );
-            """)
+        await self.pool.executescript("""
+            CREATE TABLE IF NOT EXISTS users (
+                user_id INTEGER PRIMARY KEY,
+                password_hash TEXT NOT NULL,
+                status TEXT DEFAULT 'user',
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+
+            CREATE TABLE IF NOT EXISTS tasks (
+                task_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                operation_id INTEGER NOT NULL,
+                title TEXT NOT NULL,
+                description TEXT,
+                status TEXT DEFAULT 'pending',
+                assigned_to INTEGER,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+        """)
 
     async def execute(self, query: str, params: tuple = ()):
-        """Execute SQL query"""
-        if not self.pool:
-            await self.init_pool()
-        async with self.pool as conn:
-            await conn.execute(query, params)
-            await conn.commit()
+        """Execute SQL query, returns lastrowid"""
+        await self._ensure_pool()
+        lastrowid, _ = await self.pool.execute(query, params)
+        return lastrowid
+
+    async def execute_many(self, query: str, params_seq: Iterable[tuple]) -> int:
+        """Execute SQL query for every parameter set in one transaction"""
+        await self._ensure_pool()
+        return await self.pool.executemany(query, list(params_seq))
+
+    executemany = execute_many
+
+    async def copy_records(self, table: str, columns: Sequence[str], records: Iterable[Sequence]) -> int:
+        """Bulk load rows (COPY on PostgreSQL, batched INSERT on SQLite)"""
+        await self._ensure_pool()
+        return await self.pool.copy_records(table, columns, records)
+
+    async def executescript(self, script: str):
+        """Execute several SQL statements (schema, triggers)"""
+        await self._ensure_pool()
+        await self.pool.executescript(script)
+
+    async def run_in_transaction(self, job: WriteJob):
+        """Run ``job(conn)`` on the writer connection inside one transaction"""
+        await self._ensure_pool()
+        return await self.pool.write(job)
 
     async def fetchone(self, query: str, params: tuple = ()):
         """Fetch single row"""
-        if not self.pool:
-            await self.init_pool()
-        async with self.pool as conn:
-            async with conn.execute(query, params) as cursor:
-                return await cursor.fetchone()
+        await self._ensure_pool()
+        return await self.pool.fetchone(query, params)
 
     async def fetchall(self, query: str, params: tuple = ()):
         """Fetch all rows"""
+        await self._ensure_pool()
+        return await self.pool.fetchall(query, params)
+
+    async def fetch_one(self, query: str, params: tuple = ()) -> Optional[Dict]:
+        """Fetch single row as a dict"""
+        rows = await self._fetch_dicts(query, params, one=True)
+        return rows[0] if rows else None
+
+    async def fetch_all(self, query: str, params: tuple = ()) -> List[Dict]:
+        """Fetch all rows as dicts"""
+        return await self._fetch_dicts(query, params)
+
+    async def _fetch_dicts(self, query: str, params: tuple, one: bool = False) -> List[Dict]:
+        await self._ensure_pool()
+        return await self.pool.fetch_dicts(query, params, one)
+
+    async def iterate(self, query: str, params: tuple = (), batch_size: int = 500):
+        """Stream rows in batches without loading the whole result"""
+        await self._ensure_pool()
+        async for rows in self.pool.iterate(query, params, batch_size):
+            yield rows
+
+    # ---- tasks and escalations (EscalationManager) ----
+
+    async def get_pending_tasks(self) -> List[Dict]:
+        """Unfinished coordination tasks that have a deadline"""
+        return await self.fetch_all("""
+            SELECT task_id, title, status, deadline
+            FROM coordination_tasks
+            WHERE status != 'completed' AND deadline IS NOT NULL
+        """)
+
+    async def get_task(self, task_id: int) -> Optional[Dict]:
+        return await self.fetch_one("SELECT * FROM coordination_tasks WHERE task_id = ?", (task_id,))
+
+    async def create_escalation(self, task_id: int, level: int) -> int:
+        return await self.execute(
+            "INSERT INTO task_escalations (task_id, escalation_level) VALUES (?, ?)",
+            (task_id, level)
+        )
+
+    # ---- group membership (TrackingService) ----
+
+    async def get_user_active_group(self, user_id: int) -> Optional[int]:
+        """Group the user is an active member of, most recently joined first"""
+        row = await self.fetchone("""
+            SELECT group_id FROM group_members
+            WHERE user_id = ? AND status = 'active'
+            ORDER BY joined_at DESC LIMIT 1
+        """, (user_id,))
+        return row[0] if row else None
+
+    # ---- group maps (TrackingService, MapHandler) ----
+
+    async def update_group_map(self, group_id: int, map_html: str):
+        """Store the latest rendered map of a group"""
+        await self.execute("""
+            INSERT INTO group_maps (group_id, map_html, updated_at)
+            VALUES (?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT (group_id) DO UPDATE
+            SET map_html = excluded.map_html, updated_at = excluded.updated_at
+        """, (group_id, map_html))
+
+    async def get_group_members_locations(self, group_id: int) -> List[Dict]:
+        """Latest track point of every group member, for members_by_user()"""
+        return await self.fetch_all("""
+            SELECT gm.user_id, tp.latitude, tp.longitude, tp.timestamp
+            FROM group_members gm
+            JOIN track_points tp ON tp.point_id = (
+                SELECT point_id FROM track_points
+                WHERE user_id = gm.user_id
+                ORDER BY timestamp DESC LIMIT 1
+            )
+            WHERE gm.group_id = ?
+        """, (group_id,))
+
+    def get_pool_stats(self) -> Dict:
+        """Connection pool statistics (wait time, in-use, saturation)"""
         if not self.pool:
-            await self.init_pool()
-        async with self.pool as conn:
-            async with conn.execute(query, params) as cursor:
-                return await cursor.fetchall()
+            return {}
+        return self.pool.get_stats()
 
     async def close(self):
         """Close database connection"""
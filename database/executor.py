@@ -0,0 +1,128 @@
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from config.settings import DB_BUSY_TIMEOUT, DB_EXECUTOR_WORKERS
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteExecutor:
+    """Выполнение синхронного кода sqlite3 вне цикла событий.
+
+    Задания - обычные функции ``fn(conn, *args)`` - выполняются в
+    отдельном пуле потоков; у каждого потока свое постоянное соединение.
+    Задание работает в транзакции: коммит при успехе, откат при
+    исключении (как ``with conn:`` в sqlite3).
+    """
+
+    def __init__(self, db_path: str, workers: int = DB_EXECUTOR_WORKERS,
+                 busy_timeout: int = DB_BUSY_TIMEOUT):
+        self.db_path = db_path
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='sqlite-executor')
+        self._stats = {'jobs': 0, 'errors': 0, 'busy_time': 0.0, 'busy_max': 0.0}
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # check_same_thread=False только ради закрытия из close();
+            # работает с соединением всегда один поток
+            conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout / 1000,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout)}")
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def _call(self, fn: Callable, args: Tuple) -> Any:
+        conn = self._connection()
+        started = time.perf_counter()
+        try:
+            with conn:
+                return fn(conn, *args)
+        except Exception:
+            with self._lock:
+                self._stats['errors'] += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            # Задания идут параллельно в нескольких потоках пула
+            with self._lock:
+                self._stats['jobs'] += 1
+                self._stats['busy_time'] += elapsed
+                self._stats['busy_max'] = max(self._stats['busy_max'], elapsed)
+
+    async def run(self, fn: Callable, *args) -> Any:
+        """Выполнение ``fn(conn, *args)`` в потоке пула"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, self._call, fn, args)
+
+    async def execute(self, query: str, params: Sequence = ()) -> Tuple[Optional[int], int]:
+        """Запрос на изменение; возвращает (lastrowid, rowcount)"""
+        def job(conn):
+            cursor = conn.execute(query, params)
+            return cursor.lastrowid, cursor.rowcount
+        return await self.run(job)
+
+    async def executemany(self, query: str, params_seq) -> int:
+        def job(conn):
+            return conn.executemany(query, params_seq).rowcount
+        return await self.run(job)
+
+    async def fetchone(self, query: str, params: Sequence = ()) -> Optional[tuple]:
+        return await self.run(lambda conn: conn.execute(query, params).fetchone())
+
+    async def fetchall(self, query: str, params: Sequence = ()) -> List[tuple]:
+        return await self.run(lambda conn: conn.execute(query, params).fetchall())
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['connections'] = len(self._connections)
+        stats['busy_avg'] = stats['busy_time'] / stats['jobs'] if stats['jobs'] else 0.0
+        return stats
+
+
+_executors: Dict[str, SQLiteExecutor] = {}
+_executors_lock = threading.Lock()
+
+
+def executor_for(db) -> SQLiteExecutor:
+    """Общий исполнитель для файла БД (``db`` - путь или объект с db_path).
+
+    Только для отдельных файлов SQLite: основная БД бота работает через
+    пул DatabaseManager с единственным писателем, и второй писатель в
+    соседнем потоке получал бы SQLITE_BUSY.
+    """
+    path = db if isinstance(db, str) else db.db_path
+    if path.startswith(('postgres://', 'postgresql://')):
+        raise ValueError("SQLiteExecutor supports only SQLite database files")
+    with _executors_lock:
+        executor = _executors.get(path)
+        if executor is None:
+            executor = _executors[path] = SQLiteExecutor(path)
+        return executor
+
+
+def close_executors():
+    with _executors_lock:
+        for executor in _executors.values():
+            executor.close()
+        _executors.clear()
@@ -0,0 +1,15 @@
+-- Точки треков (пакетная запись из LocationIngestPipeline)
+CREATE TABLE IF NOT EXISTS track_points (
+    point_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    track_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    latitude REAL NOT NULL,
+    longitude REAL NOT NULL,
+    accuracy REAL,
+    altitude REAL,
+    timestamp TIMESTAMP NOT NULL,
+    FOREIGN KEY (track_id) REFERENCES user_tracks(track_id),
+    FOREIGN KEY (user_id) REFERENCES users(user_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_track_points_track ON track_points(track_id, timestamp);
@@ -0,0 +1,7 @@
+-- Растровые сетки покрытия операций (см. services/coverage_grid.py)
+CREATE TABLE IF NOT EXISTS coverage_grids (
+    operation_id INTEGER PRIMARY KEY,
+    data BLOB NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (operation_id) REFERENCES search_operations(operation_id)
+);
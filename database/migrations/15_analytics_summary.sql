@@ -0,0 +1,51 @@
+-- Материализованная аналитика (см. services/analytics_summary.py)
+-- Счетчики поддерживаются триггерами на задачах, треках, группах и отчетах; триггеры
+-- зависят от столбцов исходных таблиц и ставятся AnalyticsSummary.install() при запуске бота,
+-- тяжелые метрики пересчитываются планировщиком для операций с changes > refreshed_changes
+CREATE TABLE IF NOT EXISTS operation_summary (
+    operation_id INTEGER PRIMARY KEY,
+    team_count INTEGER DEFAULT 0,
+    participant_count INTEGER DEFAULT 0,
+    task_total INTEGER DEFAULT 0,
+    task_completed INTEGER DEFAULT 0,
+    track_count INTEGER DEFAULT 0,
+    total_distance FLOAT DEFAULT 0,
+    report_count INTEGER DEFAULT 0,
+    last_activity TIMESTAMP,
+    -- тяжелые метрики
+    response_time INTEGER,
+    coordination_score FLOAT,
+    resource_efficiency FLOAT,
+    coverage_rate FLOAT,
+    success_rate FLOAT,
+    changes INTEGER DEFAULT 0,
+    refreshed_changes INTEGER DEFAULT -1,
+    refreshed_at TIMESTAMP,
+    FOREIGN KEY (operation_id) REFERENCES search_operations(operation_id)
+);
+
+CREATE TABLE IF NOT EXISTS team_summary (
+    group_id INTEGER PRIMARY KEY,
+    operation_id INTEGER,
+    member_count INTEGER DEFAULT 0,
+    task_total INTEGER DEFAULT 0,
+    task_completed INTEGER DEFAULT 0,
+    track_count INTEGER DEFAULT 0,
+    total_distance FLOAT DEFAULT 0,
+    FOREIGN KEY (group_id) REFERENCES search_groups(group_id)
+);
+
+CREATE TABLE IF NOT EXISTS user_summary (
+    user_id INTEGER,
+    operation_id INTEGER,
+    task_total INTEGER DEFAULT 0,
+    task_completed INTEGER DEFAULT 0,
+    track_count INTEGER DEFAULT 0,
+    total_distance FLOAT DEFAULT 0,
+    report_count INTEGER DEFAULT 0,
+    PRIMARY KEY (user_id, operation_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_team_summary_operation ON team_summary(operation_id);
+CREATE INDEX IF NOT EXISTS idx_user_summary_operation ON user_summary(operation_id);
+CREATE INDEX IF NOT EXISTS idx_operation_summary_dirty ON operation_summary(changes, refreshed_changes);
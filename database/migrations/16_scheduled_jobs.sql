@@ -0,0 +1,16 @@
+-- Отложенные задания единого планировщика (см. core/scheduler.py):
+-- напоминания, эскалации, сроки задач. fired_at - отметка срабатывания,
+-- по ней после перезапуска задание не выполняется повторно
+CREATE TABLE IF NOT EXISTS scheduled_jobs (
+    job_key TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    ref_id INTEGER,
+    due_at FLOAT NOT NULL,  -- unix-время
+    payload TEXT,  -- JSON
+    fired_at FLOAT,
+    attempts INTEGER DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_scheduled_jobs_due ON scheduled_jobs(due_at) WHERE fired_at IS NULL;
+CREATE INDEX IF NOT EXISTS idx_scheduled_jobs_ref ON scheduled_jobs(kind, ref_id);
@@ -0,0 +1,6 @@
+-- Последняя позиция участника для распределения команд по секторам
+CREATE INDEX IF NOT EXISTS idx_track_points_user_time ON track_points(user_id, timestamp);
+
+-- Поиск свободных команд и незанятых секторов операции
+CREATE INDEX IF NOT EXISTS idx_teams_free ON search_teams(operation_id, status) WHERE current_sector IS NULL;
+CREATE INDEX IF NOT EXISTS idx_sectors_unassigned ON search_sectors(operation_id, status) WHERE assigned_team IS NULL;
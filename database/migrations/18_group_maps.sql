@@ -0,0 +1,7 @@
+-- Последняя отрисованная карта группы (см. services/group_map.py)
+CREATE TABLE IF NOT EXISTS group_maps (
+    group_id INTEGER PRIMARY KEY,
+    map_html TEXT NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (group_id) REFERENCES search_groups(group_id)
+);
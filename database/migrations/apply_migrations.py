@@ -56,7 +56,13 @@ class DatabaseMigration:
                 '07_search_operations.sql',
                 'task_system_update.sql',
                 'task_system_extensions.sql',
-                'sectors.sql'
+                'sectors.sql',
+                '12_track_points.sql',
+                '13_coverage_grids.sql',
+                '15_analytics_summary.sql',
+                '16_scheduled_jobs.sql',
+                '17_team_positions.sql',
+                '18_group_maps.sql'
             ]
 
             for migration_file in migrations_order:
@@ -1,18 +1,6 @@
--- Партиционирование таблицы location_history по времени
-CREATE TABLE IF NOT EXISTS location_history_partitioned (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    user_id INTEGER NOT NULL,
-    latitude REAL NOT NULL,
-    longitude REAL NOT NULL,
-    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-    operation_id INTEGER
-) PARTITION BY RANGE (strftime('%Y%m', timestamp));
-
--- Создание партиций по месяцам
-CREATE TABLE location_history_y2023m12 
-PARTITION OF location_history_partitioned 
-FOR VALUES FROM ('202312') TO ('202401');
-
-CREATE TABLE location_history_y2024m01 
-PARTITION OF location_history_partitioned 
-FOR VALUES FROM ('202401') TO ('202402');
\ No newline at end of file
+-- Партиционирование истории перемещений
+-- SQLite не поддерживает PARTITION BY: история хранится в суточных файлах-шардах
+-- (services/location_store.py), удаление старых данных - удаление файлов.
+-- Для оставшейся таблицы location_history достаточно индекса по времени.
+CREATE INDEX IF NOT EXISTS idx_location_history_group_time ON location_history(group_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_location_history_user_time ON location_history(user_id, timestamp);
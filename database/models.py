@@ -3,6 +3,8 @@ import json
 from datetime import datetime
 from typing import Dict, List, Optional, Union
 
+from database.executor import executor_for
+
 class DatabaseManager:
     def __init__(self, db_path: str = 'bot_database.db'):
         self.db_path = db_path
@@ -10,17 +12,21 @@ class DatabaseManager:
     def get_connection(self) -> sqlite3.Connection:
         return sqlite3.connect(self.db_path)
 
+    async def run(self, fn, *args):
+        """Выполнение ``fn(conn, *args)`` в пуле потоков БД, не блокируя цикл событий"""
+        return await executor_for(self.db_path).run(fn, *args)
+
 class SearchArea:
     def __init__(self, db: DatabaseManager):
         self.db = db
 
-    def create_area(self, operation_id: int, boundaries: Dict, metadata: Dict, created_by: int) -> int:
+    async def create_area(self, operation_id: int, boundaries: Dict, metadata: Dict, created_by: int) -> int:
         """Создание новой поисковой области"""
         query = """
         INSERT INTO search_areas (operation_id, boundaries, metadata, created_by, status)
         VALUES (?, ?, ?, ?, 'active')
         """
-        with self.db.get_connection() as conn:
+        def job(conn):
             cursor = conn.cursor()
             cursor.execute(query, (
                 operation_id,
@@ -29,11 +35,12 @@ class SearchArea:
                 created_by
             ))
             return cursor.lastrowid
+        return await self.db.run(job)
 
-    def get_area(self, area_id: int) -> Optional[Dict]:
+    async def get_area(self, area_id: int) -> Optional[Dict]:
         """Получение информации о поисковой области"""
         query = "SELECT * FROM search_areas WHERE area_id = ?"
-        with self.db.get_connection() as conn:
+        def job(conn):
             cursor = conn.cursor()
             cursor.execute(query, (area_id,))
             row = cursor.fetchone()
@@ -48,21 +55,23 @@ class SearchArea:
                     'status': row[6],
                     'created_by': row[7]
                 }
-        return None
+            return None
+        return await self.db.run(job)
 
-    def update_area_status(self, area_id: int, status: str) -> bool:
+    async def update_area_status(self, area_id: int, status: str) -> bool:
         """Обновление статуса поисковой области"""
         query = "UPDATE search_areas SET status = ? WHERE area_id = ?"
-        with self.db.get_connection() as conn:
+        def job(conn):
             cursor = conn.cursor()
             cursor.execute(query, (status, area_id))
             return cursor.rowcount > 0
+        return await self.db.run(job)
 
 class GroupMember:
     def __init__(self, db: DatabaseManager):
         self.db = db
 
-    def add_member(self, user_id: int, group_id: int, role: str = 'member') -> bool:
+    async def add_member(self, user_id: int, group_id: int, role: str = 'member') -> bool:
         """Добавление участника в группу"""
         query = """
         INSERT INTO group_members (
@@ -72,27 +81,29 @@ class GroupMember:
         )
         VALUES (?, ?, 'active', ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP, 1, 'ready')
         """
+        def job(conn):
+            cursor = conn.cursor()
+            cursor.execute(query, (user_id, group_id, role))
+            return True
         try:
-            with self.db.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute(query, (user_id, group_id, role))
-                return True
+            return await self.db.run(job)
         except sqlite3.IntegrityError:
             return False
 
-    def update_location(self, user_id: int, group_id: int, location: Dict) -> bool:
+    async def update_location(self, user_id: int, group_id: int, location: Dict) -> bool:
         """Обновление местоположения участника"""
         query = """
         UPDATE group_members 
         SET last_location = ?, last_update = CURRENT_TIMESTAMP 
         WHERE user_id = ? AND group_id = ?
         """
-        with self.db.get_connection() as conn:
+        def job(conn):
             cursor = conn.cursor()
             cursor.execute(query, (json.dumps(location), user_id, group_id))
             return cursor.rowcount > 0
+        return await self.db.run(job)
 
-    def get_group_members(self, group_id: int) -> List[Dict]:
+    async def get_group_members(self, group_id: int) -> List[Dict]:
         """Получение списка всех участников группы"""
         query = """
         SELECT gm.*, u.username 
@@ -100,7 +111,7 @@ class GroupMember:
         JOIN users u ON gm.user_id = u.user_id
         WHERE gm.group_id = ? AND gm.status = 'active'
         """
-        with self.db.get_connection() as conn:
+        def job(conn):
             cursor = conn.cursor()
             cursor.execute(query, (group_id,))
             members = []
@@ -119,49 +130,56 @@ class GroupMember:
                     'username': row[10]
                 })
             return members
+        return await self.db.run(job)
 
-    def update_member_status(self, user_id: int, group_id: int, status: str) -> bool:
+    async def update_member_status(self, user_id: int, group_id: int, status: str) -> bool:
         """Обновление статуса участника группы"""
         query = """
         UPDATE group_members 
         SET status = ?, last_update = CURRENT_TIMESTAMP 
         WHERE user_id = ? AND group_id = ?
         """
-        with self.db.get_connection() as conn:
+        def job(conn):
             cursor = conn.cursor()
             cursor.execute(query, (status, user_id, group_id))
             return cursor.rowcount > 0
+        return await self.db.run(job)
 
 # Пример использования:
 if __name__ == "__main__":
-    db = DatabaseManager()
-    
-    # Работа с поисковыми областями
-    search_area = SearchArea(db)
-    area_id = search_area.create_area(
-        operation_id=1,
-        boundaries={
-            "type": "Polygon",
-            "coordinates": [[[30.0, 50.0], [30.1, 50.0], [30.1, 50.1], [30.0, 50.1], [30.0, 50.0]]]
-        },
-        metadata={"difficulty": "medium", "terrain": "forest"},
-        created_by=1
-    )
-    print(f"Created area with ID: {area_id}")
-
-    # Работа с участниками групп
-    group_member = GroupMember(db)
-    success = group_member.add_member(
-        user_id=1,
-        group_id=1,
-        role='coordinator'
-    )
-    print(f"Added member: {success}")
-
-    # Обновление местоположения
-    location_updated = group_member.update_location(
-        user_id=1,
-        group_id=1,
-        location={"lat": 50.0, "lon": 30.0}
-    )
-    print(f"Location updated: {location_updated}")
\ No newline at end of file
+    import asyncio
+
+    async def main():
+        db = DatabaseManager()
+
+        # Работа с поисковыми областями
+        search_area = SearchArea(db)
+        area_id = await search_area.create_area(
+            operation_id=1,
+            boundaries={
+                "type": "Polygon",
+                "coordinates": [[[30.0, 50.0], [30.1, 50.0], [30.1, 50.1], [30.0, 50.1], [30.0, 50.0]]]
+            },
+            metadata={"difficulty": "medium", "terrain": "forest"},
+            created_by=1
+        )
+        print(f"Created area with ID: {area_id}")
+
+        # Работа с участниками групп
+        group_member = GroupMember(db)
+        success = await group_member.add_member(
+            user_id=1,
+            group_id=1,
+            role='coordinator'
+        )
+        print(f"Added member: {success}")
+
+        # Обновление местоположения
+        location_updated = await group_member.update_location(
+            user_id=1,
+            group_id=1,
+            location={"lat": 50.0, "lon": 30.0}
+        )
+        print(f"Location updated: {location_updated}")
+
+    asyncio.run(main())
\ No newline at end of file
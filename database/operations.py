@@ -1,5 +1,14 @@
+from typing import Dict, List
+
 async def get_activity_points(self, operation_id: int) -> List[Dict]:
-    """Получение точек активности для тепловой карты"""
+    """Получение точек активности для тепловой карты за последние сутки
+
+    При наличии истории в шардах (LocationHistoryStore) веса читаются из
+    накопленной при записи таблицы heat, без группировки точек.
+    """
+    store = getattr(self, 'location_store', None)
+    if store:
+        return await store.heatmap(operation_id)
     query = """
         SELECT 
             latitude, 
@@ -12,6 +21,17 @@ async def get_activity_points(self, operation_id: int) -> List[Dict]:
     """
     return await self.execute_query(query, (operation_id,))
 
+async def get_activity_heatmap(self, operation_id: int) -> List[Dict]:
+    """Тепловая карта из растровой сетки покрытия (без группировки по location_history)
+
+    Веса накоплены за всю операцию; если сетки нет, используется get_activity_points.
+    """
+    grids = getattr(self, 'coverage_grids', None)
+    grid = await grids.load(operation_id) if grids else None
+    if not grid:
+        return await get_activity_points(self, operation_id)
+    return grid.heatmap()
+
 async def get_important_points(self, operation_id: int) -> List[Dict]:
     """Получение важных точек операции"""
     query = """
@@ -0,0 +1,237 @@
+import logging
+import re
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import asyncpg
+
+logger = logging.getLogger(__name__)
+
+# Строковые литералы, идентификаторы в кавычках и комментарии пропускаются
+_PLACEHOLDER_RE = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|--[^\n]*|/\*.*?\*/|\?", re.S)
+_RETURNS_ROWS_RE = re.compile(r"^\s*(SELECT|WITH|VALUES|PRAGMA|SHOW)\b|\bRETURNING\b", re.I)
+_INSERT_RE = re.compile(r"^\s*INSERT\b", re.I)
+
+
+def translate_placeholders(query: str) -> str:
+    """Замена SQLite-параметров ``?`` на ``$1, $2, ...`` для asyncpg"""
+    counter = 0
+
+    def replace(match):
+        nonlocal counter
+        if match.group(0) != '?':
+            return match.group(0)
+        counter += 1
+        return f"${counter}"
+
+    return _PLACEHOLDER_RE.sub(replace, query)
+
+
+def _rowcount(status: str) -> int:
+    """Число строк из статуса команды ('INSERT 0 5', 'UPDATE 3')"""
+    try:
+        return int(status.rsplit(' ', 1)[-1])
+    except (ValueError, AttributeError):
+        return -1
+
+
+class PostgresCursor:
+    """Результат запроса в интерфейсе курсора aiosqlite"""
+
+    def __init__(self, rows: List[tuple], columns: Sequence[str], rowcount: int,
+                 lastrowid: Optional[int] = None):
+        self._rows = rows
+        self._position = 0
+        self.description = [(name,) + (None,) * 6 for name in columns]
+        self.rowcount = rowcount
+        self.lastrowid = lastrowid
+
+    async def fetchone(self) -> Optional[tuple]:
+        if self._position >= len(self._rows):
+            return None
+        self._position += 1
+        return self._rows[self._position - 1]
+
+    async def fetchall(self) -> List[tuple]:
+        rows, self._position = self._rows[self._position:], len(self._rows)
+        return rows
+
+    async def close(self):
+        pass
+
+
+class PostgresConnection:
+    """Соединение asyncpg с интерфейсом соединения aiosqlite для заданий записи.
+
+    Задания ``run_in_transaction`` пишутся один раз с параметрами ``?`` и
+    выполняются на любом бэкенде.
+    """
+
+    def __init__(self, conn: asyncpg.Connection):
+        self.raw = conn
+
+    async def execute(self, query: str, params: Sequence = ()) -> PostgresCursor:
+        sql = translate_placeholders(query)
+        insert = _INSERT_RE.match(query) is not None
+        if _RETURNS_ROWS_RE.search(query) or insert:
+            if insert and not re.search(r"\bRETURNING\b", query, re.I):
+                # lastrowid как в SQLite: первый столбец вставленной строки (первичный ключ)
+                sql = sql.rstrip().rstrip(';') + " RETURNING *"
+            records = await self.raw.fetch(sql, *params)
+            rows = [tuple(record) for record in records]
+            columns = list(records[0].keys()) if records else []
+            lastrowid = rows[-1][0] if insert and rows else None
+            return PostgresCursor(rows, columns, len(rows), lastrowid)
+        status = await self.raw.execute(sql, *params)
+        return PostgresCursor([], [], _rowcount(status))
+
+    async def executemany(self, query: str, params_seq: Iterable[Sequence]) -> PostgresCursor:
+        params_seq = list(params_seq)
+        await self.raw.executemany(translate_placeholders(query), params_seq)
+        return PostgresCursor([], [], len(params_seq))
+
+    async def executescript(self, script: str):
+        await self.raw.execute(script)
+
+
+class PostgresPool:
+    """Пул соединений PostgreSQL (asyncpg) с интерфейсом SQLitePool.
+
+    Запросы пишутся с параметрами ``?`` и переводятся в нумерованные
+    параметры PostgreSQL; пакетная загрузка идет через COPY.
+    """
+
+    dialect = 'postgres'
+
+    def __init__(self, dsn: str, min_size: int = 2, max_size: int = 10,
+                 statement_cache: int = 256, command_timeout: float = 60):
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.statement_cache = statement_cache
+        self.command_timeout = command_timeout
+        self._pool: Optional[asyncpg.Pool] = None
+        self._stats = {
+            'acquires': 0,
+            'wait_total': 0.0,
+            'wait_max': 0.0,
+            'write_jobs': 0,
+            'write_errors': 0,
+            'copied_rows': 0,
+        }
+
+    async def open(self):
+        self._pool = await asyncpg.create_pool(
+            self.dsn, min_size=self.min_size, max_size=self.max_size,
+            statement_cache_size=self.statement_cache, command_timeout=self.command_timeout
+        )
+
+    async def close(self):
+        if self._pool:
+            await self._pool.close()
+            self._pool = None
+
+    @property
+    def is_open(self) -> bool:
+        return self._pool is not None
+
+    @asynccontextmanager
+    async def acquire(self):
+        started = time.perf_counter()
+        async with self._pool.acquire() as conn:
+            waited = time.perf_counter() - started
+            self._stats['acquires'] += 1
+            self._stats['wait_total'] += waited
+            self._stats['wait_max'] = max(self._stats['wait_max'], waited)
+            yield conn
+
+    @asynccontextmanager
+    async def acquire_reader(self):
+        async with self.acquire() as conn:
+            yield PostgresConnection(conn)
+
+    # ---- чтение ----
+
+    async def fetchone(self, query: str, params: tuple = ()) -> Optional[tuple]:
+        async with self.acquire() as conn:
+            record = await conn.fetchrow(translate_placeholders(query), *params)
+        return tuple(record) if record is not None else None
+
+    async def fetchall(self, query: str, params: tuple = ()) -> List[tuple]:
+        async with self.acquire() as conn:
+            return [tuple(record) for record in await conn.fetch(translate_placeholders(query), *params)]
+
+    async def fetch_dicts(self, query: str, params: tuple = (), one: bool = False) -> List[Dict]:
+        async with self.acquire() as conn:
+            if one:
+                record = await conn.fetchrow(translate_placeholders(query), *params)
+                return [dict(record)] if record is not None else []
+            return [dict(record) for record in await conn.fetch(translate_placeholders(query), *params)]
+
+    async def iterate(self, query: str, params: tuple = (), batch_size: int = 500):
+        """Чтение большого результата пачками через серверный курсор"""
+        async with self.acquire() as conn:
+            async with conn.transaction():
+                cursor = await conn.cursor(translate_placeholders(query), *params)
+                while True:
+                    records = await cursor.fetch(batch_size)
+                    if not records:
+                        return
+                    yield [tuple(record) for record in records]
+
+    # ---- запись ----
+
+    async def write(self, job) -> Any:
+        """Выполнение задания записи в отдельной транзакции"""
+        self._stats['write_jobs'] += 1
+        try:
+            async with self.acquire() as conn:
+                async with conn.transaction():
+                    return await job(PostgresConnection(conn))
+        except Exception:
+            self._stats['write_errors'] += 1
+            raise
+
+    async def execute(self, query: str, params: tuple = ()) -> Tuple[Optional[int], int]:
+        async def job(conn):
+            cursor = await conn.execute(query, params)
+            return cursor.lastrowid, cursor.rowcount
+        return await self.write(job)
+
+    async def executemany(self, query: str, params_seq) -> int:
+        async def job(conn):
+            return (await conn.executemany(query, params_seq)).rowcount
+        return await self.write(job)
+
+    async def executescript(self, script: str):
+        async with self.acquire() as conn:
+            await conn.execute(script)
+
+    async def copy_records(self, table: str, columns: Sequence[str], records: Iterable[Sequence]) -> int:
+        """Пакетная загрузка строк через COPY"""
+        records = list(records)
+        async with self.acquire() as conn:
+            await conn.copy_records_to_table(table, records=records, columns=list(columns))
+        self._stats['copied_rows'] += len(records)
+        return len(records)
+
+    # ---- статистика ----
+
+    def get_stats(self) -> Dict:
+        stats = self._stats
+        acquires = stats['acquires']
+        size = self._pool.get_size() if self._pool else 0
+        idle = self._pool.get_idle_size() if self._pool else 0
+        return {
+            'size': size,
+            'in_use': size - idle,
+            'max_size': self.max_size,
+            'saturation': round((size - idle) / self.max_size, 3),
+            'acquires': acquires,
+            'wait_avg': stats['wait_total'] / acquires if acquires else 0.0,
+            'wait_max': stats['wait_max'],
+            'write_jobs': stats['write_jobs'],
+            'write_errors': stats['write_errors'],
+            'copied_rows': stats['copied_rows'],
+        }
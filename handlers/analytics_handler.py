@@ -47,16 +47,16 @@ class AnalyticsHandler:
             "📊 Детальная аналитика операции\n\n"
             f"👥 Команд: {analytics['basic_info']['team_count']}\n"
             f"👤 Участников: {analytics['basic_info']['participant_count']}\n"
-            f"🎯 Выполнение задач: {analytics['basic_info']['avg_task_completion']:.1f}%\n"
+            f"🎯 Выполнение задач: {analytics['task_analysis']['completion_rate']:.1f}%\n"
             f"🗺 Покрытие территории: {analytics['coverage_analysis']['total_coverage']:.1f}%\n"
-            f"⏱ Среднее время реагирования: {analytics['basic_info']['avg_response_time']} мин\n\n"
+            f"⏱ Время реагирования: {analytics['basic_info']['response_time'] or 0} мин\n\n"
             "📈 Эффективность команд:\n"
         )
         
         for team in analytics['team_analysis']:
             message += (
-                f"└ {team['team_name']}: {team['coordination_score']:.1f}%\n"
-                f"  ├ Покрытие: {team['coverage_area']:.1f} км²\n"
+                f"└ {team['team_name']}: {team['member_count']} чел.\n"
+                f"  ├ Пройдено: {team['total_distance']:.1f} км\n"
                 f"  └ Выполнение задач: {team['task_completion_rate']:.1f}%\n"
             )
 
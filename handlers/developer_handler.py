@@ -1,3 +1,5 @@
+from services.user_cache import access_cache_for
+
 class DeveloperHandler:
     def __init__(self, db_manager, notification_manager):
         self.db = db_manager
@@ -106,6 +108,7 @@ class DeveloperHandler:
             "UPDATE users SET is_coordinator = TRUE WHERE user_id = ?",
             (request_data['user_id'],)
         )
+        access_cache_for(self.db).invalidate_roles(request_data['user_id'])
 
         # Уведомляем пользователя
         await context.bot.send_message(
@@ -1,6 +1,9 @@
 import logging
 import json
 import math
+import asyncio
+import io
+import os
 from datetime import datetime
 import gpxpy
 import gpxpy.gpx
@@ -11,10 +14,13 @@ from database.db_manager import DatabaseManager
 from services.map_service import MapService
 from config.api_config import MAP_UPDATE_INTERVAL
 from services.gps_handler import GPSHandler
+from services.group_map import GroupMapRenderer, members_by_user
 from services.map_cache_service import MapCacheService
+from services.offline_maps_manager import OfflineMapsManager, circle_area
 from services.track_compression import TrackCompressor
 from services.track_export import TrackExporter
 from services.track_analyzer import TrackAnalyzer
+from services.track_data import Track
 from core.map_manager import MapManager
 from services.yandex_maps_service import YandexMapsService
 from utils.location_permission_manager import LocationPermissionManager
@@ -26,14 +32,27 @@ class MapHandler(BaseHandler):
         super().__init__(db_manager)
         self.gps_handler = GPSHandler()
         self.map_cache = MapCacheService()
+        self.offline_maps = OfflineMapsManager(self.map_cache)
+        self.area_downloads = {}  # user_id: задача скачивания области
         self.track_compressor = TrackCompressor()
         self.track_exporter = TrackExporter()
-        self.active_tracks = {}  # user_id: {track_id, points}
+        self.track_analyzer = TrackAnalyzer()
+        self.active_tracks = {}  # user_id: {track_id, points: Track}
         self.map_service = MapService()
+        self.group_maps = GroupMapRenderer()
         self.location_updates = {}  # user_id: last_update_time
         self.live_tracking_users = set()  # Для отслеживания пользователей с включенным live-трекингом
         self.location_permission_manager = LocationPermissionManager(db_manager)
 
+    async def close(self):
+        """Остановка скачиваний областей и закрытие кэша тайлов"""
+        downloads = [task for task in self.area_downloads.values() if not task.done()]
+        for task in downloads:
+            task.cancel()
+        await asyncio.gather(*downloads, return_exceptions=True)
+        self.area_downloads.clear()
+        await self.map_cache.close()
+
     async def show_map_menu(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
         """Показ меню карты"""
         keyboard = [
@@ -84,6 +103,12 @@ class MapHandler(BaseHandler):
             
             elif data == "online_map":
                 await self.show_online_map(update, context)
+
+            elif data == "download_area":
+                await self.handle_download_area(update, context)
+
+            elif data.startswith("download_") and data.endswith("km"):
+                await self.handle_area_radius(update, context)
             
             else:
                 logger.warning(f"Неизвестный callback для карты: {data}")
@@ -107,7 +132,9 @@ class MapHandler(BaseHandler):
         track_id = await self.db.create_track(user_id)
         self.active_tracks[user_id] = {
             'track_id': track_id,
-            'points': []
+            'points': Track(track_id),
+            'simplifier': self.track_compressor.create_stream(),
+            'start_time': datetime.now()
         }
         
         keyboard = [
@@ -134,7 +161,7 @@ class MapHandler(BaseHandler):
         track_info = {
             'id': track_data['track_id'],
             'user_id': user_id,
-            'points': track_data['points'],
+            'points': track_data['points'].to_dicts(),
             'start_time': track_data['start_time'],
             'end_time': datetime.now()
         }
@@ -151,7 +178,7 @@ class MapHandler(BaseHandler):
         
         await update.callback_query.message.edit_text(
             "✅ Запись трека завершена\n\n"
-            f"📏 Пройдено: {stats['distance']:.2f} км\n"
+            f"📏 Пройдено: {stats['total_distance']:.2f} км\n"
             f"⏱ Время в пути: {stats['duration']}\n"
             f"📈 Средняя скорость: {stats['avg_speed']:.1f} км/ч",
             reply_markup=InlineKeyboardMarkup(keyboard)
@@ -164,11 +191,13 @@ class MapHandler(BaseHandler):
         
         if user_id in self.active_tracks:
             # Добавляем точку к активному треку
-            self.active_tracks[user_id]['points'].append({
-                'lat': location.latitude,
-                'lon': location.longitude,
-                'time': update.message.date
-            })
+            track_data = self.active_tracks[user_id]
+            track_data['points'].add(
+                location.latitude,
+                location.longitude,
+                update.message.date
+            )
+            track_data['simplifier'].push(track_data['points'][-1])
             
             await update.message.reply_text("📍 Точка добавлена к треку")
             return True
@@ -390,24 +419,33 @@ class MapHandler(BaseHandler):
         group_id = job.context['group_id']
         
         # Получаем обновленные координаты
-        members = self.db.get_group_members_locations(group_id)
-        
-        # Генерируем новую карту
-        map_file = self.map_service.generate_dynamic_map(members)
-        
-        if map_file:
-            with open(f"temp/{map_file}", "rb") as f:
-                await context.bot.send_document(
-                    chat_id=chat_id,
-                    document=f,
-                    filename="map.html",
-                    caption="🗺 Обновленная карта группы"
-                )
+        members = members_by_user(await self.db.get_group_members_locations(group_id))
+
+        if not self.group_maps.has_base(group_id):
+            await asyncio.get_running_loop().run_in_executor(
+                None, self.group_maps.set_base, group_id, [], []
+            )
+
+        # Базовый слой не пересобирается, в HTML подставляются только маркеры
+        version = self.group_maps.versions.get(group_id)
+        map_html = self.group_maps.render(group_id, members)
+        if self.group_maps.versions.get(group_id) == version:
+            return  # позиции не изменились с прошлой отправки
+
+        await context.bot.send_document(
+            chat_id=chat_id,
+            document=io.BytesIO(map_html.encode('utf-8')),
+            filename="map.html",
+            caption="🗺 Обновленная карта группы"
+        )
 
     async def _auto_save_track(self, user_id: int, context: ContextTypes.DEFAULT_TYPE):
         """Автоматическое сохранение и сжатие трека"""
         track_data = self.active_tracks[user_id]
-        compressed_points = self.track_compressor.compress_track(track_data['points'])
+        # Ключевые точки, отобранные потоковым упрощением с прошлого сохранения;
+        # из буфера они убираются только после успешной записи
+        simplifier = track_data['simplifier']
+        compressed_points = simplifier.peek_ready()
         
         # Сохраняем сжатый трек
         success = self.db.update_track_points(
@@ -417,8 +455,9 @@ class MapHandler(BaseHandler):
         )
         
         if success:
+            simplifier.commit(len(compressed_points))
             # Очищаем буфер точек
-            track_data['points'] = []
+            track_data['points'].clear()
             await context.bot.send_message(
                 chat_id=user_id,
                 text="✅ Трек автоматически сохранен и оптимизирован"
@@ -533,8 +572,7 @@ class MapHandler(BaseHandler):
             return
         
         points = json.loads(track['points_json'])
-        analyzer = TrackAnalyzer()
-        stats = analyzer.analyze_track(points)
+        stats = self.track_analyzer.analyze_track(points)
         
         # Форматируем статистику для отображения
         stats_text = (
@@ -704,6 +742,73 @@ class MapHandler(BaseHandler):
             reply_markup=InlineKeyboardMarkup(keyboard)
         )
 
+    async def handle_area_radius(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Оценка объема и запуск скачивания области выбранного радиуса"""
+        query = update.callback_query
+        user_id = update.effective_user.id
+        center = context.user_data.get('download_center')
+        if not center:
+            await query.answer("Сначала отправьте локацию центра области")
+            return
+        if user_id in self.area_downloads and not self.area_downloads[user_id].done():
+            await query.answer("Скачивание уже выполняется")
+            return
+
+        radius_km = int(query.data[len("download_"):-len("km")])
+        lat, lon = center
+        area = circle_area(lat, lon, radius_km * 1000)
+        region = f"area_{user_id}_{lat:.4f}_{lon:.4f}_{radius_km}km"
+        try:
+            estimate = await self.offline_maps.estimate_area(area)
+        except ValueError as e:
+            logger.warning(f"Скачивание областей недоступно: {e}")
+            await query.answer("Скачивание областей не настроено: нет разрешенного источника тайлов",
+                               show_alert=True)
+            return
+
+        message = await query.message.edit_text(
+            f"📥 Скачивание области {radius_km} км\n\n"
+            f"Тайлов: {estimate['tiles']} (в кэше: {estimate['cached']})\n"
+            f"Примерный объем: {estimate['estimated_bytes'] / 1024 / 1024:.1f} МБ"
+        )
+        self.area_downloads[user_id] = asyncio.create_task(
+            self._run_area_download(context, message, region, area, estimate)
+        )
+
+    async def _run_area_download(self, context: ContextTypes.DEFAULT_TYPE, message,
+                                 region: str, area, estimate: dict):
+        """Фоновое скачивание области с обновлением прогресса"""
+        async def progress(stats):
+            processed = stats['done'] + stats['skipped'] + stats['failed']
+            percent = processed / max(estimate['tiles'], 1) * 100
+            try:
+                await message.edit_text(
+                    f"📥 Скачивание: {percent:.0f}% ({processed}/{estimate['tiles']})\n"
+                    f"Загружено: {stats['bytes'] / 1024 / 1024:.1f} МБ"
+                )
+            except Exception as e:
+                logger.debug(f"Не удалось обновить прогресс: {e}")
+
+        try:
+            stats = await self.offline_maps.download_area(region, area, progress=progress)
+            path = self.offline_maps.region_path(region)
+            caption = (f"🗺 Офлайн-карта готова: {stats['done'] + stats['skipped']} тайлов"
+                       + (f", ошибок: {stats['failed']} (повторите скачивание)" if stats['failed'] else ""))
+            # Лимит Telegram на размер документа - 50 МБ
+            if os.path.getsize(path) < 50 * 1024 * 1024:
+                with open(path, "rb") as f:
+                    await context.bot.send_document(
+                        chat_id=message.chat_id,
+                        document=f,
+                        filename=f"{region}.mbtiles",
+                        caption=caption
+                    )
+            else:
+                await message.edit_text(f"{caption}\nФайл: {path}")
+        except Exception as e:
+            logger.error(f"Ошибка скачивания области: {e}")
+            await message.edit_text("❌ Ошибка скачивания области. Повторный запуск продолжит загрузку.")
+
     async def show_operation_map(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Показ комплексной карты операции"""
         query = update.callback_query
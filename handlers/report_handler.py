@@ -75,7 +75,7 @@ class ReportHandler:
             f"⏱ Длительность: {stats['duration']} часов\n\n"
             f"👥 Участников: {stats['total_participants']}\n"
             f"✅ Выполнено задач: {stats['completed_tasks']}/{stats['total_tasks']}\n"
-            f"🗺 Покрытая территория: {stats['covered_area']} км²\n"
+            f"🗺 Средний прогресс секторов: {stats['average_sector_progress']}%\n"
             f"👣 Общая дистанция: {stats['total_distance']} км\n\n"
             f"📈 Эффективность: {report_data['efficiency']['overall_score']}%\n"
         )
\ No newline at end of file
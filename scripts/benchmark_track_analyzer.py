@@ -0,0 +1,120 @@
+"""Сравнение векторизованного TrackAnalyzer с прежней реализацией на циклах.
+
+Запуск: python -m scripts.benchmark_track_analyzer [количество_точек]
+"""
+import sys
+import time
+from datetime import datetime, timedelta
+from math import radians, sin, cos, sqrt, atan2
+
+import numpy as np
+
+from services.track_analyzer import TrackAnalyzer
+from services.track_data import Track
+
+
+class LegacyTrackAnalyzer:
+    """Прежний алгоритм: циклы по точкам и fromisoformat на каждом шаге"""
+
+    MIN_SPEED = 0.5
+    MAX_SPEED = 20.0
+
+    def analyze_track(self, points):
+        total_distance = self._total_distance(points)
+        duration = (self._time(points[-1]) - self._time(points[0])).total_seconds()
+        speeds = self._speeds(points)
+        avg_speed = np.mean([s for s in speeds if self.MIN_SPEED <= s <= self.MAX_SPEED])
+        elevations = [p.get('elevation', 0) for p in points if p.get('elevation')]
+        elevation_gain = sum(max(0, elevations[i] - elevations[i - 1])
+                             for i in range(1, len(elevations)))
+        moving_time = sum(
+            (self._time(points[i + 1]) - self._time(points[i])).total_seconds()
+            for i, s in enumerate(speeds) if s >= self.MIN_SPEED
+        )
+        segments = self._segments(points)
+        return {
+            'total_distance': round(total_distance, 2),
+            'duration': duration,
+            'moving_time': moving_time,
+            'avg_speed': round(avg_speed, 1),
+            'max_speed': round(max(speeds), 1),
+            'elevation_gain': round(elevation_gain, 1),
+            'segments': segments,
+        }
+
+    @staticmethod
+    def _time(point):
+        return datetime.fromisoformat(point['timestamp'])
+
+    @staticmethod
+    def _distance(p1, p2):
+        lat1, lon1 = radians(p1['lat']), radians(p1['lon'])
+        lat2, lon2 = radians(p2['lat']), radians(p2['lon'])
+        a = sin((lat2 - lat1) / 2) ** 2 + cos(lat1) * cos(lat2) * sin((lon2 - lon1) / 2) ** 2
+        return 6371.0 * 2 * atan2(sqrt(a), sqrt(1 - a))
+
+    def _total_distance(self, points):
+        return sum(self._distance(points[i], points[i + 1]) for i in range(len(points) - 1))
+
+    def _speeds(self, points):
+        speeds = []
+        for i in range(len(points) - 1):
+            dt = (self._time(points[i + 1]) - self._time(points[i])).total_seconds()
+            speeds.append(self._distance(points[i], points[i + 1]) / (dt / 3600) if dt > 0 else 0)
+        return speeds
+
+    def _segments(self, points):
+        segments, current, distance = [], [], 0
+        for i in range(len(points) - 1):
+            current.append(points[i])
+            distance += self._distance(points[i], points[i + 1])
+            if distance >= 1.0:
+                segments.append(round(distance, 2))
+                current, distance = [], 0
+        return segments
+
+
+def generate_points(count: int):
+    rng = np.random.default_rng(42)
+    start = datetime(2024, 2, 16, 8, 0, 0)
+    lat = 55.75 + np.cumsum(rng.normal(0, 0.00005, count))
+    lon = 37.61 + np.cumsum(rng.normal(0, 0.00008, count))
+    elevation = 150 + np.cumsum(rng.normal(0, 0.3, count))
+    return [
+        {
+            'lat': float(lat[i]),
+            'lon': float(lon[i]),
+            'elevation': float(elevation[i]),
+            'timestamp': (start + timedelta(seconds=5 * i)).isoformat()
+        }
+        for i in range(count)
+    ]
+
+
+def measure(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return result, (time.perf_counter() - started) * 1000
+
+
+def main(count: int = 100_000):
+    points = generate_points(count)
+    track = Track.from_points(points)
+    analyzer = TrackAnalyzer()
+
+    legacy, legacy_ms = measure(LegacyTrackAnalyzer().analyze_track, points)
+    from_dicts, dicts_ms = measure(analyzer.analyze_track, points)
+    from_track, track_ms = measure(analyzer.analyze_track, track)
+
+    print(f"Точек: {count}")
+    print(f"Прежняя реализация:       {legacy_ms:10.1f} мс")
+    print(f"Векторизованная (dict):   {dicts_ms:10.1f} мс")
+    print(f"Векторизованная (Track):  {track_ms:10.1f} мс")
+    print(f"Дистанция: {legacy['total_distance']} / {from_dicts['total_distance']} / "
+          f"{from_track['total_distance']} км")
+    print(f"Сегментов: {len(legacy['segments'])} / {len(from_dicts['segments'])} / "
+          f"{len(from_track['segments'])}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
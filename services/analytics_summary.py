@@ -0,0 +1,366 @@
+import asyncio
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from config.settings import ANALYTICS_REFRESH_CONCURRENCY, ANALYTICS_REFRESH_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_PATH = Path(__file__).resolve().parents[1] / 'database' / 'migrations' / '15_analytics_summary.sql'
+
+OPERATION_COUNTERS = ('team_count', 'participant_count', 'task_total', 'task_completed',
+                      'track_count', 'total_distance', 'report_count')
+HEAVY_METRICS = ('response_time', 'coordination_score', 'resource_efficiency',
+                 'coverage_rate', 'success_rate')
+
+
+def _upsert(table: str, keys: Dict[str, str], deltas: Dict[str, str], source: str = '',
+            where: str = '', group_by: str = '', touch: bool = False) -> str:
+    """INSERT ... ON CONFLICT, прибавляющий ``deltas`` к строке сводки.
+
+    ``keys`` и ``deltas`` - столбец: SQL-выражение над ``source``. Строки с
+    пустым ключом пропускаются. ``touch`` отмечает изменение операции для
+    планировщика тяжелых метрик.
+    """
+    columns = list(keys) + list(deltas)
+    values = list(keys.values()) + list(deltas.values())
+    updates = [f"{column} = {column} + excluded.{column}" for column in deltas]
+    if touch:
+        columns += ['changes', 'last_activity']
+        values += ['1', 'CURRENT_TIMESTAMP']
+        updates += ['changes = changes + 1', 'last_activity = excluded.last_activity']
+    conditions = [where] if where else []
+    conditions += [f"({value}) IS NOT NULL" for value in keys.values()]
+    # WHERE обязателен: иначе ON CONFLICT разбирается как часть выборки
+    return (f"INSERT INTO {table} ({', '.join(columns)}) "
+            f"SELECT {', '.join(values)} {source} WHERE {' AND '.join(conditions)} "
+            f"{'GROUP BY ' + group_by if group_by else ''} "
+            f"ON CONFLICT ({', '.join(keys)}) DO UPDATE SET {', '.join(updates)};")
+
+
+def _team_update(group: str, deltas: Dict[str, str]) -> str:
+    sets = ', '.join(f"{column} = {column} + {value}" for column, value in deltas.items())
+    return f"UPDATE team_summary SET {sets} WHERE group_id = {group};"
+
+
+def _group_operation(group: str) -> str:
+    return f"(SELECT operation_id FROM search_groups WHERE group_id = {group})"
+
+
+class AnalyticsSummary:
+    """Материализованные сводки аналитики по операциям, командам и участникам.
+
+    Счетчики (команды, участники, задачи, треки, дистанция, отчеты)
+    поддерживаются триггерами при записи в исходные таблицы, поэтому
+    дашборд и сравнение операций - одно чтение по индексу. Тяжелые метрики
+    (покрытие, время реагирования, координация) пересчитывает
+    ``AnalyticsRefresher`` для операций, изменившихся с прошлого пересчета.
+    """
+
+    def __init__(self, db_manager):
+        self.db = db_manager
+
+    # ---- схема ----
+
+    async def install(self):
+        """Создание таблиц сводок и триггеров для существующих исходных таблиц"""
+        await self.db.executescript(SCHEMA_PATH.read_text(encoding='utf-8'))
+        triggers = self._triggers(await self._source_columns())
+        if triggers:
+            await self.db.executescript('\n'.join(triggers))
+
+    async def _source_columns(self) -> Dict[str, Set[str]]:
+        columns = {}
+        for table in ('search_groups', 'group_members', 'coordination_tasks',
+                      'user_tracks', 'operation_reports'):
+            rows = await self.db.fetchall(f"PRAGMA table_info({table})")
+            if rows:
+                columns[table] = {row[1] for row in rows}
+        return columns
+
+    @staticmethod
+    def _task_operation(columns: Dict[str, Set[str]], row: str) -> str:
+        if 'operation_id' in columns.get('coordination_tasks', ()):
+            return f"{row}.operation_id"
+        return _group_operation(f"{row}.group_id")
+
+    def _triggers(self, columns: Dict[str, Set[str]]) -> List[str]:
+        """SQL триггеров: вклад строки NEW прибавляется, OLD - вычитается"""
+        contributions = {}
+
+        if 'search_groups' in columns:
+            def group(row, sign):
+                statements = [_upsert('operation_summary', {'operation_id': f"{row}.operation_id"},
+                                      {'team_count': sign}, touch=True)]
+                if sign == '1':
+                    statements.append(
+                        "INSERT OR IGNORE INTO team_summary (group_id, operation_id) "
+                        f"VALUES ({row}.group_id, {row}.operation_id);")
+                else:
+                    statements.append(f"DELETE FROM team_summary WHERE group_id = {row}.group_id;")
+                return statements
+            contributions['search_groups'] = (group, ())
+
+        if 'group_members' in columns:
+            def member(row, sign):
+                operation = _group_operation(f"{row}.group_id")
+                return [
+                    _team_update(f"{row}.group_id", {'member_count': sign}),
+                    # Уникальные участники пересчитываются по индексу группы
+                    "UPDATE operation_summary SET participant_count = ("
+                    " SELECT COUNT(DISTINCT m.user_id) FROM group_members m"
+                    " JOIN search_groups g ON g.group_id = m.group_id"
+                    f" WHERE g.operation_id = {operation}), changes = changes + 1,"
+                    f" last_activity = CURRENT_TIMESTAMP WHERE operation_id = {operation};",
+                ]
+            contributions['group_members'] = (member, ('group_id', 'user_id'))
+
+        if 'coordination_tasks' in columns:
+            def task(row, sign):
+                operation = self._task_operation(columns, row)
+                deltas = {'task_total': sign,
+                          'task_completed': f"{sign} * ({row}.status = 'completed')"}
+                return [
+                    _upsert('operation_summary', {'operation_id': operation}, deltas, touch=True),
+                    _team_update(f"{row}.group_id", deltas),
+                    _upsert('user_summary', {'user_id': f"{row}.assigned_to", 'operation_id': operation},
+                            deltas),
+                ]
+            watched = ('status', 'group_id', 'assigned_to') + (
+                ('operation_id',) if 'operation_id' in columns['coordination_tasks'] else ())
+            contributions['coordination_tasks'] = (task, watched)
+
+        if 'user_tracks' in columns:
+            def track(row, sign):
+                operation = _group_operation(f"{row}.group_id")
+                deltas = {'track_count': sign,
+                          'total_distance': f"{sign} * COALESCE({row}.distance, 0)"}
+                return [
+                    _upsert('operation_summary', {'operation_id': operation}, deltas, touch=True),
+                    _team_update(f"{row}.group_id", deltas),
+                    _upsert('user_summary', {'user_id': f"{row}.user_id", 'operation_id': operation},
+                            deltas),
+                ]
+            contributions['user_tracks'] = (track, ('distance', 'group_id', 'user_id'))
+
+        if 'operation_reports' in columns:
+            def report(row, sign):
+                keys = {'operation_id': f"{row}.operation_id"}
+                return [
+                    _upsert('operation_summary', keys, {'report_count': sign}, touch=True),
+                    _upsert('user_summary', {'user_id': f"{row}.created_by", **keys},
+                            {'report_count': sign}),
+                ]
+            contributions['operation_reports'] = (report, ())
+
+        triggers = []
+        for table, (contribution, watched) in contributions.items():
+            body = {
+                'insert': ('AFTER INSERT', contribution('NEW', '1')),
+                'delete': ('AFTER DELETE', contribution('OLD', '-1')),
+            }
+            if watched:
+                body['update'] = (f"AFTER UPDATE OF {', '.join(watched)}",
+                                  contribution('OLD', '-1') + contribution('NEW', '1'))
+            for name, (event, statements) in body.items():
+                triggers.append(
+                    f"CREATE TRIGGER IF NOT EXISTS {table}_summary_{name} {event} ON {table}\n"
+                    "BEGIN\n    " + '\n    '.join(statements) + "\nEND;"
+                )
+        return triggers
+
+    async def rebuild(self, operation_ids: Optional[Sequence[int]] = None):
+        """Полный пересчет счетчиков из исходных таблиц (первичное заполнение, сверка)"""
+        columns = await self._source_columns()
+        if operation_ids is None:
+            params = ()
+
+            def scope(column: str) -> str:
+                return '1'
+        else:
+            params = tuple(operation_ids)
+
+            def scope(column: str) -> str:
+                return f"{column} IN ({', '.join('?' * len(params))})"
+
+        statements: List[str] = [
+            f"UPDATE operation_summary SET {', '.join(f'{c} = 0' for c in OPERATION_COUNTERS)}, "
+            f"changes = changes + 1 WHERE {scope('operation_id')}",
+            f"DELETE FROM team_summary WHERE {scope('operation_id')}",
+            f"DELETE FROM user_summary WHERE {scope('operation_id')}",
+        ]
+        if 'search_groups' in columns:
+            statements += [
+                _upsert('operation_summary', {'operation_id': 'operation_id'}, {'team_count': 'COUNT(*)'},
+                        'FROM search_groups', scope('operation_id'), 'operation_id', touch=True),
+                "INSERT INTO team_summary (group_id, operation_id) "
+                f"SELECT group_id, operation_id FROM search_groups WHERE {scope('operation_id')}",
+            ]
+        if 'group_members' in columns:
+            statements += [
+                "UPDATE team_summary SET member_count = (SELECT COUNT(*) FROM group_members m "
+                f"WHERE m.group_id = team_summary.group_id) WHERE {scope('operation_id')}",
+                "UPDATE operation_summary SET participant_count = (SELECT COUNT(DISTINCT m.user_id) "
+                "FROM group_members m JOIN search_groups g ON g.group_id = m.group_id "
+                "WHERE g.operation_id = operation_summary.operation_id) "
+                f"WHERE {scope('operation_id')}",
+            ]
+
+        sources = []
+        if 'coordination_tasks' in columns:
+            if 'operation_id' in columns['coordination_tasks']:
+                operation, source = 't.operation_id', 'FROM coordination_tasks t'
+            else:
+                operation = 'g.operation_id'
+                source = 'FROM coordination_tasks t JOIN search_groups g ON g.group_id = t.group_id'
+            sources.append((source, operation, 't.assigned_to',
+                            {'task_total': 'COUNT(*)', 'task_completed': "SUM(t.status = 'completed')"}))
+        if 'user_tracks' in columns:
+            sources.append(('FROM user_tracks t JOIN search_groups g ON g.group_id = t.group_id',
+                            'g.operation_id', 't.user_id',
+                            {'track_count': 'COUNT(*)', 'total_distance': 'COALESCE(SUM(t.distance), 0)'}))
+        for source, operation, user, deltas in sources:
+            statements += [
+                _upsert('operation_summary', {'operation_id': operation}, deltas,
+                        source, scope(operation), operation, touch=True),
+                _upsert('user_summary', {'user_id': user, 'operation_id': operation}, deltas,
+                        source, scope(operation), f"{user}, {operation}"),
+                "UPDATE team_summary SET " + ', '.join(
+                    f"{column} = (SELECT COALESCE({value}, 0) {source} "
+                    f"WHERE t.group_id = team_summary.group_id)"
+                    for column, value in deltas.items()
+                ) + f" WHERE {scope('operation_id')}",
+            ]
+        if 'operation_reports' in columns:
+            statements += [
+                _upsert('operation_summary', {'operation_id': 'operation_id'}, {'report_count': 'COUNT(*)'},
+                        'FROM operation_reports', scope('operation_id'), 'operation_id', touch=True),
+                _upsert('user_summary', {'user_id': 'created_by', 'operation_id': 'operation_id'},
+                        {'report_count': 'COUNT(*)'}, 'FROM operation_reports', scope('operation_id'),
+                        'created_by, operation_id'),
+            ]
+
+        async def job(conn):
+            for query in statements:
+                await conn.execute(query, params if '?' in query else ())
+
+        await self.db.run_in_transaction(job)
+
+    # ---- чтение ----
+
+    async def get_operation(self, operation_id: int) -> Optional[Dict]:
+        return await self.db.fetch_one(
+            "SELECT * FROM operation_summary WHERE operation_id = ?", (operation_id,)
+        )
+
+    async def get_operations(self, operation_ids: Sequence[int]) -> List[Dict]:
+        """Сводки нескольких операций одним запросом (в порядке ``operation_ids``)"""
+        if not operation_ids:
+            return []
+        rows = await self.db.fetch_all(
+            f"SELECT * FROM operation_summary WHERE operation_id IN ({', '.join('?' * len(operation_ids))})",
+            tuple(operation_ids)
+        )
+        by_id = {row['operation_id']: row for row in rows}
+        return [by_id[operation_id] for operation_id in operation_ids if operation_id in by_id]
+
+    async def get_teams(self, operation_ids: Iterable[int]) -> Dict[int, List[Dict]]:
+        """Сводки команд операций: operation_id -> список команд"""
+        operation_ids = list(operation_ids)
+        teams = {operation_id: [] for operation_id in operation_ids}
+        if not operation_ids:
+            return teams
+        rows = await self.db.fetch_all(f"""
+            SELECT ts.*, sg.name AS team_name
+            FROM team_summary ts
+            LEFT JOIN search_groups sg ON sg.group_id = ts.group_id
+            WHERE ts.operation_id IN ({', '.join('?' * len(operation_ids))})
+            ORDER BY ts.group_id
+        """, tuple(operation_ids))
+        for row in rows:
+            teams[row['operation_id']].append(row)
+        return teams
+
+    async def get_users(self, operation_id: int) -> List[Dict]:
+        return await self.db.fetch_all(
+            "SELECT * FROM user_summary WHERE operation_id = ? ORDER BY user_id", (operation_id,)
+        )
+
+    async def dirty_operations(self, limit: int = 100) -> List[Tuple[int, int]]:
+        """Операции, изменившиеся после последнего пересчета: (operation_id, changes)"""
+        return await self.db.fetchall("""
+            SELECT operation_id, changes FROM operation_summary
+            WHERE changes > refreshed_changes
+            ORDER BY last_activity
+            LIMIT ?
+        """, (limit,))
+
+    async def save_metrics(self, operation_id: int, metrics: Dict, changes: int):
+        """Запись тяжелых метрик; ``changes`` - версия сводки, по которой они посчитаны"""
+        values = [metrics.get(name) for name in HEAVY_METRICS]
+        await self.db.execute(f"""
+            UPDATE operation_summary
+            SET {', '.join(f'{name} = ?' for name in HEAVY_METRICS)},
+                refreshed_changes = MAX(refreshed_changes, ?), refreshed_at = ?
+            WHERE operation_id = ?
+        """, (*values, changes, datetime.now().isoformat(), operation_id))
+
+
+class AnalyticsRefresher:
+    """Периодический пересчет тяжелых метрик изменившихся операций"""
+
+    def __init__(self, summary: AnalyticsSummary, efficiency_manager,
+                 interval: float = ANALYTICS_REFRESH_INTERVAL,
+                 concurrency: int = ANALYTICS_REFRESH_CONCURRENCY):
+        self.summary = summary
+        self.efficiency = efficiency_manager
+        self.interval = interval
+        self.concurrency = concurrency
+        self._task: Optional[asyncio.Task] = None
+
+    async def refresh_dirty(self, limit: int = 100) -> int:
+        """Пересчет операций с новыми изменениями, возвращает число пересчитанных"""
+        dirty = await self.summary.dirty_operations(limit)
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def refresh(operation_id: int, changes: int) -> bool:
+            async with semaphore:
+                return await self.refresh(operation_id, changes)
+
+        results = await asyncio.gather(*(refresh(*row) for row in dirty))
+        return sum(results)
+
+    async def refresh(self, operation_id: int, changes: int) -> bool:
+        try:
+            metrics = await self.efficiency.calculate_operation_metrics(operation_id)
+        except Exception as e:
+            logger.error(f"Error refreshing analytics for operation {operation_id}: {e}")
+            return False
+        if metrics is None:
+            return False
+        # Изменения, пришедшие во время расчета, оставят операцию "грязной"
+        await self.summary.save_metrics(operation_id, metrics, changes)
+        return True
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh_dirty()
+            except Exception as e:
+                logger.error(f"Analytics refresh failed: {e}")
+            await asyncio.sleep(self.interval)
@@ -0,0 +1,140 @@
+from math import cos, radians
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from shapely.geometry import LineString, Point, Polygon
+from shapely.ops import unary_union
+
+from services.track_simplify import EARTH_RADIUS_M
+
+
+class SectorCoverage:
+    """Покрытая площадь одного сектора в локальной метрической проекции"""
+
+    def __init__(self, boundaries: Sequence[Tuple[float, float]], search_radius: float,
+                 simplify_tolerance: float):
+        lon0, lat0 = np.asarray(boundaries, dtype=np.float64).mean(axis=0)
+        self.origin = (float(lon0), float(lat0))
+        self.k = cos(radians(lat0))
+        self.search_radius = search_radius
+        self.simplify_tolerance = simplify_tolerance
+        self.polygon = Polygon(self.project(boundaries))
+        self.area = self.polygon.area
+        self.covered = Polygon()
+        self.pending: List = []  # буферы новых сегментов, еще не объединенные
+        self.track_state: Dict[int, Tuple[int, Tuple[float, float]]] = {}  # track_id: (точек, последняя)
+        # track_id: (длина, хэш, хэш без закрывающей скобки) сериализованных точек
+        self.sources: Dict[int, Tuple[int, int, int]] = {}
+        self.revision = 0  # растет при каждом сбросе покрытия
+
+    def project(self, coords) -> np.ndarray:
+        """(lon, lat) -> метры относительно центра сектора"""
+        coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        x = np.radians(coords[:, 0] - self.origin[0]) * EARTH_RADIUS_M * self.k
+        y = np.radians(coords[:, 1] - self.origin[1]) * EARTH_RADIUS_M
+        return np.column_stack((x, y))
+
+    def add_points(self, track_id: int, points: Sequence[Dict]) -> int:
+        """Добавление точек трека; обрабатываются только еще не учтенные.
+
+        ``points`` - полный или дополняемый список точек трека: точки до
+        ранее обработанного индекса пропускаются. Возвращает число новых точек.
+        """
+        processed, _ = self.track_state.get(track_id, (0, None))
+        return self.extend(track_id, points[processed:])
+
+    def extend(self, track_id: int, new_points: Sequence[Dict]) -> int:
+        """Добавление только новых точек трека, продолжающих учтенные"""
+        processed, last = self.track_state.get(track_id, (0, None))
+        if not new_points:
+            return 0
+
+        coords = [(float(p['lon']), float(p['lat'])) for p in new_points]
+        if last is not None:
+            coords.insert(0, last)
+        self.track_state[track_id] = (processed + len(new_points), coords[-1])
+
+        xy = self.project(coords)
+        if len(xy) == 1:
+            piece = Point(xy[0]).buffer(self.search_radius)
+        else:
+            line = LineString(xy).simplify(self.simplify_tolerance)
+            piece = line.buffer(self.search_radius)
+        if piece.intersects(self.polygon):
+            self.pending.append(piece.intersection(self.polygon))
+        return len(new_points)
+
+    def is_changed(self, track_id: int, source: str) -> bool:
+        """Изменился ли сериализованный (JSON-массив) трек с прошлого расчета.
+
+        Дописанный трек продолжает обрабатываться с учтенной точки. Если
+        трек укоротился или изменилось его начало (пересжатие, правка),
+        покрытие сектора сбрасывается: из объединения нельзя вычесть
+        старые точки, поэтому все треки нужно учесть заново.
+        """
+        digest = hash(source)
+        seen = self.sources.get(track_id)
+        if seen and seen[:2] == (len(source), digest):
+            return False
+        if seen and not (len(source) > seen[0] and hash(source[:seen[0] - 1]) == seen[2]):
+            self.reset()
+        self.sources[track_id] = (len(source), digest, hash(source[:-1]))
+        return True
+
+    def reset(self):
+        """Сброс покрытой геометрии и учтенных точек всех треков"""
+        self.covered = Polygon()
+        self.pending = []
+        self.track_state.clear()
+        self.sources.clear()
+        self.revision += 1
+
+    def coverage(self) -> float:
+        """Процент покрытия сектора"""
+        if self.pending:
+            self.covered = unary_union([self.covered, *self.pending])
+            self.pending = []
+        if not self.area:
+            return 0.0
+        return min(100.0, self.covered.area / self.area * 100)
+
+
+class CoverageEngine:
+    """Инкрементальный расчет покрытия секторов.
+
+    Для каждого сектора хранится уже покрытая геометрия; новые точки треков
+    превращаются в буфер упрощенной линии и объединяются только с ней,
+    поэтому повторный запрос покрытия стоит O(новых точек).
+    """
+
+    def __init__(self, search_radius: float = 50.0, simplify_tolerance: float = 5.0):
+        self.search_radius = search_radius  # м
+        self.simplify_tolerance = simplify_tolerance  # м
+        self.sectors: Dict[int, SectorCoverage] = {}
+
+    def ensure_sector(self, sector_id: int, boundaries: Sequence[Tuple[float, float]]) -> SectorCoverage:
+        if sector_id not in self.sectors:
+            self.sectors[sector_id] = SectorCoverage(
+                boundaries, self.search_radius, self.simplify_tolerance
+            )
+        return self.sectors[sector_id]
+
+    def reset_sector(self, sector_id: int):
+        """Сброс состояния сектора (например, после изменения границ)"""
+        self.sectors.pop(sector_id, None)
+
+    def add_points(self, sector_id: int, track_id: int, points: Sequence[Dict]) -> int:
+        sector = self.sectors.get(sector_id)
+        if not sector:
+            return 0
+        return sector.add_points(track_id, points)
+
+    def extend(self, sector_id: int, track_id: int, new_points: Sequence[Dict]) -> int:
+        sector = self.sectors.get(sector_id)
+        if not sector:
+            return 0
+        return sector.extend(track_id, new_points)
+
+    def get_coverage(self, sector_id: int) -> Optional[float]:
+        sector = self.sectors.get(sector_id)
+        return sector.coverage() if sector else None
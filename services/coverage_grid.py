@@ -0,0 +1,336 @@
+import asyncio
+import json
+import logging
+import zlib
+from math import ceil, cos, radians
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import shapely
+from shapely.geometry import Polygon
+
+from config.settings import COVERAGE_GRID_FLUSH_INTERVAL
+from services.track_simplify import EARTH_RADIUS_M
+
+logger = logging.getLogger(__name__)
+
+Bounds = Tuple[float, float, float, float]  # min_lon, min_lat, max_lon, max_lat
+
+
+class CoverageGrid:
+    """Растровая сетка покрытия операции.
+
+    Каждая ячейка ``cell_size`` x ``cell_size`` метров хранит признак
+    "осмотрено": точки треков закрашивают диск радиуса ``search_radius``.
+    Покрытие сектора - число закрашенных ячеек под маской сектора, поэтому
+    не зависит от количества точек. Параллельно ведется грубая сетка
+    счетчиков фиксаций для тепловой карты.
+    """
+
+    MAX_STENCIL_CELLS = 2_000_000  # ограничение памяти на пачку растеризации
+
+    def __init__(self, bounds: Bounds, cell_size: float = 2.0, search_radius: float = 50.0,
+                 heat_cell_size: float = 50.0, max_gap: float = 300.0):
+        self.bounds = tuple(float(v) for v in bounds)
+        self.cell_size = cell_size
+        self.search_radius = search_radius
+        self.heat_cell_size = heat_cell_size
+        self.max_gap = max_gap  # более длинные скачки не заполняются (пауза, сбой GPS)
+
+        min_lon, min_lat, max_lon, max_lat = self.bounds
+        self.kx = radians(1) * EARTH_RADIUS_M * cos(radians((min_lat + max_lat) / 2))
+        self.ky = radians(1) * EARTH_RADIUS_M
+        width = (max_lon - min_lon) * self.kx
+        height = (max_lat - min_lat) * self.ky
+        self.shape = (max(1, ceil(height / cell_size)), max(1, ceil(width / cell_size)))
+        self.heat_shape = (max(1, ceil(height / heat_cell_size)), max(1, ceil(width / heat_cell_size)))
+
+        self.cells = np.zeros(self.shape, dtype=bool)
+        self.heat = np.zeros(self.heat_shape, dtype=np.uint32)
+        self._stencil = self._disk_stencil()
+        self._masks: Dict = {}
+        self._last_points: Dict[int, Tuple[float, float]] = {}
+
+    @classmethod
+    def for_area(cls, polygon_coords: Sequence[Tuple[float, float]], **kwargs) -> 'CoverageGrid':
+        """Сетка по границам области (lon, lat) с запасом на радиус поиска"""
+        coords = np.asarray(polygon_coords, dtype=np.float64)
+        radius = kwargs.get('search_radius', 50.0)
+        lat_margin = radius / (radians(1) * EARTH_RADIUS_M)
+        lon_margin = lat_margin / max(cos(radians(coords[:, 1].mean())), 1e-6)
+        return cls((coords[:, 0].min() - lon_margin, coords[:, 1].min() - lat_margin,
+                    coords[:, 0].max() + lon_margin, coords[:, 1].max() + lat_margin), **kwargs)
+
+    def _disk_stencil(self) -> Tuple[np.ndarray, np.ndarray]:
+        r = int(ceil(self.search_radius / self.cell_size))
+        dy, dx = np.mgrid[-r:r + 1, -r:r + 1]
+        inside = (dx * dx + dy * dy) * self.cell_size ** 2 <= self.search_radius ** 2
+        return dy[inside], dx[inside]
+
+    def _to_xy(self, lat: np.ndarray, lon: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        return (lon - self.bounds[0]) * self.kx, (lat - self.bounds[1]) * self.ky
+
+    def _densify(self, x: np.ndarray, y: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Промежуточные точки на отрезках длиннее половины радиуса"""
+        if len(x) < 2:
+            return x, y
+        dx, dy = np.diff(x), np.diff(y)
+        length = np.hypot(dx, dy)
+        parts = np.where(length <= self.max_gap,
+                         np.maximum(1, np.ceil(length / (self.search_radius / 2))), 1).astype(int)
+        segment = np.repeat(np.arange(len(dx)), parts)
+        offset = np.arange(parts.sum()) - np.repeat(np.cumsum(parts) - parts, parts)
+        t = offset / parts[segment]
+        return (np.append(x[segment] + t * dx[segment], x[-1]),
+                np.append(y[segment] + t * dy[segment], y[-1]))
+
+    def add_points(self, lat: Sequence[float], lon: Sequence[float], track_id: Optional[int] = None,
+                   connect: bool = True):
+        """Растеризация точек трека (продолжает линию трека ``track_id``).
+
+        ``connect=False`` - отдельные отметки без линии между ними (точки
+        разных волонтеров вне записи трека).
+        """
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        if not lat.size:
+            return
+
+        x, y = self._to_xy(lat, lon)
+        self._add_heat(x, y)
+
+        if track_id is not None:
+            previous = self._last_points.get(track_id)
+            self._last_points[track_id] = (x[-1], y[-1])
+            if previous is not None:
+                x = np.insert(x, 0, previous[0])
+                y = np.insert(y, 0, previous[1])
+        if connect:
+            x, y = self._densify(x, y)
+
+        rows = np.floor(y / self.cell_size).astype(np.int64)
+        cols = np.floor(x / self.cell_size).astype(np.int64)
+        sdy, sdx = self._stencil
+        chunk = max(1, self.MAX_STENCIL_CELLS // len(sdy))
+        for start in range(0, len(rows), chunk):
+            r = (rows[start:start + chunk, None] + sdy[None, :]).ravel()
+            c = (cols[start:start + chunk, None] + sdx[None, :]).ravel()
+            valid = (r >= 0) & (r < self.shape[0]) & (c >= 0) & (c < self.shape[1])
+            self.cells[r[valid], c[valid]] = True
+
+    def _add_heat(self, x: np.ndarray, y: np.ndarray):
+        r = np.floor(y / self.heat_cell_size).astype(np.int64)
+        c = np.floor(x / self.heat_cell_size).astype(np.int64)
+        valid = (r >= 0) & (r < self.heat_shape[0]) & (c >= 0) & (c < self.heat_shape[1])
+        np.add.at(self.heat, (r[valid], c[valid]), 1)
+
+    def _mask(self, key, polygon_coords: Sequence[Tuple[float, float]]):
+        """Маска ячеек, центры которых лежат внутри полигона (кэшируется по ключу)"""
+        if key in self._masks:
+            return self._masks[key]
+        coords = np.asarray(polygon_coords, dtype=np.float64)
+        px, py = self._to_xy(coords[:, 1], coords[:, 0])
+        polygon = Polygon(np.column_stack((px, py)))
+        min_x, min_y, max_x, max_y = polygon.bounds
+        r0 = max(0, int(min_y // self.cell_size))
+        r1 = min(self.shape[0], int(max_y // self.cell_size) + 1)
+        c0 = max(0, int(min_x // self.cell_size))
+        c1 = min(self.shape[1], int(max_x // self.cell_size) + 1)
+        cy, cx = np.mgrid[r0:r1, c0:c1]
+        mask = shapely.contains_xy(polygon, (cx + 0.5) * self.cell_size, (cy + 0.5) * self.cell_size)
+        entry = (slice(r0, r1), slice(c0, c1), mask, int(mask.sum()))
+        self._masks[key] = entry
+        return entry
+
+    def coverage(self, polygon_coords: Optional[Sequence[Tuple[float, float]]] = None,
+                 key=None) -> float:
+        """Процент покрытия полигона (или всей сетки)"""
+        if polygon_coords is None:
+            return float(np.count_nonzero(self.cells)) / self.cells.size * 100
+        rows, cols, mask, total = self._mask(key if key is not None else id(polygon_coords),
+                                             polygon_coords)
+        if not total:
+            return 0.0
+        covered = np.count_nonzero(self.cells[rows, cols] & mask)
+        return covered / total * 100
+
+    def sector_coverage(self, sector_id: int, boundaries: Sequence[Tuple[float, float]]) -> float:
+        return self.coverage(boundaries, key=('sector', sector_id))
+
+    def reset_mask(self, sector_id: int):
+        self._masks.pop(('sector', sector_id), None)
+
+    def heatmap(self) -> List[Dict]:
+        """Точки тепловой карты (центры ячеек с весом = числу фиксаций)"""
+        rows, cols = np.nonzero(self.heat)
+        lat = self.bounds[1] + (rows + 0.5) * self.heat_cell_size / self.ky
+        lon = self.bounds[0] + (cols + 0.5) * self.heat_cell_size / self.kx
+        weights = self.heat[rows, cols]
+        return [
+            {'latitude': float(a), 'longitude': float(b), 'weight': int(w)}
+            for a, b, w in zip(lat, lon, weights)
+        ]
+
+    def to_blob(self) -> bytes:
+        """Сериализация: заголовок JSON + упакованные биты + счетчики"""
+        header = json.dumps({
+            'bounds': self.bounds,
+            'cell_size': self.cell_size,
+            'search_radius': self.search_radius,
+            'heat_cell_size': self.heat_cell_size,
+            'max_gap': self.max_gap,
+        }).encode()
+        body = np.packbits(self.cells, axis=None).tobytes() + self.heat.astype('<u4').tobytes()
+        return len(header).to_bytes(4, 'little') + header + zlib.compress(body, 1)
+
+    @classmethod
+    def from_blob(cls, blob: bytes) -> 'CoverageGrid':
+        size = int.from_bytes(blob[:4], 'little')
+        params = json.loads(blob[4:4 + size])
+        grid = cls(tuple(params.pop('bounds')), **params)
+        body = zlib.decompress(blob[4 + size:])
+        packed = (grid.cells.size + 7) // 8
+        grid.cells = np.unpackbits(
+            np.frombuffer(body[:packed], dtype=np.uint8), count=grid.cells.size
+        ).astype(bool).reshape(grid.shape)
+        grid.heat = np.frombuffer(body[packed:], dtype='<u4').astype(np.uint32).reshape(grid.heat_shape)
+        return grid
+
+
+class CoverageGridStore:
+    """Сетки покрытия операций: кэш в памяти и хранение в таблице coverage_grids.
+
+    Живые точки копятся в буфере (``submit``) и раз в ``flush_interval``
+    секунд растеризуются пачкой в потоке; измененные сетки записываются
+    в БД. Сетка операции создается по ее search_area при первой точке.
+    """
+
+    def __init__(self, db_manager, flush_interval: float = COVERAGE_GRID_FLUSH_INTERVAL, **grid_options):
+        self.db = db_manager
+        self.flush_interval = flush_interval
+        self.grid_options = grid_options
+        self.grids: Dict[int, CoverageGrid] = {}
+        self._pending: Dict[int, List[Tuple[Optional[int], Optional[int], float, float]]] = {}
+        self._dirty = set()
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def cached(self, operation_id: int) -> Optional[CoverageGrid]:
+        return self.grids.get(operation_id)
+
+    def create(self, operation_id: int, area_coords: Sequence[Tuple[float, float]]) -> CoverageGrid:
+        grid = CoverageGrid.for_area(area_coords, **self.grid_options)
+        self.grids[operation_id] = grid
+        self._dirty.add(operation_id)
+        return grid
+
+    async def ensure(self, operation_id: int) -> Optional[CoverageGrid]:
+        """Сетка операции: из кэша, из БД или новая по области поиска"""
+        grid = await self.load(operation_id)
+        if grid:
+            return grid
+        try:
+            row = await self.db.fetch_one(
+                "SELECT search_area FROM search_operations WHERE operation_id = ?", (operation_id,)
+            )
+            area = json.loads(row['search_area']) if row and row['search_area'] else None
+        except Exception as e:
+            logger.error(f"Error reading search area of operation {operation_id}: {e}")
+            return None
+        if not area or area.get('type') != 'Polygon':
+            return None
+        return self.create(operation_id, area['coordinates'][0])
+
+    async def load(self, operation_id: int) -> Optional[CoverageGrid]:
+        if operation_id in self.grids:
+            return self.grids[operation_id]
+        try:
+            row = await self.db.fetchone(
+                "SELECT data FROM coverage_grids WHERE operation_id = ?", (operation_id,)
+            )
+        except Exception as e:
+            logger.error(f"Error loading coverage grid: {e}")
+            return None
+        if not row:
+            return None
+        grid = CoverageGrid.from_blob(row[0])
+        self.grids[operation_id] = grid
+        return grid
+
+    async def save(self, operation_id: int) -> bool:
+        grid = self.grids.get(operation_id)
+        if not grid:
+            return False
+        try:
+            # Упаковка и сжатие сетки - в потоке, не в цикле событий
+            blob = await asyncio.get_running_loop().run_in_executor(None, grid.to_blob)
+            await self.db.execute("""
+                INSERT OR REPLACE INTO coverage_grids (operation_id, data, updated_at)
+                VALUES (?, ?, CURRENT_TIMESTAMP)
+            """, (operation_id, blob))
+            self._dirty.discard(operation_id)
+            return True
+        except Exception as e:
+            logger.error(f"Error saving coverage grid: {e}")
+            return False
+
+    # ---- живые точки ----
+
+    def submit(self, operation_id: int, track_id: Optional[int], latitude: float, longitude: float,
+               user_id: Optional[int] = None):
+        """Точка трека в буфер операции; растеризуется при ближайшем ``flush``"""
+        self._pending.setdefault(operation_id, []).append((track_id, user_id, latitude, longitude))
+
+    @staticmethod
+    def _rasterize(grid: CoverageGrid, points: List[Tuple[Optional[int], Optional[int], float, float]]):
+        tracks: Dict[Tuple[Optional[int], Optional[int]], Tuple[List[float], List[float]]] = {}
+        for track_id, user_id, latitude, longitude in points:
+            lat, lon = tracks.setdefault((track_id, user_id), ([], []))
+            lat.append(latitude)
+            lon.append(longitude)
+        for (track_id, user_id), (lat, lon) in tracks.items():
+            if track_id is None:
+                # Без трека непрерывность маршрута неизвестна: только отпечатки точек
+                grid.add_points(lat, lon, connect=False)
+            else:
+                grid.add_points(lat, lon, track_id=(track_id, user_id))
+
+    async def flush(self) -> int:
+        """Растеризация буфера и запись измененных сеток, возвращает число точек"""
+        async with self._lock:
+            pending, self._pending = self._pending, {}
+            added = 0
+            loop = asyncio.get_running_loop()
+            for operation_id, points in pending.items():
+                grid = await self.ensure(operation_id)
+                if not grid:
+                    continue
+                await loop.run_in_executor(None, self._rasterize, grid, points)
+                self._dirty.add(operation_id)
+                added += len(points)
+            for operation_id in list(self._dirty):
+                await self.save(operation_id)
+            return added
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Остановка фоновой записи с сохранением накопленного"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Coverage grid flush failed: {e}")
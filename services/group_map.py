@@ -0,0 +1,186 @@
+import json
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import folium
+from branca.element import MacroElement
+from jinja2 import Template
+
+from config.api_config import MAP_CENTER, MAP_ZOOM
+
+logger = logging.getLogger(__name__)
+
+# Место в готовом HTML, куда подставляется слой участников
+MARKERS_PLACEHOLDER = '"__GROUP_MAP_MARKERS__"'
+
+SECTOR_COLORS = {
+    'pending': 'gray',
+    'in_progress': 'orange',
+    'completed': 'green'
+}
+
+
+class _MemberLayer(MacroElement):
+    """Скрипт, рисующий участников из подставленного JSON"""
+
+    _template = Template(u"""
+        {% macro script(this, kwargs) %}
+            (function () {
+                var map = {{ this._parent.get_name() }};
+                var members = """ + MARKERS_PLACEHOLDER + """;
+                var bounds = [];
+                members.forEach(function (member) {
+                    L.circleMarker([member.lat, member.lon], {
+                        radius: 7, color: member.color, fillOpacity: 0.8
+                    }).bindPopup(member.label).addTo(map);
+                    bounds.push([member.lat, member.lon]);
+                });
+                if ({{ this.fit_members|tojson }} && bounds.length) {
+                    map.fitBounds(bounds, {maxZoom: 16});
+                }
+            })();
+        {% endmacro %}
+    """)
+
+    def __init__(self, fit_members: bool):
+        super().__init__()
+        self._name = 'MemberLayer'
+        self.fit_members = fit_members
+
+
+def build_base_layer(sectors: List[Dict], points: List[Dict]) -> Tuple[str, str]:
+    """Базовый слой карты группы: секторы и важные точки.
+
+    Карта собирается через folium один раз и делится на две части по
+    месту слоя участников. Возвращает (начало, конец) HTML.
+    """
+    m = folium.Map(location=MAP_CENTER, zoom_start=MAP_ZOOM)
+    bounds = []
+
+    for sector in sectors:
+        try:
+            ring = json.loads(sector['boundaries'])['coordinates'][0]
+        except (KeyError, IndexError, TypeError, ValueError):
+            logger.warning(f"Skipping sector {sector.get('sector_id')} with malformed boundaries")
+            continue
+        # GeoJSON хранит [lon, lat], folium ждет [lat, lon]
+        locations = [[lat, lon] for lon, lat in (point[:2] for point in ring)]
+        folium.Polygon(
+            locations=locations,
+            popup=sector.get('name'),
+            color=SECTOR_COLORS.get(sector.get('status'), 'blue'),
+            fill=True,
+            fill_opacity=0.15
+        ).add_to(m)
+        bounds.extend(locations)
+
+    for point in points:
+        if point.get('latitude') is None or point.get('longitude') is None:
+            continue
+        folium.Marker(
+            location=[point['latitude'], point['longitude']],
+            popup=point.get('description') or point.get('name'),
+            icon=folium.Icon(color='red', icon='info-sign')
+        ).add_to(m)
+        bounds.append([point['latitude'], point['longitude']])
+
+    if bounds:
+        m.fit_bounds(bounds)
+    # Без секторов и точек карта центрируется по участникам
+    _MemberLayer(fit_members=not bounds).add_to(m)
+
+    html = m.get_root().render()
+    head, found, tail = html.partition(MARKERS_PLACEHOLDER)
+    if not found:
+        raise RuntimeError("Member layer placeholder is missing in rendered map")
+    return head, tail
+
+
+def base_fingerprint(sectors: List[Dict], points: List[Dict]) -> int:
+    """Отпечаток базового слоя: меняется при изменении секторов или точек"""
+    return hash((
+        tuple((s.get('sector_id'), s.get('boundaries'), s.get('status'), s.get('name')) for s in sectors),
+        tuple((p.get('latitude'), p.get('longitude'), p.get('description')) for p in points)
+    ))
+
+
+def _member_marker(user_id, location: Dict) -> str:
+    return json.dumps({
+        'lat': location['latitude'],
+        'lon': location['longitude'],
+        'color': location.get('color', 'blue'),
+        'label': location.get('name') or str(user_id)
+    }, ensure_ascii=False).replace('</', '<\\/')  # имя не должно закрыть <script>
+
+
+class GroupMapRenderer:
+    """Инкрементальная отрисовка карт групп.
+
+    Базовый слой (секторы и важные точки) рендерится через folium один раз
+    и хранится до изменения отпечатка. На каждое обновление заново
+    сериализуются только маркеры участников, сменившие позицию, и
+    подставляются в готовый HTML.
+    """
+
+    def __init__(self):
+        self._base: Dict[int, Tuple[int, str, str]] = {}  # group_id: (отпечаток, начало, конец)
+        self._markers: Dict[int, Dict[int, Tuple[tuple, str]]] = {}  # group_id: {user_id: (позиция, JSON)}
+        self._layers: Dict[int, str] = {}  # group_id: последний слой участников
+        self.versions: Dict[int, int] = {}  # group_id: номер версии слоя участников
+        self.base_builds = 0
+
+    def has_base(self, group_id: int, fingerprint: Optional[int] = None) -> bool:
+        cached = self._base.get(group_id)
+        return cached is not None and (fingerprint is None or cached[0] == fingerprint)
+
+    def set_base(self, group_id: int, sectors: List[Dict], points: List[Dict]):
+        """Пересборка базового слоя, если секторы или точки изменились"""
+        fingerprint = base_fingerprint(sectors, points)
+        if self.has_base(group_id, fingerprint):
+            return
+        head, tail = build_base_layer(sectors, points)
+        self._base[group_id] = (fingerprint, head, tail)
+        self.base_builds += 1
+
+    def invalidate(self, group_id: int):
+        """Сброс базового слоя группы (например, после изменения секторов)"""
+        self._base.pop(group_id, None)
+
+    def forget(self, group_id: int):
+        self.invalidate(group_id)
+        self._markers.pop(group_id, None)
+        self._layers.pop(group_id, None)
+        self.versions.pop(group_id, None)
+
+    def marker_layer(self, group_id: int, members: Dict[int, Dict]) -> str:
+        """JSON слоя участников; сериализуются только изменившиеся маркеры"""
+        cache = self._markers.setdefault(group_id, {})
+        for user_id in set(cache) - set(members):
+            del cache[user_id]
+        for user_id, location in members.items():
+            key = (location['latitude'], location['longitude'],
+                   location.get('color'), location.get('name'))
+            cached = cache.get(user_id)
+            if cached is None or cached[0] != key:
+                cache[user_id] = (key, _member_marker(user_id, location))
+
+        layer = '[' + ','.join(cache[user_id][1] for user_id in sorted(cache)) + ']'
+        if self._layers.get(group_id) != layer:
+            self._layers[group_id] = layer
+            self.versions[group_id] = self.versions.get(group_id, 0) + 1
+        return layer
+
+    def render(self, group_id: int, members: Dict[int, Dict]) -> str:
+        """HTML карты группы из кэшированного базового слоя и текущих позиций"""
+        if group_id not in self._base:
+            self.set_base(group_id, [], [])
+        _, head, tail = self._base[group_id]
+        return head + self.marker_layer(group_id, members) + tail
+
+
+def members_by_user(rows: Iterable[Dict]) -> Dict[int, Dict]:
+    """Позиции участников из строк БД в виде {user_id: location}"""
+    return {
+        row['user_id']: row for row in rows
+        if row.get('latitude') is not None and row.get('longitude') is not None
+    }
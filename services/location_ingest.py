@@ -0,0 +1,188 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from config.api_config import LOCATION_BATCH_SIZE, LOCATION_BATCH_WINDOW, LOCATION_QUEUE_SIZE
+
+logger = logging.getLogger(__name__)
+
+TRACK_POINT_COLUMNS = ('track_id', 'user_id', 'latitude', 'longitude', 'accuracy', 'altitude', 'timestamp')
+
+
+class LocationIngestPipeline:
+    """Буферизованная запись GPS-точек пачками.
+
+    Точки складываются в ограниченную очередь; фоновая задача забирает их
+    пачками по ``batch_size`` точек или по истечении ``batch_window`` секунд
+    и записывает одной транзакцией через ``copy_records`` (COPY в PostgreSQL,
+    ``executemany`` в SQLite). Если очередь заполнена, ``submit`` ждет
+    освобождения места (backpressure).
+    """
+
+    def __init__(self, db_manager, batch_size: int = LOCATION_BATCH_SIZE,
+                 batch_window: float = LOCATION_BATCH_WINDOW,
+                 max_queue: int = LOCATION_QUEUE_SIZE):
+        self.db = db_manager
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._task: Optional[asyncio.Task] = None
+        self._stats = {
+            'points_written': 0,
+            'batches': 0,
+            'failed_points': 0,
+            'last_flush_ms': 0.0,
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """Запуск фоновой задачи записи"""
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Запись оставшихся точек и остановка"""
+        if not self.running:
+            return
+        await self.queue.put(None)
+        await self._task
+        self._task = None
+
+    async def submit(self, track_id: int, user_id: int, latitude: float, longitude: float,
+                     accuracy: Optional[float] = None, altitude: Optional[float] = None,
+                     timestamp: Optional[datetime] = None):
+        """Постановка точки в очередь (ждет, если очередь заполнена)
+
+        COPY в PostgreSQL принимает для колонки TIMESTAMP только datetime,
+        поэтому строка ISO 8601 разбирается здесь.
+        """
+        if not self.running:
+            self.start()
+        if isinstance(timestamp, str):
+            timestamp = datetime.fromisoformat(timestamp)
+        await self.queue.put((
+            track_id, user_id, latitude, longitude, accuracy, altitude,
+            timestamp or datetime.now()
+        ))
+
+    async def flush(self):
+        """Ожидание записи всех точек, поставленных в очередь"""
+        if self.running:
+            await self.queue.join()
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                return
+            batch = [item]
+            stop = False
+            deadline = loop.time() + self.batch_window
+            while len(batch) < self.batch_size:
+                if not self.queue.empty():
+                    item = self.queue.get_nowait()
+                else:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self.queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+
+            await self._write_batch(batch)
+            for _ in range(len(batch) + (1 if stop else 0)):
+                self.queue.task_done()
+            if stop:
+                return
+
+    async def _write_batch(self, rows: List[tuple]):
+        started = time.perf_counter()
+        try:
+            await self.db.copy_records('track_points', TRACK_POINT_COLUMNS, rows)
+        except Exception as e:
+            logger.error(f"Error writing {len(rows)} track points: {e}")
+            self._stats['failed_points'] += len(rows)
+            return
+
+        self._stats['points_written'] += len(rows)
+        self._stats['batches'] += 1
+        self._stats['last_flush_ms'] = (time.perf_counter() - started) * 1000
+
+    def get_stats(self) -> Dict:
+        """Статистика пайплайна"""
+        return {**self._stats, 'queue_size': self.queue.qsize()}
+
+
+class MapRefreshDebouncer:
+    """Планировщик обновления карт групп.
+
+    Обновления группы, пришедшие в течение ``delay`` секунд, объединяются
+    в одну перерисовку, и перерисовки одной группы начинаются не чаще
+    раза в ``interval`` секунд. Если позиции изменились во время
+    перерисовки, следующая выполняется по истечении интервала.
+    """
+
+    def __init__(self, refresh: Callable[[int], Awaitable[None]], delay: float,
+                 interval: Optional[float] = None):
+        self.refresh = refresh
+        self.delay = delay
+        self.interval = delay if interval is None else interval
+        self._pending: Dict[int, asyncio.Task] = {}
+        self._waiting = set()  # группы, ожидающие окна объединения
+        self._dirty = set()  # группы, обновленные во время перерисовки
+        self._last_refresh: Dict[int, float] = {}
+
+    def schedule(self, group_id: int):
+        """Планирование обновления; повторные вызовы до срабатывания объединяются"""
+        if group_id in self._waiting:
+            return
+        if group_id in self._pending:
+            self._dirty.add(group_id)
+            return
+        self._waiting.add(group_id)
+        self._pending[group_id] = asyncio.create_task(self._fire(group_id))
+
+    async def _fire(self, group_id: int):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                last = self._last_refresh.get(group_id)
+                wait = self.delay if last is None else max(self.delay, last + self.interval - loop.time())
+                self._waiting.add(group_id)
+                try:
+                    await asyncio.sleep(wait)
+                finally:
+                    self._waiting.discard(group_id)
+
+                self._last_refresh[group_id] = loop.time()
+                try:
+                    await self.refresh(group_id)
+                except Exception as e:
+                    logger.error(f"Error refreshing map of group {group_id}: {e}")
+
+                if group_id not in self._dirty:
+                    break
+                self._dirty.discard(group_id)
+        finally:
+            self._pending.pop(group_id, None)
+
+    async def cancel_all(self):
+        tasks = list(self._pending.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._pending.clear()
+        self._waiting.clear()
+        self._dirty.clear()
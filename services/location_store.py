@@ -0,0 +1,317 @@
+import os
+import asyncio
+import glob
+import logging
+import sqlite3
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from config.api_config import (
+    LOCATION_BATCH_SIZE, LOCATION_DOWNSAMPLE_AFTER_DAYS, LOCATION_DOWNSAMPLE_INTERVAL,
+    LOCATION_HEAT_PRECISION, LOCATION_HISTORY_DIR, LOCATION_RETENTION_DAYS
+)
+from config.scaling_config import SCALING_THRESHOLDS
+
+logger = logging.getLogger(__name__)
+
+SHARD_PREFIX = 'locations_'
+HOUR = 3600
+
+# user_id, operation_id, group_id, latitude, longitude, accuracy, timestamp (unix, UTC)
+Fix = Tuple[int, Optional[int], Optional[int], float, float, Optional[float], float]
+
+SHARD_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS fixes (
+        user_id INTEGER NOT NULL,
+        operation_id INTEGER,
+        group_id INTEGER,
+        latitude REAL NOT NULL,
+        longitude REAL NOT NULL,
+        accuracy REAL,
+        timestamp REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_fixes_user_time ON fixes(user_id, timestamp);
+    CREATE INDEX IF NOT EXISTS idx_fixes_operation_time ON fixes(operation_id, timestamp);
+    -- Тепловая карта накапливается при записи: ячейка x час
+    CREATE TABLE IF NOT EXISTS heat (
+        operation_id INTEGER NOT NULL,
+        hour INTEGER NOT NULL,
+        lat_cell INTEGER NOT NULL,
+        lon_cell INTEGER NOT NULL,
+        weight INTEGER NOT NULL,
+        PRIMARY KEY (operation_id, hour, lat_cell, lon_cell)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+def shard_day(timestamp: float) -> date:
+    return datetime.fromtimestamp(timestamp, timezone.utc).date()
+
+
+def _to_unix(value) -> float:
+    if value is None:
+        return time.time()
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.timestamp()
+
+
+class LocationHistoryStore:
+    """История перемещений в суточных файлах SQLite.
+
+    Каждые сутки (UTC) - отдельный файл ``locations_YYYYMMDD.db``: запись
+    идет только в файлы текущих суток, поэтому основная база не растет, а
+    удаление истории старше ``retention_days`` - удаление файлов. Шарды
+    старше ``downsample_after`` дней прореживаются до одной точки
+    пользователя на ``downsample_interval`` секунд. Тепловая карта
+    накапливается при записи в таблице ``heat`` и не зависит от
+    прореживания.
+
+    Все обращения к файлам выполняет один поток, event loop не блокируется.
+    """
+
+    def __init__(self, base_dir: str = LOCATION_HISTORY_DIR,
+                 retention_days: int = LOCATION_RETENTION_DAYS,
+                 downsample_after: int = LOCATION_DOWNSAMPLE_AFTER_DAYS,
+                 downsample_interval: float = LOCATION_DOWNSAMPLE_INTERVAL,
+                 heat_precision: int = LOCATION_HEAT_PRECISION,
+                 batch_size: int = LOCATION_BATCH_SIZE, max_open: int = 4):
+        self.base_dir = base_dir
+        self.retention_days = retention_days
+        self.downsample_after = downsample_after
+        self.downsample_interval = downsample_interval
+        self.heat_scale = 10 ** heat_precision
+        self.batch_size = batch_size
+        self.max_open = max_open
+        self._pending: List[Fix] = []
+        self._connections: Dict[date, sqlite3.Connection] = {}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='location-store')
+        self._flushing: Optional[asyncio.Task] = None
+        self._maintenance: Optional[asyncio.Task] = None
+
+    # ---- шарды ----
+
+    def shard_path(self, day: date) -> str:
+        return os.path.join(self.base_dir, f"{SHARD_PREFIX}{day:%Y%m%d}.db")
+
+    def shard_days(self) -> List[date]:
+        """Сутки, для которых есть файлы, по возрастанию"""
+        days = []
+        for path in glob.glob(os.path.join(self.base_dir, f"{SHARD_PREFIX}*.db")):
+            try:
+                days.append(datetime.strptime(os.path.basename(path)[len(SHARD_PREFIX):-3], '%Y%m%d').date())
+            except ValueError:
+                continue
+        return sorted(days)
+
+    def _connect(self, day: date, create: bool = True) -> Optional[sqlite3.Connection]:
+        conn = self._connections.pop(day, None)
+        if conn is None:
+            path = self.shard_path(day)
+            if not create and not os.path.exists(path):
+                return None
+            os.makedirs(self.base_dir, exist_ok=True)
+            conn = sqlite3.connect(path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SHARD_SCHEMA)
+        # Открытыми держим только последние шарды (обычно текущие сутки)
+        self._connections[day] = conn
+        while len(self._connections) > self.max_open:
+            oldest = next(iter(self._connections))
+            self._connections.pop(oldest).close()
+        return conn
+
+    def _close(self, day: date):
+        conn = self._connections.pop(day, None)
+        if conn:
+            conn.close()
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    # ---- запись ----
+
+    def add(self, user_id: int, latitude: float, longitude: float, operation_id: Optional[int] = None,
+            group_id: Optional[int] = None, accuracy: Optional[float] = None, timestamp=None):
+        """Добавление точки в буфер; запись пачками в фоне"""
+        self._pending.append((user_id, operation_id, group_id, latitude, longitude,
+                              accuracy, _to_unix(timestamp)))
+        if len(self._pending) >= self.batch_size and (self._flushing is None or self._flushing.done()):
+            self._flushing = asyncio.ensure_future(self.flush())
+
+    async def flush(self):
+        """Запись накопленных точек"""
+        while self._pending:
+            batch, self._pending = self._pending, []
+            try:
+                await self._run(self._write, batch)
+            except Exception as e:
+                logger.error(f"Error writing {len(batch)} location fixes: {e}")
+
+    def _write(self, fixes: Sequence[Fix]):
+        by_day: Dict[date, List[Fix]] = {}
+        for fix in fixes:
+            by_day.setdefault(shard_day(fix[6]), []).append(fix)
+
+        for day, rows in by_day.items():
+            heat = Counter(
+                (operation_id, int(timestamp // HOUR),
+                 round(latitude * self.heat_scale), round(longitude * self.heat_scale))
+                for _, operation_id, _, latitude, longitude, _, timestamp in rows
+                if operation_id is not None
+            )
+            conn = self._connect(day)
+            with conn:
+                conn.executemany("INSERT INTO fixes VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+                conn.executemany("""
+                    INSERT INTO heat (operation_id, hour, lat_cell, lon_cell, weight)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT (operation_id, hour, lat_cell, lon_cell)
+                    DO UPDATE SET weight = weight + excluded.weight
+                """, [(*key, weight) for key, weight in heat.items()])
+
+    # ---- чтение ----
+
+    def _days(self, since: float, until: float) -> Iterator[date]:
+        day, last = shard_day(since), shard_day(until)
+        while day <= last:
+            yield day
+            day += timedelta(days=1)
+
+    async def heatmap(self, operation_id: int, since=None, until=None) -> List[Dict]:
+        """Тепловая карта операции за период (по умолчанию - последние сутки)"""
+        until = _to_unix(until)
+        since = _to_unix(since) if since is not None else until - 24 * HOUR
+        await self.flush()
+        cells = await self._run(self._heatmap, operation_id, since, until)
+        return [
+            {'latitude': lat / self.heat_scale, 'longitude': lon / self.heat_scale, 'weight': weight}
+            for (lat, lon), weight in cells.items()
+        ]
+
+    def _heatmap(self, operation_id: int, since: float, until: float) -> Counter:
+        cells = Counter()
+        for day in self._days(since, until):
+            conn = self._connect(day, create=False)
+            if conn is None:
+                continue
+            for lat, lon, weight in conn.execute("""
+                SELECT lat_cell, lon_cell, SUM(weight) FROM heat
+                WHERE operation_id = ? AND hour BETWEEN ? AND ?
+                GROUP BY lat_cell, lon_cell
+            """, (operation_id, int(since // HOUR), int(until // HOUR))):
+                cells[(lat, lon)] += weight
+        return cells
+
+    async def fixes(self, since, until=None, user_id: Optional[int] = None,
+                    operation_id: Optional[int] = None) -> List[Fix]:
+        """Точки за период по пользователю и/или операции, по времени"""
+        await self.flush()
+        return await self._run(self._fixes, _to_unix(since), _to_unix(until), user_id, operation_id)
+
+    def _fixes(self, since: float, until: float, user_id: Optional[int],
+               operation_id: Optional[int]) -> List[Fix]:
+        conditions, params = ["timestamp BETWEEN ? AND ?"], [since, until]
+        if user_id is not None:
+            conditions.append("user_id = ?")
+            params.append(user_id)
+        if operation_id is not None:
+            conditions.append("operation_id = ?")
+            params.append(operation_id)
+        result = []
+        for day in self._days(since, until):
+            conn = self._connect(day, create=False)
+            if conn is not None:
+                result += conn.execute(
+                    f"SELECT * FROM fixes WHERE {' AND '.join(conditions)} ORDER BY timestamp", params
+                ).fetchall()
+        return result
+
+    # ---- обслуживание ----
+
+    async def maintain(self, today: Optional[date] = None) -> Dict:
+        """Прореживание старых шардов и удаление шардов вне срока хранения"""
+        today = today or datetime.now(timezone.utc).date()
+        await self.flush()
+        return await self._run(self._maintain, today)
+
+    def _maintain(self, today: date) -> Dict:
+        result = {'pruned': [], 'downsampled': []}
+        for day in self.shard_days():
+            age = (today - day).days
+            if age > self.retention_days:
+                self._drop(day)
+                result['pruned'].append(day)
+            elif age > self.downsample_after and self._downsample(day):
+                result['downsampled'].append(day)
+
+        size = self.total_size()
+        if size > SCALING_THRESHOLDS['database']['size_warning']:
+            logger.warning(f"Location history uses {size / 2 ** 30:.1f} GB, consider shorter retention")
+        return result
+
+    def _drop(self, day: date):
+        self._close(day)
+        path = self.shard_path(day)
+        for suffix in ('', '-wal', '-shm'):
+            try:
+                os.remove(path + suffix)
+            except FileNotFoundError:
+                pass
+
+    def _downsample(self, day: date) -> bool:
+        """Одна точка пользователя на интервал; повторно шард не обрабатывается"""
+        conn = self._connect(day)
+        done = conn.execute("SELECT value FROM meta WHERE name = 'downsampled'").fetchone()
+        if done:
+            return False
+        with conn:
+            conn.execute("""
+                DELETE FROM fixes WHERE rowid NOT IN (
+                    SELECT MIN(rowid) FROM fixes
+                    GROUP BY user_id, CAST(timestamp / ? AS INTEGER)
+                )
+            """, (self.downsample_interval,))
+            conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('downsampled', ?)",
+                         (str(self.downsample_interval),))
+        conn.execute("VACUUM")
+        self._close(day)
+        return True
+
+    def total_size(self) -> int:
+        """Размер всех файлов истории в байтах"""
+        return sum(os.path.getsize(path) for path in
+                   glob.glob(os.path.join(self.base_dir, f"{SHARD_PREFIX}*.db*")))
+
+    def start(self, interval: float = HOUR):
+        """Фоновое обслуживание раз в ``interval`` секунд"""
+        if self._maintenance is None or self._maintenance.done():
+            self._maintenance = asyncio.create_task(self._maintenance_loop(interval))
+
+    async def _maintenance_loop(self, interval: float):
+        while True:
+            try:
+                await self.maintain()
+            except Exception as e:
+                logger.error(f"Location history maintenance failed: {e}")
+            await asyncio.sleep(interval)
+
+    async def close(self):
+        if self._maintenance:
+            self._maintenance.cancel()
+            await asyncio.gather(self._maintenance, return_exceptions=True)
+            self._maintenance = None
+        await self.flush()
+
+        def close_all():
+            for day in list(self._connections):
+                self._close(day)
+
+        await self._run(close_all)
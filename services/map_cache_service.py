@@ -1,86 +1,215 @@
 import os
-import hashlib
-import requests
-from typing import Tuple, List, Optional
+import asyncio
+import logging
 import sqlite3
-from datetime import datetime, timedelta
-import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import aiohttp
+
+from config.api_config import (
+    CACHE_LIFETIME, TILE_MAX_CONNECTIONS, TILE_PER_HOST_LIMIT, TILE_REQUEST_TIMEOUT,
+    TILE_SOURCES, TILE_USER_AGENT
+)
+from database.executor import SQLiteExecutor
+
+logger = logging.getLogger(__name__)
+
+MAX_ZOOM = 24
+
+
+def make_tile_id(z: int, x: int, y: int, source_id: int) -> int:
+    """Целочисленный ключ тайла: source(6 бит) | z(5) | x(25) | y(25)"""
+    if not 0 <= z <= MAX_ZOOM:
+        raise ValueError(f"Unsupported zoom level: {z}")
+    return (source_id << 55) | (z << 50) | (x << 25) | y
+
 
 class MapCacheService:
-    def __init__(self, cache_dir: str = "cache/maps"):
+    """Асинхронная загрузка тайлов с кэшем в SQLite.
+
+    Соединения к серверам тайлов берутся из общего пула aiohttp с
+    ограничением на хост; одновременные запросы одного тайла ждут одну
+    загрузку. Кэш - SQLite в режиме WAL, запросы к нему выполняются в
+    пуле потоков SQLiteExecutor, а не в цикле событий; ключ тайла - целое
+    число из (z, x, y, source).
+    """
+
+    def __init__(self, cache_dir: str = "cache/maps", sources: Optional[Dict[str, str]] = None,
+                 ttl: int = CACHE_LIFETIME, max_connections: int = TILE_MAX_CONNECTIONS,
+                 per_host_limit: int = TILE_PER_HOST_LIMIT, timeout: float = TILE_REQUEST_TIMEOUT):
         self.cache_dir = cache_dir
         self.db_path = os.path.join(cache_dir, "tile_cache.db")
-        self.cache_lock = threading.Lock()
+        self.sources = dict(sources or TILE_SOURCES)
+        self.ttl = ttl
+        self.max_connections = max_connections
+        self.per_host_limit = per_host_limit
+        self.timeout = timeout
+        self.executor: Optional[SQLiteExecutor] = None
+        self.session: Optional[aiohttp.ClientSession] = None
+        self._source_ids: Dict[str, int] = {}
+        self._inflight: Dict[int, asyncio.Future] = {}
+        self.stats = {'hits': 0, 'downloads': 0, 'coalesced': 0, 'errors': 0, 'stale': 0}
         self.init_cache()
-        
+
     def init_cache(self):
-        """Инициализация кэша"""
+        """Инициализация кэша (один раз при создании сервиса)"""
         os.makedirs(self.cache_dir, exist_ok=True)
-        
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS tiles (
-                    tile_key TEXT PRIMARY KEY,
-                    data BLOB,
-                    timestamp DATETIME,
-                    expires DATETIME
-                )
+        conn = sqlite3.connect(self.db_path)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS tile_sources (
+                    source_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT UNIQUE NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS tile_data (
+                    tile_id INTEGER PRIMARY KEY,
+                    data BLOB NOT NULL,
+                    expires REAL NOT NULL
+                );
             """)
-    
-    def get_tile(self, z: int, x: int, y: int, source: str = 'osm') -> bytes:
-        """Получение тайла карты с учетом кэша"""
-        tile_key = self._make_tile_key(z, x, y, source)
-        
-        with self.cache_lock:
-            cached_tile = self._get_cached_tile(tile_key)
-            if cached_tile:
-                return cached_tile
-            
-            tile_data = self._download_tile(z, x, y, source)
-            if tile_data:
-                self._cache_tile(tile_key, tile_data)
-                return tile_data
-            
-            return self._get_fallback_tile()
-    
-    def _make_tile_key(self, z: int, x: int, y: int, source: str) -> str:
-        """Создание уникального ключа для тайла"""
-        return hashlib.md5(f"{source}/{z}/{x}/{y}".encode()).hexdigest()
-    
-    def _get_cached_tile(self, tile_key: str) -> Optional[bytes]:
-        """Получение тайла из кэша"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.execute(
-                "SELECT data, expires FROM tiles WHERE tile_key = ?", 
-                (tile_key,)
+            self._source_ids = dict(conn.execute("SELECT name, source_id FROM tile_sources"))
+        finally:
+            conn.close()
+        self.executor = SQLiteExecutor(self.db_path)
+
+    async def _source_id(self, source: str) -> int:
+        if source not in self._source_ids:
+            if source not in self.sources:
+                raise ValueError(f"Unknown tile source: {source}")
+
+            def register(conn):
+                conn.execute("INSERT OR IGNORE INTO tile_sources (name) VALUES (?)", (source,))
+                return conn.execute("SELECT source_id FROM tile_sources WHERE name = ?", (source,)).fetchone()[0]
+
+            self._source_ids[source] = await self.executor.run(register)
+        return self._source_ids[source]
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections,
+                                               limit_per_host=self.per_host_limit),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers={'User-Agent': TILE_USER_AGENT}
             )
-            result = cursor.fetchone()
-            
-            if result and result[1] and datetime.fromisoformat(result[1]) > datetime.now():
-                return result[0]
-        return None
+        return self.session
+
+    async def get_tile(self, z: int, x: int, y: int, source: str = 'osm', store: bool = True) -> bytes:
+        """Получение тайла карты с учетом кэша
+
+        ``store=False`` - не сохранять загруженный тайл (массовая выгрузка в MBTiles).
+        """
+        tile_id = make_tile_id(z, x, y, await self._source_id(source))
+        while tile_id in self._inflight:
+            pending = self._inflight[tile_id]
+            self.stats['coalesced'] += 1
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise  # отменен сам ожидающий
+                # Отменили загрузку, которую ждали: загружаем заново
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[tile_id] = future
+        try:
+            data = await self._load_tile(tile_id, z, x, y, source, store)
+            future.set_result(data)
+            return data
+        except asyncio.CancelledError:
+            # Отмена касается только владельца загрузки
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            del self._inflight[tile_id]
+
+    async def _load_tile(self, tile_id: int, z: int, x: int, y: int, source: str, store: bool) -> bytes:
+        cached = await self._get_cached_tile(tile_id)
+        if cached and cached[1] > time.time():
+            self.stats['hits'] += 1
+            return cached[0]
+
+        data = await self._download_tile(z, x, y, source)
+        if data:
+            if store:
+                await self._cache_tile(tile_id, data)
+        elif cached:
+            # Сервер недоступен - отдаем устаревший тайл
+            self.stats['stale'] += 1
+            data = cached[0]
+        else:
+            data = self._get_fallback_tile()
+        return data
+
+    async def get_tiles(self, tiles: Iterable[Tuple[int, int, int]], source: str = 'osm') -> List[bytes]:
+        """Параллельная загрузка набора тайлов (z, x, y)"""
+        return await asyncio.gather(*(self.get_tile(z, x, y, source) for z, x, y in tiles))
 
-    def _download_tile(self, z: int, x: int, y: int, source: str) -> Optional[bytes]:
+    async def has_tile(self, z: int, x: int, y: int, source: str = 'osm') -> bool:
+        """Есть ли свежий тайл в кэше"""
+        return await self.count_cached([(z, x, y)], source) == 1
+
+    async def count_cached(self, tiles: Iterable[Tuple[int, int, int]], source: str = 'osm') -> int:
+        """Число свежих тайлов набора в кэше (одно задание в пуле потоков)"""
+        source_id = await self._source_id(source)
+        tile_ids = [make_tile_id(z, x, y, source_id) for z, x, y in tiles]
+        now = time.time()
+
+        def count(conn):
+            total = 0
+            for start in range(0, len(tile_ids), 500):
+                chunk = tile_ids[start:start + 500]
+                total += conn.execute(
+                    f"SELECT COUNT(*) FROM tile_data WHERE expires > ? "
+                    f"AND tile_id IN ({', '.join('?' * len(chunk))})",
+                    (now, *chunk)
+                ).fetchone()[0]
+            return total
+
+        return await self.executor.run(count)
+
+    async def _get_cached_tile(self, tile_id: int) -> Optional[Tuple[bytes, float]]:
+        """Получение тайла из кэша: (данные, срок годности)"""
+        return await self.executor.fetchone(
+            "SELECT data, expires FROM tile_data WHERE tile_id = ?", (tile_id,)
+        )
+
+    async def _download_tile(self, z: int, x: int, y: int, source: str) -> Optional[bytes]:
         """Загрузка тайла с сервера"""
+        url = self.sources[source].format(z=z, x=x, y=y)
         try:
-            url = f"https://tile.openstreetmap.org/{z}/{x}/{y}.png"
-            response = requests.get(url)
-            if response.status_code == 200:
-                return response.content
-        except Exception as e:
-            print(f"Error downloading tile: {e}")
+            async with self._get_session().get(url) as response:
+                if response.status == 200:
+                    self.stats['downloads'] += 1
+                    return await response.read()
+                logger.warning(f"Tile {url} returned HTTP {response.status}")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f"Error downloading tile {url}: {e}")
+        self.stats['errors'] += 1
         return None
 
-    def _cache_tile(self, tile_key: str, data: bytes, ttl: int = 86400):
+    async def _cache_tile(self, tile_id: int, data: bytes):
         """Сохранение тайла в кэш"""
-        expires = datetime.now() + timedelta(seconds=ttl)
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute(
-                "INSERT OR REPLACE INTO tiles (tile_key, data, timestamp, expires) VALUES (?, ?, ?, ?)",
-                (tile_key, data, datetime.now().isoformat(), expires.isoformat())
-            )
+        await self.executor.execute(
+            "INSERT OR REPLACE INTO tile_data (tile_id, data, expires) VALUES (?, ?, ?)",
+            (tile_id, data, time.time() + self.ttl)
+        )
 
     def _get_fallback_tile(self) -> bytes:
         """Получение резервного тайла при ошибке"""
         # Здесь можно вернуть пустой или дефолтный тайл
         return b''  # Пустой тайл
+
+    async def close(self):
+        if self.session and not self.session.closed:
+            await self.session.close()
+        if self.executor:
+            # close() ждет завершения заданий пула
+            await asyncio.get_running_loop().run_in_executor(None, self.executor.close)
+            self.executor = None
@@ -1,98 +1,93 @@
-import asyncio
 from typing import List, Dict, Optional
 from datetime import datetime, timedelta
 from telegram import Bot, InlineKeyboardMarkup, InlineKeyboardButton
 import logging
 
+from core.notification_queue_manager import NotificationQueueManager
+
 logger = logging.getLogger(__name__)
 
 class NotificationManager:
     def __init__(self, bot: Bot, db_manager):
         self.bot = bot
         self.db = db_manager
-        self.notification_queue = asyncio.Queue()
+        self.notification_queue = NotificationQueueManager(bot, db_manager)
         self.notification_levels = {
             'info': '📝',
             'warning': '⚠️',
             'critical': '🚨',
             'success': '✅'
         }
+        # Приоритет в очереди: 1 - отправляется первым
+        self.level_priorities = {
+            'critical': 1,
+            'warning': 2,
+            'info': 3,
+            'success': 3
+        }
 
     async def start(self):
-        """Запуск обработчика очереди уведомлений"""
-        asyncio.create_task(self._process_queue())
+        """Запуск отправителей очереди уведомлений"""
+        await self.notification_queue.start()
 
     async def stop(self):
         """Остановка менеджера уведомлений"""
-        # Здесь можно добавить логику остановки обработчика
-        pass
-
-    async def _process_queue(self):
-        """Обработка очереди уведомлений"""
-        while True:
-            try:
-                notification = await self.notification_queue.get()
-                await self._send_notification(notification)
-                await asyncio.sleep(0.1)  # Небольшая задержка между отправками
-            except Exception as e:
-                logger.error(f"Error processing notification: {e}")
-
-    async def _send_notification(self, notification: dict):
-        """Отправка уведомления"""
-        try:
-            emoji = self.notification_levels.get(notification['level'], '📝')
-            message = f"{emoji} {notification['message']}"
-            
-            keyboard = None
-            if notification.get('buttons'):
-                keyboard = InlineKeyboardMarkup(notification['buttons'])
-            
-            await self.bot.send_message(
-                chat_id=notification['user_id'],
-                text=message,
-                parse_mode='HTML',
-                reply_markup=keyboard
-            )
-            
-            # Сохраняем в БД
-            await self.db.create_notification(
-                user_id=notification['user_id'],
-                message=notification['message'],
-                level=notification['level'],
-                created_at=datetime.now()
-            )
-            
-        except Exception as e:
-            logger.error(f"Error sending notification: {e}")
+        await self.notification_queue.stop()
 
     async def notify_user(self, user_id: int, message: str, 
                          level: str = 'info',
                          buttons: List[List[InlineKeyboardButton]] = None):
         """Добавление уведомления в очередь"""
-        await self.notification_queue.put({
-            'user_id': user_id,
-            'message': message,
-            'level': level,
-            'buttons': buttons
-        })
+        emoji = self.notification_levels.get(level, '📝')
+        await self.notification_queue.add_notification(
+            user_id,
+            f"{emoji} {message}",
+            priority=self.level_priorities.get(level, 2),
+            parse_mode='HTML',
+            reply_markup=InlineKeyboardMarkup(buttons) if buttons else None
+        )
 
     async def notify_group(self, group_id: int, message: str,
                           level: str = 'info',
                           exclude_user_id: Optional[int] = None):
         """Отправка уведомления всем участникам группы"""
+        emoji = self.notification_levels.get(level, '📝')
+        await self.notification_queue.broadcast(
+            f"{emoji} {message}",
+            group_ids=[group_id],
+            priority=self.level_priorities.get(level, 2),
+            exclude_user_ids=[exclude_user_id] if exclude_user_id else (),
+            parse_mode='HTML'
+        )
+
+    async def notify_team(self, team_id: int, message: str, level: str = 'info'):
+        """Отправка уведомления руководителю и участникам команды"""
         try:
-            users = await self.db.get_group_users(group_id)
-            for user in users:
-                if user['user_id'] != exclude_user_id:
-                    await self.notify_user(user['user_id'], message, level)
+            rows = await self.db.fetchall("""
+                SELECT leader_id FROM search_teams WHERE team_id = ?
+                UNION
+                SELECT user_id FROM team_members WHERE team_id = ?
+            """, (team_id, team_id))
+            emoji = self.notification_levels.get(level, '📝')
+            await self.notification_queue.broadcast(
+                f"{emoji} {message}",
+                user_ids=[row[0] for row in rows],
+                priority=self.level_priorities.get(level, 2),
+                parse_mode='HTML'
+            )
         except Exception as e:
-            logger.error(f"Error sending group notification: {e}")
+            logger.error(f"Error sending team notification: {e}")
 
     async def notify_coordinators(self, message: str, level: str = 'info'):
         """Отправка уведомления всем координаторам"""
         try:
-            coordinators = await self.db.get_coordinators()
-            for coord in coordinators:
-                await self.notify_user(coord['user_id'], message, level)
+            rows = await self.db.fetchall("SELECT user_id FROM users WHERE is_coordinator")
+            emoji = self.notification_levels.get(level, '📝')
+            await self.notification_queue.broadcast(
+                f"{emoji} {message}",
+                user_ids=[row[0] for row in rows],
+                priority=self.level_priorities.get(level, 2),
+                parse_mode='HTML'
+            )
         except Exception as e:
             logger.error(f"Error sending coordinator notification: {e}")
\ No newline at end of file
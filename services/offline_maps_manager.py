@@ -1,23 +1,322 @@
 import os
 import math
-from typing import Tuple, List, Optional
-import sqlite3
-from datetime import datetime
-import aiohttp
+import asyncio
+import hashlib
+import itertools
 import logging
-from PIL import Image
-import io
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import shapely
+from shapely import affinity
+from shapely.geometry import Point, Polygon
+
+from config.api_config import (
+    OFFLINE_AVG_TILE_SIZE, OFFLINE_DOWNLOAD_CONCURRENCY, OFFLINE_DOWNLOAD_RATE,
+    OFFLINE_FORBIDDEN_SOURCES, OFFLINE_MAPS_DIR, OFFLINE_TILE_SOURCE, OFFLINE_ZOOM_RANGE
+)
+from core.notification_queue_manager import TokenBucket
+from services.map_cache_service import MapCacheService
+from services.spatial_index import METERS_PER_DEGREE
 
 logger = logging.getLogger(__name__)
 
+TileXYZ = Tuple[int, int, int]  # z, x, y (схема XYZ)
+
+TILE_CHUNK = 2000  # Тайлов за один шаг перечисления в пуле потоков
+
+
+def lonlat_to_tile(lon: float, lat: float, z: int) -> Tuple[int, int]:
+    """Номер тайла Web Mercator, содержащего точку"""
+    n = 1 << z
+    lat = max(min(lat, 85.0511), -85.0511)
+    x = int((lon + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tile_lon(x, z):
+    return np.asarray(x) / (1 << z) * 360.0 - 180.0
+
+
+def tile_lat(y, z):
+    return np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * np.asarray(y) / (1 << z)))))
+
+
+def circle_area(lat: float, lon: float, radius: float) -> Polygon:
+    """Круг радиуса ``radius`` м в координатах (lon, lat)"""
+    k = math.cos(math.radians(lat))
+    circle = Point(0, 0).buffer(radius / METERS_PER_DEGREE, quad_segs=32)
+    return affinity.affine_transform(circle, [1 / k, 0, 0, 1, lon, lat])
+
+
+def enumerate_tiles(area: Polygon, zooms: Sequence[int]) -> Iterator[TileXYZ]:
+    """Тайлы, пересекающие область, по строкам (без построения полного списка)"""
+    min_lon, min_lat, max_lon, max_lat = area.bounds
+    shapely.prepare(area)
+    for z in zooms:
+        x0, y0 = lonlat_to_tile(min_lon, max_lat, z)
+        x1, y1 = lonlat_to_tile(max_lon, min_lat, z)
+        xs = np.arange(x0, x1 + 1)
+        west, east = tile_lon(xs, z), tile_lon(xs + 1, z)
+        for y in range(y0, y1 + 1):
+            north, south = float(tile_lat(y, z)), float(tile_lat(y + 1, z))
+            boxes = shapely.box(west, south, east, north)
+            for x in xs[shapely.intersects(area, boxes)]:
+                yield z, int(x), y
+
+
+async def iter_tiles(area: Polygon, zooms: Sequence[int], chunk: int = TILE_CHUNK) -> AsyncIterator[TileXYZ]:
+    """enumerate_tiles в пуле потоков: проверки shapely не занимают цикл событий"""
+    loop = asyncio.get_running_loop()
+    tiles = enumerate_tiles(area, zooms)
+    while True:
+        batch = await loop.run_in_executor(None, list, itertools.islice(tiles, chunk))
+        if not batch:
+            return
+        for tile in batch:
+            yield tile
+
+
+class MBTilesWriter:
+    """Запись тайлов в файл MBTiles.
+
+    Используется схема с дедупликацией (``map`` + ``images`` и представление
+    ``tiles``): одинаковые тайлы (вода, пустые области) хранятся один раз.
+    Повторный запуск пропускает тайлы, уже записанные в файл.
+    """
+
+    def __init__(self, path: str, metadata: Optional[Dict[str, str]] = None, batch_size: int = 500):
+        self.path = path
+        self.batch_size = batch_size
+        self._pending: List[Tuple[int, int, int, str, bytes]] = []
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS metadata (name TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS images (tile_id TEXT PRIMARY KEY, tile_data BLOB);
+            CREATE TABLE IF NOT EXISTS map (
+                zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_id TEXT,
+                PRIMARY KEY (zoom_level, tile_column, tile_row)
+            );
+            CREATE VIEW IF NOT EXISTS tiles AS
+                SELECT map.zoom_level, map.tile_column, map.tile_row, images.tile_data
+                FROM map JOIN images ON images.tile_id = map.tile_id;
+        """)
+        if metadata:
+            self.set_metadata(metadata)
+
+    def set_metadata(self, metadata: Dict[str, str]):
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO metadata (name, value) VALUES (?, ?)",
+                [(k, str(v)) for k, v in metadata.items()]
+            )
+
+    def existing(self, z: int) -> set:
+        """Уже записанные тайлы масштаба ``z`` в схеме XYZ"""
+        flip = (1 << z) - 1
+        return {(x, flip - row) for x, row in self.conn.execute(
+            "SELECT tile_column, tile_row FROM map WHERE zoom_level = ?", (z,)
+        )}
+
+    def add(self, z: int, x: int, y: int, data: bytes):
+        # MBTiles хранит строки в схеме TMS (ось Y снизу вверх)
+        self._pending.append((z, x, (1 << z) - 1 - y, hashlib.sha1(data).hexdigest(), data))
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO images (tile_id, tile_data) VALUES (?, ?)",
+                [(tile_id, data) for *_, tile_id, data in self._pending]
+            )
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO map (zoom_level, tile_column, tile_row, tile_id) VALUES (?, ?, ?, ?)",
+                [item[:4] for item in self._pending]
+            )
+        self._pending = []
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+
 class OfflineMapsManager:
-    def __init__(self):
-        self.cache = {}
-        
+    """Подготовка офлайн-карт областей в формате MBTiles.
+
+    Массовая выгрузка идет только из явно заданного источника
+    (``source`` или OFFLINE_TILE_SOURCE), разрешающего ее, и не быстрее
+    ``rate`` тайлов в секунду на все загрузки вместе.
+    """
+
+    def __init__(self, map_cache: Optional[MapCacheService] = None, maps_dir: str = OFFLINE_MAPS_DIR,
+                 concurrency: int = OFFLINE_DOWNLOAD_CONCURRENCY,
+                 source: Optional[str] = OFFLINE_TILE_SOURCE, rate: float = OFFLINE_DOWNLOAD_RATE):
+        self._map_cache = map_cache
+        # Переданный кэш закрывает его владелец, созданный здесь - close()
+        self.owns_cache = map_cache is None
+        self.maps_dir = maps_dir
+        self.concurrency = concurrency
+        self.source = source
+        self.rate_limit = TokenBucket(rate, 1)
+        os.makedirs(maps_dir, exist_ok=True)
+        self.cache = {  # регион: путь к MBTiles
+            name[:-len('.mbtiles')]: os.path.join(maps_dir, name)
+            for name in os.listdir(maps_dir) if name.endswith('.mbtiles')
+        }
+
+    @property
+    def map_cache(self) -> MapCacheService:
+        if self._map_cache is None:
+            self._map_cache = MapCacheService()
+        return self._map_cache
+
+    async def close(self):
+        """Закрытие собственного кэша тайлов (сессия HTTP и пул потоков SQLite)"""
+        if self.owns_cache and self._map_cache is not None:
+            await self._map_cache.close()
+            self._map_cache = None
+
     def check_map_availability(self, region: str) -> bool:
         """Check if map for given region is available"""
         return region in self.cache
-        
+
     def list_available_regions(self) -> list:
         """List all available map regions"""
         return list(self.cache.keys())
+
+    def region_path(self, region: str) -> str:
+        return os.path.join(self.maps_dir, f"{region}.mbtiles")
+
+    def bulk_source(self, source: Optional[str] = None) -> str:
+        """Источник для массовой выгрузки; ValueError, если он не задан или запрещен"""
+        source = source or self.source
+        if not source:
+            raise ValueError("No tile source configured for offline downloads (OFFLINE_TILE_SOURCE)")
+        if source in OFFLINE_FORBIDDEN_SOURCES:
+            raise ValueError(f"Tile source '{source}' does not allow bulk downloads")
+        if source not in self.map_cache.sources:
+            raise ValueError(f"Unknown tile source '{source}'")
+        return source
+
+    async def estimate_area(self, area: Polygon, zooms: Sequence[int] = None,
+                            source: Optional[str] = None) -> Dict:
+        """Оценка числа тайлов и объема загрузки до ее начала"""
+        source = self.bulk_source(source)
+        zooms = list(zooms or range(OFFLINE_ZOOM_RANGE[0], OFFLINE_ZOOM_RANGE[1] + 1))
+        per_zoom = {z: 0 for z in zooms}
+        cached = 0
+        for z in zooms:
+            tiles = [tile async for tile in iter_tiles(area, [z])]
+            per_zoom[z] = len(tiles)
+            cached += await self.map_cache.count_cached(tiles, source)
+        total = sum(per_zoom.values())
+        return {
+            'tiles': total,
+            'per_zoom': per_zoom,
+            'cached': cached,
+            'estimated_bytes': total * OFFLINE_AVG_TILE_SIZE,
+            'download_bytes': (total - cached) * OFFLINE_AVG_TILE_SIZE,
+        }
+
+    async def download_area(self, region: str, area: Polygon, zooms: Sequence[int] = None,
+                            source: Optional[str] = None,
+                            progress: Optional[Callable[[Dict], object]] = None,
+                            progress_interval: float = 5.0) -> Dict:
+        """Загрузка области в MBTiles.
+
+        Тайлы, уже записанные в файл региона, пропускаются (возобновление
+        прерванной загрузки); тайлы из кэша не скачиваются повторно.
+        ``progress`` вызывается не чаще раза в ``progress_interval`` секунд
+        и в конце со словарем статистики.
+        """
+        source = self.bulk_source(source)
+        zooms = list(zooms or range(OFFLINE_ZOOM_RANGE[0], OFFLINE_ZOOM_RANGE[1] + 1))
+        min_lon, min_lat, max_lon, max_lat = area.bounds
+        metadata = {
+            'name': region,
+            'format': 'png',
+            'type': 'baselayer',
+            'version': '1.1',
+            'bounds': f"{min_lon},{min_lat},{max_lon},{max_lat}",
+            'minzoom': min(zooms),
+            'maxzoom': max(zooms),
+        }
+        # Файл MBTiles пишется синхронным sqlite3 в отдельном потоке;
+        # соединение создается и используется только этим потоком
+        loop = asyncio.get_running_loop()
+        io = ThreadPoolExecutor(max_workers=1, thread_name_prefix='mbtiles-writer')
+
+        def run(fn, *args):
+            return loop.run_in_executor(io, fn, *args)
+
+        try:
+            writer = await run(MBTilesWriter, self.region_path(region), metadata)
+        except Exception:
+            io.shutdown(wait=False)
+            raise
+        stats = {'total': 0, 'done': 0, 'skipped': 0, 'failed': 0, 'bytes': 0}
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 4)
+        last_report = time.monotonic()
+
+        async def report(force: bool = False):
+            nonlocal last_report
+            if progress and (force or time.monotonic() - last_report >= progress_interval):
+                last_report = time.monotonic()
+                result = progress(dict(stats))
+                if asyncio.iscoroutine(result):
+                    await result
+
+        async def worker():
+            while True:
+                tile = await queue.get()
+                try:
+                    if tile is None:
+                        return
+                    if not await self.map_cache.has_tile(*tile, source):
+                        # Запросы к серверу тайлов - не чаще self.rate_limit
+                        await self.rate_limit.acquire()
+                    data = await self.map_cache.get_tile(*tile, source=source, store=False)
+                    if data:
+                        await run(writer.add, *tile, data)
+                        stats['done'] += 1
+                        stats['bytes'] += len(data)
+                    else:
+                        stats['failed'] += 1
+                    await report()
+                finally:
+                    queue.task_done()
+
+        workers = [asyncio.create_task(worker()) for _ in range(self.concurrency)]
+        try:
+            for z in zooms:
+                existing = await run(writer.existing, z)
+                async for tile in iter_tiles(area, [z]):
+                    stats['total'] += 1
+                    if (tile[1], tile[2]) in existing:
+                        stats['skipped'] += 1
+                        continue
+                    await queue.put(tile)
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            for task in workers:
+                task.cancel()
+            try:
+                await run(writer.close)
+            finally:
+                io.shutdown(wait=False)
+
+        self.cache[region] = writer.path
+        await report(force=True)
+        return stats
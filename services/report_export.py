@@ -0,0 +1,247 @@
+import asyncio
+import csv
+import json
+import logging
+import queue
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import aclosing
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterable, List, Sequence, Union
+
+import xlsxwriter
+
+from config.settings import REPORT_EXPORT_BATCH, REPORT_EXPORT_WORKERS
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = {'xlsx': '.xlsx', 'csv': '.csv', 'jsonl': '.jsonl'}
+
+# Общий пул потоков записи файлов: xlsxwriter и csv блокируют event loop
+_executor = ThreadPoolExecutor(max_workers=REPORT_EXPORT_WORKERS, thread_name_prefix='report-export')
+
+Rows = Union[Iterable[Sequence], AsyncIterator[List[Sequence]]]
+
+_END = object()
+
+
+class ReportSection:
+    """Раздел отчета: лист Excel / блок CSV.
+
+    ``rows`` - обычный итерируемый набор строк или асинхронный генератор
+    пачек строк (например, ``DatabaseManager.iterate``).
+    """
+
+    def __init__(self, name: str, headers: Sequence[str], rows: Rows):
+        self.name = name
+        self.headers = list(headers)
+        self.rows = rows
+
+
+def dict_rows(items: Iterable[Dict], keys: Sequence[str]) -> Iterable[List]:
+    """Строки из словарей по списку ключей"""
+    return ([item.get(key) if hasattr(item, 'get') else item[key] for key in keys] for item in items)
+
+
+def report_sections(report_data: Dict, titles: Dict[str, str] = None) -> List[ReportSection]:
+    """Разделы из словаря отчета: словари - "параметр/значение", списки словарей - таблицы"""
+    titles = titles or {}
+    sections = []
+    for key, value in report_data.items():
+        title = titles.get(key, key)
+        if isinstance(value, dict):
+            sections.append(ReportSection(title, ['Параметр', 'Значение'], list(value.items())))
+        elif isinstance(value, list) and value and hasattr(value[0], 'keys'):
+            headers = list(value[0].keys())
+            sections.append(ReportSection(title, headers, dict_rows(value, headers)))
+    return sections
+
+
+def _cell(value: Any) -> Any:
+    if value is None or isinstance(value, (int, float, str)):
+        return value
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (dict, list, tuple)):
+        return json.dumps(value, ensure_ascii=False, default=str)
+    return str(value)
+
+
+class _XlsxSink:
+    def __init__(self, path: Path):
+        # constant_memory: строки сбрасываются на диск по мере записи
+        self.workbook = xlsxwriter.Workbook(str(path), {'constant_memory': True})
+        self.header_format = self.workbook.add_format({
+            'bold': True,
+            'bg_color': '#4CAF50',
+            'color': 'white'
+        })
+        self.sheet = None
+        self.row = 0
+
+    def section(self, name: str, headers: List[str]):
+        self.sheet = self.workbook.add_worksheet(name[:31])
+        self.sheet.write_row(0, 0, headers, self.header_format)
+        self.row = 1
+
+    def rows(self, rows: List[Sequence]):
+        for values in rows:
+            self.sheet.write_row(self.row, 0, [_cell(v) for v in values])
+            self.row += 1
+
+    def close(self):
+        self.workbook.close()
+
+
+class _CsvSink:
+    def __init__(self, path: Path):
+        self.file = open(path, 'w', newline='', encoding='utf-8-sig')
+        self.writer = csv.writer(self.file)
+        self.first = True
+
+    def section(self, name: str, headers: List[str]):
+        if not self.first:
+            self.writer.writerow([])
+        self.first = False
+        self.writer.writerow([name])
+        self.writer.writerow(headers)
+
+    def rows(self, rows: List[Sequence]):
+        self.writer.writerows([_cell(v) for v in values] for values in rows)
+
+    def close(self):
+        self.file.close()
+
+
+class _JsonLinesSink:
+    def __init__(self, path: Path):
+        self.file = open(path, 'w', encoding='utf-8')
+        self.name = None
+        self.headers: List[str] = []
+
+    def section(self, name: str, headers: List[str]):
+        self.name, self.headers = name, headers
+
+    def rows(self, rows: List[Sequence]):
+        self.file.writelines(
+            json.dumps({'section': self.name, **dict(zip(self.headers, values))},
+                       ensure_ascii=False, default=str) + '\n'
+            for values in rows
+        )
+
+    def close(self):
+        self.file.close()
+
+
+_SINKS = {'xlsx': _XlsxSink, 'csv': _CsvSink, 'jsonl': _JsonLinesSink}
+
+
+class StreamingReportExporter:
+    """Потоковый экспорт отчета в файл.
+
+    Строки читаются пачками в event loop и через ограниченную очередь
+    передаются потоку записи, поэтому в памяти одновременно находится не
+    больше ``max_batches`` пачек, а форматирование файла не блокирует loop.
+    Результат - путь к файлу, который можно открыть и отдать Telegram.
+    """
+
+    def __init__(self, spool_dir: Union[str, Path, None] = None,
+                 batch_size: int = REPORT_EXPORT_BATCH, max_batches: int = 8):
+        self.spool_dir = Path(spool_dir) if spool_dir else None
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+
+    def spool_path(self, suffix: str) -> Path:
+        """Новый файл во временном каталоге отчетов"""
+        if self.spool_dir:
+            self.spool_dir.mkdir(parents=True, exist_ok=True)
+        spool = tempfile.NamedTemporaryFile(prefix='report_', suffix=suffix,
+                                            dir=self.spool_dir, delete=False)
+        spool.close()
+        return Path(spool.name)
+
+    async def export(self, sections: Iterable[ReportSection], format: str = 'xlsx',
+                     path: Union[str, Path, None] = None) -> Path:
+        if format not in EXPORT_FORMATS:
+            raise ValueError(f"Unsupported format: {format}")
+        path = Path(path) if path else self.spool_path(EXPORT_FORMATS[format])
+        channel: queue.Queue = queue.Queue(maxsize=self.max_batches)
+        writer = asyncio.get_running_loop().run_in_executor(_executor, self._write, format, path, channel)
+
+        try:
+            for section in sections:
+                await self._put(channel, writer, ('section', section.name, section.headers))
+                async for batch in self._batches(section.rows):
+                    await self._put(channel, writer, ('rows', batch))
+            await self._put(channel, writer, _END)
+        except BaseException:
+            # Поток записи завершается без ожидания новых строк, файл удаляется
+            self._abort(channel)
+            writer.add_done_callback(lambda _: path.unlink(missing_ok=True))
+            raise
+        await writer
+        return path
+
+    async def export_json(self, report_data: Dict, path: Union[str, Path, None] = None) -> Path:
+        """Отчет целиком в JSON (запись в пуле потоков)"""
+        path = Path(path) if path else self.spool_path('.json')
+
+        def write():
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(report_data, f, indent=2, ensure_ascii=False, default=str)
+
+        await asyncio.get_running_loop().run_in_executor(_executor, write)
+        return path
+
+    async def _batches(self, rows: Rows):
+        if hasattr(rows, '__aiter__'):
+            async with aclosing(rows):
+                async for batch in rows:
+                    yield batch
+            return
+        batch = []
+        for values in rows:
+            batch.append(values)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    @staticmethod
+    async def _put(channel: queue.Queue, writer: asyncio.Future, item):
+        """Неблокирующая передача в поток записи с ожиданием свободного места"""
+        while True:
+            if writer.done():
+                writer.result()  # поток записи упал - пробрасываем ошибку
+                raise RuntimeError("Report writer stopped unexpectedly")
+            try:
+                channel.put_nowait(item)
+                return
+            except queue.Full:
+                await asyncio.sleep(0.005)
+
+    @staticmethod
+    def _abort(channel: queue.Queue):
+        while True:
+            try:
+                channel.get_nowait()
+            except queue.Empty:
+                break
+        channel.put_nowait(None)
+
+    @staticmethod
+    def _write(format: str, path: Path, channel: queue.Queue):
+        sink = _SINKS[format](path)
+        try:
+            while True:
+                item = channel.get()
+                if item is _END or item is None:
+                    return
+                if item[0] == 'section':
+                    sink.section(item[1], item[2])
+                else:
+                    sink.rows(item[1])
+        finally:
+            sink.close()
@@ -0,0 +1,321 @@
+import asyncio
+import logging
+from math import cos, radians
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import shapely
+
+from config.settings import SECTOR_WALKING_SPEED
+from services.track_simplify import EARTH_RADIUS_M
+
+logger = logging.getLogger(__name__)
+
+KM_PER_DEGREE = radians(1) * EARTH_RADIUS_M / 1000
+
+# Все слагаемые стоимости - в минутах
+PRIORITY_WEIGHT = 20.0  # столько минут пути "стоит" один уровень приоритета
+DIFFICULTY_PENALTY = {'easy': 0.0, 'normal': 10.0, 'hard': 30.0, 'extreme': 60.0}
+PRIORITY_LEVELS = {'low': 0, 'normal': 1, 'high': 2, 'urgent': 3, 'critical': 3}
+REFERENCE_TEAM_SIZE = 4  # штраф за сложность задан для команды такого размера
+MAX_APPLY_ATTEMPTS = 3
+
+
+def solve_assignment(cost: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Назначение минимальной суммарной стоимости (венгерский алгоритм).
+
+    Прямоугольная матрица: каждой строке меньшего измерения достается
+    свой столбец. Бесконечная стоимость - запрет; такие пары в ответ не
+    попадают. Кратчайшие увеличивающие пути с потенциалами, внутренний
+    цикл векторизован по столбцам: O(n² m) для n <= m.
+    """
+    cost = np.array(cost, dtype=float)
+    if cost.ndim != 2 or 0 in cost.shape:
+        return np.empty(0, dtype=int), np.empty(0, dtype=int)
+    transposed = cost.shape[0] > cost.shape[1]
+    if transposed:
+        cost = cost.T
+    n, m = cost.shape
+
+    forbidden = ~np.isfinite(cost)
+    if forbidden.any():
+        finite = cost[~forbidden]
+        span = (np.abs(finite).max() if finite.size else 0.0) + 1.0
+        cost[forbidden] = span * (n + 1)
+
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    owner = np.zeros(m + 1, dtype=int)  # строка (с 1), занявшая столбец; 0 - свободен
+    way = np.zeros(m + 1, dtype=int)
+    for row in range(1, n + 1):
+        owner[0] = row
+        column = 0
+        min_reduced = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[column] = True
+            current = owner[column]
+            reduced = cost[current - 1] - u[current] - v[1:]
+            free = ~used[1:]
+            better = free & (reduced < min_reduced[1:])
+            min_reduced[1:][better] = reduced[better]
+            way[1:][better] = column
+            candidates = np.where(free, min_reduced[1:], np.inf)
+            next_column = int(candidates.argmin()) + 1
+            delta = candidates[next_column - 1]
+            u[owner[used]] += delta
+            v[used] -= delta
+            min_reduced[~used] -= delta
+            column = next_column
+            if owner[column] == 0:
+                break
+        # Разворот увеличивающего пути
+        while column:
+            previous = way[column]
+            owner[column] = owner[previous]
+            column = previous
+
+    columns = np.flatnonzero(owner[1:])
+    rows = owner[1:][columns] - 1
+    allowed = ~forbidden[rows, columns]
+    rows, columns = rows[allowed], columns[allowed]
+    if transposed:
+        rows, columns = columns, rows
+    order = np.argsort(rows)
+    return rows[order], columns[order]
+
+
+def _priority_level(value) -> float:
+    if isinstance(value, str):
+        return PRIORITY_LEVELS.get(value, 1)
+    return float(value or 0)
+
+
+def build_cost_matrix(team_positions: np.ndarray, team_sizes: np.ndarray,
+                      centroids: np.ndarray, priorities: Sequence, difficulties: Sequence) -> np.ndarray:
+    """Стоимость (в минутах) отправки каждой команды в каждый сектор.
+
+    Время пешего перехода от позиции команды до центра сектора плюс
+    штраф за сложность (меньше для больших команд) минус бонус за
+    приоритет сектора. Позиции - (lat, lon); у команды без координат
+    путь считается средним, чтобы он не влиял на выбор.
+    """
+    team_positions = np.asarray(team_positions, dtype=float).reshape(-1, 2)
+    centroids = np.asarray(centroids, dtype=float).reshape(-1, 2)
+    known = ~np.isnan(team_positions).any(axis=1)
+    if known.any():
+        ref_lat = float(np.nanmean(np.concatenate([team_positions[known, 0], centroids[:, 0]])))
+    else:
+        ref_lat = float(centroids[:, 0].mean()) if len(centroids) else 0.0
+    kx = KM_PER_DEGREE * cos(radians(ref_lat))
+
+    dy = (centroids[None, :, 0] - team_positions[:, None, 0]) * KM_PER_DEGREE
+    dx = (centroids[None, :, 1] - team_positions[:, None, 1]) * kx
+    travel = np.hypot(dx, dy) / SECTOR_WALKING_SPEED * 60
+    if known.any():
+        travel[~known] = float(np.mean(travel[known]))
+    else:
+        travel[:] = 0.0
+
+    penalty = np.array([DIFFICULTY_PENALTY.get(value, DIFFICULTY_PENALTY['normal']) for value in difficulties])
+    sizes = np.clip(np.asarray(team_sizes, dtype=float), 1, None)
+    bonus = np.array([_priority_level(value) for value in priorities]) * PRIORITY_WEIGHT
+    return travel + penalty[None, :] * (REFERENCE_TEAM_SIZE / sizes)[:, None] - bonus[None, :]
+
+
+async def claim_sector(conn, sector_id: int, team_id: int) -> bool:
+    """Условный захват свободного сектора в транзакции ``conn``"""
+    cursor = await conn.execute("""
+        UPDATE search_sectors
+        SET assigned_team = ?,
+            status = 'in_progress',
+            last_searched = CURRENT_TIMESTAMP
+        WHERE sector_id = ? AND assigned_team IS NULL AND status = 'pending'
+    """, (team_id, sector_id))
+    return cursor.rowcount == 1
+
+
+class AssignmentConflict(Exception):
+    """Сектор или команда заняты другим назначением"""
+
+
+class SectorAssignmentEngine:
+    """Распределение свободных команд операции по незанятым секторам.
+
+    Стоимость пары учитывает последние позиции участников команды,
+    центр, приоритет и сложность сектора; решение - назначение минимальной
+    суммарной стоимости. Результат применяется одной транзакцией с
+    условными UPDATE: если кто-то успел занять сектор или команду,
+    транзакция откатывается и план пересчитывается. Освободившаяся
+    команда перепланируется отдельно, остальные назначения не трогаются.
+    """
+
+    def __init__(self, db_manager, notification_manager):
+        self.db = db_manager
+        self.notification_manager = notification_manager
+        self._locks: Dict[int, asyncio.Lock] = {}
+
+    def _lock(self, operation_id: int) -> asyncio.Lock:
+        return self._locks.setdefault(operation_id, asyncio.Lock())
+
+    async def _free_teams(self, operation_id: int, team_ids: Optional[Iterable[int]]) -> List[Dict]:
+        query = """
+            SELECT t.team_id, t.leader_id,
+                   (SELECT COUNT(*) FROM team_members tm WHERE tm.team_id = t.team_id) AS members
+            FROM search_teams t
+            WHERE t.operation_id = ? AND t.status = 'active' AND t.current_sector IS NULL
+        """
+        params: List = [operation_id]
+        if team_ids is not None:
+            team_ids = list(team_ids)
+            if not team_ids:
+                return []
+            query += f" AND t.team_id IN ({', '.join('?' * len(team_ids))})"
+            params.extend(team_ids)
+        return await self.db.fetch_all(query + " ORDER BY t.team_id", tuple(params))
+
+    async def _team_positions(self, teams: List[Dict]) -> np.ndarray:
+        """Средняя последняя позиция участников (и лидера) каждой команды"""
+        positions = np.full((len(teams), 2), np.nan)
+        if not teams:
+            return positions
+        team_ids = [team['team_id'] for team in teams]
+        placeholders = ', '.join('?' * len(team_ids))
+        rows = await self.db.fetch_all(f"""
+            WITH people AS (
+                SELECT team_id, user_id FROM team_members WHERE team_id IN ({placeholders})
+                UNION
+                SELECT team_id, leader_id FROM search_teams WHERE team_id IN ({placeholders})
+            )
+            SELECT people.team_id, AVG(tp.latitude) AS latitude, AVG(tp.longitude) AS longitude
+            FROM people
+            JOIN track_points tp ON tp.point_id = (
+                SELECT point_id FROM track_points
+                WHERE user_id = people.user_id
+                ORDER BY timestamp DESC LIMIT 1
+            )
+            GROUP BY people.team_id
+        """, tuple(team_ids) * 2)
+        index = {team_id: position for position, team_id in enumerate(team_ids)}
+        for row in rows:
+            positions[index[row['team_id']]] = (row['latitude'], row['longitude'])
+        return positions
+
+    async def _open_sectors(self, operation_id: int) -> List[Dict]:
+        return await self.db.fetch_all("""
+            SELECT sector_id, boundaries, priority, difficulty
+            FROM search_sectors
+            WHERE operation_id = ? AND status = 'pending' AND assigned_team IS NULL
+            ORDER BY sector_id
+        """, (operation_id,))
+
+    async def plan(self, operation_id: int,
+                   team_ids: Optional[Iterable[int]] = None) -> List[Tuple[int, int, float]]:
+        """План назначений [(team_id, sector_id, стоимость)] без записи в БД"""
+        teams = await self._free_teams(operation_id, team_ids)
+        sectors = await self._open_sectors(operation_id) if teams else []
+        if not teams or not sectors:
+            return []
+
+        positions = await self._team_positions(teams)
+        # Центры секторов из GeoJSON границ - одним векторным вызовом
+        polygons = shapely.from_geojson(np.array([sector['boundaries'] for sector in sectors], dtype=object),
+                                        on_invalid='ignore')
+        lon_lat = shapely.get_coordinates(shapely.centroid(polygons), include_z=False)
+        # GeoJSON хранит [lon, lat]; пустые геометрии не дают координат
+        centroids = np.full((len(sectors), 2), np.nan)
+        valid = ~shapely.is_empty(polygons) & ~shapely.is_missing(polygons)
+        centroids[valid] = lon_lat[:, ::-1]
+
+        cost = build_cost_matrix(
+            positions,
+            [max(team['members'], 1) for team in teams],
+            centroids,
+            [sector['priority'] for sector in sectors],
+            [sector['difficulty'] for sector in sectors]
+        )
+        cost[:, ~valid] = np.inf
+        rows, columns = solve_assignment(cost)
+        return [(teams[row]['team_id'], sectors[column]['sector_id'], float(cost[row, column]))
+                for row, column in zip(rows.tolist(), columns.tolist())]
+
+    async def apply(self, assignments: Sequence[Tuple[int, int]]) -> None:
+        """Атомарная запись назначений; AssignmentConflict - ничего не записано"""
+        async def job(conn):
+            for team_id, sector_id in assignments:
+                if not await claim_sector(conn, sector_id, team_id):
+                    raise AssignmentConflict(f"Sector {sector_id} is already taken")
+                cursor = await conn.execute("""
+                    UPDATE search_teams SET current_sector = ?
+                    WHERE team_id = ? AND current_sector IS NULL
+                """, (sector_id, team_id))
+                if cursor.rowcount != 1:
+                    raise AssignmentConflict(f"Team {team_id} is already busy")
+
+        await self.db.run_in_transaction(job)
+
+    async def assign(self, operation_id: int,
+                     team_ids: Optional[Iterable[int]] = None) -> List[Tuple[int, int, float]]:
+        """Назначение свободных команд (всех или ``team_ids``) на секторы"""
+        team_ids = list(team_ids) if team_ids is not None else None
+        async with self._lock(operation_id):
+            for attempt in range(MAX_APPLY_ATTEMPTS):
+                plan = await self.plan(operation_id, team_ids)
+                if not plan:
+                    return []
+                try:
+                    await self.apply([(team_id, sector_id) for team_id, sector_id, _ in plan])
+                    break
+                except AssignmentConflict as e:
+                    logger.info(f"Assignment conflict in operation {operation_id}, replanning: {e}")
+            else:
+                logger.warning(f"Could not apply assignment plan for operation {operation_id}")
+                return []
+
+        # Назначения уже записаны: сбой уведомлений не должен превращаться в отказ
+        try:
+            await asyncio.gather(*(
+                self.notification_manager.notify_team(team_id, "📍 Ваша команда назначена на новый сектор")
+                for team_id, _, _ in plan
+            ), return_exceptions=True)
+        except Exception as e:
+            logger.error(f"Error notifying assigned teams in operation {operation_id}: {e}")
+        return plan
+
+    async def release_team(self, operation_id: int, team_id: int, sector_id: int,
+                           completed: bool = True, reassign: bool = True) -> Optional[int]:
+        """Освобождение команды от сектора ``sector_id`` и, при ``reassign``, назначение следующего.
+
+        Сектор и команда меняются, только если команда все еще работает
+        в этом секторе: повторный или запоздавший отчет по старому сектору
+        ничего не трогает. Возвращает ID нового сектора команды или None.
+        """
+        if completed:
+            sector_update = """
+                UPDATE search_sectors
+                SET status = 'completed', completed_at = CURRENT_TIMESTAMP
+                WHERE sector_id = ? AND assigned_team = ? AND status != 'completed'
+            """
+        else:
+            sector_update = """
+                UPDATE search_sectors
+                SET status = 'pending', assigned_team = NULL
+                WHERE sector_id = ? AND assigned_team = ? AND status != 'completed'
+            """
+
+        async def job(conn):
+            cursor = await conn.execute(sector_update, (sector_id, team_id))
+            if cursor.rowcount != 1:
+                return False
+            await conn.execute(
+                "UPDATE search_teams SET current_sector = NULL WHERE team_id = ? AND current_sector = ?",
+                (team_id, sector_id)
+            )
+            return True
+
+        async with self._lock(operation_id):
+            released = await self.db.run_in_transaction(job)
+        if not released or not reassign:
+            return None
+        plan = await self.assign(operation_id, [team_id])
+        return plan[0][1] if plan else None
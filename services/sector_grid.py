@@ -0,0 +1,304 @@
+import json
+import logging
+from math import ceil, cos, radians, sqrt
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+import shapely
+from shapely.geometry import Polygon, shape as geojson_shape
+
+from config.settings import SECTOR_GRID_MAX_CELLS, SECTOR_SWEEP_WIDTH, SECTOR_WALKING_SPEED
+from services.track_simplify import EARTH_RADIUS_M
+
+logger = logging.getLogger(__name__)
+
+SHAPES = ('square', 'hex', 'terrain')
+
+# Скорость прочесывания относительно открытой местности
+TERRAIN_SPEED = {
+    'open': 1.0,
+    'field': 1.0,
+    'urban': 0.8,
+    'forest': 0.6,
+    'mountain': 0.45,
+    'swamp': 0.35,
+}
+
+SPLIT_THRESHOLD = 1.5  # ячейка дробится, если ее прочесывание дольше цели в 1.5 раза
+MAX_SPLIT_DEPTH = 3  # не мельче 1/64 базовой ячейки
+GRID_PRECISION = 0.01  # м, сетка округления при слиянии обрезков
+
+
+class _Projection:
+    """Равнопромежуточная проекция в метры вокруг центра области"""
+
+    def __init__(self, lon0: float, lat0: float):
+        self.origin = np.array([lon0, lat0])
+        self.scale = np.array([radians(1) * EARTH_RADIUS_M * cos(radians(lat0)), radians(1) * EARTH_RADIUS_M])
+
+    def forward(self, geometry):
+        return shapely.transform(geometry, lambda xy: (xy - self.origin) * self.scale)
+
+    def inverse(self, geometry):
+        return shapely.transform(geometry, lambda xy: xy / self.scale + self.origin)
+
+
+def _as_geometry(data: Union[str, Dict, List]):
+    """Полигон из GeoJSON (геометрия, Feature, FeatureCollection) или контура [lon, lat]"""
+    if isinstance(data, str):
+        data = json.loads(data)
+    if isinstance(data, list):
+        geometry = Polygon([point[:2] for point in data]) if len(data) >= 3 else Polygon()
+    elif data.get('type') == 'FeatureCollection':
+        geometry = shapely.union_all([_as_geometry(feature) for feature in data.get('features', [])])
+    elif data.get('type') == 'Feature':
+        geometry = _as_geometry(data.get('geometry') or {})
+    elif data.get('type') in ('Polygon', 'MultiPolygon'):
+        geometry = geojson_shape(data)
+    else:
+        geometry = Polygon()
+
+    if not geometry.is_valid:
+        geometry = shapely.make_valid(geometry)
+    # После make_valid могут остаться линии и точки - нужны только полигоны
+    parts = [part for part in shapely.get_parts(geometry) if part.geom_type == 'Polygon']
+    return shapely.union_all(parts) if parts else Polygon()
+
+
+def target_cell_area(cell_area_m2: Optional[float] = None, walking_minutes: Optional[float] = None) -> float:
+    """Площадь сектора в м²: задана явно или по времени прочесывания одним поисковиком"""
+    if cell_area_m2:
+        return float(cell_area_m2)
+    if walking_minutes:
+        return SECTOR_WALKING_SPEED * 1000 / 60 * walking_minutes * SECTOR_SWEEP_WIDTH
+    raise ValueError("Either cell_area_m2 or walking_minutes is required")
+
+
+def _row_label(row: int) -> str:
+    """Номер ряда буквами, как столбцы в таблице: A..Z, AA, AB..."""
+    label = ''
+    row += 1
+    while row:
+        row, rest = divmod(row - 1, 26)
+        label = chr(65 + rest) + label
+    return label
+
+
+def _grid_names(rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+    return np.array([f"{_row_label(row)}{col + 1}" for row, col in zip(rows.tolist(), cols.tolist())], dtype=object)
+
+
+def _square_grid(bounds: Tuple[float, ...], side: float):
+    """Квадратная сетка; ряд A - северный. Соседи делят одни и те же координаты."""
+    min_x, min_y, max_x, max_y = bounds
+    cols_count = max(1, ceil((max_x - min_x) / side))
+    rows_count = max(1, ceil((max_y - min_y) / side))
+    xs = min_x + np.arange(cols_count + 1) * side
+    ys = max_y - np.arange(rows_count + 1) * side
+    cols, rows = (grid.ravel() for grid in np.meshgrid(np.arange(cols_count), np.arange(rows_count)))
+    boxes = np.column_stack([xs[cols], ys[rows + 1], xs[cols + 1], ys[rows]])
+    return boxes, _grid_names(rows, cols)
+
+
+def _hex_grid(bounds: Tuple[float, ...], area: float):
+    """Шестиугольники (вершиной вверх) площади ``area``; нечетные ряды сдвинуты"""
+    min_x, min_y, max_x, max_y = bounds
+    size = sqrt(2 * area / (3 * sqrt(3)))
+    width, step = sqrt(3) * size, 1.5 * size
+    cols_count = ceil((max_x - min_x) / width) + 1
+    rows_count = ceil((max_y - min_y) / step) + 1
+    cols, rows = (grid.ravel() for grid in np.meshgrid(np.arange(cols_count), np.arange(rows_count)))
+    centers = np.column_stack([min_x + cols * width + (rows % 2) * width / 2, max_y - rows * step])
+    angles = np.radians(30 + 60 * np.arange(6))
+    corners = size * np.column_stack([np.cos(angles), np.sin(angles)])
+    # Округление до мм, чтобы общие вершины соседей совпадали точно
+    coords = np.round(centers[:, None, :] + corners[None, :, :], 3)
+    return shapely.polygons(coords), _grid_names(rows, cols)
+
+
+def _terrain_zones(terrain) -> List[Tuple[object, float, str]]:
+    """(геометрия, скорость, тип) для зон местности из списка или FeatureCollection"""
+    if isinstance(terrain, str):
+        terrain = json.loads(terrain)
+    if isinstance(terrain, dict):
+        terrain = terrain.get('features', [])
+    zones = []
+    for zone in terrain or ():
+        properties = zone.get('properties') or zone
+        terrain_type = properties.get('terrain_type', 'open')
+        speed = properties.get('speed') or TERRAIN_SPEED.get(terrain_type)
+        if speed is None:
+            logger.warning(f"Unknown terrain type '{terrain_type}', treating as open ground")
+            speed = 1.0
+        geometry = _as_geometry(zone.get('geometry') or {})
+        if not geometry.is_empty:
+            zones.append((geometry, float(speed), terrain_type))
+    return zones
+
+
+def _terrain_grid(area, target: float, zones: List[Tuple[object, float, str]]):
+    """Квадраты, дробящиеся на четверти, пока время прочесывания выше цели.
+
+    В открытой местности ячейка равна целевой площади, в лесу или болоте
+    она делится, чтобы каждый сектор прочесывался примерно одинаково.
+    """
+    boxes, names = _square_grid(area.bounds, sqrt(target))
+    # Ключ сортировки: дочерние ячейки идут сразу за родительской позицией
+    keys = np.arange(len(boxes), dtype=float)
+    shapely.prepare(area)
+    final_boxes, final_names, final_keys = [], [], []
+    for depth in range(MAX_SPLIT_DEPTH + 1):
+        cells = shapely.box(*boxes.T)
+        hit = shapely.intersects(area, cells)
+        boxes, names, keys, cells = boxes[hit], names[hit], keys[hit], cells[hit]
+        clipped = shapely.intersection(cells, area)
+        cost = shapely.area(clipped)
+        for geometry, speed, _ in zones:
+            cost = cost + shapely.area(shapely.intersection(clipped, geometry)) * (1 / speed - 1)
+        split = cost > target * SPLIT_THRESHOLD
+        if depth == MAX_SPLIT_DEPTH or not split.any():
+            split[:] = False
+        final_boxes.append(boxes[~split])
+        final_names.append(names[~split])
+        final_keys.append(keys[~split])
+        if not split.any():
+            break
+
+        x0, y0, x1, y1 = boxes[split].T
+        mx, my = (x0 + x1) / 2, (y0 + y1) / 2
+        # Четверти по часовой стрелке с северо-запада
+        boxes = np.concatenate([
+            np.column_stack(quarter) for quarter in (
+                (x0, my, mx, y1), (mx, my, x1, y1), (mx, y0, x1, my), (x0, y0, mx, my))
+        ])
+        names = np.concatenate([
+            np.array([f"{name}.{quarter}" for name in names[split]], dtype=object) for quarter in range(1, 5)
+        ])
+        keys = np.concatenate([keys[split] + quarter / 4 ** (depth + 1) for quarter in range(4)])
+
+    order = np.argsort(np.concatenate(final_keys), kind='stable')
+    boxes = np.concatenate(final_boxes)[order]
+    return shapely.box(*boxes.T), np.concatenate(final_names)[order]
+
+
+def _clip(cells: np.ndarray, names: np.ndarray, area):
+    """Обрезка ячеек по границе области; ячейки, целиком внутри, не пересчитываются"""
+    shapely.prepare(area)
+    hit = shapely.intersects(area, cells)
+    cells, names = cells[hit], names[hit]
+    inside = shapely.covers(area, cells)
+    clipped = cells.copy()
+    clipped[~inside] = shapely.intersection(cells[~inside], area)
+
+    # Ячейка на вогнутой границе может распасться на несколько частей
+    parts, index = shapely.get_parts(clipped, return_index=True)
+    polygonal = (shapely.get_type_id(parts) == 3) & (shapely.area(parts) > 0)
+    parts, index = parts[polygonal], index[polygonal]
+    counts = np.bincount(index, minlength=len(names))
+    part_names = []
+    seen: Dict[int, int] = {}
+    for cell in index.tolist():
+        seen[cell] = seen.get(cell, 0) + 1
+        part_names.append(names[cell] if counts[cell] == 1 else f"{names[cell]}-{seen[cell]}")
+    return parts, part_names
+
+
+def _merge_slivers(parts: np.ndarray, names: List[str], min_area: float):
+    """Присоединение мелких обрезков к соседу с самой длинной общей границей"""
+    areas = shapely.area(parts)
+    small = np.flatnonzero(areas < min_area)
+    large = np.flatnonzero(areas >= min_area)
+    if not len(small) or not len(large):
+        return parts, names
+
+    tree = shapely.STRtree(parts[large])
+    sliver_pos, neighbour_pos = tree.query(parts[small], predicate='intersects')
+    shared = shapely.length(shapely.intersection(parts[small][sliver_pos], parts[large][neighbour_pos]))
+    touching = shared > 0
+    sliver_pos, neighbour_pos, shared = sliver_pos[touching], neighbour_pos[touching], shared[touching]
+    order = np.lexsort((-shared, sliver_pos))
+    slivers, first = np.unique(sliver_pos[order], return_index=True)
+    targets = neighbour_pos[order][first]
+
+    groups: Dict[int, List[int]] = {}
+    for sliver, target in zip(small[slivers].tolist(), large[targets].tolist()):
+        groups.setdefault(target, []).append(sliver)
+
+    merged = parts.copy()
+    dropped = set()
+    for target, members in groups.items():
+        union = shapely.union_all(parts[[target] + members], grid_size=GRID_PRECISION)
+        if union.geom_type == 'Polygon':
+            merged[target] = union
+            dropped.update(members)
+
+    keep = [index for index in range(len(parts)) if index not in dropped]
+    return merged[keep], [names[index] for index in keep]
+
+
+def grid_search_area(search_area: Union[str, Dict, List], shape: str = 'square',
+                     cell_area_m2: Optional[float] = None, walking_minutes: Optional[float] = None,
+                     terrain: Optional[Union[str, Dict, Iterable[Dict]]] = None,
+                     min_fraction: float = 0.25,
+                     max_cells: int = SECTOR_GRID_MAX_CELLS) -> List[Dict]:
+    """Нарезка области поиска на секторы.
+
+    ``shape`` - 'square', 'hex' или 'terrain' (квадраты, уменьшенные в
+    труднопроходимых зонах ``terrain``). Размер ячейки задается площадью
+    или временем прочесывания. Ячейки обрезаются по границе области
+    векторными операциями shapely 2.0, обрезки меньше ``min_fraction``
+    ячейки присоединяются к соседям. Возвращает словари секторов в формате
+    SectorManager.create_sectors (координаты [lon, lat], как в GeoJSON).
+    """
+    if shape not in SHAPES:
+        raise ValueError(f"Unknown cell shape '{shape}', expected one of {', '.join(SHAPES)}")
+    target = target_cell_area(cell_area_m2, walking_minutes)
+
+    geometry = _as_geometry(search_area)
+    if geometry.is_empty:
+        raise ValueError("Search area is empty or is not a polygon")
+    center = geometry.centroid
+    projection = _Projection(center.x, center.y)
+    area = projection.forward(geometry)
+
+    estimate = ceil(area.area / target)
+    if estimate > max_cells:
+        raise ValueError(f"Search area needs about {estimate} cells, the limit is {max_cells}")
+
+    zones = []
+    if shape == 'terrain':
+        zones = [(projection.forward(zone), speed, terrain_type)
+                 for zone, speed, terrain_type in _terrain_zones(terrain)]
+        cells, names = _terrain_grid(area, target, zones)
+    elif shape == 'hex':
+        cells, names = _hex_grid(area.bounds, target)
+    else:
+        boxes, names = _square_grid(area.bounds, sqrt(target))
+        cells = shapely.box(*boxes.T)
+
+    parts, names = _clip(cells, names, area)
+    if len(parts) > max_cells:
+        raise ValueError(f"Search area produced {len(parts)} cells, the limit is {max_cells}")
+    parts, names = _merge_slivers(parts, names, target * min_fraction)
+
+    # Тип местности сектора - зона, занимающая большую его часть
+    areas = shapely.area(parts)
+    terrain_types = np.full(len(parts), 'unknown' if shape != 'terrain' else 'open', dtype=object)
+    if zones:
+        shares = np.column_stack([shapely.area(shapely.intersection(parts, zone)) for zone, _, _ in zones])
+        dominant = shares.argmax(axis=1)
+        covered = shares[np.arange(len(parts)), dominant] >= areas / 2
+        terrain_types[covered] = np.array([zones[index][2] for index in dominant[covered]], dtype=object)
+
+    rings = shapely.get_exterior_ring(projection.inverse(parts))
+    coords, index = shapely.get_coordinates(rings, return_index=True)
+    coords = np.round(coords, 7)
+    boundaries = np.split(coords, np.flatnonzero(np.diff(index)) + 1)
+
+    return [{
+        'name': name,
+        'boundaries': ring[:-1].tolist(),  # без замыкающей точки, как в SectorManager
+        'priority': 1,
+        'terrain_type': terrain_type,
+        'area_m2': round(float(cell_area))
+    } for name, ring, terrain_type, cell_area in zip(names, boundaries, terrain_types, areas)]
@@ -0,0 +1,148 @@
+import asyncio
+import json
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import shapely
+
+from config.settings import SECTOR_VALIDATION_CHUNK, SECTOR_VALIDATION_PROCESSES
+
+logger = logging.getLogger(__name__)
+
+Ring = Sequence[Sequence[float]]
+# (ошибка или None, GeoJSON границ для записи в БД или None)
+GeometryCheck = Tuple[Optional[str], Optional[str]]
+
+
+def _open_ring(ring: Ring) -> List[List[float]]:
+    """Контур без замыкающей точки (как границы в SectorManager)"""
+    points = [list(point[:2]) for point in ring]
+    if len(points) > 3 and points[0] == points[-1]:
+        points.pop()
+    return points
+
+
+def check_sector_geometries(rings: List[Ring]) -> List[GeometryCheck]:
+    """Проверка пачки контуров секторов.
+
+    Полигоны строятся и проверяются векторно (shapely 2.0) одним вызовом
+    на пачку. Для корректных контуров сразу готовится GeoJSON, чтобы
+    сериализация тоже не выполнялась в цикле событий. Функция вызывается
+    в процессе пула, поэтому находится на уровне модуля.
+    """
+    results: List[GeometryCheck] = [(None, None)] * len(rings)
+    opened: List[List[List[float]]] = []
+    arrays = []
+    positions = []
+    for position, ring in enumerate(rings):
+        try:
+            points = _open_ring(ring)
+            array = np.asarray(points, dtype=float)
+        except (TypeError, ValueError):
+            results[position] = ("Malformed coordinates", None)
+            continue
+        if array.ndim != 2 or array.shape[1] != 2:
+            results[position] = ("Malformed coordinates", None)
+        elif len(array) < 3:
+            results[position] = ("Less than 3 points", None)
+        else:
+            opened.append(points)
+            arrays.append(array)
+            positions.append(position)
+
+    if not arrays:
+        return results
+
+    indices = np.repeat(np.arange(len(arrays)), [len(array) for array in arrays])
+    polygons = shapely.polygons(shapely.linearrings(np.concatenate(arrays), indices=indices))
+    reasons = shapely.is_valid_reason(polygons)
+    areas = shapely.area(polygons)
+
+    for position, points, reason, area in zip(positions, opened, reasons, areas):
+        if reason != 'Valid Geometry':
+            results[position] = (reason, None)
+        elif area <= 0:
+            results[position] = ("Zero area", None)
+        else:
+            geojson = {'type': 'Polygon', 'coordinates': [points + [points[0]]]}
+            results[position] = (None, json.dumps(geojson))
+    return results
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _validation_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=SECTOR_VALIDATION_PROCESSES)
+    return _pool
+
+
+def shutdown_validation_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=True)
+        _pool = None
+
+
+async def validate_sectors(rings: List[Ring],
+                           chunk_size: int = SECTOR_VALIDATION_CHUNK) -> List[GeometryCheck]:
+    """Проверка контуров вне цикла событий.
+
+    Небольшие пачки проверяются в потоке: пересылка в другой процесс
+    обошлась бы дороже самой проверки. Крупные импорты делятся на части
+    по ``chunk_size`` и проверяются параллельно в пуле процессов.
+    """
+    loop = asyncio.get_running_loop()
+    rings = list(rings)
+    if not rings:
+        return []
+    if len(rings) <= chunk_size:
+        return await loop.run_in_executor(None, check_sector_geometries, rings)
+
+    pool = _validation_pool()
+    parts = await asyncio.gather(*(
+        loop.run_in_executor(pool, check_sector_geometries, rings[start:start + chunk_size])
+        for start in range(0, len(rings), chunk_size)
+    ))
+    return [check for part in parts for check in part]
+
+
+def sectors_from_geojson(data: Union[str, Dict, List]) -> List[Dict]:
+    """Секторы из GeoJSON (FeatureCollection, Feature или список Feature).
+
+    Каждый Polygon становится сектором (берется внешний контур), части
+    MultiPolygon - отдельными секторами. Имя, приоритет и тип местности
+    берутся из properties.
+    """
+    if isinstance(data, str):
+        data = json.loads(data)
+    if isinstance(data, dict):
+        features = data.get('features', [data] if data.get('type') == 'Feature' else [])
+    else:
+        features = data
+
+    sectors = []
+    for number, feature in enumerate(features, 1):
+        geometry = feature.get('geometry') or {}
+        properties = feature.get('properties') or {}
+        if geometry.get('type') == 'Polygon':
+            parts = [geometry['coordinates']]
+        elif geometry.get('type') == 'MultiPolygon':
+            parts = geometry['coordinates']
+        else:
+            logger.warning(f"Skipping feature {number}: unsupported geometry {geometry.get('type')}")
+            continue
+
+        name = properties.get('name') or f"Сектор {number}"
+        for part_number, polygon in enumerate(parts, 1):
+            sectors.append({
+                'name': name if len(parts) == 1 else f"{name}-{part_number}",
+                'boundaries': _open_ring(polygon[0]),
+                'priority': properties.get('priority', 1),
+                'terrain_type': properties.get('terrain_type', 'unknown')
+            })
+    return sectors
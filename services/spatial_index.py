@@ -0,0 +1,116 @@
+import time
+from math import asin, cos, floor, radians, sin, sqrt
+from typing import Dict, List, Optional, Tuple
+
+from services.track_simplify import EARTH_RADIUS_M
+
+METERS_PER_DEGREE = radians(1) * EARTH_RADIUS_M
+
+
+def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Расстояние между точками, м"""
+    dlat = radians(lat2 - lat1)
+    dlon = radians(lon2 - lon1)
+    a = sin(dlat / 2) ** 2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_M * asin(min(1.0, sqrt(a)))
+
+
+def bounding_box(lat: float, lon: float, radius: float) -> Tuple[float, float, float, float]:
+    """(min_lon, max_lon, min_lat, max_lat) окружности радиуса ``radius`` м"""
+    dlat = radius / METERS_PER_DEGREE
+    dlon = dlat / max(cos(radians(lat)), 1e-6)
+    return lon - dlon, lon + dlon, lat - dlat, lat + dlat
+
+
+class LivePositionIndex:
+    """Индекс текущих позиций волонтеров в памяти.
+
+    Позиции разложены по корзинам сетки ``cell_size`` метров (аналог
+    geohash с целочисленными ключами). Обновление - O(1), поиск в радиусе
+    просматривает только корзины, пересекающие окружность.
+    """
+
+    def __init__(self, cell_size: float = 500.0):
+        self.cell_size = cell_size
+        self.cell_deg = cell_size / METERS_PER_DEGREE
+        self.buckets: Dict[Tuple[int, int], set] = {}
+        self.positions: Dict[int, Tuple[float, float, float, Optional[int]]] = {}  # user_id: (lat, lon, ts, group)
+        self._cells: Dict[int, Tuple[int, int]] = {}
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        # Долготная ячейка шире на высоких широтах - это влияет только на число корзин
+        return floor(lat / self.cell_deg), floor(lon / self.cell_deg)
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def update(self, user_id: int, lat: float, lon: float, group_id: Optional[int] = None,
+               timestamp: Optional[float] = None):
+        cell = self._cell(lat, lon)
+        old = self._cells.get(user_id)
+        if old != cell:
+            if old is not None:
+                self._discard(old, user_id)
+            self.buckets.setdefault(cell, set()).add(user_id)
+            self._cells[user_id] = cell
+        self.positions[user_id] = (lat, lon, timestamp or time.time(), group_id)
+
+    def remove(self, user_id: int):
+        cell = self._cells.pop(user_id, None)
+        if cell is not None:
+            self._discard(cell, user_id)
+        self.positions.pop(user_id, None)
+
+    def _discard(self, cell: Tuple[int, int], user_id: int):
+        bucket = self.buckets.get(cell)
+        if bucket:
+            bucket.discard(user_id)
+            if not bucket:
+                del self.buckets[cell]
+
+    def prune(self, max_age: float) -> int:
+        """Удаление позиций старше ``max_age`` секунд"""
+        threshold = time.time() - max_age
+        stale = [uid for uid, pos in self.positions.items() if pos[2] < threshold]
+        for user_id in stale:
+            self.remove(user_id)
+        return len(stale)
+
+    def within(self, lat: float, lon: float, radius: float,
+               group_id: Optional[int] = None) -> List[Tuple[int, float]]:
+        """Волонтеры в радиусе ``radius`` м: [(user_id, расстояние)] по возрастанию"""
+        min_lon, max_lon, min_lat, max_lat = bounding_box(lat, lon, radius)
+        row0, col0 = self._cell(min_lat, min_lon)
+        row1, col1 = self._cell(max_lat, max_lon)
+
+        result = []
+        if (row1 - row0 + 1) * (col1 - col0 + 1) > len(self.buckets):
+            candidates = (uid for bucket in self.buckets.values() for uid in bucket)
+        else:
+            candidates = (uid
+                          for row in range(row0, row1 + 1)
+                          for col in range(col0, col1 + 1)
+                          for uid in self.buckets.get((row, col), ()))
+        for user_id in candidates:
+            p_lat, p_lon, _, p_group = self.positions[user_id]
+            if group_id is not None and p_group != group_id:
+                continue
+            distance = haversine_m(lat, lon, p_lat, p_lon)
+            if distance <= radius:
+                result.append((user_id, distance))
+        result.sort(key=lambda item: item[1])
+        return result
+
+    def nearest(self, lat: float, lon: float, count: int = 5,
+                max_distance: Optional[float] = None,
+                group_id: Optional[int] = None) -> List[Tuple[int, float]]:
+        """``count`` ближайших волонтеров (поиск расширяющимся радиусом)"""
+        radius = self.cell_size
+        limit = max_distance or EARTH_RADIUS_M * 3.15
+        while True:
+            radius = min(radius, limit)
+            found = self.within(lat, lon, radius, group_id)
+            if len(found) >= count or radius >= limit:
+                return found[:count]
+            radius *= 4
+
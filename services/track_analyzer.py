@@ -1,44 +1,46 @@
-from typing import List, Dict, Tuple
-from datetime import datetime
+from typing import List, Dict, Tuple, Union
 import numpy as np
-from math import ceil
+from services.track_data import Track, to_epoch
+
+EARTH_RADIUS_KM = 6371.0
 
 class TrackAnalyzer:
     def __init__(self):
         self.MIN_SPEED = 0.5  # км/ч
         self.MAX_SPEED = 20.0  # км/ч
-        
-    def analyze_track(self, points: List[Dict]) -> Dict:
+        self.SEGMENT_LENGTH = 1.0  # км
+
+    def analyze_track(self, points: Union[List[Dict], Track]) -> Dict:
         """Полный анализ трека"""
         if len(points) < 2:
             return self._empty_stats()
-            
+
+        lat, lon, ts, elevation = self._to_arrays(points)
+
         # Базовые метрики
-        total_distance = self._calculate_total_distance(points)
-        duration = self._calculate_duration(points)
-        
+        distances = self._haversine(lat, lon)  # км между соседними точками
+        cumulative = np.concatenate(([0.0], np.cumsum(distances)))
+        total_distance = float(cumulative[-1])
+        dt = np.diff(ts)
+        duration = float(ts[-1] - ts[0])
+
         # Скорость и темп
-        speeds = self._calculate_speeds(points)
-        avg_speed = np.mean([s for s in speeds if self.MIN_SPEED <= s <= self.MAX_SPEED])
-        max_speed = np.max(speeds)
-        
+        speeds = self._calculate_speeds(distances, dt)
+        valid = speeds[(speeds >= self.MIN_SPEED) & (speeds <= self.MAX_SPEED)]
+        avg_speed = float(valid.mean()) if valid.size else 0.0
+        max_speed = float(speeds.max())
+        moving_time = float(dt[speeds >= self.MIN_SPEED].sum())
+
         # Анализ высот
-        elevations = [p.get('elevation', 0) for p in points if p.get('elevation')]
-        if elevations:
-            elevation_gain = sum(max(0, elevations[i] - elevations[i-1]) 
-                               for i in range(1, len(elevations)))
-            elevation_loss = sum(max(0, elevations[i-1] - elevations[i]) 
-                               for i in range(1, len(elevations)))
-        else:
-            elevation_gain = elevation_loss = 0
-            
+        elevation_gain, elevation_loss = self._calculate_elevation(elevation)
+
         # Разбивка на сегменты
-        segments = self._analyze_segments(points)
-        
+        segments = self._analyze_segments(points, cumulative, ts)
+
         return {
             'total_distance': round(total_distance, 2),  # км
             'duration': self._format_duration(duration),  # чч:мм:сс
-            'moving_time': self._calculate_moving_time(points),  # чч:мм:сс
+            'moving_time': self._format_duration(moving_time),  # чч:мм:сс
             'avg_speed': round(avg_speed, 1),  # км/ч
             'max_speed': round(max_speed, 1),  # км/ч
             'elevation_gain': round(elevation_gain, 1),  # м
@@ -49,53 +51,104 @@ class TrackAnalyzer:
             'start_time': points[0]['timestamp'],
             'end_time': points[-1]['timestamp']
         }
-    
-    def _analyze_segments(self, points: List[Dict]) -> List[Dict]:
+
+    def _to_arrays(self, points: Union[List[Dict], Track]) -> Tuple[np.ndarray, ...]:
+        """Колонки lat/lon/время (эпоха, с)/высота; высота NaN, если неизвестна"""
+        if isinstance(points, Track):
+            columns = points.as_numpy()
+            return (columns['lat'], columns['lon'], columns['ts'],
+                    columns['elevation'].astype(np.float64))
+
+        n = len(points)
+        lat = np.fromiter((p['lat'] for p in points), dtype=np.float64, count=n)
+        lon = np.fromiter((p['lon'] for p in points), dtype=np.float64, count=n)
+        ts = np.fromiter(
+            (to_epoch(p.get('timestamp', p.get('time'))) for p in points),
+            dtype=np.float64, count=n
+        )
+        elevation = np.fromiter(
+            (p.get('elevation') or np.nan for p in points), dtype=np.float64, count=n
+        )
+        return lat, lon, ts, elevation
+
+    @staticmethod
+    def _haversine(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+        """Расстояния (км) между соседними точками"""
+        phi = np.radians(lat)
+        lam = np.radians(lon)
+        dphi = np.diff(phi)
+        dlam = np.diff(lam)
+        a = np.sin(dphi / 2) ** 2 + np.cos(phi[:-1]) * np.cos(phi[1:]) * np.sin(dlam / 2) ** 2
+        return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+    @staticmethod
+    def _calculate_speeds(distances: np.ndarray, dt: np.ndarray) -> np.ndarray:
+        """Скорости (км/ч) на каждом шаге; 0 при нулевом интервале"""
+        speeds = np.zeros_like(distances)
+        np.divide(distances * 3600.0, dt, out=speeds, where=dt > 0)
+        return speeds
+
+    @staticmethod
+    def _calculate_elevation(elevation: np.ndarray) -> Tuple[float, float]:
+        """Набор и потеря высоты по точкам с известной высотой"""
+        known = elevation[~np.isnan(elevation) & (elevation != 0)]
+        if known.size < 2:
+            return 0.0, 0.0
+        deltas = np.diff(known)
+        return float(deltas[deltas > 0].sum()), float(-deltas[deltas < 0].sum())
+
+    def _analyze_segments(self, points: Union[List[Dict], Track],
+                          cumulative: np.ndarray, ts: np.ndarray) -> List[Dict]:
         """Разбивка трека на сегменты по 1 км"""
-        segments = []
-        current_segment = []
-        current_distance = 0
-        
-        for i in range(len(points) - 1):
-            current_segment.append(points[i])
-            distance = self._calculate_distance(points[i], points[i+1])
-            current_distance += distance
-            
-            if current_distance >= 1.0:  # каждый километр
-                segments.append({
-                    'distance': round(current_distance, 2),
-                    'time': self._calculate_segment_time(current_segment),
-                    'avg_speed': self._calculate_segment_speed(current_segment),
-                    'start_point': current_segment[0],
-                    'end_point': current_segment[-1]
-                })
-                current_segment = []
-                current_distance = 0
-        
-        return segments
-    
-    def _calculate_segment_time(self, segment: List[Dict]) -> str:
-        """Расчет времени прохождения сегмента"""
-        if not segment:
-            return "00:00:00"
-        
-        start_time = datetime.fromisoformat(segment[0]['timestamp'])
-        end_time = datetime.fromisoformat(segment[-1]['timestamp'])
-        duration = (end_time - start_time).total_seconds()
-        
-        return self._format_duration(duration)
-    
-    def _calculate_segment_speed(self, segment: List[Dict]) -> float:
-        """Расчет средней скорости на сегменте"""
-        if len(segment) < 2:
-            return 0.0
-            
-        distance = self._calculate_total_distance(segment)
-        time = (datetime.fromisoformat(segment[-1]['timestamp']) - 
-                datetime.fromisoformat(segment[0]['timestamp'])).total_seconds() / 3600
-        
-        return round(distance / time if time > 0 else 0, 1)
-    
+        # Границы: первая точка, на которой накопленная от начала сегмента
+        # дистанция достигает 1 км; следующий сегмент начинается с нее
+        last = len(cumulative) - 1
+        boundaries = [0]
+        while True:
+            end = int(cumulative.searchsorted(cumulative[boundaries[-1]] + self.SEGMENT_LENGTH))
+            if end > last:
+                break
+            boundaries.append(end)
+        if len(boundaries) < 2:
+            return []
+
+        starts = np.array(boundaries[:-1])
+        ends = np.array(boundaries[1:])
+        tails = ends - 1  # последняя точка, входящая в сегмент
+        distances = np.round(cumulative[ends] - cumulative[starts], 2)
+        times = ts[tails] - ts[starts]
+        speeds = np.zeros_like(times)
+        np.divide((cumulative[tails] - cumulative[starts]) * 3600.0, times, out=speeds, where=times > 0)
+        speeds = np.round(speeds, 1)
+
+        return [
+            {
+                'distance': float(distances[i]),
+                'time': self._format_duration(times[i]),
+                'avg_speed': float(speeds[i]),
+                'start_point': points[int(starts[i])],
+                'end_point': points[int(tails[i])]
+            }
+            for i in range(len(starts))
+        ]
+
+    @staticmethod
+    def _format_duration(seconds: float) -> str:
+        """Форматирование длительности в чч:мм:сс"""
+        seconds = int(max(seconds, 0))
+        hours, remainder = divmod(seconds, 3600)
+        minutes, seconds = divmod(remainder, 60)
+        return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+
+    @staticmethod
+    def _calculate_pace(distance: float, duration: float) -> str:
+        """Темп в мин/км (мм:сс)"""
+        if distance <= 0:
+            return "00:00"
+        pace = int(duration / distance)
+        minutes, seconds = divmod(pace, 60)
+        return f"{minutes:02d}:{seconds:02d}"
+
     def _empty_stats(self) -> Dict:
         """Пустые статистические данные"""
         return {
@@ -111,4 +164,4 @@ class TrackAnalyzer:
             'points_count': 0,
             'start_time': None,
             'end_time': None
-        }
\ No newline at end of file
+        }
@@ -1,8 +1,10 @@
 from math import radians, sin, cos, sqrt, atan2
+from services.track_simplify import StreamingSimplifier, simplify_track
 
 class TrackCompressor:
-    def __init__(self, min_distance=10):
-        self.min_distance = min_distance
+    def __init__(self, min_distance=10, method='dp'):
+        self.min_distance = min_distance  # допуск упрощения в метрах
+        self.method = method
 
     def distance(self, p1: dict, p2: dict) -> float:
         """Calculate distance between two points using Haversine formula"""
@@ -23,11 +25,9 @@ class TrackCompressor:
         """Compress track points using Douglas-Peucker algorithm"""
         if len(points) < 3:
             return points
-            
-        result = [points[0]]
-        
-        for point in points[1:]:
-            if self.distance(result[-1], point) >= self.min_distance:
-                result.append(point)
-                
-        return result
+
+        return simplify_track(points, tolerance=self.min_distance, method=self.method)
+
+    def create_stream(self) -> StreamingSimplifier:
+        """Online compressor for a track that is still being recorded"""
+        return StreamingSimplifier(tolerance=self.min_distance)
@@ -0,0 +1,147 @@
+import math
+from array import array
+from datetime import datetime, tzinfo
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+
+NAN = float('nan')
+
+TimestampLike = Union[datetime, str, float, int, None]
+
+
+def to_epoch(value: TimestampLike) -> float:
+    """Convert datetime / ISO string / epoch seconds to epoch seconds"""
+    if value is None:
+        return datetime.now().timestamp()
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return value.timestamp()
+
+
+class Track:
+    """Columnar in-memory track.
+
+    Points are stored in parallel ``array`` buffers instead of per-point
+    dicts: lat/lon/time as float64 and accuracy/elevation as float32
+    (NaN when unknown), ~32 bytes per fix. Iteration and indexing still
+    yield ``{'lat', 'lon', 'timestamp', ...}`` dicts for older callers.
+    """
+
+    COLUMNS = ('lat', 'lon', 'ts', 'accuracy', 'elevation')
+
+    def __init__(self, track_id: Optional[int] = None):
+        self.track_id = track_id
+        self.lat = array('d')
+        self.lon = array('d')
+        self.ts = array('d')
+        self.accuracy = array('f')
+        self.elevation = array('f')
+        self.tz: Optional[tzinfo] = None
+
+    @classmethod
+    def from_points(cls, points: Iterable[Dict], track_id: Optional[int] = None) -> 'Track':
+        track = cls(track_id)
+        track.extend(points)
+        return track
+
+    def add(self, lat: float, lon: float, timestamp: TimestampLike = None,
+            accuracy: Optional[float] = None, elevation: Optional[float] = None):
+        """Append one fix (amortized O(1))"""
+        if self.tz is None and isinstance(timestamp, datetime) and timestamp.tzinfo:
+            self.tz = timestamp.tzinfo
+        self.lat.append(lat)
+        self.lon.append(lon)
+        self.ts.append(to_epoch(timestamp))
+        self.accuracy.append(NAN if accuracy is None else accuracy)
+        self.elevation.append(NAN if elevation is None else elevation)
+
+    def append(self, point: Dict):
+        """Append a point dict (``lat``/``latitude``, ``lon``/``longitude``, ...)"""
+        self.add(
+            point['lat'] if 'lat' in point else point['latitude'],
+            point['lon'] if 'lon' in point else point['longitude'],
+            point.get('timestamp', point.get('time')),
+            point.get('accuracy'),
+            point.get('elevation', point.get('altitude'))
+        )
+
+    def extend(self, points: Iterable[Dict]):
+        for point in points:
+            self.append(point)
+
+    def clear(self):
+        for name in self.COLUMNS:
+            del getattr(self, name)[:]
+
+    def __len__(self) -> int:
+        return len(self.lat)
+
+    def __bool__(self) -> bool:
+        return len(self.lat) > 0
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.slice(index.start, index.stop, index.step)
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("track index out of range")
+        return self._point(index)
+
+    def __iter__(self) -> Iterator[Dict]:
+        for i in range(len(self)):
+            yield self._point(i)
+
+    def _point(self, i: int) -> Dict:
+        point = {
+            'lat': self.lat[i],
+            'lon': self.lon[i],
+            'timestamp': datetime.fromtimestamp(self.ts[i], self.tz).isoformat()
+        }
+        accuracy = self.accuracy[i]
+        if not math.isnan(accuracy):
+            point['accuracy'] = accuracy
+        elevation = self.elevation[i]
+        if not math.isnan(elevation):
+            point['elevation'] = elevation
+        return point
+
+    def slice(self, start: Optional[int] = None, stop: Optional[int] = None,
+              step: Optional[int] = None) -> 'Track':
+        """Copy of a sub-range as a new Track"""
+        result = Track(self.track_id)
+        result.tz = self.tz
+        for name in self.COLUMNS:
+            setattr(result, name, getattr(self, name)[start:stop:step])
+        return result
+
+    def take(self, indices: Iterable[int]) -> 'Track':
+        """Copy of the points at ``indices`` as a new Track"""
+        result = Track(self.track_id)
+        result.tz = self.tz
+        indices = list(indices)
+        for name in self.COLUMNS:
+            column = getattr(self, name)
+            setattr(result, name, array(column.typecode, (column[i] for i in indices)))
+        return result
+
+    def view(self, start: Optional[int] = None, stop: Optional[int] = None) -> Dict[str, memoryview]:
+        """Zero-copy memoryviews of the columns.
+
+        Views pin the buffers: release them before appending to the track.
+        """
+        return {name: memoryview(getattr(self, name))[start:stop] for name in self.COLUMNS}
+
+    def as_numpy(self, start: Optional[int] = None, stop: Optional[int] = None):
+        """Zero-copy NumPy arrays over the columns (same pinning rule as ``view``)"""
+        import numpy as np
+        return {name: np.frombuffer(buf, dtype=np.float64 if buf.format == 'd' else np.float32)
+                for name, buf in self.view(start, stop).items()}
+
+    def to_dicts(self) -> List[Dict]:
+        return list(self)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(len(col) * col.itemsize for col in (getattr(self, n) for n in self.COLUMNS))
@@ -0,0 +1,220 @@
+import heapq
+from math import cos, radians, hypot
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from services.track_data import Track
+
+EARTH_RADIUS_M = 6371000.0
+
+
+def project(lat: np.ndarray, lon: np.ndarray, ref_lat: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Equirectangular projection to local metres around ``ref_lat``"""
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    if ref_lat is None:
+        ref_lat = float(lat.mean()) if lat.size else 0.0
+    k = cos(radians(ref_lat))
+    return np.radians(lon) * EARTH_RADIUS_M * k, np.radians(lat) * EARTH_RADIUS_M
+
+
+def _segment_distances(px: np.ndarray, py: np.ndarray,
+                       ax: float, ay: float, bx: float, by: float) -> np.ndarray:
+    """Distances from points to segment AB"""
+    dx, dy = bx - ax, by - ay
+    length_sq = dx * dx + dy * dy
+    if length_sq == 0:
+        return np.hypot(px - ax, py - ay)
+    t = np.clip(((px - ax) * dx + (py - ay) * dy) / length_sq, 0.0, 1.0)
+    return np.hypot(px - (ax + t * dx), py - (ay + t * dy))
+
+
+def douglas_peucker_indices(x: np.ndarray, y: np.ndarray, tolerance: float) -> np.ndarray:
+    """Iterative Douglas-Peucker; returns sorted indices of kept points"""
+    n = len(x)
+    if n < 3:
+        return np.arange(n)
+
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        distances = _segment_distances(x[start + 1:end], y[start + 1:end],
+                                       x[start], y[start], x[end], y[end])
+        i = int(distances.argmax())
+        if distances[i] > tolerance:
+            split = start + 1 + i
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+    return np.flatnonzero(keep)
+
+
+def visvalingam_indices(x: np.ndarray, y: np.ndarray, min_area: Optional[float] = None,
+                        keep_count: Optional[int] = None) -> np.ndarray:
+    """Visvalingam-Whyatt: removes points with the smallest effective area.
+
+    Stops once every remaining triangle is at least ``min_area`` (m²) or
+    ``keep_count`` points remain.
+    """
+    n = len(x)
+    if n < 3:
+        return np.arange(n)
+    if min_area is None and keep_count is None:
+        raise ValueError("min_area or keep_count is required")
+    keep_count = max(keep_count or 2, 2)
+
+    prev = list(range(-1, n - 1))
+    nxt = list(range(1, n + 1))
+    removed = [False] * n
+    area = [0.0] * n
+
+    def triangle(i: int) -> float:
+        a, b = prev[i], nxt[i]
+        return abs((x[a] - x[i]) * (y[b] - y[i]) - (x[b] - x[i]) * (y[a] - y[i])) / 2
+
+    heap = []
+    for i in range(1, n - 1):
+        area[i] = triangle(i)
+        heap.append((area[i], i))
+    heapq.heapify(heap)
+
+    remaining = n
+    max_area = 0.0
+    while heap and remaining > keep_count:
+        value, i = heapq.heappop(heap)
+        if removed[i] or value != area[i]:
+            continue  # устаревшая запись
+        if min_area is not None and value >= min_area:
+            break
+        # Площадь не убывает, чтобы не удалять точку раньше уже удаленных соседей
+        max_area = max(max_area, value)
+        removed[i] = True
+        remaining -= 1
+        a, b = prev[i], nxt[i]
+        nxt[a], prev[b] = b, a
+        for j in (a, b):
+            if 0 < j < n - 1:
+                area[j] = max(triangle(j), max_area)
+                heapq.heappush(heap, (area[j], j))
+
+    return np.array([i for i in range(n) if not removed[i]])
+
+
+def _columns(points: Union[Sequence[Dict], Track]) -> Tuple[np.ndarray, np.ndarray]:
+    if isinstance(points, Track):
+        columns = points.as_numpy()
+        return columns['lat'], columns['lon']
+    lat = np.fromiter((float(p['lat']) for p in points), dtype=np.float64, count=len(points))
+    lon = np.fromiter((float(p['lon']) for p in points), dtype=np.float64, count=len(points))
+    return lat, lon
+
+
+def simplify_track(points: Union[Sequence[Dict], Track], tolerance: float = 10.0,
+                   method: str = 'dp') -> Union[List[Dict], Track]:
+    """Simplify a track in metric coordinates.
+
+    ``method='dp'`` keeps points farther than ``tolerance`` metres from the
+    simplified line; ``method='vw'`` drops points whose triangle area is
+    below ``tolerance²`` m². Track input returns a Track, lists return lists.
+    """
+    if len(points) < 3:
+        return points
+    lat, lon = _columns(points)
+    x, y = project(lat, lon)
+    if method == 'dp':
+        indices = douglas_peucker_indices(x, y, tolerance)
+    elif method == 'vw':
+        indices = visvalingam_indices(x, y, min_area=tolerance * tolerance)
+    else:
+        raise ValueError(f"Unknown simplification method: {method}")
+
+    if isinstance(points, Track):
+        return points.take(indices)
+    return [points[i] for i in indices]
+
+
+class StreamingSimplifier:
+    """Online (opening window) simplifier fed point by point.
+
+    Holds only the points since the last key point (at most ``max_window``).
+    A point becomes a key point when the segment from the previous key
+    point to the newest fix would pass farther than ``tolerance`` metres
+    from any buffered point.
+    """
+
+    def __init__(self, tolerance: float = 10.0, max_window: int = 200):
+        self.tolerance = tolerance
+        self.max_window = max_window
+        self._k: Optional[float] = None
+        self._anchor: Optional[Tuple[float, float]] = None
+        self._window: List[Tuple[float, float, Dict]] = []
+        self._ready: List[Dict] = []
+        self.points_in = 0
+        self.points_out = 0
+
+    def _xy(self, point: Dict) -> Tuple[float, float]:
+        lat, lon = float(point['lat']), float(point['lon'])
+        if self._k is None:
+            self._k = cos(radians(lat))
+        return radians(lon) * EARTH_RADIUS_M * self._k, radians(lat) * EARTH_RADIUS_M
+
+    def _emit(self, x: float, y: float, point: Dict):
+        self._anchor = (x, y)
+        self._ready.append(point)
+        self.points_out += 1
+
+    def push(self, point: Dict):
+        """Add a new fix"""
+        self.points_in += 1
+        x, y = self._xy(point)
+        if self._anchor is None:
+            self._emit(x, y, point)
+            return
+
+        if self._window and self._exceeds(x, y):
+            self._emit(*self._window[-1])
+            self._window = []
+        self._window.append((x, y, point))
+
+        if len(self._window) >= self.max_window:
+            self._emit(*self._window[-1])
+            self._window = []
+
+    def _exceeds(self, bx: float, by: float) -> bool:
+        ax, ay = self._anchor
+        dx, dy = bx - ax, by - ay
+        length_sq = dx * dx + dy * dy
+        for px, py, _ in self._window:
+            if length_sq == 0:
+                distance = hypot(px - ax, py - ay)
+            else:
+                t = min(max(((px - ax) * dx + (py - ay) * dy) / length_sq, 0.0), 1.0)
+                distance = hypot(px - (ax + t * dx), py - (ay + t * dy))
+            if distance > self.tolerance:
+                return True
+        return False
+
+    def pop_ready(self) -> List[Dict]:
+        """Key points emitted since the previous call"""
+        ready, self._ready = self._ready, []
+        return ready
+
+    def peek_ready(self) -> List[Dict]:
+        """Key points not yet committed, left in place until ``commit``"""
+        return list(self._ready)
+
+    def commit(self, count: int):
+        """Drop the first ``count`` ready key points once they are saved"""
+        del self._ready[:count]
+
+    def finish(self) -> List[Dict]:
+        """Flush the last point of the track and return remaining key points"""
+        if self._window:
+            self._emit(*self._window[-1])
+            self._window = []
+        return self.pop_ready()
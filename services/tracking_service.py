@@ -2,16 +2,55 @@ import logging
 from typing import Dict, List, Optional
 from datetime import datetime
 import asyncio
+import time
+from config.api_config import (GROUP_MAP_COALESCE_WINDOW, GROUP_MAP_DEBOUNCE, LIVE_POSITION_MAX_AGE,
+                               LIVE_POSITION_PRUNE_INTERVAL, USER_GROUP_MISS_TTL)
+from services.coverage_grid import CoverageGridStore
+from services.group_map import GroupMapRenderer, base_fingerprint
+from services.location_ingest import LocationIngestPipeline, MapRefreshDebouncer
+from services.location_store import LocationHistoryStore
+from services.spatial_index import LivePositionIndex
+from services.track_analyzer import TrackAnalyzer
+from services.track_data import Track
 from services.yandex_maps_service import YandexMapsService
 
 logger = logging.getLogger(__name__)
 
 class TrackingService:
-    def __init__(self, db_manager, map_service: YandexMapsService):
+    def __init__(self, db_manager, map_service: YandexMapsService,
+                 coverage_grids: Optional[CoverageGridStore] = None,
+                 location_history: Optional[LocationHistoryStore] = None):
         self.db = db_manager
         self.map_service = map_service
         self.active_tracks = {}  # user_id: track_data
         self.live_tracking = {}  # group_id: {user_id: location}
+        self.user_groups = {}  # user_id: group_id
+        self.group_misses = {}  # user_id: время, до которого группа не запрашивается повторно
+        self.group_operations = {}  # group_id: operation_id
+        self.live_index = LivePositionIndex()
+        self._pruner: Optional[asyncio.Task] = None
+        self.track_analyzer = TrackAnalyzer()
+        self.map_renderer = GroupMapRenderer()
+        self.map_refresher = MapRefreshDebouncer(
+            self._update_group_map, GROUP_MAP_COALESCE_WINDOW, GROUP_MAP_DEBOUNCE
+        )
+        self.ingest = LocationIngestPipeline(db_manager)
+        # Общую историю приложения запускает и закрывает само приложение
+        self.owns_history = location_history is None
+        self.location_history = location_history or LocationHistoryStore()
+        self.coverage_grids = coverage_grids  # общие сетки покрытия приложения
+
+    def start(self, interval: float = LIVE_POSITION_PRUNE_INTERVAL):
+        """Фоновая очистка позиций волонтеров, переставших присылать отметки"""
+        if self._pruner is None or self._pruner.done():
+            self._pruner = asyncio.create_task(self._prune_loop(interval))
+
+    async def _prune_loop(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            removed = self.live_index.prune(LIVE_POSITION_MAX_AGE)
+            if removed:
+                logger.debug(f"Pruned {removed} stale live positions")
 
     async def start_tracking(self, user_id: int, group_id: int) -> bool:
         """Начало отслеживания пользователя"""
@@ -19,9 +58,10 @@ class TrackingService:
             track_id = await self.db.create_track(user_id, group_id)
             self.active_tracks[user_id] = {
                 'track_id': track_id,
-                'points': [],
+                'points': Track(track_id),
                 'start_time': datetime.now()
             }
+            self.user_groups[user_id] = group_id
             return True
         except Exception as e:
             logger.error(f"Error starting tracking: {e}")
@@ -30,70 +70,186 @@ class TrackingService:
     async def update_location(self, user_id: int, location: Dict) -> bool:
         """Обновление местоположения пользователя"""
         try:
+            now = datetime.now()
+            group_id = await self._get_user_group(user_id)
+
             # Обновляем активный трек
             if user_id in self.active_tracks:
                 track_data = self.active_tracks[user_id]
-                track_data['points'].append({
-                    'lat': location['latitude'],
-                    'lon': location['longitude'],
-                    'timestamp': datetime.now().isoformat()
-                })
-                
-                # Сохраняем точку в БД
-                await self.db.add_track_point(
+                track_data['points'].add(
+                    location['latitude'],
+                    location['longitude'],
+                    now,
+                    accuracy=location.get('accuracy'),
+                    elevation=location.get('altitude')
+                )
+
+                # Точка уходит в очередь пакетной записи
+                await self.ingest.submit(
                     track_data['track_id'],
+                    user_id,
                     location['latitude'],
-                    location['longitude']
+                    location['longitude'],
+                    accuracy=location.get('accuracy'),
+                    altitude=location.get('altitude'),
+                    timestamp=now
                 )
 
             # Обновляем live-позицию в группе
-            group_id = await self.db.get_user_active_group(user_id)
             if group_id:
                 if group_id not in self.live_tracking:
                     self.live_tracking[group_id] = {}
                 self.live_tracking[group_id][user_id] = location
-                
-                # Обновляем карту группы
-                await self._update_group_map(group_id)
-            
+
+                # Карта группы перестраивается отложенно
+                self.map_refresher.schedule(group_id)
+
+            # Индекс для поиска ближайших волонтеров
+            self.live_index.update(user_id, location['latitude'], location['longitude'], group_id)
+
+            operation_id = await self._get_group_operation(group_id) if group_id else None
+
+            # История перемещений пишется в суточные шарды, а не в основную базу
+            self.location_history.add(
+                user_id, location['latitude'], location['longitude'],
+                operation_id=operation_id,
+                group_id=group_id, accuracy=location.get('accuracy'), timestamp=now
+            )
+
+            # Покрытие операции растеризуется пачками в фоне
+            if self.coverage_grids and operation_id:
+                track = self.active_tracks.get(user_id)
+                self.coverage_grids.submit(
+                    operation_id, track['track_id'] if track else None,
+                    location['latitude'], location['longitude'], user_id=user_id
+                )
+
             return True
         except Exception as e:
             logger.error(f"Error updating location: {e}")
             return False
 
+    def find_nearest_volunteers(self, latitude: float, longitude: float, count: int = 5,
+                                max_distance: Optional[float] = None) -> List[Dict]:
+        """Ближайшие волонтеры к точке (например, к находке)"""
+        return [
+            {'user_id': user_id, 'distance': round(distance, 1),
+             'group_id': self.live_index.positions[user_id][3]}
+            for user_id, distance in self.live_index.nearest(latitude, longitude, count, max_distance)
+        ]
+
+    async def _get_group_operation(self, group_id: int) -> Optional[int]:
+        """Операция группы (с кэшированием)"""
+        if group_id not in self.group_operations:
+            try:
+                row = await self.db.fetchone(
+                    "SELECT operation_id FROM search_groups WHERE group_id = ?", (group_id,)
+                )
+            except Exception as e:
+                logger.error(f"Error getting group operation: {e}")
+                return None
+            self.group_operations[group_id] = row[0] if row else None
+        return self.group_operations[group_id]
+
+    async def _get_user_group(self, user_id: int) -> Optional[int]:
+        """Активная группа пользователя (с кэшированием).
+
+        Отсутствие группы кэшируется только на USER_GROUP_MISS_TTL секунд:
+        пользователь может вступить в группу, не перезапуская трекинг.
+        """
+        if user_id in self.user_groups:
+            return self.user_groups[user_id]
+        if self.group_misses.get(user_id, 0) > time.monotonic():
+            return None
+        group_id = await self.db.get_user_active_group(user_id)
+        if group_id is None:
+            self.group_misses[user_id] = time.monotonic() + USER_GROUP_MISS_TTL
+        else:
+            self.group_misses.pop(user_id, None)
+            self.user_groups[user_id] = group_id
+        return group_id
+
+    def user_group_changed(self, user_id: int, group_id: Optional[int] = None):
+        """Сброс кэша группы после вступления в группу или выхода из нее"""
+        self.group_misses.pop(user_id, None)
+        if group_id is None:
+            self.user_groups.pop(user_id, None)
+        else:
+            self.user_groups[user_id] = group_id
+
     async def _update_group_map(self, group_id: int):
-        """Обновление карты группы"""
+        """Обновление карты группы (вызывается планировщиком, не на каждую точку)"""
         try:
-            if group_id in self.live_tracking:
-                locations = self.live_tracking[group_id]
-                map_data = await self.map_service.create_group_map(locations)
-                
-                # Сохраняем карту
-                await self.db.update_group_map(group_id, map_data)
-                
-                # Уведомляем участников группы
-                await self._notify_group_members(group_id, "Карта обновлена")
+            locations = self.live_tracking.get(group_id)
+            if not locations:
+                return
+            await self._refresh_base_layer(group_id)
+            # Подставляются только маркеры участников, базовый слой берется из кэша
+            map_data = self.map_renderer.render(group_id, locations)
+            await self.db.update_group_map(group_id, map_data)
         except Exception as e:
             logger.error(f"Error updating group map: {e}")
 
+    async def _refresh_base_layer(self, group_id: int):
+        """Секторы и важные точки операции; folium пересобирает слой только при их изменении"""
+        sectors, points = [], []
+        operation_id = await self._get_group_operation(group_id)
+        if operation_id:
+            sectors = await self.db.fetch_all(
+                "SELECT sector_id, name, boundaries, status FROM search_sectors WHERE operation_id = ?",
+                (operation_id,)
+            )
+            try:
+                points = await self.db.fetch_all(
+                    "SELECT * FROM important_points WHERE operation_id = ?", (operation_id,)
+                )
+            except Exception as e:
+                logger.warning(f"Important points are not available for operation {operation_id}: {e}")
+
+        if not self.map_renderer.has_base(group_id, base_fingerprint(sectors, points)):
+            await asyncio.get_running_loop().run_in_executor(
+                None, self.map_renderer.set_base, group_id, sectors, points
+            )
+
     async def stop_tracking(self, user_id: int) -> Optional[Dict]:
         """Завершение отслеживания"""
         try:
             if user_id in self.active_tracks:
                 track_data = self.active_tracks[user_id]
-                
+
+                # Дожидаемся записи точек из очереди
+                await self.ingest.flush()
+
                 # Сохраняем финальные данные трека
                 await self.db.complete_track(
                     track_data['track_id'],
-                    track_data['points']
+                    track_data['points'].to_dicts()
                 )
                 
                 # Генерируем статистику
                 stats = await self._generate_track_stats(track_data)
                 
                 del self.active_tracks[user_id]
+                self.user_groups.pop(user_id, None)
+                # Волонтер больше не на поиске и не должен попадать в ближайшие
+                self.live_index.remove(user_id)
                 return stats
             return None
         except Exception as e:
             logger.error(f"Error stopping tracking: {e}")
-            return None
\ No newline at end of file
+            return None
+
+    async def _generate_track_stats(self, track_data: Dict) -> Dict:
+        """Статистика завершенного трека"""
+        return self.track_analyzer.analyze_track(track_data['points'])
+
+    async def shutdown(self):
+        """Запись оставшихся точек и остановка фоновых задач"""
+        if self._pruner:
+            self._pruner.cancel()
+            await asyncio.gather(self._pruner, return_exceptions=True)
+            self._pruner = None
+        await self.ingest.stop()
+        if self.owns_history:
+            await self.location_history.close()
+        await self.map_refresher.cancel_all()
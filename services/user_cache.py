@@ -0,0 +1,193 @@
+import json
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, time as dtime
+from typing import Any, Dict, FrozenSet, Hashable, Iterable, List, Optional
+
+from core.constants.notification_settings import DEFAULT_SETTINGS
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class TTLCache:
+    """LRU-кэш с ограничением размера и временем жизни записей"""
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()  # ключ -> (срок годности, значение)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any):
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get_stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+@dataclass(frozen=True)
+class DndWindow:
+    """Окно "Не беспокоить"; может переходить через полночь (23:00-07:00)"""
+    start: dtime
+    end: dtime
+
+    @classmethod
+    def parse(cls, settings: Dict) -> Optional['DndWindow']:
+        if not settings.get('enabled'):
+            return None
+        start = datetime.strptime(settings['start_time'], '%H:%M').time()
+        end = datetime.strptime(settings['end_time'], '%H:%M').time()
+        return cls(start, end)
+
+    def contains(self, moment: dtime) -> bool:
+        if self.start <= self.end:
+            return self.start <= moment < self.end
+        return moment >= self.start or moment < self.end
+
+
+@dataclass(frozen=True)
+class UserSettings:
+    """Разобранные настройки уведомлений пользователя"""
+    settings: Dict
+    dnd: Optional[DndWindow]
+
+
+class UserAccessCache:
+    """Кэш настроек уведомлений, ролей и прав координаторов.
+
+    Записи живут ``ttl`` секунд и вытесняются по LRU; методы изменения
+    (NotificationSettingsManager, одобрение координатора) сбрасывают
+    записи пользователя сразу после записи в БД. Промахи для группы
+    пользователей дочитываются одним запросом.
+    """
+
+    def __init__(self, db_manager, maxsize: int = 10000, ttl: float = 300):
+        self.db = db_manager
+        self.settings = TTLCache(maxsize, ttl)
+        self.roles = TTLCache(maxsize, ttl)
+        self.permissions = TTLCache(maxsize, ttl)
+
+    # ---- настройки ----
+
+    @staticmethod
+    def _parse_settings(raw: Optional[str]) -> UserSettings:
+        settings = json.loads(raw) if raw else DEFAULT_SETTINGS
+        return UserSettings(settings, DndWindow.parse(settings['do_not_disturb']))
+
+    async def get_settings(self, user_id: int) -> UserSettings:
+        return (await self.get_settings_many([user_id]))[user_id]
+
+    async def get_settings_many(self, user_ids: Iterable[int]) -> Dict[int, UserSettings]:
+        result = {}
+        missing = []
+        for user_id in dict.fromkeys(user_ids):
+            cached = self.settings.get(user_id, _MISSING)
+            if cached is _MISSING:
+                missing.append(user_id)
+            else:
+                result[user_id] = cached
+        if missing:
+            rows = await self.db.fetch_all(
+                f"SELECT user_id, settings FROM notification_settings "
+                f"WHERE user_id IN ({', '.join('?' * len(missing))})",
+                tuple(missing)
+            )
+            found = {row['user_id']: row['settings'] for row in rows}
+            for user_id in missing:
+                parsed = self._parse_settings(found.get(user_id))
+                self.settings.set(user_id, parsed)
+                result[user_id] = parsed
+        return result
+
+    # ---- роли и права ----
+
+    async def is_coordinator(self, user_id: int) -> bool:
+        cached = self.roles.get(user_id, _MISSING)
+        if cached is _MISSING:
+            row = await self.db.fetch_one("SELECT is_coordinator FROM users WHERE user_id = ?", (user_id,))
+            cached = bool(row and row['is_coordinator'])
+            self.roles.set(user_id, cached)
+        return cached
+
+    async def get_permissions(self, user_id: int) -> FrozenSet[str]:
+        cached = self.permissions.get(user_id, _MISSING)
+        if cached is _MISSING:
+            rows = await self.db.fetch_all(
+                "SELECT permission FROM coordinator_permissions WHERE coordinator_id = ?", (user_id,)
+            )
+            cached = frozenset(row['permission'] for row in rows)
+            self.permissions.set(user_id, cached)
+        return cached
+
+    async def has_permission(self, user_id: int, permission: str) -> bool:
+        return permission in await self.get_permissions(user_id)
+
+    # ---- инвалидация ----
+
+    def invalidate_settings(self, user_id: int):
+        self.settings.invalidate(user_id)
+
+    def invalidate_roles(self, user_id: int):
+        self.roles.invalidate(user_id)
+        self.permissions.invalidate(user_id)
+
+    def invalidate_user(self, user_id: int):
+        self.invalidate_settings(user_id)
+        self.invalidate_roles(user_id)
+
+    def clear(self):
+        for cache in (self.settings, self.roles, self.permissions):
+            cache.clear()
+
+    def get_stats(self) -> Dict[str, Dict]:
+        return {
+            'settings': self.settings.get_stats(),
+            'roles': self.roles.get_stats(),
+            'permissions': self.permissions.get_stats(),
+        }
+
+
+def access_cache_for(db_manager) -> UserAccessCache:
+    """Общий кэш для менеджера БД: все его пользователи видят одну инвалидацию"""
+    cache = getattr(db_manager, 'access_cache', None)
+    if cache is None:
+        cache = UserAccessCache(db_manager)
+        db_manager.access_cache = cache
+    return cache
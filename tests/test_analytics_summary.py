@@ -0,0 +1,161 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+from core.analytics_manager import AnalyticsManager
+from core.application import BotApplication
+from core.efficiency_manager import EfficiencyManager
+from database.db_manager import DatabaseManager
+from services.analytics_summary import AnalyticsRefresher, AnalyticsSummary
+
+SCHEMA = """
+    CREATE TABLE search_operations (operation_id INTEGER PRIMARY KEY, name TEXT, status TEXT,
+        search_area TEXT);
+    CREATE TABLE search_groups (group_id INTEGER PRIMARY KEY, operation_id INTEGER, name TEXT);
+    CREATE TABLE group_members (member_id INTEGER PRIMARY KEY, group_id INTEGER, user_id INTEGER);
+    CREATE TABLE coordination_tasks (task_id INTEGER PRIMARY KEY, operation_id INTEGER,
+        group_id INTEGER, title TEXT, status TEXT, assigned_to INTEGER);
+    CREATE TABLE user_tracks (track_id INTEGER PRIMARY KEY, user_id INTEGER, group_id INTEGER,
+        distance REAL);
+    CREATE TABLE operation_reports (report_id INTEGER PRIMARY KEY, operation_id INTEGER,
+        created_by INTEGER, report_data TEXT);
+    CREATE TABLE operation_timestamps (id INTEGER PRIMARY KEY, operation_id INTEGER,
+        event_type TEXT, timestamp TEXT, details TEXT);
+    CREATE TABLE operation_metrics (operation_id INTEGER PRIMARY KEY, response_time INTEGER,
+        coordination_score FLOAT, resource_efficiency FLOAT, coverage_rate FLOAT,
+        success_rate FLOAT, total_distance FLOAT);
+    CREATE TABLE coverage_grids (operation_id INTEGER PRIMARY KEY, data BLOB, updated_at TEXT);
+"""
+
+
+class CountingDatabase(DatabaseManager):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.reads = 0
+
+    async def fetch_all(self, query, params=()):
+        self.reads += 1
+        return await super().fetch_all(query, params)
+
+
+class TestAnalyticsSummary(unittest.TestCase):
+    def run_scenario(self, scenario):
+        async def runner():
+            with tempfile.TemporaryDirectory() as tmp:
+                db = CountingDatabase(os.path.join(tmp, 'analytics.db'))
+                await db.init_pool()
+                await db.executescript(SCHEMA)
+                summary = AnalyticsSummary(db)
+                await summary.install()
+                try:
+                    return await scenario(db, summary)
+                finally:
+                    await db.close()
+        return asyncio.run(runner())
+
+    @staticmethod
+    async def populate(db, operation_id: int, teams: int = 2, completed: int = 1):
+        await db.execute("INSERT INTO search_operations VALUES (?, ?, 'active', NULL)",
+                         (operation_id, f"Операция {operation_id}"))
+        for team in range(teams):
+            group_id = operation_id * 100 + team
+            await db.execute("INSERT INTO search_groups VALUES (?, ?, ?)",
+                             (group_id, operation_id, f"Группа {team}"))
+            await db.executemany("INSERT INTO group_members (group_id, user_id) VALUES (?, ?)",
+                                 [(group_id, group_id * 10 + i) for i in range(3)])
+            await db.executemany(
+                "INSERT INTO coordination_tasks (operation_id, group_id, title, status, assigned_to) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(operation_id, group_id, f"Задача {i}", 'completed' if i < completed else 'pending',
+                  group_id * 10 + i) for i in range(2)]
+            )
+            await db.execute("INSERT INTO user_tracks (user_id, group_id, distance) VALUES (?, ?, ?)",
+                             (group_id * 10, group_id, 2.5))
+
+    def test_application_startup_fills_existing_data(self):
+        async def runner():
+            with tempfile.TemporaryDirectory() as tmp:
+                app = BotApplication('token', db_path=os.path.join(tmp, 'startup.db'))
+                await app.db.init_pool()
+                await app.db.executescript(SCHEMA)
+                # Данные, записанные до появления сводок
+                await self.populate(app.db, 1)
+                await app.setup_services()
+                await self.populate(app.db, 2)
+                try:
+                    return [await app.analytics_summary.get_operation(i) for i in (1, 2)]
+                finally:
+                    await app.db.close()
+
+        for operation in asyncio.run(runner()):
+            self.assertEqual((operation['team_count'], operation['task_total']), (2, 4))
+
+    def test_triggers_keep_counters_in_sync(self):
+        async def scenario(db, summary):
+            await self.populate(db, 1)
+            await db.execute("UPDATE coordination_tasks SET status = 'completed' WHERE task_id = 2")
+            await db.execute("UPDATE user_tracks SET distance = 4.0 WHERE track_id = 1")
+            await db.execute("UPDATE coordination_tasks SET group_id = 101 WHERE task_id = 1")
+            await db.execute("DELETE FROM group_members WHERE user_id = 1000")
+            await db.execute("INSERT INTO operation_reports VALUES (1, 1, 1001, '{}')")
+            incremental = (await summary.get_operation(1), await summary.get_teams([1]),
+                           await summary.get_users(1))
+            await summary.rebuild()
+            rebuilt = (await summary.get_operation(1), await summary.get_teams([1]),
+                       await summary.get_users(1))
+            return incremental, rebuilt
+
+        incremental, rebuilt = self.run_scenario(scenario)
+        operation, teams, users = incremental
+        self.assertEqual(operation['team_count'], 2)
+        self.assertEqual(operation['participant_count'], 5)
+        self.assertEqual((operation['task_total'], operation['task_completed']), (4, 3))
+        self.assertEqual((operation['track_count'], operation['total_distance']), (2, 6.5))
+        self.assertEqual(operation['report_count'], 1)
+        self.assertEqual([(t['group_id'], t['task_total'], t['member_count']) for t in teams[1]],
+                         [(100, 1, 2), (101, 3, 3)])
+
+        counters = ('team_count', 'participant_count', 'task_total', 'task_completed',
+                    'track_count', 'total_distance', 'report_count')
+        self.assertEqual({k: operation[k] for k in counters}, {k: rebuilt[0][k] for k in counters})
+        self.assertEqual(teams, rebuilt[1])
+        self.assertEqual(users, rebuilt[2])
+
+    def test_refresher_updates_only_changed_operations(self):
+        async def scenario(db, summary):
+            for operation_id in (1, 2):
+                await self.populate(db, operation_id)
+            efficiency = EfficiencyManager(db, summary=summary)
+            refresher = AnalyticsRefresher(summary, efficiency)
+            first = await refresher.refresh_dirty()
+            second = await refresher.refresh_dirty()
+            await db.execute("UPDATE coordination_tasks SET status = 'completed' WHERE task_id = 2")
+            third = await refresher.refresh_dirty()
+            return first, second, third, await summary.get_operation(1)
+
+        first, second, third, operation = self.run_scenario(scenario)
+        self.assertEqual((first, second, third), (2, 0, 1))
+        self.assertEqual(operation['refreshed_changes'], operation['changes'])
+        self.assertEqual(operation['resource_efficiency'], round(3 / 6 * 100, 2))
+        self.assertIsNotNone(operation['coordination_score'])
+
+    def test_comparison_is_constant_number_of_reads(self):
+        async def scenario(db, summary):
+            for operation_id in range(1, 31):
+                await self.populate(db, operation_id, completed=operation_id % 3)
+            analytics = AnalyticsManager(db, summary=summary)
+            reads = db.reads
+            result = await analytics.generate_comparative_analysis(list(range(1, 31)))
+            return result, db.reads - reads
+
+        result, reads = self.run_scenario(scenario)
+        self.assertEqual(reads, 2)
+        self.assertEqual(len(result['operations']), 30)
+        self.assertEqual(result['comparison']['task_completion_rate']['max'], 100.0)
+        self.assertEqual(result['comparison']['task_completion_rate']['best_operation'], 2)
+        self.assertEqual(result['best_practices'][0]['completion_rate'], 100.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
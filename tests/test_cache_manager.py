@@ -0,0 +1,160 @@
+import asyncio
+import time
+import unittest
+
+from database.cache_manager import CacheManager, LocalCache, cached
+
+try:
+    import fakeredis.aioredis as fakeredis
+except ImportError:
+    fakeredis = None
+
+
+class BrokenRedis:
+    """Redis, до которого нельзя достучаться"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def ping(self):
+        self.calls += 1
+        raise ConnectionError("Connection refused")
+
+    async def get(self, key):
+        self.calls += 1
+        raise ConnectionError("Connection refused")
+
+
+class MembersManager:
+    def __init__(self, cache=None):
+        self.cache = cache
+        self.queries = 0
+
+    @cached(ttl=60, key=lambda group_id: f"group:{group_id}:members", tags=lambda group_id: [f"group:{group_id}"])
+    async def get_group_members(self, group_id):
+        self.queries += 1
+        await asyncio.sleep(0.01)
+        return [{'user_id': group_id * 10, 'queries': self.queries}]
+
+    @cached(ttl=60)
+    async def search(self, text, limit=10):
+        self.queries += 1
+        return [text] * limit
+
+
+class TestLocalCache(unittest.TestCase):
+    def test_byte_limit_ttl_and_tags(self):
+        cache = LocalCache(max_items=100, max_bytes=100)
+        cache.set('a', b'"' + b'x' * 38 + b'"', 60, tags=['group:1'])
+        cache.set('b', b'"' + b'y' * 38 + b'"', 60, tags=['group:2'])
+        cache.get('a')
+        cache.set('c', b'"' + b'z' * 38 + b'"', 60, tags=['group:1'])  # 120 байт - вытесняется 'b'
+        self.assertEqual(cache.size, 80)
+        self.assertEqual(cache.stats['evictions'], 1)
+        self.assertEqual(cache.get('a'), 'x' * 38)
+        cache.invalidate_tags(['group:1'])
+        self.assertEqual(len(cache), 0)
+        cache.set('op:1:report', b'1', 0.01)
+        cache.set('op:2:report', b'2', 60)
+        time.sleep(0.02)
+        cache.invalidate('op:2:*')
+        self.assertEqual(len(cache), 1)  # просроченная запись удаляется при чтении
+        cache.get('op:1:report')
+        self.assertEqual((len(cache), cache.size), (0, 0))
+
+
+class TestCacheManager(unittest.TestCase):
+    def test_stampede_protection(self):
+        async def scenario():
+            manager = MembersManager(CacheManager(redis_url=None))
+            results = await asyncio.gather(*(manager.get_group_members(3) for _ in range(50)))
+            again = await manager.get_group_members(3)
+            await manager.cache.invalidate_tags('group:3')
+            fresh = await manager.get_group_members(3)
+            return results, again, fresh, manager.queries, manager.cache.get_stats()
+
+        results, again, fresh, queries, stats = asyncio.run(scenario())
+        self.assertEqual(queries, 2)
+        self.assertTrue(all(result == [{'user_id': 30, 'queries': 1}] for result in results))
+        self.assertEqual(again, results[0])
+        self.assertEqual(fresh[0]['queries'], 2)
+        self.assertEqual(stats['coalesced'], 49)
+        self.assertEqual(stats['loads'], 2)
+
+    def test_failed_load_is_not_cached(self):
+        async def scenario():
+            cache = CacheManager(redis_url=None)
+            calls = []
+
+            async def loader():
+                calls.append(1)
+                await asyncio.sleep(0.01)
+                if len(calls) == 1:
+                    raise ValueError("db locked")
+                return 42
+
+            first = await asyncio.gather(*(cache.get_or_set('k', loader) for _ in range(5)),
+                                         return_exceptions=True)
+            second = await cache.get_or_set('k', loader)
+            return first, second, len(calls)
+
+        first, second, calls = asyncio.run(scenario())
+        self.assertTrue(all(isinstance(result, ValueError) for result in first))
+        self.assertEqual((second, calls), (42, 2))
+
+    def test_decorator_without_cache_and_default_keys(self):
+        async def scenario():
+            plain = MembersManager()
+            await plain.get_group_members(1)
+            await plain.get_group_members(1)
+            manager = MembersManager(CacheManager(redis_url=None))
+            await manager.search('river', limit=2)
+            await manager.search('river', limit=2)
+            await manager.search('river', limit=3)
+            return plain.queries, manager.queries
+
+        self.assertEqual(asyncio.run(scenario()), (2, 2))
+
+    def test_falls_back_to_local_when_redis_is_down(self):
+        async def scenario():
+            redis = BrokenRedis()
+            cache = CacheManager(redis_client=redis, retry_interval=60)
+            connected = await cache.connect()
+            await cache.set('user:1', {'name': 'Иван'})
+            value = await cache.get('user:1')
+            missing = await cache.get('user:2', 'default')
+            return connected, value, missing, redis.calls, cache.get_stats()
+
+        connected, value, missing, calls, stats = asyncio.run(scenario())
+        self.assertFalse(connected)
+        self.assertEqual(value, {'name': 'Иван'})
+        self.assertEqual(missing, 'default')
+        self.assertEqual(calls, 1)  # после отказа Redis не дергается до retry_interval
+        self.assertFalse(stats['redis'])
+
+
+@unittest.skipUnless(fakeredis, "fakeredis is not installed")
+class TestRedisTier(unittest.TestCase):
+    def test_shared_tier_and_invalidation(self):
+        async def scenario():
+            server = fakeredis.FakeRedis()
+            first = CacheManager(redis_client=server, local_ttl=60)
+            second = CacheManager(redis_client=server, local_ttl=60)
+            await first.set('operation:1:report', {'groups': 3}, tags=['operation:1'])
+            await first.set('operation:2:report', {'groups': 5})
+            shared = await second.get('operation:1:report')
+            await second.invalidate_tags('operation:1')
+            await second.invalidate('operation:2:*')
+            first.local.clear()
+            return (shared, second.stats['redis_hits'],
+                    await first.get('operation:1:report'), await first.get('operation:2:report'))
+
+        shared, redis_hits, after_tag, after_scan = asyncio.run(scenario())
+        self.assertEqual(shared, {'groups': 3})
+        self.assertEqual(redis_hits, 1)
+        self.assertIsNone(after_tag)
+        self.assertIsNone(after_scan)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+from database.db_manager import DatabaseManager
+
+
+class TestConnectionPool(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db = DatabaseManager(os.path.join(self.tmpdir.name, "pool.db"), pool_size=3)
+        self.assertTrue(await self.db.init_pool())
+
+    async def asyncTearDown(self):
+        await self.db.close()
+        self.tmpdir.cleanup()
+
+    async def test_wal_mode_enabled(self):
+        row = await self.db.fetchone("PRAGMA journal_mode")
+        self.assertEqual(row[0].lower(), "wal")
+
+    async def test_concurrent_writes_and_reads(self):
+        """Test that concurrent writes are all committed and visible to readers"""
+        await asyncio.gather(*[
+            self.db.execute(
+                "INSERT INTO tasks (operation_id, title) VALUES (?, ?)", (1, f"task {i}")
+            )
+            for i in range(100)
+        ])
+        counts = await asyncio.gather(*[
+            self.db.fetchone("SELECT COUNT(*) FROM tasks") for _ in range(10)
+        ])
+        self.assertTrue(all(row[0] == 100 for row in counts))
+
+        stats = self.db.get_pool_stats()
+        self.assertEqual(stats['readers'], 3)
+        self.assertEqual(stats['write_jobs'], 101)  # + create_tables
+        self.assertLess(stats['write_commits'], stats['write_jobs'])
+        self.assertEqual(stats['reads_in_use'], 0)
+
+    async def test_failed_write_does_not_affect_batch(self):
+        """Test that a failing job is rolled back without losing its neighbours"""
+        results = await asyncio.gather(
+            self.db.execute("INSERT INTO tasks (operation_id, title) VALUES (1, 'ok')"),
+            self.db.execute("INSERT INTO tasks (operation_id) VALUES (1)"),  # NOT NULL
+            self.db.executemany(
+                "INSERT INTO tasks (operation_id, title) VALUES (?, ?)",
+                [(2, 'a'), (2, 'b')]
+            ),
+            return_exceptions=True
+        )
+        self.assertIsInstance(results[1], Exception)
+        row = await self.db.fetchone("SELECT COUNT(*) FROM tasks")
+        self.assertEqual(row[0], 3)
+
+    async def test_memory_database_uses_single_connection(self):
+        db = DatabaseManager(":memory:")
+        await db.init_pool()
+        await db.execute("INSERT INTO users (user_id, password_hash) VALUES (1, 'x')")
+        row = await db.fetchone("SELECT COUNT(*) FROM users")
+        self.assertEqual(row[0], 1)
+        self.assertEqual(db.get_pool_stats()['readers'], 0)
+        await db.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
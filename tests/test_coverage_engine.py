@@ -0,0 +1,93 @@
+import json
+import unittest
+from unittest.mock import MagicMock
+
+from core.sector_manager import SectorManager
+from services.coverage_engine import CoverageEngine
+
+# Сектор ~630 x 1110 м
+BOUNDARIES = [(37.60, 55.75), (37.61, 55.75), (37.61, 55.76), (37.60, 55.76)]
+
+
+def sweep(lon: float, count: int = 200):
+    """Проход с юга на север по долготе ``lon``"""
+    return [{'lat': 55.75 + i * 0.01 / (count - 1), 'lon': lon} for i in range(count)]
+
+
+class TestCoverageEngine(unittest.TestCase):
+    def setUp(self):
+        self.engine = CoverageEngine(search_radius=50.0)
+        self.engine.ensure_sector(1, BOUNDARIES)
+
+    def test_single_sweep_coverage(self):
+        self.engine.add_points(1, 10, sweep(37.605))
+        # Полоса 100 м из ~630 м ширины сектора
+        self.assertAlmostEqual(self.engine.get_coverage(1), 100 / 630 * 100, delta=1.0)
+
+    def test_incremental_updates_only_process_new_points(self):
+        points = sweep(37.605)
+        self.assertEqual(self.engine.add_points(1, 10, points[:100]), 100)
+        partial = self.engine.get_coverage(1)
+        self.assertEqual(self.engine.add_points(1, 10, points), 100)
+        self.assertEqual(self.engine.add_points(1, 10, points), 0)
+        full = self.engine.get_coverage(1)
+        self.assertAlmostEqual(partial, full / 2, delta=1.0)
+
+    def test_full_coverage(self):
+        for i, lon in enumerate(x / 1000 for x in range(37600, 37611)):
+            self.engine.add_points(1, i, sweep(lon))
+        self.assertEqual(self.engine.get_coverage(1), 100.0)
+
+
+class TestSectorManagerCoverage(unittest.TestCase):
+    def test_get_sector_coverage(self):
+        db = MagicMock()
+        db.get_sector.return_value = {
+            'boundaries': json.dumps({'type': 'Polygon', 'coordinates': [BOUNDARIES + [BOUNDARIES[0]]]})
+        }
+        track = {'track_id': 5, 'points_json': json.dumps(sweep(37.605))}
+        db.get_sector_tracks.return_value = [track]
+        manager = SectorManager(db, MagicMock(), MagicMock())
+
+        first = manager.get_sector_coverage(1)
+        self.assertGreater(first, 10)
+        track['points_json'] = json.dumps(sweep(37.605) + sweep(37.607))
+        self.assertGreater(manager.get_sector_coverage(1), first)
+
+    def test_rewritten_track_resets_coverage(self):
+        def manager_for(tracks):
+            db = MagicMock()
+            db.get_sector.return_value = {
+                'boundaries': json.dumps({'type': 'Polygon', 'coordinates': [BOUNDARIES + [BOUNDARIES[0]]]})
+            }
+            db.get_sector_tracks.return_value = tracks
+            return SectorManager(db, MagicMock(), MagicMock())
+
+        other = {'track_id': 4, 'points_json': json.dumps(sweep(37.602))}
+        track = {'track_id': 5, 'points_json': json.dumps(sweep(37.605) + sweep(37.608))}
+        manager = manager_for([other, track])
+        manager.get_sector_coverage(1)
+
+        # Та же длина, другое содержимое: полоса сдвинута
+        shifted = json.dumps(sweep(37.605) + sweep(37.609))
+        self.assertEqual(len(shifted), len(track['points_json']))
+        track['points_json'] = shifted
+        expected = manager_for([dict(other), dict(track)]).get_sector_coverage(1)
+        self.assertAlmostEqual(manager.get_sector_coverage(1), expected, places=6)
+
+        # Трек укоротился: покрытие пересчитано, соседний трек не потерян
+        track['points_json'] = json.dumps(sweep(37.605))
+        self.assertAlmostEqual(manager.get_sector_coverage(1), 2 * 100 / 630 * 100, delta=1.5)
+
+    def test_track_points_delta(self):
+        db = MagicMock()
+        manager = SectorManager(db, MagicMock(), MagicMock())
+        manager.coverage_engine.ensure_sector(1, BOUNDARIES)
+        points = sweep(37.605)
+        self.assertEqual(manager.add_track_points(1, 5, points[:100]), 100)
+        self.assertEqual(manager.add_track_points(1, 5, points[100:]), 100)
+        self.assertAlmostEqual(manager.coverage_engine.get_coverage(1), 100 / 630 * 100, delta=1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from database.db_manager import DatabaseManager
+from services.coverage_engine import CoverageEngine
+from services.coverage_grid import CoverageGrid, CoverageGridStore
+
+SECTOR = [(37.600, 55.750), (37.610, 55.750), (37.610, 55.756), (37.600, 55.756), (37.600, 55.750)]
+
+
+def zigzag_points(count: int = 2000):
+    """Проход "змейкой" по сектору"""
+    t = np.linspace(0, 1, count)
+    lat = 55.7505 + t * 0.005
+    lon = 37.6005 + 0.009 * np.abs(((t * 6) % 2) - 1)
+    return [{'lat': float(a), 'lon': float(b)} for a, b in zip(lat, lon)]
+
+
+class TestCoverageGrid(unittest.TestCase):
+    def test_matches_vector_engine(self):
+        points = zigzag_points()
+        grid = CoverageGrid.for_area(SECTOR, cell_size=2.0, search_radius=50.0)
+        grid.add_points([p['lat'] for p in points], [p['lon'] for p in points], track_id=1)
+
+        engine = CoverageEngine(search_radius=50.0, simplify_tolerance=0.5)
+        engine.ensure_sector(1, SECTOR)
+        engine.add_points(1, 1, points)
+
+        raster = grid.sector_coverage(1, SECTOR)
+        vector = engine.get_coverage(1)
+        self.assertGreater(raster, 10.0)
+        self.assertAlmostEqual(raster, vector, delta=2.0)
+
+    def test_gaps_are_filled_and_tracks_continue(self):
+        grid = CoverageGrid.for_area(SECTOR, search_radius=20.0)
+        # Две удаленные фиксации одного трека в разных вызовах: отрезок между ними закрашен
+        grid.add_points([55.751], [37.601], track_id=7)
+        grid.add_points([55.751], [37.603], track_id=7)
+        x, y = grid._to_xy(np.array([55.751]), np.array([37.602]))
+        self.assertTrue(grid.cells[int(y[0] // grid.cell_size), int(x[0] // grid.cell_size)])
+
+        # Скачок длиннее max_gap не заполняется
+        grid = CoverageGrid.for_area(SECTOR, search_radius=20.0, max_gap=100.0)
+        grid.add_points([55.751, 55.751], [37.601, 37.609])
+        x, y = grid._to_xy(np.array([55.751]), np.array([37.605]))
+        self.assertFalse(grid.cells[int(y[0] // grid.cell_size), int(x[0] // grid.cell_size)])
+
+    def test_heatmap_and_blob_roundtrip(self):
+        points = zigzag_points(500)
+        grid = CoverageGrid.for_area(SECTOR)
+        grid.add_points([p['lat'] for p in points], [p['lon'] for p in points])
+        heat = grid.heatmap()
+        self.assertEqual(sum(p['weight'] for p in heat), 500)
+
+        restored = CoverageGrid.from_blob(grid.to_blob())
+        self.assertTrue(np.array_equal(restored.cells, grid.cells))
+        self.assertTrue(np.array_equal(restored.heat, grid.heat))
+        self.assertAlmostEqual(restored.sector_coverage(1, SECTOR), grid.sector_coverage(1, SECTOR))
+
+    def test_store_persists_grid(self):
+        async def scenario(path):
+            db = DatabaseManager(path)
+            await db.init_pool()
+            await db.execute("""
+                CREATE TABLE coverage_grids (
+                    operation_id INTEGER PRIMARY KEY, data BLOB NOT NULL,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)
+            """)
+            store = CoverageGridStore(db, search_radius=30.0)
+            grid = store.create(5, SECTOR)
+            grid.add_points([55.752, 55.753], [37.602, 37.604], track_id=1)
+            self.assertTrue(await store.save(5))
+
+            loaded = await CoverageGridStore(db).load(5)
+            await db.close()
+            return grid, loaded
+
+        with tempfile.TemporaryDirectory() as tmp:
+            grid, loaded = asyncio.run(scenario(os.path.join(tmp, 'grid.db')))
+        self.assertEqual(loaded.search_radius, 30.0)
+        self.assertTrue(np.array_equal(loaded.cells, grid.cells))
+
+    def test_live_points_create_and_persist_grid(self):
+        async def scenario(path):
+            db = DatabaseManager(path)
+            await db.init_pool()
+            await db.executescript("""
+                CREATE TABLE coverage_grids (
+                    operation_id INTEGER PRIMARY KEY, data BLOB NOT NULL,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+                CREATE TABLE search_operations (operation_id INTEGER PRIMARY KEY, search_area TEXT);
+            """)
+            await db.execute("INSERT INTO search_operations VALUES (7, ?)",
+                             (json.dumps({'type': 'Polygon', 'coordinates': [SECTOR]}),))
+            store = CoverageGridStore(db, flush_interval=0.05)
+            store.start()
+            for point in zigzag_points(200):
+                store.submit(7, 1, point['lat'], point['lon'])
+            store.submit(8, 1, 55.75, 37.6)  # операция без области поиска
+            await asyncio.sleep(0.2)
+            store.submit(7, 1, 55.7559, 37.6009)
+            await store.stop()
+
+            loaded = await CoverageGridStore(db).load(7)
+            await db.close()
+            return store.cached(7), loaded
+
+        with tempfile.TemporaryDirectory() as tmp:
+            grid, loaded = asyncio.run(scenario(os.path.join(tmp, 'live.db')))
+        self.assertGreater(grid.coverage(SECTOR), 50)
+        # Точки, пришедшие перед остановкой, тоже сохранены
+        self.assertTrue(np.array_equal(loaded.cells, grid.cells))
+
+    def test_untracked_fixes_of_different_users_are_not_joined(self):
+        grid = CoverageGrid.for_area(SECTOR)
+        # Два волонтера без записи трека в ~250 м друг от друга
+        CoverageGridStore._rasterize(grid, [(None, 1, 55.752, 37.602), (None, 2, 55.752, 37.606),
+                                            (None, 1, 55.7521, 37.602)])
+        footprints = CoverageGrid.for_area(SECTOR)
+        for lat, lon in ((55.752, 37.602), (55.752, 37.606), (55.7521, 37.602)):
+            footprints.add_points([lat], [lon])
+        # Только отпечатки точек, полоса между волонтерами не закрашена
+        self.assertTrue(np.array_equal(grid.cells, footprints.cells))
+
+
+if __name__ == '__main__':
+    unittest.main()
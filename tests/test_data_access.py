@@ -0,0 +1,133 @@
+import asyncio
+import os
+from datetime import datetime, timedelta
+import tempfile
+import unittest
+
+from database.db_manager import DatabaseManager, create_pool
+from database.connection_pool import SQLitePool
+from database.postgres_pool import PostgresConnection, PostgresPool, translate_placeholders
+
+POSTGRES_DSN = os.getenv('TEST_POSTGRES_DSN')
+
+SCHEMA = {
+    'sqlite': """
+        CREATE TABLE IF NOT EXISTS dal_points (
+            point_id INTEGER PRIMARY KEY, track_id INTEGER, note TEXT, latitude REAL,
+            recorded_at TIMESTAMP
+        );
+    """,
+    'postgres': """
+        DROP TABLE IF EXISTS dal_points;
+        CREATE TABLE dal_points (
+            point_id SERIAL PRIMARY KEY, track_id INTEGER, note TEXT, latitude DOUBLE PRECISION,
+            recorded_at TIMESTAMP
+        );
+    """,
+}
+
+
+async def contract(db: DatabaseManager):
+    """Одинаковое поведение слоя доступа на любом бэкенде"""
+    await db.init_pool()
+    await db.executescript(SCHEMA[db.dialect])
+    first = await db.execute("INSERT INTO dal_points (track_id, note, latitude) VALUES (?, ?, ?)",
+                             (1, "what? 'quoted'", 55.1))
+    written = await db.execute_many(
+        "INSERT INTO dal_points (track_id, note, latitude) VALUES (?, ?, ?)",
+        [(1, f"p{i}", 55.2 + i) for i in range(5)]
+    )
+    # COPY в PostgreSQL требует datetime для колонки TIMESTAMP
+    start = datetime(2024, 5, 1, 10, 0, 0)
+    copied = await db.copy_records('dal_points', ('track_id', 'note', 'latitude', 'recorded_at'),
+                                   [(2, f"c{i}", 56.0 + i, start + timedelta(seconds=i))
+                                    for i in range(100)])
+    recent = await db.fetch_one("SELECT COUNT(*) AS points FROM dal_points WHERE recorded_at >= ?",
+                                (start + timedelta(seconds=60),))
+
+    async def job(conn):
+        cursor = await conn.execute("UPDATE dal_points SET note = ? WHERE track_id = ?", ('moved', 2))
+        return cursor.rowcount
+
+    updated = await db.run_in_transaction(job)
+    row = await db.fetch_one("SELECT * FROM dal_points WHERE point_id = ?", (first,))
+    rows = await db.fetch_all("SELECT track_id, COUNT(*) AS points FROM dal_points "
+                              "WHERE note <> '?' GROUP BY track_id ORDER BY track_id")
+    batches = [len(batch) async for batch in db.iterate(
+        "SELECT point_id FROM dal_points ORDER BY point_id", batch_size=40)]
+    missing = await db.fetch_one("SELECT * FROM dal_points WHERE point_id = ?", (-1,))
+    await db.close()
+    return first, written, copied, recent, updated, row, rows, batches, missing
+
+
+class TestPlaceholders(unittest.TestCase):
+    def test_translation_skips_literals_and_comments(self):
+        self.assertEqual(
+            translate_placeholders("SELECT '?', \"a?\" FROM t -- why?\nWHERE a = ? AND b IN (?, ?) /* ? */"),
+            "SELECT '?', \"a?\" FROM t -- why?\nWHERE a = $1 AND b IN ($2, $3) /* ? */"
+        )
+        self.assertEqual(translate_placeholders("SELECT 'it''s ?' WHERE x = ?"),
+                         "SELECT 'it''s ?' WHERE x = $1")
+
+    def test_pool_selection(self):
+        self.assertIsInstance(create_pool('bot_database.db'), SQLitePool)
+        self.assertIsInstance(create_pool('postgresql://bot@localhost/bot'), PostgresPool)
+        self.assertEqual(DatabaseManager('postgres://localhost/bot').dialect, 'postgres')
+
+
+class FakeRecord(dict):
+    def __iter__(self):
+        return iter(self.values())
+
+
+class FakeAsyncpgConnection:
+    def __init__(self):
+        self.calls = []
+
+    async def fetch(self, query, *args):
+        self.calls.append(('fetch', query, args))
+        return [FakeRecord(point_id=41, track_id=args[0])]
+
+    async def execute(self, query, *args):
+        self.calls.append(('execute', query, args))
+        return 'UPDATE 3'
+
+
+class TestPostgresConnection(unittest.TestCase):
+    def test_insert_returns_primary_key(self):
+        async def scenario():
+            raw = FakeAsyncpgConnection()
+            conn = PostgresConnection(raw)
+            inserted = await conn.execute("INSERT INTO dal_points (track_id) VALUES (?);", (7,))
+            updated = await conn.execute("UPDATE dal_points SET note = ? WHERE track_id = ?", ('x', 7))
+            return raw.calls, inserted, updated
+
+        calls, inserted, updated = asyncio.run(scenario())
+        self.assertEqual(calls[0], ('fetch', "INSERT INTO dal_points (track_id) VALUES ($1) RETURNING *", (7,)))
+        self.assertEqual(inserted.lastrowid, 41)
+        self.assertEqual(calls[1][1], "UPDATE dal_points SET note = $1 WHERE track_id = $2")
+        self.assertEqual(updated.rowcount, 3)
+
+
+class TestDataAccessContract(unittest.TestCase):
+    def check(self, result):
+        first, written, copied, recent, updated, row, rows, batches, missing = result
+        self.assertEqual(recent['points'], 40)
+        self.assertEqual(row['note'], "what? 'quoted'")
+        self.assertEqual(row['point_id'], first)
+        self.assertEqual((written, copied, updated), (5, 100, 100))
+        self.assertEqual(rows, [{'track_id': 1, 'points': 6}, {'track_id': 2, 'points': 100}])
+        self.assertEqual(batches, [40, 40, 26])
+        self.assertIsNone(missing)
+
+    def test_sqlite_backend(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            self.check(asyncio.run(contract(DatabaseManager(os.path.join(tmp, 'dal.db')))))
+
+    @unittest.skipUnless(POSTGRES_DSN, "TEST_POSTGRES_DSN is not set")
+    def test_postgres_backend(self):
+        self.check(asyncio.run(contract(DatabaseManager(POSTGRES_DSN))))
+
+
+if __name__ == '__main__':
+    unittest.main()
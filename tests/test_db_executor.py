@@ -0,0 +1,181 @@
+import asyncio
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+
+from core.group_manager import GroupManager
+from database.cache_manager import CacheManager
+from database.db_manager import DatabaseManager
+from database.executor import SQLiteExecutor, executor_for
+from utils.loop_monitor import LoopBlockDetector
+
+
+class FakeNotifications:
+    def __init__(self):
+        self.sent = []
+
+    async def notify_group(self, group_id, message, exclude_user_id=None):
+        self.sent.append((group_id, exclude_user_id))
+
+
+class FakeTracking:
+    def __init__(self):
+        self.changes = []
+
+    def user_group_changed(self, user_id, group_id=None):
+        self.changes.append((user_id, group_id))
+
+
+def slow_write(conn, rows):
+    """Тяжелая запись координатора"""
+    conn.executemany("INSERT INTO points (value) VALUES (?)", ((i,) for i in range(rows)))
+    return conn.execute("SELECT COUNT(*) FROM points").fetchone()[0]
+
+
+class TestSQLiteExecutor(unittest.TestCase):
+    def setUp(self):
+        fd, self.db_path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("CREATE TABLE points (value INTEGER)")
+
+    def tearDown(self):
+        os.remove(self.db_path)
+
+    def test_loop_stays_responsive_during_heavy_write(self):
+        async def scenario():
+            executor = SQLiteExecutor(self.db_path, workers=2)
+            detector = LoopBlockDetector(threshold=0.05)
+            detector.start()
+            ticks = 0
+
+            async def ticker():
+                nonlocal ticks
+                while True:
+                    await asyncio.sleep(0.005)
+                    ticks += 1
+
+            task = asyncio.create_task(ticker())
+            started = time.perf_counter()
+            count = await executor.run(slow_write, 300_000)
+            elapsed = time.perf_counter() - started
+            task.cancel()
+            await detector.stop()
+            executor.close()
+            return count, elapsed, ticks, detector.stats['blocks']
+
+        count, elapsed, ticks, blocks = asyncio.run(scenario())
+        self.assertEqual(count, 300_000)
+        self.assertGreater(ticks, elapsed / 0.005 * 0.3)
+        self.assertEqual(blocks, 0)
+
+    def test_rollback_on_error(self):
+        def failing(conn):
+            conn.execute("INSERT INTO points (value) VALUES (1)")
+            raise ValueError("boom")
+
+        async def scenario():
+            executor = SQLiteExecutor(self.db_path, workers=1)
+            with self.assertRaises(ValueError):
+                await executor.run(failing)
+            row = await executor.fetchone("SELECT COUNT(*) FROM points")
+            stats = executor.get_stats()
+            executor.close()
+            return row[0], stats
+
+        count, stats = asyncio.run(scenario())
+        self.assertEqual(count, 0)
+        self.assertEqual((stats['jobs'], stats['errors']), (2, 1))
+
+    def test_stats_from_parallel_jobs(self):
+        async def scenario():
+            executor = SQLiteExecutor(self.db_path, workers=4)
+            await asyncio.gather(*(executor.fetchone("SELECT COUNT(*) FROM points") for _ in range(200)))
+            stats = executor.get_stats()
+            executor.close()
+            return stats
+
+        stats = asyncio.run(scenario())
+        self.assertEqual((stats['jobs'], stats['errors']), (200, 0))
+        self.assertLessEqual(stats['connections'], 4)
+
+    def test_postgres_dsn_refused(self):
+        with self.assertRaises(ValueError):
+            executor_for('postgresql://bot@localhost/bot')
+
+    def test_detector_reports_blocking_call(self):
+        db_path = self.db_path
+
+        async def blocking_handler():
+            with sqlite3.connect(db_path) as conn:
+                slow_write(conn, 300_000)
+                time.sleep(0.2)
+
+        async def scenario():
+            detector = LoopBlockDetector(threshold=0.05)
+            detector.start()
+            await asyncio.sleep(0.05)
+            with self.assertLogs('utils.loop_monitor', 'WARNING'):
+                await asyncio.create_task(blocking_handler(), name='coordinator-write')
+                await asyncio.sleep(0.1)
+            await detector.stop()
+            return list(detector.blocks)
+
+        blocks = asyncio.run(scenario())
+        self.assertEqual(len(blocks), 1)
+        self.assertGreater(blocks[0]['duration'], 0.15)
+        self.assertEqual(blocks[0]['task'], 'coordinator-write')
+        self.assertTrue(any('blocking_handler' in line for line in blocks[0]['stack']))
+
+
+class TestGroupManagerFlow(unittest.TestCase):
+    def test_group_flow(self):
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        self.addCleanup(os.remove, db_path)
+        with sqlite3.connect(db_path) as conn:
+            conn.executescript("""
+                CREATE TABLE users (user_id INTEGER PRIMARY KEY, username TEXT, full_name TEXT);
+                CREATE TABLE search_groups (
+                    group_id INTEGER PRIMARY KEY, operation_id INTEGER, name TEXT, leader_id INTEGER,
+                    type TEXT, max_members INTEGER, equipment_required TEXT, experience_required INTEGER);
+                CREATE TABLE group_members (
+                    group_id INTEGER, user_id INTEGER, role TEXT, status TEXT,
+                    last_location TEXT, last_active TIMESTAMP, UNIQUE (group_id, user_id));
+                CREATE TABLE location_history (user_id INTEGER, group_id INTEGER, location TEXT);
+                INSERT INTO users VALUES (1, 'lead', 'Анна'), (2, 'scout', 'Борис');
+            """)
+
+        async def scenario():
+            db = DatabaseManager(db_path)
+            await db.init_pool()
+            notifications = FakeNotifications()
+            tracking = FakeTracking()
+            manager = GroupManager(db, notifications, cache=CacheManager(redis_url=None),
+                                   tracking=tracking)
+            group_id = await manager.create_group(1, {'name': 'Альфа', 'leader_id': 1})
+            await manager.add_member(group_id, 2)
+            await manager.add_member(group_id, 3)
+            await manager.remove_member(group_id, 3)
+            self.assertEqual(tracking.changes, [(1, group_id), (2, group_id), (3, group_id), (3, None)])
+            members = await manager.get_group_members(group_id)
+            # Отметки GPS не сбрасывают закэшированный состав группы
+            await manager.update_location(2, group_id, {'lat': 55.7, 'lon': 37.6})
+            await manager.get_group_members(group_id)
+            locations = await manager.get_member_locations(group_id)
+            await db.close()
+            return group_id, members, locations, notifications.sent, manager.cache.get_stats()
+
+        group_id, members, locations, sent, stats = asyncio.run(scenario())
+        self.assertEqual(sent, [(group_id, 2), (group_id, 3)])
+        self.assertEqual([member['role'] for member in members], ['member', 'leader'])
+        self.assertNotIn('last_location', members[0])
+        self.assertEqual([(row['user_id'], row['last_location']) for row in locations],
+                         [(2, {'lat': 55.7, 'lon': 37.6})])
+        self.assertEqual(stats['loads'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+
+from database.db_manager import DatabaseManager
+from services.group_map import GroupMapRenderer, members_by_user
+from services.location_ingest import MapRefreshDebouncer
+
+
+def _sector(sector_id, status='pending'):
+    ring = [[37.0, 55.0], [37.1, 55.0], [37.1, 55.1], [37.0, 55.0]]
+    return {'sector_id': sector_id, 'name': f"Сектор {sector_id}", 'status': status,
+            'boundaries': json.dumps({'type': 'Polygon', 'coordinates': [ring]})}
+
+
+class TestGroupMapRenderer(unittest.TestCase):
+    def test_base_layer_built_once(self):
+        renderer = GroupMapRenderer()
+        sectors = [_sector(1)]
+        points = [{'latitude': 55.05, 'longitude': 37.05, 'description': 'Находка'}]
+
+        for i in range(10):
+            renderer.set_base(1, sectors, points)
+            html = renderer.render(1, {7: {'latitude': 55.0 + i * 1e-3, 'longitude': 37.0}})
+
+        self.assertEqual(renderer.base_builds, 1)
+        self.assertIn('"lat": 55.009', html)
+        self.assertNotIn('__GROUP_MAP_MARKERS__', html)
+
+        # Изменение статуса сектора пересобирает базовый слой
+        renderer.set_base(1, [_sector(1, 'completed')], points)
+        self.assertEqual(renderer.base_builds, 2)
+
+    def test_only_changed_markers_change_layer(self):
+        renderer = GroupMapRenderer()
+        members = {1: {'latitude': 55.0, 'longitude': 37.0, 'name': 'Иван'},
+                   2: {'latitude': 55.1, 'longitude': 37.1}}
+        renderer.render(5, members)
+        renderer.render(5, dict(members))
+        self.assertEqual(renderer.versions[5], 1)
+
+        members[2] = {'latitude': 55.2, 'longitude': 37.1}
+        layer = json.loads(renderer.marker_layer(5, members))
+        self.assertEqual(renderer.versions[5], 2)
+        self.assertEqual([marker['lat'] for marker in layer], [55.0, 55.2])
+        self.assertEqual(layer[0]['label'], 'Иван')
+
+        del members[1]
+        self.assertEqual(len(json.loads(renderer.marker_layer(5, members))), 1)
+
+    def test_marker_label_cannot_close_script(self):
+        renderer = GroupMapRenderer()
+        html = renderer.render(1, {1: {'latitude': 55.0, 'longitude': 37.0,
+                                      'name': '</script><b>x</b>'}})
+        self.assertNotIn('</script><b>', html)
+
+
+class TestMapRefreshScheduler(unittest.TestCase):
+    def test_fixes_coalesced_and_rate_limited(self):
+        calls = []
+
+        async def refresh(group_id):
+            calls.append((group_id, asyncio.get_running_loop().time()))
+
+        async def run():
+            scheduler = MapRefreshDebouncer(refresh, delay=0.02, interval=0.15)
+            for _ in range(50):
+                scheduler.schedule(1)
+                scheduler.schedule(2)
+            await asyncio.sleep(0.05)
+            # Обновления сразу после перерисовки ждут конца интервала
+            for _ in range(3):
+                for _ in range(20):
+                    scheduler.schedule(1)
+                await asyncio.sleep(0.01)
+            await asyncio.sleep(0.3)
+            await scheduler.cancel_all()
+
+        asyncio.run(run())
+        group_calls = [at for group_id, at in calls if group_id == 1]
+        self.assertEqual(len(group_calls), 2)
+        self.assertGreaterEqual(group_calls[1] - group_calls[0], 0.14)
+        self.assertEqual(sum(1 for group_id, _ in calls if group_id == 2), 1)
+
+    def test_update_during_refresh_rescheduled(self):
+        calls = []
+
+        async def run():
+            scheduler = None
+
+            async def refresh(group_id):
+                calls.append(group_id)
+                if len(calls) == 1:
+                    scheduler.schedule(group_id)
+
+            scheduler = MapRefreshDebouncer(refresh, delay=0.01, interval=0.03)
+            scheduler.schedule(3)
+            await asyncio.sleep(0.15)
+            await scheduler.cancel_all()
+
+        asyncio.run(run())
+        self.assertEqual(calls, [3, 3])
+
+
+class TestGroupMapStorage(unittest.TestCase):
+    def test_member_locations_and_map_upsert(self):
+        async def run(path):
+            db = DatabaseManager(path)
+            await db.init_pool()
+            await db.executescript("""
+                CREATE TABLE group_members (group_id INTEGER, user_id INTEGER);
+                CREATE TABLE track_points (
+                    point_id INTEGER PRIMARY KEY, track_id INTEGER, user_id INTEGER,
+                    latitude REAL, longitude REAL, timestamp TIMESTAMP);
+            """)
+            with open('database/migrations/18_group_maps.sql', encoding='utf-8') as f:
+                await db.executescript(f.read())
+            await db.execute_many("INSERT INTO group_members VALUES (?, ?)", [(5, 1), (5, 2), (6, 3)])
+            await db.execute_many(
+                "INSERT INTO track_points (track_id, user_id, latitude, longitude, timestamp) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(1, 1, 55.0, 37.0, '2024-01-01 10:00:00'), (1, 1, 55.1, 37.1, '2024-01-01 10:05:00'),
+                 (2, 3, 56.0, 38.0, '2024-01-01 10:00:00')]
+            )
+            members = members_by_user(await db.get_group_members_locations(5))
+
+            await db.update_group_map(5, '<html>1</html>')
+            await db.update_group_map(5, '<html>2</html>')
+            maps = await db.fetch_all("SELECT group_id, map_html FROM group_maps")
+            await db.close()
+            return members, maps
+
+        with tempfile.TemporaryDirectory() as tmp:
+            members, maps = asyncio.run(run(os.path.join(tmp, 'maps.db')))
+
+        # Участник без точек на карту не попадает, чужая группа не видна
+        self.assertEqual(list(members), [1])
+        self.assertEqual((members[1]['latitude'], members[1]['longitude']), (55.1, 37.1))
+        self.assertEqual(maps, [{'group_id': 5, 'map_html': '<html>2</html>'}])
+
+
+if __name__ == '__main__':
+    unittest.main()
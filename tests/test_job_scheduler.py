@@ -0,0 +1,186 @@
+import asyncio
+import os
+import tempfile
+import time
+import unittest
+from datetime import datetime, timedelta
+
+from core.escalation_manager import EscalationManager
+from core.scheduler import JobScheduler
+from database.db_manager import DatabaseManager
+
+
+class TaskDb(DatabaseManager):
+    """DatabaseManager с задачами в памяти для EscalationManager"""
+
+    def __init__(self, path, tasks):
+        super().__init__(path)
+        self.tasks = tasks
+        self.escalations = []
+
+    async def get_pending_tasks(self):
+        return [task for task in self.tasks.values() if task['status'] != 'completed']
+
+    async def get_task(self, task_id):
+        return self.tasks.get(task_id)
+
+    async def create_escalation(self, task_id, level):
+        self.escalations.append((task_id, level))
+
+
+class FakeNotifications:
+    def __init__(self):
+        self.messages = []
+
+    async def notify_coordinators(self, message):
+        self.messages.append(message)
+
+
+class TestJobScheduler(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'jobs.db')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    async def open_db(self, db=None):
+        db = db or DatabaseManager(self.path)
+        await db.init_pool()
+        await JobScheduler(db).install()
+        return db
+
+    def test_fires_on_time_once_across_restarts(self):
+        async def scenario():
+            db = await self.open_db()
+            fired = []
+
+            async def handler(job):
+                fired.append((job['job_key'], time.time() - job['due_at'], job['payload']))
+
+            scheduler = JobScheduler(db)
+            scheduler.register('ping', handler)
+            await scheduler.start()
+            now = time.time()
+            await scheduler.schedule('ping', 1, now + 0.2, {'n': 1})
+            await scheduler.schedule('ping', 2, now + 0.3)
+            await scheduler.schedule('ping', 3, now + 10)
+            await scheduler.schedule('ping', 2, now + 0.3)  # тот же срок - без дубля
+            await scheduler.cancel('ping:3')
+            await asyncio.sleep(0.5)
+            await scheduler.stop()
+            first_run = list(fired)
+
+            # Пока бот был остановлен, наступил срок еще одного задания
+            await db.execute("""
+                INSERT INTO scheduled_jobs (job_key, kind, ref_id, due_at) VALUES ('ping:4', 'ping', 4, ?)
+            """, (time.time() - 5,))
+            restarted = JobScheduler(db)
+            restarted.register('ping', handler)
+            await restarted.start()
+            await restarted.schedule('ping', 1, now + 0.2, {'n': 1})  # повтор после рестарта
+            await asyncio.sleep(0.1)
+            await restarted.stop()
+            await db.close()
+            return first_run, fired, restarted.stats
+
+        first_run, fired, stats = asyncio.run(scenario())
+        self.assertEqual([key for key, _, _ in first_run], ['ping:1', 'ping:2'])
+        self.assertEqual(first_run[0][2], {'n': 1})
+        self.assertTrue(all(0 <= lag < 0.05 for _, lag, _ in first_run))
+        self.assertEqual([key for key, _, _ in fired], ['ping:1', 'ping:2', 'ping:4'])
+        self.assertEqual(stats['fired'], 1)
+
+    def test_reschedule_horizon_and_retry(self):
+        async def scenario():
+            db = await self.open_db()
+            fired = []
+            attempts = []
+
+            async def handler(job):
+                fired.append(job['job_key'])
+
+            async def flaky(job):
+                attempts.append(job['attempts'])
+                if len(attempts) < 2:
+                    raise RuntimeError("temporary failure")
+
+            scheduler = JobScheduler(db, horizon=0.6, retry_delay=0.1)
+            scheduler.register('ping', handler)
+            scheduler.register('flaky', flaky)
+            await scheduler.start()
+            now = time.time()
+            await scheduler.schedule('ping', 1, now + 0.1)
+            await scheduler.schedule('ping', 1, now + 0.4)  # перенос на более поздний срок
+            await scheduler.schedule('ping', 2, now + 1.0)  # за горизонтом
+            await scheduler.schedule('flaky', 1, now)
+            in_memory = scheduler.pending()
+            await asyncio.sleep(0.25)
+            early = list(fired)
+            await asyncio.sleep(1.0)
+            await scheduler.stop()
+            await db.close()
+            return in_memory, early, fired, attempts
+
+        in_memory, early, fired, attempts = asyncio.run(scenario())
+        self.assertEqual(in_memory, 2)
+        self.assertEqual(early, [])
+        self.assertEqual(fired, ['ping:1', 'ping:2'])
+        self.assertEqual(attempts, [0, 1])
+
+    def test_foreign_job_kinds_are_not_claimed(self):
+        async def scenario():
+            db = await self.open_db()
+            fired = []
+
+            async def remind(job):
+                fired.append(job['job_key'])
+
+            escalations = JobScheduler(db)
+            escalations.register('escalation', remind)
+            await escalations.start()
+            await escalations.schedule('reminder', 1, time.time())
+            await asyncio.sleep(0.1)
+            row = await db.fetchone("SELECT fired_at FROM scheduled_jobs WHERE job_key = 'reminder:1'")
+
+            # Вид, зарегистрированный позже, подхватывается тем же планировщиком
+            escalations.register('reminder', remind)
+            await asyncio.sleep(0.1)
+            await escalations.stop()
+            await db.close()
+            return row, fired
+
+        row, fired = asyncio.run(scenario())
+        self.assertIsNone(row[0])
+        self.assertEqual(fired, ['reminder:1'])
+
+    def test_escalations_fire_once_per_level(self):
+        async def scenario():
+            deadline = datetime.now() + timedelta(hours=1, seconds=0.3)
+            tasks = {
+                7: {'task_id': 7, 'title': 'Обход сектора', 'status': 'pending', 'deadline': deadline.isoformat()},
+                8: {'task_id': 8, 'title': 'Связь', 'status': 'completed', 'deadline': deadline.isoformat()},
+                9: {'task_id': 9, 'title': 'Снаряжение', 'status': 'pending',
+                    'deadline': (datetime.now() + timedelta(hours=5)).isoformat()},
+            }
+            db = await self.open_db(TaskDb(self.path, tasks))
+            notifications = FakeNotifications()
+            manager = EscalationManager(db, notifications)
+            await manager.start()
+            await asyncio.sleep(0.1)
+            before_deadline = list(db.escalations)
+            await manager.check_pending_escalations(None)  # повторная синхронизация
+            await manager.task_completed(9)
+            await asyncio.sleep(0.4)
+            await manager.stop()
+            await db.close()
+            return before_deadline, db.escalations, notifications.messages
+
+        before_deadline, escalations, messages = asyncio.run(scenario())
+        self.assertEqual(before_deadline, [(7, 2)])
+        self.assertEqual(escalations, [(7, 2), (7, 3)])
+        self.assertEqual(len(messages), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
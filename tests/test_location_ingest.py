@@ -0,0 +1,123 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock
+
+from database.db_manager import DatabaseManager
+from services.location_ingest import LocationIngestPipeline, MapRefreshDebouncer
+from services.location_store import LocationHistoryStore
+from services.tracking_service import TrackingService
+
+
+class TestLocationIngestPipeline(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db = DatabaseManager(os.path.join(self.tmpdir.name, "ingest.db"))
+        await self.db.init_pool()
+        with open("database/migrations/12_track_points.sql", encoding="utf-8") as f:
+            await self.db.pool.executescript(f.read())
+
+    async def asyncTearDown(self):
+        await self.db.close()
+        self.tmpdir.cleanup()
+
+    async def test_points_written_in_batches(self):
+        pipeline = LocationIngestPipeline(self.db, batch_size=200, batch_window=0.05)
+        for i in range(500):
+            await pipeline.submit(1, 42, 55.75 + i * 1e-5, 37.61, accuracy=5.0)
+        await pipeline.flush()
+
+        row = await self.db.fetchone("SELECT COUNT(*) FROM track_points WHERE track_id = 1")
+        self.assertEqual(row[0], 500)
+        stats = pipeline.get_stats()
+        self.assertEqual(stats['points_written'], 500)
+        self.assertLessEqual(stats['batches'], 5)
+        await pipeline.stop()
+
+    async def test_backpressure_when_queue_full(self):
+        pipeline = LocationIngestPipeline(self.db, batch_size=10, batch_window=0.01, max_queue=5)
+        await asyncio.gather(*[pipeline.submit(2, 1, 55.0, 37.0) for _ in range(50)])
+        await pipeline.stop()
+
+        row = await self.db.fetchone("SELECT COUNT(*) FROM track_points WHERE track_id = 2")
+        self.assertEqual(row[0], 50)
+
+
+class TestTrackingServiceIngest(unittest.IsolatedAsyncioTestCase):
+    async def test_group_map_refresh_is_debounced(self):
+        db = MagicMock()
+        db.create_track = AsyncMock(return_value=7)
+        db.copy_records = AsyncMock(return_value=0)
+        db.update_group_map = AsyncMock()
+        db.fetchone = AsyncMock(return_value=(9,))
+        db.fetch_all = AsyncMock(return_value=[])
+        map_service = MagicMock()
+
+        service = TrackingService(db, map_service)
+        service.map_refresher = MapRefreshDebouncer(service._update_group_map, 0.05)
+        history_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(history_dir.cleanup)
+        service.location_history = LocationHistoryStore(history_dir.name)
+
+        await service.start_tracking(1, group_id=3)
+        for i in range(20):
+            await service.update_location(1, {'latitude': 55.0 + i * 1e-4, 'longitude': 37.0})
+        await asyncio.sleep(0.1)
+        heatmap = await service.location_history.heatmap(9)
+        await service.shutdown()
+
+        self.assertEqual(db.update_group_map.await_count, 1)
+        self.assertEqual(service.map_renderer.base_builds, 1)
+        written = sum(len(call.args[2]) for call in db.copy_records.await_args_list)
+        self.assertEqual(written, 20)
+        # В COPY уходит datetime, а не строка ISO 8601
+        records = db.copy_records.await_args_list[0].args[2]
+        self.assertIsInstance(records[0][-1], datetime)
+        self.assertEqual(sum(cell['weight'] for cell in heatmap), 20)
+
+    async def test_missing_group_is_not_cached_for_good(self):
+        db = MagicMock()
+        db.get_user_active_group = AsyncMock(return_value=None)
+        db.fetchone = AsyncMock(return_value=(9,))
+        service = TrackingService(db, MagicMock(), location_history=MagicMock())
+
+        self.assertIsNone(await service._get_user_group(1))
+        self.assertIsNone(await service._get_user_group(1))
+        self.assertEqual(db.get_user_active_group.await_count, 1)  # короткий кэш промаха
+
+        # Вступление в группу сразу видно трекингу
+        service.user_group_changed(1, 3)
+        self.assertEqual(await service._get_user_group(1), 3)
+        service.user_group_changed(1)
+        db.get_user_active_group.return_value = 4
+        self.assertEqual(await service._get_user_group(1), 4)
+        self.assertEqual(db.get_user_active_group.await_count, 2)
+
+    async def test_stopped_and_stale_volunteers_leave_nearest(self):
+        db = MagicMock()
+        db.create_track = AsyncMock(return_value=7)
+        db.complete_track = AsyncMock()
+        db.get_user_active_group = AsyncMock(return_value=None)
+        service = TrackingService(db, MagicMock(), location_history=MagicMock())
+        service.ingest = MagicMock(submit=AsyncMock(), flush=AsyncMock(), stop=AsyncMock())
+
+        await service.start_tracking(1, group_id=None)
+        await service.update_location(1, {'latitude': 55.0, 'longitude': 37.0})
+        await service.update_location(2, {'latitude': 55.001, 'longitude': 37.0})
+        self.assertEqual([v['user_id'] for v in service.find_nearest_volunteers(55.0, 37.0)], [1, 2])
+
+        await service.stop_tracking(1)
+        self.assertEqual([v['user_id'] for v in service.find_nearest_volunteers(55.0, 37.0)], [2])
+
+        # Волонтер 2 давно не присылал отметок
+        service.live_index.update(2, 55.001, 37.0, timestamp=1.0)
+        service.start(interval=0.01)
+        await asyncio.sleep(0.05)
+        await service.shutdown()
+        self.assertEqual(service.find_nearest_volunteers(55.0, 37.0), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
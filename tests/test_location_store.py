@@ -0,0 +1,94 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from datetime import date, datetime, timedelta, timezone
+
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+from database.operations import get_activity_points
+from services.location_store import LocationHistoryStore
+from services.tracking_service import TrackingService
+
+
+def utc(day: date, seconds: float = 0) -> float:
+    return datetime(day.year, day.month, day.day, tzinfo=timezone.utc).timestamp() + seconds
+
+
+class TestLocationHistoryStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = LocationHistoryStore(self.tmp.name, retention_days=30, downsample_after=7,
+                                          downsample_interval=60, batch_size=100)
+
+    def tearDown(self):
+        asyncio.run(self.store.close())
+        self.tmp.cleanup()
+
+    def test_rollover_and_queries(self):
+        day = date(2024, 2, 16)
+
+        async def scenario():
+            # Точки каждые 10 секунд через полночь: две пары суток
+            for i in range(720):
+                self.store.add(1, 55.75 + i * 1e-5, 37.61, operation_id=5, group_id=2,
+                               timestamp=utc(day, 23 * 3600 + i * 10))
+            self.store.add(2, 55.0, 37.0, operation_id=6, timestamp=utc(day, 23 * 3600))
+            await self.store.flush()
+            fixes = await self.store.fixes(utc(day), utc(day, 2 * 86400), user_id=1)
+            heat = await self.store.heatmap(5, utc(day), utc(day, 2 * 86400))
+            last_day = await self.store.heatmap(5, until=utc(day, 86400 + 3600))
+            return fixes, heat, last_day
+
+        fixes, heat, last_day = asyncio.run(scenario())
+        self.assertEqual(self.store.shard_days(), [day, day + timedelta(days=1)])
+        self.assertEqual(len(fixes), 720)
+        self.assertEqual([f[6] for f in fixes], sorted(f[6] for f in fixes))
+        self.assertEqual(sum(cell['weight'] for cell in heat), 720)
+        self.assertEqual(sum(cell['weight'] for cell in last_day), 720)
+        self.assertTrue(all(round(cell['latitude'], 4) == cell['latitude'] for cell in heat))
+
+    def test_shared_store_serves_heatmap_and_outlives_tracking(self):
+        async def scenario():
+            service = TrackingService(MagicMock(), MagicMock(), location_history=self.store)
+            self.store.start(interval=3600)
+            self.store.add(1, 55.75, 37.61, operation_id=5)
+            await service.shutdown()
+            # Обслуживание общего хранилища продолжается после остановки сервиса
+            running = self.store._maintenance is not None and not self.store._maintenance.done()
+            await self.store.flush()
+            heat = await get_activity_points(SimpleNamespace(location_store=self.store), 5)
+            await self.store.close()
+            return running, heat
+
+        running, heat = asyncio.run(scenario())
+        self.assertTrue(running)
+        self.assertEqual(sum(cell['weight'] for cell in heat), 1)
+
+    def test_downsample_and_prune(self):
+        today = date(2024, 3, 20)
+        old, stale, fresh = today - timedelta(days=10), today - timedelta(days=40), today
+
+        async def scenario():
+            for day in (old, stale, fresh):
+                for i in range(600):
+                    self.store.add(1, 55.75, 37.61, operation_id=5, timestamp=utc(day, i * 6))
+            await self.store.flush()
+            result = await self.store.maintain(today)
+            again = await self.store.maintain(today)
+            counts = {day: len(await self.store.fixes(utc(day), utc(day, 86399))) for day in (old, fresh)}
+            heat = await self.store.heatmap(5, utc(old), utc(old, 86399))
+            return result, again, counts, heat
+
+        result, again, counts, heat = asyncio.run(scenario())
+        self.assertEqual(result, {'pruned': [stale], 'downsampled': [old]})
+        self.assertEqual(again, {'pruned': [], 'downsampled': []})
+        self.assertFalse(os.path.exists(self.store.shard_path(stale)))
+        # 3600 секунд по 60 - одна точка на минуту
+        self.assertEqual(counts, {old: 60, fresh: 600})
+        self.assertEqual(sum(cell['weight'] for cell in heat), 600)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,165 @@
+import asyncio
+import tempfile
+import time
+import unittest
+
+from aiohttp import web
+
+from services.map_cache_service import MapCacheService, make_tile_id
+
+
+class StubTileServer:
+    """Локальный сервер тайлов с задержкой и счетчиками запросов"""
+
+    def __init__(self, delay: float = 0.02):
+        self.delay = delay
+        self.requests = {}
+        self.active = 0
+        self.max_active = 0
+        self.fail = False
+
+    async def handle(self, request):
+        path = request.match_info['path']
+        self.requests[path] = self.requests.get(path, 0) + 1
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.active -= 1
+        if self.fail:
+            return web.Response(status=404)
+        return web.Response(body=f"tile:{path}".encode(), content_type='image/png')
+
+    async def start(self) -> str:
+        app = web.Application()
+        app.router.add_get('/{path:.+}', self.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        return f"http://127.0.0.1:{port}"
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+
+class TestMapCacheService(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def run_with_server(self, scenario, **server_options):
+        async def runner():
+            server = StubTileServer(**server_options)
+            base = await server.start()
+            try:
+                return await scenario(server, base)
+            finally:
+                await server.stop()
+        return asyncio.run(runner())
+
+    def make_service(self, base: str, **options) -> MapCacheService:
+        return MapCacheService(self.tmp.name, sources={'stub': base + '/{z}/{x}/{y}.png'}, **options)
+
+    def test_tile_id_is_unique(self):
+        self.assertNotEqual(make_tile_id(10, 1, 2, 1), make_tile_id(10, 2, 1, 1))
+        self.assertNotEqual(make_tile_id(10, 1, 2, 1), make_tile_id(10, 1, 2, 2))
+        self.assertLess(make_tile_id(24, 2 ** 24 - 1, 2 ** 24 - 1, 63), 2 ** 63)
+
+    def test_concurrent_requests_share_download(self):
+        async def scenario(server, base):
+            service = self.make_service(base)
+            tiles = await asyncio.gather(*(service.get_tile(12, 100, 200, 'stub') for _ in range(50)))
+            await service.close()
+            return server, service, tiles
+
+        server, service, tiles = self.run_with_server(scenario, delay=0.05)
+        self.assertEqual(set(tiles), {b"tile:12/100/200.png"})
+        self.assertEqual(server.requests, {'12/100/200.png': 1})
+        self.assertEqual(service.stats['coalesced'], 49)
+
+    def test_many_tiles_with_host_limit(self):
+        tiles = [(14, x, y) for x in range(20) for y in range(15)]
+
+        async def scenario(server, base):
+            service = self.make_service(base, per_host_limit=8)
+            start = time.perf_counter()
+            result = await service.get_tiles(tiles, 'stub')
+            elapsed = time.perf_counter() - start
+            await service.close()
+            return server, result, elapsed
+
+        server, result, elapsed = self.run_with_server(scenario, delay=0.02)
+        self.assertEqual(len(result), 300)
+        self.assertTrue(all(result))
+        self.assertLessEqual(server.max_active, 8)
+        self.assertLess(elapsed, 5.0)
+
+    def test_persistent_cache_and_fallbacks(self):
+        async def scenario(server, base):
+            service = self.make_service(base)
+            first = await service.get_tile(5, 1, 1, 'stub')
+            await service.close()
+
+            # Новый экземпляр берет тайл из файла кэша
+            service = self.make_service(base)
+            second = await service.get_tile(5, 1, 1, 'stub')
+            await service.close()
+
+            # Просроченный тайл отдается, если сервер не отвечает
+            server.fail = True
+            service = self.make_service(base, ttl=-1)
+            await service._cache_tile(make_tile_id(5, 1, 1, await service._source_id('stub')), first)
+            stale = await service.get_tile(5, 1, 1, 'stub')
+            empty = await service.get_tile(6, 0, 0, 'stub')
+            await service.close()
+            return server, first, second, stale, empty, service
+
+        server, first, second, stale, empty, service = self.run_with_server(scenario, delay=0)
+        self.assertEqual(first, second)
+        self.assertEqual(server.requests['5/1/1.png'], 2)
+        self.assertEqual(stale, first)
+        self.assertEqual(empty, b'')
+        self.assertEqual(service.stats['stale'], 1)
+
+    def test_loader_error_reaches_waiters(self):
+        async def scenario(server, base):
+            service = self.make_service(base)
+
+            async def broken(*args):
+                await asyncio.sleep(0.02)
+                raise OSError("disk full")
+
+            service._load_tile = broken
+            results = await asyncio.gather(*(service.get_tile(3, 1, 1, 'stub') for _ in range(5)),
+                                           return_exceptions=True)
+            await service.close()
+            return results
+
+        results = self.run_with_server(scenario, delay=0)
+        # Ожидающие получают исходную ошибку, а не CancelledError
+        self.assertTrue(all(isinstance(result, OSError) for result in results))
+
+    def test_owner_cancellation_restarts_load_for_waiters(self):
+        async def scenario(server, base):
+            service = self.make_service(base)
+            owner = asyncio.create_task(service.get_tile(3, 1, 1, 'stub'))
+            await asyncio.sleep(0.01)
+            waiters = [asyncio.create_task(service.get_tile(3, 1, 1, 'stub')) for _ in range(3)]
+            await asyncio.sleep(0.01)
+            owner.cancel()
+            results = await asyncio.gather(*waiters)
+            await service.close()
+            return owner, results
+
+        owner, results = self.run_with_server(scenario, delay=0.1)
+        self.assertTrue(owner.cancelled())
+        self.assertEqual(results, [b'tile:3/1/1.png'] * 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
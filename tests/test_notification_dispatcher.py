@@ -0,0 +1,270 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from collections import defaultdict
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from telegram.error import Forbidden, RetryAfter
+
+from core.notification_queue_manager import NotificationQueueManager, TokenBucket
+from database.db_manager import DatabaseManager
+from services.notification_manager import NotificationManager
+
+SCHEMA_PATH = os.path.join(os.path.dirname(__file__), '..', 'database', 'migrations', 'notification_queue.sql')
+
+
+class FakeBot:
+    """Bot, записывающий время отправки; может отвечать 429 и 403"""
+
+    def __init__(self, flood_after=None, retry_after=1, blocked=()):
+        self.sent = []
+        self.flood_after = flood_after
+        self.retry_after = retry_after
+        self.blocked = set(blocked)
+        self.flooded = False
+
+    async def send_message(self, chat_id, text, **kwargs):
+        if chat_id in self.blocked:
+            raise Forbidden("bot was blocked by the user")
+        if self.flood_after is not None and len(self.sent) == self.flood_after and not self.flooded:
+            self.flooded = True
+            raise RetryAfter(self.retry_after)
+        self.sent.append((asyncio.get_running_loop().time(), chat_id, text, kwargs))
+
+
+class FakeDb:
+    def __init__(self):
+        self.next_id = 0
+        self.statements = []
+
+    async def execute(self, query, params=()):
+        self.statements.append((query.split()[0], params))
+        self.next_id += 1
+        return self.next_id
+
+    async def executemany(self, query, params_seq):
+        self.statements.append(('MANY', list(params_seq)))
+        return len(self.statements[-1][1])
+
+    async def fetch_all(self, query, params=()):
+        return []
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_rate_and_pause(self):
+        bucket = TokenBucket(10, capacity=2)
+        self.assertEqual([bucket.try_acquire(0.0), bucket.try_acquire(0.0)], [0.0, 0.0])
+        self.assertAlmostEqual(bucket.try_acquire(0.0), 0.1)
+        self.assertEqual(bucket.try_acquire(0.1), 0.0)
+        bucket.pause(0.1, 5)
+        self.assertAlmostEqual(bucket.try_acquire(1.1), 4.0)
+        self.assertEqual(bucket.try_acquire(5.2), 0.0)
+
+
+class TestNotificationDispatcher(unittest.TestCase):
+    def test_fan_out_respects_limits(self):
+        # Масштаб x10 по времени: 300 сообщений/с на бота, 10/с на чат
+        async def scenario():
+            bot = FakeBot()
+            manager = NotificationQueueManager(bot, FakeDb(), workers=8, global_rate=300, chat_rate=10)
+            await manager.start(restore=False)
+            for chat in range(500):
+                await manager.add_notification(chat, 'broadcast')
+            for _ in range(3):
+                await manager.add_notification(7, 'personal')
+            await manager.join(timeout=10)
+            await manager.stop()
+            return bot.sent, manager.stats
+
+        sent, stats = asyncio.run(scenario())
+        self.assertEqual(len(sent), 503)
+        self.assertEqual(stats['sent'], 503)
+        # Общий лимит: запас ведра (300) плюс 300 в секунду
+        elapsed = sent[-1][0] - sent[0][0]
+        self.assertGreaterEqual(elapsed, (503 - 300) / 300 * 0.9)
+        by_chat = defaultdict(list)
+        for moment, chat, _, _ in sent:
+            by_chat[chat].append(moment)
+        gaps = [b - a for a, b in zip(by_chat[7], by_chat[7][1:])]
+        self.assertEqual(len(gaps), 3)
+        self.assertTrue(all(gap >= 0.09 for gap in gaps))
+
+    def test_priority_schedule_and_retry_after(self):
+        async def scenario():
+            bot = FakeBot(flood_after=1, retry_after=0.3, blocked={99})
+            db = FakeDb()
+            manager = NotificationQueueManager(bot, db, workers=1, global_rate=1000, chat_rate=1000)
+            await manager.add_notification(1, 'low', priority=3)
+            await manager.add_notification(2, 'later', priority=1,
+                                           scheduled_time=datetime.now() + timedelta(seconds=0.2))
+            await manager.add_notification(3, 'urgent', priority=1, parse_mode='HTML')
+            await manager.add_notification(99, 'blocked', priority=1)
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            await manager.start(restore=False)
+            await asyncio.sleep(0.8)
+            await manager.stop()
+            return bot.sent, manager.stats, db.statements, started
+
+        sent, stats, statements, started = asyncio.run(scenario())
+        # 'low' получило 429 и ушло после паузы, уже за отложенным 'later'
+        self.assertEqual([text for _, _, text, _ in sent], ['urgent', 'later', 'low'])
+        self.assertEqual(sent[0][3], {'parse_mode': 'HTML'})
+        self.assertGreaterEqual(sent[1][0] - started, 0.2)
+        self.assertGreaterEqual(sent[2][0] - started, 0.3)
+        self.assertEqual(stats, {'sent': 3, 'failed': 1, 'retried': 0, 'rate_limited': 1})
+        self.assertIn(('MANY', [(3,), (2,), (1,)]), statements)
+        self.assertIn(('UPDATE', (4,)), statements)
+
+    def test_failed_send_is_retried(self):
+        async def scenario():
+            calls = []
+
+            class FlakyBot:
+                async def send_message(self, chat_id, text, **kwargs):
+                    calls.append(text)
+                    if len(calls) == 1:
+                        raise ConnectionError("network down")
+
+            db = FakeDb()
+            manager = NotificationQueueManager(FlakyBot(), db, workers=2, global_rate=100, chat_rate=100)
+            manager.retry_delays = [0.05]
+            await manager.start(restore=False)
+            await manager.add_notification(5, 'hello')
+            await asyncio.sleep(0.2)
+            await manager.stop()
+            return calls, manager.stats, db.statements
+
+        calls, stats, statements = asyncio.run(scenario())
+        self.assertEqual(calls, ['hello', 'hello'])
+        self.assertEqual(stats['retried'], 1)
+        self.assertIn(('UPDATE', (1, 1)), statements)
+
+    def test_sent_marked_without_full_batch(self):
+        async def scenario():
+            db = FakeDb()
+            manager = NotificationQueueManager(FakeBot(), db, workers=2, global_rate=100, chat_rate=100)
+            await manager.start(restore=False)
+            for user_id in (1, 2, 3):
+                await manager.add_notification(user_id, 'hello')
+            await asyncio.sleep(0.15)
+            # Пачка из трех не набрала SENT_FLUSH_SIZE, но отмечена по таймеру
+            flushed = [params for kind, params in db.statements if kind == 'MANY']
+            await manager.stop()
+            return flushed
+
+        with patch('core.notification_queue_manager.SENT_FLUSH_DELAY', 0.05):
+            flushed = asyncio.run(scenario())
+        self.assertEqual(sorted(id_ for batch in flushed for (id_,) in batch), [1, 2, 3])
+
+    def test_queue_survives_restart(self):
+        async def scenario(path):
+            db = DatabaseManager(path)
+            await db.init_pool()
+            with open(SCHEMA_PATH) as schema:
+                await db.executescript(schema.read())
+
+            manager = NotificationQueueManager(FakeBot(), db)
+            for user_id in (1, 2, 3):
+                await manager.add_notification(user_id, f'msg {user_id}', priority=user_id)
+            # Перезапуск до отправки: новая очередь поднимает записи из БД
+            bot = FakeBot()
+            restored = NotificationQueueManager(bot, db, workers=2, global_rate=100, chat_rate=100)
+            await restored.start()
+            await restored.join(timeout=5)
+            await restored.stop()
+            statuses = await db.fetch_all("SELECT user_id, status FROM notification_queue ORDER BY user_id")
+            await db.close()
+            return bot.sent, statuses
+
+        with tempfile.TemporaryDirectory() as tmp:
+            sent, statuses = asyncio.run(scenario(os.path.join(tmp, 'queue.db')))
+        self.assertEqual([text for _, _, text, _ in sent], ['msg 1', 'msg 2', 'msg 3'])
+        self.assertEqual([row['status'] for row in statuses], ['sent'] * 3)
+
+    def test_broadcast_batches_and_dedups(self):
+        class CountingDb(DatabaseManager):
+            calls = defaultdict(int)
+
+            async def fetchall(self, query, params=()):
+                self.calls['fetchall'] += 1
+                return await super().fetchall(query, params)
+
+            async def run_in_transaction(self, job):
+                self.calls['transactions'] += 1
+                return await super().run_in_transaction(job)
+
+            async def execute(self, query, params=()):
+                self.calls['execute'] += 1
+                return await super().execute(query, params)
+
+        async def scenario(path):
+            db = CountingDb(path)
+            await db.init_pool()
+            with open(SCHEMA_PATH) as schema:
+                await db.executescript(schema.read())
+            await db.executescript("""
+                CREATE TABLE search_groups (group_id INTEGER PRIMARY KEY, operation_id INTEGER);
+                CREATE TABLE group_members (group_id INTEGER, user_id INTEGER, role TEXT);
+            """)
+            await db.executemany("INSERT INTO search_groups VALUES (?, ?)",
+                                 [(group_id, 1 if group_id <= 3 else 2) for group_id in range(1, 6)])
+            members = [(group_id, user_id, 'coordinator' if user_id % 100 == 0 else 'member')
+                       for group_id in range(1, 6) for user_id in range(group_id * 300, group_id * 300 + 400)]
+            await db.executemany("INSERT INTO group_members VALUES (?, ?, ?)", members)
+            db.calls.clear()
+
+            bot = FakeBot()
+            manager = NotificationQueueManager(bot, db, workers=8, global_rate=10000, chat_rate=100)
+            # Операция 1: группы 1-3 пересекаются по участникам
+            sos = await manager.broadcast('SOS', operation_id=1, user_ids=[300, 5], priority=1,
+                                          exclude_user_ids=[301])
+            calls = dict(db.calls)
+            coordinators = await manager.broadcast('status', group_ids=[4, 5], roles=['coordinator'])
+            await manager.start(restore=False)
+            await manager.join(timeout=10)
+            await manager.stop()
+            stored = await db.fetchone("SELECT COUNT(*) FROM notification_queue")
+            await db.close()
+            return sos, coordinators, calls, bot.sent, stored
+
+        with tempfile.TemporaryDirectory() as tmp:
+            sos, coordinators, calls, sent, stored = asyncio.run(scenario(os.path.join(tmp, 'queue.db')))
+        # Пользователи 300..1299 операции 1 плюс пользователь 5, без 301
+        self.assertEqual(len(sos), 1000)
+        self.assertEqual(calls, {'fetchall': 1, 'transactions': 1})
+        self.assertEqual(len(coordinators), 7)
+        sos_chats = [chat for _, chat, text, _ in sent if text == 'SOS']
+        self.assertEqual(len(sos_chats), len(set(sos_chats)))
+        self.assertNotIn(301, sos_chats)
+        self.assertIn(5, sos_chats)
+        self.assertEqual(stored[0], len(sos) + len(coordinators))
+
+    def test_coordinators_notified_in_one_broadcast(self):
+        async def scenario(path):
+            db = DatabaseManager(path)
+            await db.init_pool()
+            with open(SCHEMA_PATH) as schema:
+                await db.executescript(schema.read())
+            await db.execute("ALTER TABLE users ADD COLUMN is_coordinator BOOLEAN DEFAULT FALSE")
+            await db.executemany("INSERT INTO users (user_id, password_hash, is_coordinator) VALUES (?, '', ?)",
+                                 [(user_id, user_id % 10 == 0) for user_id in range(1, 101)])
+
+            notifications = NotificationManager(FakeBot(), db)
+            with patch.object(db, 'run_in_transaction', wraps=db.run_in_transaction) as transactions:
+                await notifications.notify_coordinators('Сектор завершен', 'success')
+            rows = await db.fetch_all("SELECT user_id, message, priority FROM notification_queue ORDER BY user_id")
+            await db.close()
+            return transactions.await_count, rows
+
+        with tempfile.TemporaryDirectory() as tmp:
+            transactions, rows = asyncio.run(scenario(os.path.join(tmp, 'queue.db')))
+        self.assertEqual(transactions, 1)
+        self.assertEqual([row['user_id'] for row in rows], list(range(10, 101, 10)))
+        self.assertEqual({(row['message'], row['priority']) for row in rows}, {('✅ Сектор завершен', 3)})
+
+
+if __name__ == '__main__':
+    unittest.main()
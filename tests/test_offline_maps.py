@@ -1,6 +1,15 @@
+import asyncio
+import os
+import sqlite3
+import tempfile
+import threading
 import unittest
-from unittest.mock import MagicMock
-from services.offline_maps_manager import OfflineMapsManager
+from unittest.mock import MagicMock, patch
+from services.map_cache_service import MapCacheService
+from services.offline_maps_manager import (
+    MBTilesWriter, OfflineMapsManager, circle_area, enumerate_tiles, lonlat_to_tile
+)
+from tests.test_map_cache_service import StubTileServer
 
 class TestOfflineMapsManager(unittest.TestCase):
     def setUp(self):
@@ -15,3 +24,137 @@ class TestOfflineMapsManager(unittest.TestCase):
         """Test listing available regions"""
         regions = self.maps_manager.list_available_regions()
         self.assertIsInstance(regions, list)
+
+
+class TestAreaDownload(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_enumerate_tiles_follows_polygon(self):
+        area = circle_area(55.75, 37.62, 3000)
+        tiles = list(enumerate_tiles(area, [14]))
+        min_lon, min_lat, max_lon, max_lat = area.bounds
+        x0, y0 = lonlat_to_tile(min_lon, max_lat, 14)
+        x1, y1 = lonlat_to_tile(max_lon, min_lat, 14)
+        self.assertLess(len(tiles), (x1 - x0 + 1) * (y1 - y0 + 1))
+        self.assertIn((14, *lonlat_to_tile(37.62, 55.75, 14)), tiles)
+        self.assertEqual(len(set(tiles)), len(tiles))
+
+    def test_download_resume_and_dedupe(self):
+        area = circle_area(55.75, 37.62, 1500)
+        zooms = [13, 14]
+
+        async def scenario():
+            server = StubTileServer(delay=0.005)
+            base = await server.start()
+            cache = MapCacheService(os.path.join(self.tmp.name, 'cache'),
+                                    sources={'stub': base + '/{z}/{x}/{y}.png'})
+            manager = OfflineMapsManager(cache, os.path.join(self.tmp.name, 'offline'), concurrency=4,
+                                         rate=10000)
+            estimate = await manager.estimate_area(area, zooms, source='stub')
+
+            server.fail = True
+            failed = await manager.download_area('test', area, zooms, source='stub')
+            server.fail = False
+            reports = []
+            resumed = await manager.download_area('test', area, zooms, source='stub',
+                                                  progress=reports.append)
+            again = await manager.download_area('test', area, zooms, source='stub')
+            await cache.close()
+            await server.stop()
+            return manager, estimate, failed, resumed, again, reports
+
+        manager, estimate, failed, resumed, again, reports = asyncio.run(scenario())
+        total = estimate['tiles']
+        self.assertEqual(estimate['cached'], 0)
+        self.assertEqual(failed['failed'], total)
+        self.assertEqual(resumed['done'], total)
+        self.assertEqual(again['skipped'], total)
+        self.assertEqual(reports[-1]['done'], total)
+        self.assertTrue(manager.check_map_availability('test'))
+
+        conn = sqlite3.connect(manager.region_path('test'))
+        rows = conn.execute("SELECT zoom_level, tile_column, tile_row, tile_data FROM tiles").fetchall()
+        metadata = dict(conn.execute("SELECT name, value FROM metadata"))
+        conn.close()
+        self.assertEqual(len(rows), total)
+        self.assertEqual(metadata['minzoom'], '13')
+        z, x, row, data = rows[0]
+        self.assertEqual(data, f"tile:{z}/{x}/{(1 << z) - 1 - row}.png".encode())
+
+    def test_writer_runs_off_event_loop(self):
+        area = circle_area(55.75, 37.62, 800)
+        threads = []
+
+        def recording(method):
+            def wrapper(writer, *args):
+                threads.append(threading.get_ident())
+                return method(writer, *args)
+            return wrapper
+
+        async def scenario():
+            server = StubTileServer()
+            base = await server.start()
+            cache = MapCacheService(os.path.join(self.tmp.name, 'cache'),
+                                    sources={'stub': base + '/{z}/{x}/{y}.png'})
+            manager = OfflineMapsManager(cache, os.path.join(self.tmp.name, 'offline'), rate=10000)
+            with patch.object(MBTilesWriter, 'add', recording(MBTilesWriter.add)), \
+                    patch.object(MBTilesWriter, 'existing', recording(MBTilesWriter.existing)), \
+                    patch.object(MBTilesWriter, 'close', recording(MBTilesWriter.close)):
+                stats = await manager.download_area('thread', area, [14], source='stub')
+            await cache.close()
+            await server.stop()
+            return stats
+
+        stats = asyncio.run(scenario())
+        self.assertGreater(stats['done'], 0)
+        self.assertEqual(len(threads), stats['done'] + 2)
+        self.assertNotIn(threading.get_ident(), threads)
+        self.assertEqual(len(set(threads)), 1)
+
+    def test_bulk_source_required_and_rate_limited(self):
+        area = circle_area(55.75, 37.62, 300)
+
+        async def scenario():
+            server = StubTileServer()
+            base = await server.start()
+            cache = MapCacheService(os.path.join(self.tmp.name, 'cache'),
+                                    sources={'osm': base + '/{z}/{x}/{y}.png',
+                                             'stub': base + '/{z}/{x}/{y}.png'})
+            maps_dir = os.path.join(self.tmp.name, 'offline')
+            errors = []
+            for manager, source in ((OfflineMapsManager(cache, maps_dir, source=None), None),
+                                    (OfflineMapsManager(cache, maps_dir, source='stub'), 'osm')):
+                try:
+                    await manager.download_area('denied', area, [15], source=source)
+                except ValueError as e:
+                    errors.append(str(e))
+
+            manager = OfflineMapsManager(cache, maps_dir, concurrency=4, source='stub', rate=40)
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            stats = await manager.download_area('paced', area, [15, 16])
+            elapsed = loop.time() - started
+            await cache.close()
+            await server.stop()
+            return errors, stats, elapsed
+
+        errors, stats, elapsed = asyncio.run(scenario())
+        self.assertEqual(len(errors), 2)
+        self.assertIn('osm', errors[1])
+        self.assertGreater(stats['done'], 10)
+        # Первый тайл берется сразу, остальные - не чаще 40 в секунду
+        self.assertGreaterEqual(elapsed, (stats['done'] - 1) / 40 * 0.9)
+
+    def test_identical_tiles_stored_once(self):
+        writer = MBTilesWriter(os.path.join(self.tmp.name, 'dedupe.mbtiles'))
+        for x in range(10):
+            writer.add(10, x, 5, b'water')
+        writer.close()
+        conn = sqlite3.connect(writer.path)
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM images").fetchone()[0], 1)
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM tiles").fetchone()[0], 10)
+        conn.close()
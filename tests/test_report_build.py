@@ -0,0 +1,109 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+from core.report_system import ReportBuild, ReportSystem
+from database.db_manager import DatabaseManager
+
+
+class CountingDatabase(DatabaseManager):
+    """DatabaseManager со счетчиком запросов и максимальной параллельностью"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.queries = []
+        self.active = 0
+        self.max_active = 0
+
+    async def fetch_all(self, query, params=()):
+        self.queries.append(query)
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(0.01)
+            return await super().fetch_all(query, params)
+        finally:
+            self.active -= 1
+
+
+class TestOperationReportBuild(unittest.TestCase):
+    def run_report(self, tmp):
+        async def scenario():
+            db = CountingDatabase(os.path.join(tmp, 'report.db'))
+            await db.init_pool()
+            await db.pool.executescript("""
+                CREATE TABLE search_operations (operation_id INTEGER PRIMARY KEY, name TEXT,
+                    status TEXT, start_time TEXT, end_time TEXT);
+                CREATE TABLE search_groups (group_id INTEGER PRIMARY KEY, operation_id INTEGER,
+                    name TEXT, leader_id INTEGER, status TEXT, created_at TEXT);
+                CREATE TABLE group_members (member_id INTEGER PRIMARY KEY, group_id INTEGER,
+                    user_id INTEGER, role TEXT, status TEXT, joined_at TEXT);
+                CREATE TABLE coordination_tasks (task_id INTEGER PRIMARY KEY, operation_id INTEGER,
+                    group_id INTEGER, title TEXT, status TEXT, assigned_to INTEGER,
+                    created_at TEXT, completed_at TEXT);
+                CREATE TABLE user_tracks (track_id INTEGER PRIMARY KEY, user_id INTEGER, group_id INTEGER,
+                    start_time TEXT, end_time TEXT, distance REAL);
+                CREATE TABLE search_sectors (sector_id INTEGER PRIMARY KEY, operation_id INTEGER,
+                    status TEXT, progress REAL);
+                INSERT INTO search_operations VALUES (1, 'Поиск', 'completed',
+                    '2024-02-16T08:00:00', '2024-02-16T12:00:00');
+                INSERT INTO search_groups VALUES (10, 1, 'Альфа', 5, 'active', '2024-02-16T08:10:00'),
+                                                 (20, 2, 'Чужая', 6, 'active', '2024-02-16T08:10:00');
+                INSERT INTO group_members (group_id, user_id, role, status) VALUES
+                    (10, 5, 'leader', 'active'), (10, 7, 'member', 'active'), (20, 8, 'member', 'active');
+                INSERT INTO coordination_tasks VALUES
+                    (1, 1, 10, 'Сектор А', 'completed', 5, '2024-02-16T08:20:00', '2024-02-16T10:00:00'),
+                    (2, 1, 10, 'Сектор Б', 'pending', 7, '2024-02-16T09:00:00', NULL);
+                INSERT INTO user_tracks VALUES (100, 5, 10, NULL, NULL, 4.5), (101, 7, 10, NULL, NULL, 3.5),
+                                               (102, 8, 20, NULL, NULL, 9.0);
+                INSERT INTO search_sectors VALUES (1, 1, 'completed', 100), (2, 1, 'active', 50);
+            """)
+            system = ReportSystem.__new__(ReportSystem)
+            system.db = db
+            report = await system.generate_operation_report(1)
+            await db.close()
+            return db, report
+
+        return asyncio.run(scenario())
+
+    def test_report_uses_each_base_query_once(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            db, report = self.run_report(tmp)
+
+        self.assertEqual(len(db.queries), len(ReportBuild.QUERIES))
+        self.assertEqual(len(set(db.queries)), len(db.queries))
+        self.assertGreater(db.max_active, 1)
+
+        stats = report['statistics']
+        self.assertEqual(stats['total_participants'], 2)
+        self.assertEqual(stats['total_tasks'], 2)
+        self.assertEqual(stats['completed_tasks'], 1)
+        self.assertEqual(stats['total_distance'], 8.0)
+        self.assertEqual(stats['average_sector_progress'], 75.0)
+        self.assertEqual(stats['duration'], 4.0)
+        self.assertEqual(report['efficiency']['task_completion_rate'], 50.0)
+        self.assertEqual({p['user_id']: p['distance'] for p in report['participants']}, {5: 4.5, 7: 3.5})
+        self.assertEqual([e['event'] for e in report['timeline']],
+                         ['operation_start', 'group_created', 'task_created', 'task_created',
+                          'task_completed', 'operation_end'])
+
+    def test_missing_operation(self):
+        async def scenario(tmp):
+            db = DatabaseManager(os.path.join(tmp, 'empty.db'))
+            await db.init_pool()
+            await db.pool.executescript(
+                "CREATE TABLE search_operations (operation_id INTEGER PRIMARY KEY, name TEXT)"
+            )
+            system = ReportSystem.__new__(ReportSystem)
+            system.db = db
+            report = await system.generate_operation_report(42)
+            await db.close()
+            return report
+
+        with tempfile.TemporaryDirectory() as tmp:
+            self.assertIsNone(asyncio.run(scenario(tmp)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+import asyncio
+import csv
+import json
+import os
+import tempfile
+import tracemalloc
+import unittest
+import zipfile
+from unittest.mock import MagicMock
+
+from core.report_manager import ReportManager
+from database.db_manager import DatabaseManager
+from services.report_export import ReportSection, StreamingReportExporter
+
+
+async def track_rows(count: int, batch: int = 500):
+    for start in range(0, count, batch):
+        yield [(i, 55.75 + i * 1e-6, 37.61, f"2024-02-16T12:00:{i % 60:02d}")
+               for i in range(start, min(count, start + batch))]
+
+
+class TestStreamingReportExporter(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.exporter = StreamingReportExporter(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def sections(self, count: int):
+        return [
+            ReportSection('Операция', ['Параметр', 'Значение'], [('name', 'Поиск'), ('meta', {'a': 1})]),
+            ReportSection('Точки', ['ID', 'Широта', 'Долгота', 'Время'], track_rows(count)),
+        ]
+
+    def test_xlsx_bounded_memory(self):
+        async def scenario():
+            tracemalloc.start()
+            path = await self.exporter.export(self.sections(30_000), 'xlsx')
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            return path, peak
+
+        path, peak = asyncio.run(scenario())
+        self.assertLess(peak, 16 * 1024 * 1024)
+        with zipfile.ZipFile(path) as archive:
+            sheet = archive.read('xl/worksheets/sheet2.xml').decode()
+        self.assertEqual(sheet.count('<row '), 30_001)
+
+    def test_csv_and_jsonl(self):
+        async def scenario():
+            csv_path = await self.exporter.export(self.sections(1200), 'csv')
+            jsonl_path = await self.exporter.export(self.sections(1200), 'jsonl')
+            return csv_path, jsonl_path
+
+        csv_path, jsonl_path = asyncio.run(scenario())
+        with open(csv_path, encoding='utf-8-sig', newline='') as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(rows[0], ['Операция'])
+        self.assertEqual(rows[3], ['meta', '{"a": 1}'])
+        self.assertEqual(rows[5:7], [['Точки'], ['ID', 'Широта', 'Долгота', 'Время']])
+        self.assertEqual(len(rows), 7 + 1200)
+
+        with open(jsonl_path, encoding='utf-8') as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEqual(len(lines), 2 + 1200)
+        self.assertEqual(lines[-1]['section'], 'Точки')
+        self.assertEqual(lines[-1]['ID'], 1199)
+
+    def test_failed_source_removes_file(self):
+        async def broken_rows():
+            yield [(1, 2)]
+            raise RuntimeError("cursor failed")
+
+        async def scenario():
+            with self.assertRaises(RuntimeError):
+                await self.exporter.export([ReportSection('Данные', ['a', 'b'], broken_rows())], 'csv')
+            await asyncio.sleep(0.1)
+
+        asyncio.run(scenario())
+        self.assertEqual(os.listdir(self.tmp.name), [])
+
+
+class TestReportManagerExport(unittest.TestCase):
+    def test_export_operation_streams_from_db(self):
+        async def scenario(tmp):
+            db = DatabaseManager(os.path.join(tmp, 'reports.db'))
+            await db.init_pool()
+            with open('database/migrations/07_search_operations.sql', encoding='utf-8') as f:
+                await db.pool.executescript(f.read())
+            await db.pool.executescript("""
+                CREATE TABLE group_participants (participant_id INTEGER PRIMARY KEY, group_id INTEGER);
+                CREATE TABLE coordination_tasks (task_id INTEGER PRIMARY KEY, operation_id INTEGER,
+                    title TEXT, status TEXT, assigned_to INTEGER, created_at TEXT, completed_at TEXT);
+                CREATE TABLE user_tracks (track_id INTEGER PRIMARY KEY, user_id INTEGER, group_id INTEGER);
+                CREATE TABLE track_points (point_id INTEGER PRIMARY KEY, track_id INTEGER, user_id INTEGER,
+                    latitude REAL, longitude REAL, accuracy REAL, altitude REAL, timestamp TEXT);
+                INSERT INTO search_operations (operation_id, name, coordinator_id, status, start_time)
+                    VALUES (1, 'Поиск', 7, 'active', '2024-02-16');
+                INSERT INTO search_groups (group_id, operation_id, name, leader_id, type, status)
+                    VALUES (10, 1, 'Альфа', 5, 'foot', 'active');
+                INSERT INTO group_participants (group_id) VALUES (10), (10);
+                INSERT INTO coordination_tasks VALUES (1, 1, 'Прочесать сектор', 'pending', 5, '2024-02-16', NULL);
+                INSERT INTO user_tracks VALUES (100, 5, 10);
+            """)
+            await db.executemany(
+                "INSERT INTO track_points (track_id, user_id, latitude, longitude, timestamp) VALUES (?, ?, ?, ?, ?)",
+                [(100, 5, 55.75 + i * 1e-5, 37.61, f"2024-02-16T12:{i // 60 % 60:02d}:{i % 60:02d}")
+                 for i in range(3000)]
+            )
+            manager = ReportManager.__new__(ReportManager)
+            manager.db = db
+            manager.notification_manager = MagicMock()
+            manager.exporter = StreamingReportExporter(tmp)
+            path = await manager.export_operation(1, 'csv')
+            await db.close()
+            return path
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = asyncio.run(scenario(tmp))
+            with open(path, encoding='utf-8-sig', newline='') as f:
+                rows = list(csv.reader(f))
+        self.assertIn(['1', 'Поиск', 'active', '2024-02-16', ''], rows)
+        self.assertIn(['10', 'Альфа', '2', 'active'], rows)
+        self.assertIn(['Точки треков'], rows)
+        self.assertEqual(len(rows) - rows.index(['Точки треков']) - 2, 3000)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,214 @@
+import asyncio
+import itertools
+import json
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import MagicMock
+
+import numpy as np
+
+from core.sector_manager import SectorManager
+from database.db_manager import DatabaseManager
+from services.notification_manager import NotificationManager
+from services.sector_assignment import SectorAssignmentEngine, solve_assignment
+
+SCHEMA = """
+CREATE TABLE search_teams (
+    team_id INTEGER PRIMARY KEY, operation_id INTEGER, name TEXT, leader_id INTEGER,
+    status TEXT DEFAULT 'active', current_sector INTEGER);
+CREATE TABLE team_members (team_id INTEGER, user_id INTEGER);
+CREATE TABLE search_sectors (
+    sector_id INTEGER PRIMARY KEY, operation_id INTEGER, name TEXT, boundaries TEXT,
+    status TEXT DEFAULT 'pending', priority INTEGER DEFAULT 1, difficulty TEXT DEFAULT 'normal',
+    assigned_team INTEGER, last_searched TIMESTAMP, completed_at TIMESTAMP, progress FLOAT);
+CREATE TABLE track_points (
+    point_id INTEGER PRIMARY KEY, track_id INTEGER, user_id INTEGER,
+    latitude REAL, longitude REAL, timestamp TIMESTAMP);
+"""
+
+
+def square(lat, lon, size=0.002):
+    return json.dumps({'type': 'Polygon', 'coordinates': [[
+        [lon, lat], [lon + size, lat], [lon + size, lat + size], [lon, lat + size], [lon, lat]]]})
+
+
+def brute_force(cost):
+    n, m = cost.shape
+    if n <= m:
+        plans = ([(row, plan[row]) for row in range(n)] for plan in itertools.permutations(range(m), n))
+    else:
+        plans = ([(plan[col], col) for col in range(m)] for plan in itertools.permutations(range(n), m))
+    best = None
+    for pairs in plans:
+        allowed = [cost[row, col] for row, col in pairs if np.isfinite(cost[row, col])]
+        key = (-len(allowed), sum(allowed))
+        best = key if best is None or key < best else best
+    return best
+
+
+class FakeNotifications:
+    def __init__(self):
+        self.teams = []
+
+    async def notify_team(self, team_id, message):
+        self.teams.append(team_id)
+
+
+class TestSolver(unittest.TestCase):
+    def test_matches_brute_force(self):
+        rng = np.random.default_rng(7)
+        for trial in range(200):
+            cost = rng.integers(-20, 50, (int(rng.integers(1, 6)), int(rng.integers(1, 6)))).astype(float)
+            if trial % 3 == 0:
+                cost[rng.random(cost.shape) < 0.25] = np.inf
+            rows, cols = solve_assignment(cost)
+            self.assertEqual(len(set(rows.tolist())), len(rows))
+            self.assertEqual(len(set(cols.tolist())), len(cols))
+            self.assertEqual((-len(rows), cost[rows, cols].sum()), brute_force(cost))
+
+    def test_100_teams_1000_sectors(self):
+        rng = np.random.default_rng(3)
+        teams = rng.random((100, 2)) * 0.05  # все команды у штаба
+        sectors = rng.random((1000, 2))
+        cost = np.hypot(*(teams[:, None, :] - sectors[None, :, :]).transpose(2, 0, 1))
+        started = time.perf_counter()
+        rows, cols = solve_assignment(cost)
+        elapsed = time.perf_counter() - started
+        self.assertEqual(len(rows), 100)
+        self.assertLess(elapsed, 1.0)
+        # Оптимум не хуже жадного назначения
+        greedy, taken = 0.0, set()
+        for row in range(100):
+            col = next(col for col in np.argsort(cost[row]) if col not in taken)
+            taken.add(col)
+            greedy += cost[row, col]
+        self.assertLessEqual(cost[rows, cols].sum(), greedy + 1e-9)
+
+
+class TestAssignmentEngine(unittest.TestCase):
+    def run_scenario(self, scenario):
+        async def wrapper(path):
+            db = DatabaseManager(path)
+            await db.init_pool()
+            await db.executescript(SCHEMA)
+            # Три команды стоят у трех секторов, четвертый сектор - далеко
+            await db.executemany("INSERT INTO search_teams (team_id, operation_id, name, leader_id) VALUES (?, 1, ?, ?)",
+                                 [(1, 'Альфа', 11), (2, 'Браво', 21), (3, 'Чарли', 31)])
+            await db.executemany("INSERT INTO team_members VALUES (?, ?)", [(1, 12), (2, 22), (3, 32)])
+            await db.executemany("INSERT INTO search_sectors (sector_id, operation_id, name, boundaries) VALUES (?, 1, ?, ?)",
+                                 [(10, 'A1', square(55.0, 37.0)), (20, 'A2', square(55.0, 37.05)),
+                                  (30, 'A3', square(55.0, 37.1)), (40, 'B1', square(55.03, 37.05)),
+                                  (50, 'X', '{}')])
+            await db.executemany(
+                "INSERT INTO track_points (track_id, user_id, latitude, longitude, timestamp) VALUES (1, ?, ?, ?, ?)",
+                [(11, 50.0, 30.0, '2024-01-01 09:00'), (11, 55.001, 37.101, '2024-01-01 10:00'),
+                 (12, 55.001, 37.101, '2024-01-01 10:00'), (21, 55.001, 37.001, '2024-01-01 10:00'),
+                 (31, 55.001, 37.051, '2024-01-01 10:00')])
+            try:
+                return await scenario(db)
+            finally:
+                await db.close()
+
+        with tempfile.TemporaryDirectory() as tmp:
+            return asyncio.run(wrapper(os.path.join(tmp, 'assign.db')))
+
+    def test_nearest_sectors_assigned_atomically(self):
+        async def scenario(db):
+            notifications = FakeNotifications()
+            engine = SectorAssignmentEngine(db, notifications)
+            plan = await engine.assign(1)
+            again = await engine.assign(1)
+            teams = await db.fetch_all("SELECT team_id, current_sector FROM search_teams ORDER BY team_id")
+            sectors = await db.fetch_all("SELECT sector_id, status, assigned_team FROM search_sectors ORDER BY sector_id")
+            return plan, again, teams, sectors, notifications.teams
+
+        plan, again, teams, sectors, notified = self.run_scenario(scenario)
+        self.assertEqual([(team, sector) for team, sector, _ in plan], [(1, 30), (2, 10), (3, 20)])
+        self.assertEqual(again, [])
+        self.assertEqual([team['current_sector'] for team in teams], [30, 10, 20])
+        self.assertEqual(sectors[3]['status'], 'pending')
+        self.assertEqual(sectors[0]['assigned_team'], 2)
+        self.assertEqual(sorted(notified), [1, 2, 3])
+
+    def test_real_notification_manager_notifies_team_members(self):
+        async def scenario(db):
+            with open('database/migrations/notification_queue.sql', encoding='utf-8') as f:
+                await db.executescript(f.read())
+            notifications = NotificationManager(MagicMock(), db)
+            plan = await SectorAssignmentEngine(db, notifications).assign(1)
+            queued = await db.fetchall("SELECT user_id FROM notification_queue ORDER BY user_id")
+            return plan, [row[0] for row in queued]
+
+        plan, queued = self.run_scenario(scenario)
+        self.assertEqual(len(plan), 3)
+        self.assertEqual(queued, [11, 12, 21, 22, 31, 32])
+
+    def test_priority_outweighs_short_walk(self):
+        async def scenario(db):
+            await db.execute("UPDATE search_sectors SET priority = 5 WHERE sector_id = 40")
+            await db.execute("UPDATE search_teams SET status = 'resting' WHERE team_id IN (1, 2)")
+            return await SectorAssignmentEngine(db, FakeNotifications()).assign(1)
+
+        plan = self.run_scenario(scenario)
+        self.assertEqual([(team, sector) for team, sector, _ in plan], [(3, 40)])
+
+    def test_conflict_rolls_back_and_replans(self):
+        class RacingEngine(SectorAssignmentEngine):
+            raced = False
+
+            async def apply(self, assignments):
+                if not self.raced:
+                    self.raced = True
+                    # Координатор вручную занял сектор между планированием и записью
+                    await self.db.execute("UPDATE search_sectors SET assigned_team = 99, "
+                                          "status = 'in_progress' WHERE sector_id = 20")
+                await super().apply(assignments)
+
+        async def scenario(db):
+            plan = await RacingEngine(db, FakeNotifications()).assign(1)
+            teams = await db.fetch_all("SELECT team_id, current_sector FROM search_teams ORDER BY team_id")
+            return plan, teams
+
+        plan, teams = self.run_scenario(scenario)
+        self.assertEqual([(team, sector) for team, sector, _ in plan], [(1, 30), (2, 10), (3, 40)])
+        self.assertEqual([team['current_sector'] for team in teams], [30, 10, 40])
+
+    def test_freed_team_is_replanned_alone(self):
+        async def scenario(db):
+            manager = SectorManager(db, FakeNotifications(), map_service=None)
+            await manager.auto_assign_teams(1)
+            await db.execute("CREATE TABLE sector_progress (sector_id INTEGER, team_id INTEGER, "
+                             "coverage_percent FLOAT, search_date TIMESTAMP)")
+            await manager.update_sector_progress(20, 3, 100)
+            manual = await manager.assign_team_to_sector(40, 2)
+            teams = await db.fetch_all("SELECT team_id, current_sector FROM search_teams ORDER BY team_id")
+            done = await db.fetch_one("SELECT status, assigned_team FROM search_sectors WHERE sector_id = 20")
+            return manual, teams, done
+
+        manual, teams, done = self.run_scenario(scenario)
+        self.assertFalse(manual)  # сектор 40 уже занят освободившейся командой
+        self.assertEqual([team['current_sector'] for team in teams], [30, 10, 40])
+        self.assertEqual((done['status'], done['assigned_team']), ('completed', 3))
+
+    def test_duplicate_report_keeps_next_sector(self):
+        async def scenario(db):
+            manager = SectorManager(db, FakeNotifications(), map_service=None)
+            await manager.auto_assign_teams(1)
+            await db.execute("CREATE TABLE sector_progress (sector_id INTEGER, team_id INTEGER, "
+                             "coverage_percent FLOAT, search_date TIMESTAMP)")
+            await manager.update_sector_progress(20, 3, 100)
+            # Запоздавший повторный отчет по уже завершенному сектору
+            await manager.update_sector_progress(20, 3, 100)
+            team = await db.fetch_one("SELECT current_sector FROM search_teams WHERE team_id = 3")
+            sector = await db.fetch_one("SELECT status, assigned_team FROM search_sectors WHERE sector_id = 40")
+            return team, sector
+
+        team, sector = self.run_scenario(scenario)
+        self.assertEqual(team['current_sector'], 40)
+        self.assertEqual((sector['status'], sector['assigned_team']), ('in_progress', 3))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+import asyncio
+import json
+import os
+import tempfile
+import time
+import unittest
+
+import shapely
+from shapely.geometry import Polygon
+
+from core.sector_manager import SectorManager
+from database.db_manager import DatabaseManager
+from services.sector_grid import grid_search_area, target_cell_area
+
+# Вогнутая область около 10 x 5 км
+AREA = {'type': 'Polygon', 'coordinates': [[
+    [37.0, 55.0], [37.16, 55.0], [37.16, 55.045], [37.08, 55.02], [37.0, 55.045], [37.0, 55.0]
+]]}
+SWAMP = {'type': 'Polygon', 'coordinates': [[
+    [37.0, 55.0], [37.05, 55.0], [37.05, 55.02], [37.0, 55.02], [37.0, 55.0]
+]]}
+
+
+def polygons(sectors):
+    return [Polygon(sector['boundaries']) for sector in sectors]
+
+
+class TestGridSearchArea(unittest.TestCase):
+    def assert_partition(self, sectors, min_area):
+        cells = polygons(sectors)
+        self.assertTrue(all(cell.is_valid for cell in cells))
+        total = sum(sector['area_m2'] for sector in sectors)
+        union = shapely.union_all(cells)
+        area = shapely.geometry.shape(AREA)
+        # Секторы покрывают область целиком и не перекрываются
+        self.assertAlmostEqual(union.area / area.area, 1.0, places=4)
+        self.assertAlmostEqual(sum(cell.area for cell in cells) / union.area, 1.0, places=4)
+        self.assertGreater(total, 36_000_000)
+        self.assertGreaterEqual(min(sector['area_m2'] for sector in sectors), min_area)
+
+    def test_square_and_hex(self):
+        for shape in ('square', 'hex'):
+            with self.subTest(shape=shape):
+                sectors = grid_search_area(AREA, shape, cell_area_m2=250_000)
+                self.assertTrue(130 <= len(sectors) <= 170)
+                self.assert_partition(sectors, 250_000 * 0.25 - 1)
+                self.assertEqual(len({sector['name'] for sector in sectors}), len(sectors))
+
+    def test_square_names_and_sizes(self):
+        # 1.98 x 0.99 км: четыре столбца и два ряда, последние чуть уже
+        rectangle = [[37.0, 55.0], [37.031, 55.0], [37.031, 55.0089], [37.0, 55.0089]]
+        sectors = grid_search_area(rectangle, cell_area_m2=250_000, min_fraction=0)
+        names = [sector['name'] for sector in sectors]
+        self.assertEqual(names, ['A1', 'A2', 'A3', 'A4', 'B1', 'B2', 'B3', 'B4'])
+        self.assertEqual(sectors[0]['area_m2'], 250_000)
+        self.assertLess(sectors[-1]['area_m2'], 250_000)
+        min_lon, _, _, max_lat = Polygon(sectors[0]['boundaries']).bounds
+        self.assertEqual((min_lon, max_lat), (37.0, 55.0089))
+
+    def test_walking_time_and_terrain(self):
+        self.assertEqual(target_cell_area(walking_minutes=60), 300_000)
+        sectors = grid_search_area(AREA, 'terrain', walking_minutes=60,
+                                   terrain=[{'terrain_type': 'swamp', 'geometry': SWAMP}])
+        swamp = [sector for sector in sectors if sector['terrain_type'] == 'swamp']
+        open_ground = [sector for sector in sectors if sector['terrain_type'] == 'open']
+        self.assertTrue(swamp and open_ground)
+        self.assertTrue(all('.' in sector['name'] for sector in swamp))
+        # В болоте секторы меньше, чтобы время прочесывания было сопоставимым
+        def mean_area(items):
+            return sum(sector['area_m2'] for sector in items) / len(items)
+        self.assertLess(mean_area(swamp), mean_area(open_ground) / 2)
+        self.assertIn(300_000, [sector['area_m2'] for sector in open_ground])
+
+    def test_thousands_of_cells_within_a_second(self):
+        started = time.perf_counter()
+        sectors = grid_search_area(AREA, 'hex', cell_area_m2=10_000)
+        elapsed = time.perf_counter() - started
+        self.assertGreater(len(sectors), 3000)
+        self.assertLess(elapsed, 1.0)
+
+    def test_limits(self):
+        with self.assertRaises(ValueError):
+            grid_search_area(AREA, cell_area_m2=1000, max_cells=5000)
+        with self.assertRaises(ValueError):
+            grid_search_area(AREA, 'triangle', cell_area_m2=250_000)
+        with self.assertRaises(ValueError):
+            grid_search_area({}, cell_area_m2=250_000)
+
+
+class FakeNotifications:
+    async def notify_coordinators(self, message):
+        pass
+
+
+class FakeMapService:
+    async def generate_sector_preview(self, sector_id, boundaries):
+        pass
+
+
+class TestGenerateSectors(unittest.TestCase):
+    def test_operation_area_is_gridded_in_one_insert(self):
+        async def scenario(path):
+            db = DatabaseManager(path)
+            await db.init_pool()
+            await db.executescript("""
+                CREATE TABLE search_operations (operation_id INTEGER PRIMARY KEY, search_area TEXT);
+                CREATE TABLE search_sectors (
+                    sector_id INTEGER PRIMARY KEY AUTOINCREMENT, operation_id INTEGER, name TEXT,
+                    boundaries TEXT, priority INTEGER, difficulty TEXT, terrain_type TEXT,
+                    status TEXT, created_at TIMESTAMP);
+            """)
+            await db.execute("INSERT INTO search_operations VALUES (1, ?), (2, '{}')", (json.dumps(AREA),))
+            manager = SectorManager(db, FakeNotifications(), FakeMapService())
+            sector_ids = await manager.generate_sectors(1, 'hex', cell_area_m2=100_000)
+            missing = await manager.generate_sectors(2, cell_area_m2=100_000)
+            await manager.wait_background_tasks()
+            count = await db.fetch_one("SELECT COUNT(*) AS n FROM search_sectors WHERE operation_id = 1")
+            await db.close()
+            return sector_ids, missing, count['n']
+
+        with tempfile.TemporaryDirectory() as tmp:
+            sector_ids, missing, count = asyncio.run(scenario(os.path.join(tmp, 'grid.db')))
+        self.assertTrue(all(sector_ids))
+        self.assertEqual(count, len(sector_ids))
+        self.assertGreater(count, 300)
+        self.assertEqual(missing, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
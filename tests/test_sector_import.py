@@ -0,0 +1,149 @@
+import asyncio
+import json
+import os
+import tempfile
+import time
+import unittest
+
+from core.sector_manager import SectorManager
+from database.db_manager import DatabaseManager
+from services.sector_import import (check_sector_geometries, sectors_from_geojson,
+                                    shutdown_validation_pool, validate_sectors)
+
+SCHEMA = """
+CREATE TABLE search_sectors (
+    sector_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    operation_id INTEGER,
+    name TEXT NOT NULL,
+    boundaries TEXT NOT NULL,
+    priority INTEGER,
+    difficulty TEXT,
+    terrain_type TEXT,
+    status TEXT,
+    created_at TIMESTAMP
+);
+"""
+
+
+def tearDownModule():
+    shutdown_validation_pool()
+
+
+def grid(rows, cols, size=0.0037, lon=37.0, lat=55.0):
+    """Сетка секторов; 500 ячеек по 0.0037 градуса - около 50 км²"""
+    return [{
+        'name': f"{chr(65 + row % 26)}{col + 1}",
+        'boundaries': [
+            (lon + col * size, lat + row * size),
+            (lon + (col + 1) * size, lat + row * size),
+            (lon + (col + 1) * size, lat + (row + 1) * size),
+            (lon + col * size, lat + (row + 1) * size),
+        ]
+    } for row in range(rows) for col in range(cols)]
+
+
+class FakeNotifications:
+    def __init__(self):
+        self.messages = []
+
+    async def notify_coordinators(self, message):
+        self.messages.append(message)
+
+
+class FakeMapService:
+    def __init__(self):
+        self.previews = []
+        self.active = 0
+        self.max_active = 0
+
+    async def generate_sector_preview(self, sector_id, boundaries):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        await asyncio.sleep(0)
+        self.active -= 1
+        self.previews.append(sector_id)
+
+
+class TestGeometryChecks(unittest.TestCase):
+    def test_errors_and_geojson(self):
+        checks = check_sector_geometries([
+            [(0, 0), (1, 0), (1, 1), (0, 0)],
+            [(0, 0), (1, 0)],
+            [(0, 0), (1, 1), (1, 0), (0, 1)],
+            [(0, 0), (1, 0), (2, 0)],
+            [('a', 0), (1, 0), (1, 1)],
+        ])
+        self.assertIsNone(checks[0][0])
+        self.assertEqual(json.loads(checks[0][1]),
+                         {'type': 'Polygon', 'coordinates': [[[0, 0], [1, 0], [1, 1], [0, 0]]]})
+        self.assertEqual(checks[1], ("Less than 3 points", None))
+        self.assertTrue(checks[2][0].startswith('Self-intersection'))
+        self.assertIsNotNone(checks[3][0])
+        self.assertEqual(checks[4], ("Malformed coordinates", None))
+
+    def test_process_pool_matches_inline(self):
+        rings = [sector['boundaries'] for sector in grid(10, 30)]
+        rings[123] = [(0, 0), (1, 1), (1, 0), (0, 1)]
+        pooled = asyncio.run(validate_sectors(rings, chunk_size=100))
+        self.assertEqual(pooled, check_sector_geometries(rings))
+        self.assertEqual([index for index, (error, _) in enumerate(pooled) if error], [123])
+
+    def test_geojson_import(self):
+        sectors = sectors_from_geojson(json.dumps({
+            'type': 'FeatureCollection',
+            'features': [
+                {'type': 'Feature', 'properties': {'name': 'Лес', 'priority': 3},
+                 'geometry': {'type': 'Polygon', 'coordinates': [[[0, 0], [1, 0], [1, 1], [0, 0]]]}},
+                {'type': 'Feature', 'properties': {},
+                 'geometry': {'type': 'MultiPolygon', 'coordinates': [
+                     [[[2, 0], [3, 0], [3, 1], [2, 0]]], [[[4, 0], [5, 0], [5, 1], [4, 0]]]]}},
+                {'type': 'Feature', 'properties': {}, 'geometry': {'type': 'Point', 'coordinates': [0, 0]}},
+            ]
+        }))
+        self.assertEqual([sector['name'] for sector in sectors], ['Лес', 'Сектор 2-1', 'Сектор 2-2'])
+        self.assertEqual(sectors[0]['boundaries'], [[0, 0], [1, 0], [1, 1]])
+        self.assertEqual(sectors[0]['priority'], 3)
+
+
+class TestBulkSectorCreation(unittest.TestCase):
+    def test_grid_of_500_sectors(self):
+        async def scenario(path):
+            db = DatabaseManager(path)
+            await db.init_pool()
+            await db.executescript(SCHEMA)
+            notifications, maps = FakeNotifications(), FakeMapService()
+            manager = SectorManager(db, notifications, maps)
+
+            sectors = grid(20, 25)
+            sectors[7]['boundaries'] = [(0, 0), (1, 1), (1, 0), (0, 1)]
+            started = time.perf_counter()
+            sector_ids = await manager.create_sectors(1, sectors)
+            elapsed = time.perf_counter() - started
+
+            await manager.wait_background_tasks()
+            stored = await db.fetch_all("SELECT sector_id, name, boundaries FROM search_sectors ORDER BY sector_id")
+            single = await manager.create_sector(2, {'name': 'Овраг', 'boundaries': [(0, 0), (1, 0), (1, 1)]})
+            await manager.wait_background_tasks()
+            await db.close()
+            return sector_ids, elapsed, stored, single, notifications.messages, maps
+
+        with tempfile.TemporaryDirectory() as tmp:
+            sector_ids, elapsed, stored, single, messages, maps = asyncio.run(
+                scenario(os.path.join(tmp, 'sectors.db')))
+
+        self.assertLess(elapsed, 1.0)
+        self.assertIsNone(sector_ids[7])
+        created = [sector_id for sector_id in sector_ids if sector_id]
+        self.assertEqual(len(created), 499)
+        self.assertEqual(created, [row['sector_id'] for row in stored])
+        self.assertEqual(stored[7]['name'], 'A9')
+        self.assertEqual(json.loads(stored[0]['boundaries'])['coordinates'][0][-1], [37.0, 55.0])
+        self.assertEqual(single, 500)
+        self.assertEqual(messages, ["🆕 В операции #1 создано секторов: 499",
+                                    "🆕 Создан новый сектор 'Овраг' в операции #2"])
+        self.assertEqual(len(maps.previews), 500)
+        self.assertLessEqual(maps.max_active, 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import random
+import time
+import unittest
+
+from services.spatial_index import LivePositionIndex, haversine_m
+from utils.map_utils import MapManager
+
+
+def brute_force(positions, lat, lon, radius):
+    found = [(uid, haversine_m(lat, lon, a, b)) for uid, (a, b) in positions.items()]
+    return sorted((item for item in found if item[1] <= radius), key=lambda item: item[1])
+
+
+class TestLivePositionIndex(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(3)
+        self.index = LivePositionIndex(cell_size=300.0)
+        self.positions = {}
+        for user_id in range(5000):
+            lat, lon = 55.7 + rng.random() * 0.2, 37.5 + rng.random() * 0.3
+            self.positions[user_id] = (lat, lon)
+            self.index.update(user_id, lat, lon, group_id=user_id % 10)
+
+    def test_within_matches_brute_force(self):
+        result = self.index.within(55.8, 37.65, 1500)
+        self.assertEqual(result, brute_force(self.positions, 55.8, 37.65, 1500))
+        self.assertTrue(result)
+
+    def test_nearest(self):
+        expected = brute_force(self.positions, 55.75, 37.6, 1e7)[:5]
+        self.assertEqual(self.index.nearest(55.75, 37.6, 5), expected)
+
+        grouped = self.index.nearest(55.75, 37.6, 3, group_id=4)
+        self.assertEqual(len(grouped), 3)
+        self.assertTrue(all(uid % 10 == 4 for uid, _ in grouped))
+
+    def test_move_and_remove(self):
+        self.index.update(1, 10.0, 10.0)
+        self.assertEqual(self.index.nearest(10.0, 10.0, 1)[0][0], 1)
+        self.index.remove(1)
+        self.assertNotIn(1, [uid for uid, _ in self.index.within(10.0, 10.0, 1000)])
+        self.assertEqual(len(self.index), 4999)
+
+    def test_prune(self):
+        self.index.update(1, 55.8, 37.6, timestamp=time.time() - 3600)
+        self.assertEqual(self.index.prune(600), 1)
+        self.assertNotIn(1, self.index.positions)
+
+    def test_nearest_is_fast(self):
+        start = time.perf_counter()
+        for _ in range(100):
+            self.index.nearest(55.8, 37.65, 5)
+        self.assertLess((time.perf_counter() - start) / 100, 0.001)
+
+
+class TestPointInPolygon(unittest.TestCase):
+    def test_point_in_polygon(self):
+        square = [[0, 0], [10, 0], [10, 10], [0, 10]]
+        self.assertTrue(MapManager.point_in_polygon([5, 5], square))
+        self.assertFalse(MapManager.point_in_polygon([15, 5], square))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+from datetime import datetime, timedelta
+
+from scripts.benchmark_track_analyzer import LegacyTrackAnalyzer, generate_points
+from services.track_analyzer import TrackAnalyzer
+from services.track_data import Track
+
+
+class TestTrackAnalyzer(unittest.TestCase):
+    def setUp(self):
+        self.analyzer = TrackAnalyzer()
+        start = datetime(2024, 2, 16, 12, 0, 0)
+        # ~111 м на шаг по широте, шаг 60 с => ~6.7 км/ч
+        self.points = [
+            {
+                'lat': 55.0 + i * 0.001,
+                'lon': 37.0,
+                'elevation': 100 + (i % 4),
+                'timestamp': (start + timedelta(minutes=i)).isoformat()
+            }
+            for i in range(31)
+        ]
+
+    def test_output_format(self):
+        stats = self.analyzer.analyze_track(self.points)
+        self.assertEqual(set(stats), set(self.analyzer._empty_stats()))
+        self.assertEqual(stats['points_count'], 31)
+        self.assertEqual(stats['duration'], "00:30:00")
+        self.assertEqual(stats['moving_time'], "00:30:00")
+        self.assertAlmostEqual(stats['total_distance'], 3.34, places=2)
+        self.assertAlmostEqual(stats['avg_speed'], 6.7, places=1)
+        self.assertEqual(stats['elevation_gain'], 23)
+        self.assertEqual(stats['elevation_loss'], 21)
+        self.assertEqual(stats['start_time'], self.points[0]['timestamp'])
+
+    def test_segments(self):
+        segments = self.analyzer.analyze_track(self.points)['segments']
+        self.assertEqual(len(segments), 3)
+        self.assertGreaterEqual(segments[0]['distance'], 1.0)
+        self.assertEqual(segments[0]['start_point'], self.points[0])
+        self.assertEqual(segments[1]['start_point'], self.points[9])
+
+    def test_track_input_matches_dicts(self):
+        from_dicts = self.analyzer.analyze_track(self.points)
+        from_track = self.analyzer.analyze_track(Track.from_points(self.points))
+        for key in ('total_distance', 'duration', 'avg_speed', 'max_speed', 'elevation_gain'):
+            self.assertEqual(from_dicts[key], from_track[key])
+        self.assertEqual(len(from_dicts['segments']), len(from_track['segments']))
+
+    def test_matches_legacy_loop_implementation(self):
+        points = generate_points(2000)
+        legacy = LegacyTrackAnalyzer().analyze_track(points)
+        stats = self.analyzer.analyze_track(points)
+        self.assertEqual(stats['total_distance'], legacy['total_distance'])
+        self.assertEqual(stats['avg_speed'], legacy['avg_speed'])
+        self.assertEqual(stats['max_speed'], legacy['max_speed'])
+        self.assertEqual([s['distance'] for s in stats['segments']], legacy['segments'])
+
+    def test_short_track(self):
+        self.assertEqual(self.analyzer.analyze_track(self.points[:1]), self.analyzer._empty_stats())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+from datetime import datetime, timezone
+
+from services.track_data import Track
+
+
+class TestTrack(unittest.TestCase):
+    def setUp(self):
+        self.track = Track(track_id=1)
+        for i in range(10):
+            self.track.add(55.75 + i * 0.001, 37.61, 1700000000 + i * 5,
+                           accuracy=4.0, elevation=150 + i)
+
+    def test_dict_compatible_iteration(self):
+        points = list(self.track)
+        self.assertEqual(len(points), 10)
+        self.assertAlmostEqual(points[3]['lat'], 55.753)
+        self.assertEqual(points[3]['elevation'], 153)
+        self.assertEqual(
+            datetime.fromisoformat(points[1]['timestamp']).timestamp(), 1700000005
+        )
+
+    def test_append_legacy_dicts(self):
+        track = Track()
+        track.append({'lat': 1.0, 'lon': 2.0, 'timestamp': '2024-02-16T12:00:00Z'})
+        track.append({'latitude': 1.5, 'longitude': 2.5,
+                      'time': datetime(2024, 2, 16, 12, 0, 5, tzinfo=timezone.utc)})
+        self.assertEqual(track[1]['lon'], 2.5)
+        self.assertEqual(track[-1]['timestamp'], '2024-02-16T12:00:05+00:00')
+        self.assertNotIn('accuracy', track[0])
+
+    def test_slicing_returns_track(self):
+        part = self.track[2:5]
+        self.assertIsInstance(part, Track)
+        self.assertEqual(len(part), 3)
+        self.assertEqual(part[0], self.track[2])
+
+    def test_numpy_views_are_zero_copy(self):
+        arrays = self.track.as_numpy()
+        self.assertEqual(arrays['lat'].shape, (10,))
+        self.assertEqual(arrays['elevation'][9], 159)
+        self.track.lat[0] = 0.0
+        self.assertEqual(arrays['lat'][0], 0.0)
+
+    def test_memory_footprint(self):
+        self.assertEqual(self.track.nbytes, 10 * (8 * 3 + 4 * 2))
+        self.track.clear()
+        self.assertEqual(len(self.track), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
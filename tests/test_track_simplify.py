@@ -0,0 +1,95 @@
+import unittest
+
+import numpy as np
+
+from services.track_data import Track
+from services.track_simplify import (
+    StreamingSimplifier, douglas_peucker_indices, project, simplify_track, visvalingam_indices
+)
+
+
+def make_points(count: int, seed: int = 1):
+    """Прямые участки с GPS-шумом ~2 м и поворотами"""
+    rng = np.random.default_rng(seed)
+    heading = np.repeat(rng.uniform(0, 2 * np.pi, count // 200 + 1), 200)[:count]
+    lat = 55.75 + np.cumsum(np.cos(heading) * 4e-5) + rng.normal(0, 1.5e-5, count)
+    lon = 37.61 + np.cumsum(np.sin(heading) * 7e-5) + rng.normal(0, 2.5e-5, count)
+    return [{'lat': float(a), 'lon': float(b), 'timestamp': f"2024-02-16T12:00:{i % 60:02d}"}
+            for i, (a, b) in enumerate(zip(lat, lon))]
+
+
+def max_deviation(points, simplified):
+    """Максимальное отклонение исходных точек от упрощенной линии, м"""
+    from shapely.geometry import LineString, Point
+    lat = np.array([p['lat'] for p in points])
+    x, y = project(lat, np.array([p['lon'] for p in points]), ref_lat=float(lat.mean()))
+    sx, sy = project(np.array([p['lat'] for p in simplified]),
+                     np.array([p['lon'] for p in simplified]), ref_lat=float(lat.mean()))
+    line = LineString(list(zip(sx, sy)))
+    return max(line.distance(Point(px, py)) for px, py in zip(x, y))
+
+
+class TestTrackSimplify(unittest.TestCase):
+    def test_long_track_without_recursion(self):
+        points = make_points(100_000)
+        simplified = simplify_track(points, tolerance=10.0)
+        self.assertEqual(simplified[0], points[0])
+        self.assertEqual(simplified[-1], points[-1])
+        self.assertLess(len(simplified), len(points) / 10)
+
+    def test_dp_respects_tolerance(self):
+        points = make_points(2000)
+        simplified = simplify_track(points, tolerance=10.0)
+        self.assertLessEqual(max_deviation(points, simplified), 10.0 + 1e-6)
+
+    def test_dp_straight_line(self):
+        x = np.arange(1000, dtype=float)
+        indices = douglas_peucker_indices(x, x * 2, tolerance=0.1)
+        self.assertEqual(list(indices), [0, 999])
+
+    def test_visvalingam(self):
+        points = make_points(2000)
+        simplified = simplify_track(points, tolerance=10.0, method='vw')
+        self.assertLess(len(simplified), len(points) / 5)
+        x = np.array([0.0, 1.0, 2.0, 3.0, 4.0])
+        y = np.array([0.0, 0.1, 5.0, 0.1, 0.0])
+        self.assertEqual(list(visvalingam_indices(x, y, keep_count=3)), [0, 2, 4])
+
+    def test_track_input_returns_track(self):
+        track = Track.from_points(make_points(1000))
+        simplified = simplify_track(track, tolerance=10.0)
+        self.assertIsInstance(simplified, Track)
+        self.assertLess(len(simplified), len(track))
+
+    def test_streaming_simplifier(self):
+        points = make_points(5000)
+        stream = StreamingSimplifier(tolerance=10.0, max_window=200)
+        emitted = []
+        for point in points:
+            stream.push(point)
+            self.assertLessEqual(len(stream._window), 200)
+            emitted.extend(stream.pop_ready())
+        emitted.extend(stream.finish())
+
+        self.assertEqual(emitted[0], points[0])
+        self.assertEqual(emitted[-1], points[-1])
+        self.assertLess(len(emitted), len(points) / 5)
+        self.assertLessEqual(max_deviation(points, emitted), 10.0 + 1e-6)
+
+    def test_peek_keeps_points_until_commit(self):
+        points = make_points(2000)
+        stream = StreamingSimplifier(tolerance=10.0)
+        for point in points[:1000]:
+            stream.push(point)
+        first = stream.peek_ready()
+        # Сохранение не удалось: точки остаются для следующей попытки
+        for point in points[1000:]:
+            stream.push(point)
+        retry = stream.peek_ready()
+        self.assertEqual(retry[:len(first)], first)
+        stream.commit(len(retry))
+        self.assertEqual(stream.peek_ready(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,154 @@
+import asyncio
+import json
+import time
+import unittest
+from datetime import time as dtime
+from unittest.mock import AsyncMock, MagicMock
+
+from core.notification_settings_manager import NotificationSettingsManager
+from services.user_cache import DndWindow, TTLCache, access_cache_for
+from utils.permission_checker import check_coordinator_permission, check_coordinator_status
+
+
+class CountingDb:
+    """Настройки, роли и права в памяти со счетчиком запросов"""
+
+    def __init__(self):
+        self.queries = 0
+        self.settings = {}
+        self.coordinators = {1}
+        self.permissions = {1: {'manage_tasks'}}
+
+    async def fetch_one(self, query, params=()):
+        self.queries += 1
+        if 'FROM users' in query:
+            return {'is_coordinator': params[0] in self.coordinators}
+        raise AssertionError(query)
+
+    async def fetch_all(self, query, params=()):
+        self.queries += 1
+        if 'FROM notification_settings' in query:
+            return [{'user_id': user_id, 'settings': self.settings[user_id]}
+                    for user_id in params if user_id in self.settings]
+        if 'FROM coordinator_permissions' in query:
+            return [{'permission': p} for p in self.permissions.get(params[0], ())]
+        raise AssertionError(query)
+
+    async def execute(self, query, params=()):
+        self.settings[params[0]] = params[1]
+
+
+def user_settings(dnd_enabled=False, start='23:00', end='07:00', **filters):
+    return {
+        'do_not_disturb': {'enabled': dnd_enabled, 'start_time': start, 'end_time': end},
+        'filters': filters,
+    }
+
+
+class TestTTLCache(unittest.TestCase):
+    def test_lru_and_ttl(self):
+        cache = TTLCache(maxsize=2, ttl=0.05)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)  # вытесняет 'b' - к нему обращались раньше всех
+        self.assertEqual([cache.get('a'), cache.get('b'), cache.get('c')], [1, None, 3])
+        time.sleep(0.06)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.get_stats(), {'size': 1, 'hits': 3, 'misses': 2, 'evictions': 1, 'hit_rate': 0.6})
+
+    def test_dnd_window_over_midnight(self):
+        night = DndWindow(dtime(23, 0), dtime(7, 0))
+        self.assertTrue(night.contains(dtime(23, 30)))
+        self.assertTrue(night.contains(dtime(3, 0)))
+        self.assertFalse(night.contains(dtime(12, 0)))
+        lunch = DndWindow.parse({'enabled': True, 'start_time': '13:00', 'end_time': '14:00'})
+        self.assertTrue(lunch.contains(dtime(13, 15)))
+        self.assertFalse(lunch.contains(dtime(14, 0)))
+        self.assertIsNone(DndWindow.parse({'enabled': False}))
+
+
+class TestSettingsCache(unittest.TestCase):
+    def test_settings_are_read_once_and_invalidated_on_update(self):
+        async def scenario():
+            db = CountingDb()
+            db.settings[5] = json.dumps(user_settings(info='disabled'))
+            manager = NotificationSettingsManager(db)
+            allowed = [await manager.can_send_notification(5, 'info') for _ in range(100)]
+            reads_before_update = db.queries
+            await manager.update_user_settings(5, user_settings())
+            after_update = await manager.can_send_notification(5, 'info')
+            return allowed, reads_before_update, after_update, db.queries, manager.cache.get_stats()
+
+        allowed, reads, after_update, total_reads, stats = asyncio.run(scenario())
+        self.assertEqual(set(allowed), {False})
+        self.assertEqual(reads, 1)
+        self.assertTrue(after_update)
+        self.assertEqual(total_reads, 2)
+        self.assertEqual(stats['settings']['hits'], 99)
+
+    def test_broadcast_recipients_in_one_query(self):
+        async def scenario():
+            db = CountingDb()
+            db.settings[3] = json.dumps(user_settings(status='disabled'))
+            db.settings[4] = json.dumps(user_settings(True, '00:00', '23:59'))
+            manager = NotificationSettingsManager(db)
+            recipients = list(range(300))
+            status = await manager.filter_recipients(recipients, 'status')
+            urgent = await manager.filter_recipients(recipients, 'urgent')
+            return status, urgent, db.queries
+
+        status, urgent, queries = asyncio.run(scenario())
+        self.assertEqual(queries, 1)
+        self.assertEqual(len(status), 298)
+        self.assertNotIn(3, status)
+        self.assertNotIn(4, status)
+        self.assertEqual(len(urgent), 300)
+
+
+class FakeHandler:
+    def __init__(self, db):
+        self.db = db
+
+    @check_coordinator_permission('manage_tasks')
+    async def manage(self, update, context):
+        return 'ok'
+
+    @check_coordinator_status
+    async def coordinate(self, update, context):
+        return 'ok'
+
+
+def make_update(user_id):
+    update = MagicMock()
+    update.effective_user.id = user_id
+    update.callback_query.answer = AsyncMock()
+    return update
+
+
+class TestPermissionCache(unittest.TestCase):
+    def test_decorators_use_cache(self):
+        async def scenario():
+            db = CountingDb()
+            handler = FakeHandler(db)
+            results = []
+            for _ in range(50):
+                results.append(await handler.manage(make_update(1), None))
+                results.append(await handler.coordinate(make_update(1), None))
+            denied = await handler.coordinate(make_update(2), None)
+            queries = db.queries
+            # Одобрение заявки: запись в БД и сброс кэша ролей
+            db.coordinators.add(2)
+            access_cache_for(db).invalidate_roles(2)
+            approved = await handler.coordinate(make_update(2), None)
+            return results, denied, queries, approved
+
+        results, denied, queries, approved = asyncio.run(scenario())
+        self.assertEqual(set(results), {'ok'})
+        self.assertIsNone(denied)
+        self.assertEqual(queries, 3)
+        self.assertEqual(approved, 'ok')
+
+
+if __name__ == '__main__':
+    unittest.main()
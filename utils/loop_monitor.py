@@ -0,0 +1,89 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Dict, List, Optional
+
+from config.settings import LOOP_BLOCK_THRESHOLD
+
+logger = logging.getLogger(__name__)
+
+
+class LoopBlockDetector:
+    """Обнаружение блокировок цикла событий.
+
+    Корутина-пульс отмечается каждые ``interval`` секунд, а сторожевой
+    поток проверяет, не застыл ли пульс. Если цикл занят дольше
+    ``threshold``, в лог пишется стек потока цикла в этот момент - по нему
+    видно, какая корутина держит цикл (обычно синхронный запрос к БД).
+    """
+
+    def __init__(self, threshold: float = LOOP_BLOCK_THRESHOLD, interval: Optional[float] = None):
+        self.threshold = threshold
+        self.interval = interval or threshold / 2
+        self.blocks: deque = deque(maxlen=100)  # последние блокировки
+        self.stats = {'blocks': 0, 'blocked_time': 0.0, 'max_block': 0.0}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._last_beat = 0.0
+        self._captured: Optional[Dict] = None
+        self._beat_task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def start(self):
+        """Запуск из работающего цикла событий"""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stopped.clear()
+        self._beat_task = self._loop.create_task(self._heartbeat())
+        self._watchdog = threading.Thread(target=self._watch, name='loop-watchdog', daemon=True)
+        self._watchdog.start()
+
+    async def stop(self):
+        self._stopped.set()
+        if self._beat_task:
+            self._beat_task.cancel()
+            await asyncio.gather(self._beat_task, return_exceptions=True)
+        if self._watchdog:
+            self._watchdog.join()
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            blocked = now - self._last_beat - self.interval
+            self._last_beat = now
+            if blocked > self.threshold:
+                self._record(blocked)
+
+    def _record(self, duration: float):
+        captured, self._captured = self._captured, None
+        block = {'duration': round(duration, 3), 'task': None, 'stack': []}
+        if captured:
+            block.update(captured)
+        self.blocks.append(block)
+        self.stats['blocks'] += 1
+        self.stats['blocked_time'] += duration
+        self.stats['max_block'] = max(self.stats['max_block'], duration)
+        logger.warning(
+            f"Event loop blocked for {duration * 1000:.0f} ms in task {block['task']}:\n"
+            + ''.join(block['stack'])
+        )
+
+    def _watch(self):
+        while not self._stopped.wait(self.interval / 2):
+            stalled = time.monotonic() - self._last_beat - self.interval
+            if stalled > self.threshold and self._captured is None:
+                self._captured = self._capture()
+
+    def _capture(self) -> Dict:
+        """Стек потока цикла, пока тот заблокирован"""
+        frame = sys._current_frames().get(self._loop_thread)
+        stack: List[str] = traceback.format_stack(frame) if frame else []
+        task = asyncio.current_task(self._loop)
+        return {'task': task.get_name() if task else None, 'stack': stack}
@@ -4,6 +4,7 @@ from datetime import datetime, timedelta
 from telegram import Bot
 import logging
 from core.constants.notification_types import NotificationType, NOTIFICATION_EMOJI, NOTIFICATION_PRIORITIES
+from core.notification_queue_manager import NotificationQueueManager
 
 logger = logging.getLogger(__name__)
 
@@ -11,7 +12,7 @@ class NotificationManager:
     def __init__(self, bot: Bot, db_manager):
         self.bot = bot
         self.db = db_manager
-        self.queue_manager = NotificationQueueManager(self, db_manager)
+        self.queue_manager = NotificationQueueManager(bot, db_manager)
 
     async def start(self):
         """Запуск менеджера уведомлений"""
@@ -37,6 +38,10 @@ class NotificationManager:
             group_id, message, priority, exclude_user_id
         )
 
+    async def broadcast(self, message: str, priority: int = 2, **targets) -> List[int]:
+        """Рассылка через очередь одним пакетом (получатели - см. NotificationQueueManager.broadcast)"""
+        return await self.queue_manager.broadcast(message, priority=priority, **targets)
+
     async def send_urgent_message(self, user_id: int, message: str):
         """Отправка срочного сообщения"""
         formatted_message = self._format_message(message, NotificationType.URGENT)
@@ -3,6 +3,8 @@ from telegram import Update
 from telegram.ext import ContextTypes
 import logging
 
+from services.user_cache import access_cache_for
+
 logger = logging.getLogger(__name__)
 
 def check_coordinator_permission(permission: str):
@@ -13,10 +15,7 @@ def check_coordinator_permission(permission: str):
             user_id = update.effective_user.id
             
             # Проверяем наличие права у координатора
-            has_permission = await self.db.execute_query_fetchone("""
-                SELECT 1 FROM coordinator_permissions
-                WHERE coordinator_id = ? AND permission = ?
-            """, (user_id, permission))
+            has_permission = await access_cache_for(self.db).has_permission(user_id, permission)
             
             if not has_permission:
                 await update.callback_query.answer(
@@ -35,12 +34,9 @@ def check_coordinator_status(func):
     async def wrapper(self, update: Update, context: ContextTypes.DEFAULT_TYPE, *args, **kwargs):
         user_id = update.effective_user.id
         
-        is_coordinator = await self.db.execute_query_fetchone(
-            "SELECT is_coordinator FROM users WHERE user_id = ?",
-            (user_id,)
-        )
+        is_coordinator = await access_cache_for(self.db).is_coordinator(user_id)
         
-        if not is_coordinator or not is_coordinator['is_coordinator']:
+        if not is_coordinator:
             await update.callback_query.answer(
                 "⚠️ Эта функция доступна только координаторам",
                 show_alert=True